@@ -1,6 +1,19 @@
 import os
-from flask import Flask, render_template, request, jsonify, flash, redirect, url_for
-from app.models.resource_allocation import ResourceAllocationManager
+import json
+import time
+import logging
+from concurrent.futures import TimeoutError as AnalysisTimeout
+from flask import Flask, render_template, request, jsonify, flash, redirect, url_for, g
+from app.models.resource_allocation import DEFAULT_CYCLE_LIMIT
+from app.models.batch import BatchError
+from app.models.analytics import FULL_CYCLE_LIMIT, inline_cycle_listing
+from app.models.query import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, process_record, resource_record
+from app.models.graph_views import GraphViewSpec
+from app.models.wire import GRAPH_MEDIA_TYPE, accepts_binary, accepts_gzip
+from app.models.recovery import RecoveryCost
+from app.telemetry import configure_logging, get_logger, metrics
+from app.profiling import DEFAULT_INTERVAL, ProfilerBusy, capture, profiling_enabled
+from app.services import create_analytics, create_manager
 
 # Initialize Flask app with explicit template and static folders
 template_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'app', 'templates'))
@@ -8,8 +21,67 @@ static_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'app', 'sta
 app = Flask(__name__, template_folder=template_dir, static_folder=static_dir)
 app.secret_key = 'your-secret-key-here'  # Change this in production
 
-# Initialize the resource manager
-resource_manager = ResourceAllocationManager()
+# Structured logging, configured through RAG_LOG_LEVEL and RAG_LOG_SAMPLE
+configure_logging()
+logger = get_logger('api')
+
+# Initialize the resource manager and the analytics engine, configured as
+# described in app.services (shared with asgi.py). Expensive analyses run in
+# worker processes on snapshots of the state and are cached per state version.
+resource_manager = create_manager()
+analytics = create_analytics(resource_manager)
+
+# Seconds between keep-alive comments on idle graph streams
+STREAM_KEEPALIVE = 15
+
+# Seconds between checks for operations stored by other workers on idle streams
+STREAM_SYNC_INTERVAL = 1
+
+def detect_deadlock(max_cycles: int = DEFAULT_CYCLE_LIMIT) -> dict:
+    """
+    Detect deadlocks, enumerating long cycle listings in the analytics workers.
+
+    Whether there is a deadlock at all comes cheaply from the manager's
+    incremental state, and so does a short listing of its cycles; only
+    longer listings (all=1) are sent off.
+    """
+    if inline_cycle_listing(max_cycles) or not resource_manager.deadlocked_processes():
+        return resource_manager.detect_deadlock(max_cycles=max_cycles)
+    return analytics.result('deadlock', max_cycles=max_cycles)
+
+def analysis_pending():
+    """Response for API calls whose analysis did not finish in time."""
+    response = jsonify({
+        'error': 'Analysis is still running, retry shortly'
+    })
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    return response
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    """Count every request and time it, by route."""
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    started = g.get('request_started')
+    if started is not None:
+        metrics.observe('http_request_seconds', time.perf_counter() - started,
+                        method=request.method, route=route)
+    metrics.increment('http_requests_total', method=request.method, route=route,
+                      status=response.status_code)
+    return response
+
+# Endpoints that never read the allocation state, served without syncing it
+STATELESS_ENDPOINTS = {'static', 'index', 'graph', 'about', 'prometheus_metrics', 'api_profile'}
+
+@app.before_request
+def sync_shared_state():
+    """Apply the operations other workers stored before handling a request that reads the state."""
+    if resource_manager.storage is not None and request.endpoint not in STATELESS_ENDPOINTS | {None}:
+        resource_manager.sync()
 
 @app.route('/')
 def index():
@@ -37,21 +109,46 @@ def resources():
         except Exception as e:
             flash(f'Error adding resource: {str(e)}', 'error')
         return redirect(url_for('resources'))
-        
-    return render_template('resources.html', resources=resource_manager.get_resources())
+    
+    # Records are built under the lock; the template renders outside it
+    with resource_manager.lock:
+        page = resource_manager.find_resources(after=request.args.get('after', type=int))
+        items = [resource_record(resource) for resource in page.items]
+    return render_template('resources.html', resources=items, page=page)
+
+def resource_choice(resource) -> dict:
+    """What the process page shows of a resource, without its edges."""
+    return {
+        'id': resource.id,
+        'name': resource.name,
+        'total_units': resource.total_units,
+        'available_units': resource.available_units,
+    }
 
 @app.route('/processes', methods=['GET'])
 def processes():
     """Process management page route."""
     try:
-        processes = resource_manager.get_processes()
-        available_resources = resource_manager.get_resources()
+        with resource_manager.lock:
+            page = resource_manager.find_processes(after=request.args.get('after', type=int))
+            items = [process_record(process) for process in page.items]
+            # Only the resources the listed processes hold or wait for, and
+            # one page of choices for the allocate and request forms
+            listed = {resource_id: resource_choice(resource_manager.resources[resource_id])
+                      for item in items
+                      for resource_id in (*item['allocated_resources'], *item['requested_resources'])}
+            choices = resource_manager.find_resources(limit=MAX_PAGE_SIZE)
+            available_resources = [resource_choice(resource) for resource in choices.items]
         return render_template('processes.html', 
-                             processes=processes,
-                             available_resources=available_resources)
+                             processes=items,
+                             page=page,
+                             available_resources=available_resources,
+                             more_resources=choices.total - len(available_resources),
+                             get_resource=listed.get)
     except Exception as e:
         flash(f'Error loading processes: {str(e)}', 'error')
-        return render_template('processes.html', processes=[], available_resources=[])
+        return render_template('processes.html', processes=[], page=None, available_resources=[],
+                               more_resources=0, get_resource={}.get)
 
 @app.route('/graph')
 def graph():
@@ -60,58 +157,61 @@ def graph():
 
 @app.route('/api/graph-data')
 def api_graph_data():
-    """API endpoint for graph data."""
+    """
+    API endpoint for graph data.
+
+    The response carries the state version as its ETag, so polls that send
+    it back in If-None-Match get a 304 until the graph changes.
+
+    View arguments (deadlocked=1, around=<id>&hops=<k>, resource=<name>,
+    top=<n>, max_nodes=<n>) return only part of the graph, clustered into
+    super-nodes past max_nodes; see GraphViewSpec.
+
+    Clients listing GRAPH_MEDIA_TYPE in Accept get the compact binary
+    encoding of app.models.wire instead of JSON, gzipped if they accept it.
+    """
     try:
-        # Get processes and resources
-        processes = resource_manager.get_processes()
-        resources = resource_manager.get_resources()
-        
-        print(f"API: Found {len(processes)} processes and {len(resources)} resources")
-        
-        # Debug print each process and resource
-        for p in processes:
-            print(f"Process: {p.name} (ID: {p.id})")
-            print(f"  Allocated: {p.allocated_resources}")
-            print(f"  Requested: {p.requested_resources}")
-        
-        for r in resources:
-            print(f"Resource: {r.name} (ID: {r.id})")
-            print(f"  Total: {r.total_units}, Available: {r.available_units}")
-            print(f"  Allocated to: {r.allocated_to}")
-            print(f"  Requested by: {r.requested_by}")
-        
-        # Get graph data
-        graph_data = resource_manager.get_graph_data()
-        
-        # Ensure we have valid graph data
-        if not isinstance(graph_data, dict):
-            print("API: Invalid graph data format")
-            return jsonify({
-                'error': True,
-                'message': 'Invalid graph data format',
-                'nodes': [],
-                'edges': []
-            })
-        
-        # Add process and resource counts to the response
-        response_data = {
-            'nodes': graph_data.get('nodes', []),
-            'edges': graph_data.get('edges', []),
-            'stats': {
-                'processes': len(processes),
-                'resources': len(resources),
-                'allocations': sum(len(p.allocated_resources) for p in processes),
-                'requests': sum(len(p.requested_resources) for p in processes)
-            }
-        }
-        
-        print("API Response:", response_data)
-        return jsonify(response_data)
+        spec = GraphViewSpec.from_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': True, 'message': str(e)}), 400
+    try:
+        binary = accepts_binary(request.headers.get('Accept', ''))
+        gzipped = binary and accepts_gzip(request.headers.get('Accept-Encoding', ''))
+        if binary:
+            snapshot, body = resource_manager.encoded_graph(spec, gzipped=gzipped)
+            # Every encoding of a version is a different representation
+            etag = f"{snapshot.etag}-{'bz' if gzipped else 'b'}"
+        else:
+            if spec is not None:
+                snapshot = resource_manager.graph_view(spec)
+            else:
+                snapshot = resource_manager.graph_snapshot()
+            body, etag = snapshot.body, snapshot.etag
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+        else:
+            response = app.response_class(body, mimetype=GRAPH_MEDIA_TYPE if binary else 'application/json')
+            if gzipped:
+                response.headers['Content-Encoding'] = 'gzip'
+        response.set_etag(etag)
+        # Let browsers keep the body but revalidate it on every poll
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['Vary'] = 'Accept, Accept-Encoding'
+        metrics.increment('graph_data_requests_total', status=response.status_code)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("graph data served", extra={'fields': {
+                'status': response.status_code,
+                'version': snapshot.version,
+                'nodes': len(snapshot.data['nodes']),
+                'edges': len(snapshot.data['edges']),
+                'bytes': len(body),
+                'binary': binary,
+            }})
+        return response
         
     except Exception as e:
-        import traceback
-        print(f"API Error: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Error fetching graph data")
+        metrics.increment('errors_total', where='api_graph_data')
         return jsonify({
             'error': True,
             'message': f'Error fetching graph data: {str(e)}',
@@ -119,17 +219,78 @@ def api_graph_data():
             'edges': []
         }), 500
 
+@app.route('/api/graph-stream')
+def api_graph_stream():
+    """
+    Server-Sent Events stream of graph deltas.
+
+    Clients resume from the version tag of the snapshot they hold, given as
+    the 'since' query argument or, on reconnect, the Last-Event-ID header.
+    Without a usable tag, or when the deltas after it are no longer kept,
+    the stream starts with a 'snapshot' event carrying the full graph data;
+    after that each 'delta' event carries the list of deltas of one version.
+    """
+    tag = request.headers.get('Last-Event-ID') or request.args.get('since')
+    version = resource_manager.parse_version_tag(tag)
+    
+    def snapshot_event():
+        snapshot = resource_manager.graph_snapshot()
+        return snapshot.version, (f"id: {snapshot.etag}\nevent: snapshot\n"
+                                  f"data: {snapshot.body.decode('utf-8')}\n\n")
+    
+    def events(version):
+        if version is None:
+            version, event = snapshot_event()
+            yield event
+        idle = 0
+        while True:
+            resource_manager.sync()
+            batches = resource_manager.deltas.since(version)
+            if batches is None or any(delta['type'] == 'reset' for _, batch in batches for delta in batch):
+                version, event = snapshot_event()
+                yield event
+                continue
+            for batch_version, batch in batches:
+                version = batch_version
+                yield (f"id: {resource_manager.version_tag(batch_version)}\nevent: delta\n"
+                       f"data: {json.dumps(batch, separators=(',', ':'))}\n\n")
+            if batches:
+                idle = 0
+                continue
+            # Other workers' changes only arrive through sync(), so poll for them
+            timeout = STREAM_KEEPALIVE if resource_manager.storage is None else STREAM_SYNC_INTERVAL
+            if not resource_manager.deltas.wait(version, timeout):
+                idle += timeout
+                if idle >= STREAM_KEEPALIVE:
+                    idle = 0
+                    yield ": keep-alive\n\n"
+    
+    response = app.response_class(events(version), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @app.route('/api/check-deadlock')
 def api_check_deadlock():
-    """API endpoint for deadlock detection."""
+    """
+    API endpoint for deadlock detection.
+
+    Lists up to max_cycles cycles, or all of them (up to FULL_CYCLE_LIMIT)
+    with all=1.
+    """
     try:
-        deadlock_info = resource_manager.detect_deadlock()
+        max_cycles = request.args.get('max_cycles', DEFAULT_CYCLE_LIMIT, type=int)
+        if request.args.get('all'):
+            max_cycles = FULL_CYCLE_LIMIT
+        deadlock_info = detect_deadlock(max_cycles=max_cycles)
         return jsonify({
             'has_deadlock': deadlock_info['has_deadlock'],
             'message': 'Cycles detected in the resource allocation graph.' if deadlock_info['has_deadlock'] else 'No cycles detected.',
             'cycles': deadlock_info['cycles'],
             'affected_processes': deadlock_info['affected_processes']
         })
+    except AnalysisTimeout:
+        return analysis_pending()
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -137,10 +298,13 @@ def api_check_deadlock():
 def deadlock():
     """Deadlock detection page route."""
     try:
-        deadlock_info = resource_manager.detect_deadlock()
+        deadlock_info = detect_deadlock()
         return render_template('deadlock.html', 
                              has_deadlock=deadlock_info['has_deadlock'],
                              deadlock_info=deadlock_info)
+    except AnalysisTimeout:
+        flash('Deadlock analysis is still running, refresh in a moment.', 'info')
+        return render_template('deadlock.html', has_deadlock=False, deadlock_info=None)
     except Exception as e:
         flash(f'Error detecting deadlock: {str(e)}', 'error')
         return render_template('deadlock.html', has_deadlock=False, deadlock_info=None)
@@ -149,11 +313,14 @@ def deadlock():
 def ai_analysis():
     """AI analysis page route."""
     try:
-        analysis = resource_manager.analyze_resource_usage()
+        analysis = analytics.result('analysis')
         if not analysis:
             flash('No data available for analysis.', 'info')
             return render_template('ai_analysis.html', analysis=None)
         return render_template('ai_analysis.html', analysis=analysis)
+    except AnalysisTimeout:
+        flash('Analysis is still running, refresh in a moment.', 'info')
+        return render_template('ai_analysis.html', analysis=None)
     except Exception as e:
         flash(f'Error performing AI analysis: {str(e)}', 'error')
         return render_template('ai_analysis.html', analysis={'error': str(e)})
@@ -162,9 +329,13 @@ def ai_analysis():
 def resource_optimization():
     """Resource optimization page route."""
     try:
-        recommendations = resource_manager.get_optimization_recommendations()
+        try:
+            recommendations, pending = analytics.result('recommendations'), False
+        except AnalysisTimeout:
+            recommendations, pending = None, True
         if not recommendations:
-            flash('No optimization recommendations available.', 'info')
+            flash('Recommendations are still being computed, refresh in a moment.' if pending
+                  else 'No optimization recommendations available.', 'info')
             recommendations = {
                 'active_processes': 0,
                 'total_resources': 0,
@@ -206,8 +377,13 @@ def add_process():
         if not process_name or process_name.strip() == '':
             raise ValueError("Process name is required")
             
+        try:
+            priority = int(request.form.get('priority') or 0)
+        except ValueError:
+            raise ValueError("Priority must be a whole number")
+            
         # Create the process
-        process_id = resource_manager.add_process(process_name)
+        process_id = resource_manager.add_process(process_name, priority=priority)
         flash(f'Process {process_name} added successfully!', 'success')
     except ValueError as e:
         flash(str(e), 'error')
@@ -220,7 +396,7 @@ def remove_process(process_id):
     """Remove a process and release all its allocated resources."""
     try:
         # Get process details for the success message
-        process = next((p for p in resource_manager.get_processes() if p.id == process_id), None)
+        process = resource_manager.get_process(process_id)
         if not process:
             raise ValueError("Process not found")
             
@@ -320,7 +496,15 @@ def delete_resource(resource_id):
 
 @app.route('/api/apply_optimization', methods=['POST'])
 def api_apply_optimization():
-    """API endpoint to apply optimization recommendations."""
+    """
+    API endpoint to apply optimization recommendations.
+
+    resolve_deadlock breaks the current deadlock at the lowest cost found
+    (see ResourceAllocationManager.recover_deadlock) and accepts:
+        recovery: 'preempt' (default) or 'abort'
+        cost: weights of a victim's cost, see RecoveryCost
+        dry_run: only return the plan
+    """
     try:
         data = request.get_json()
         action = data.get('action')
@@ -333,23 +517,20 @@ def api_apply_optimization():
             
         # Handle deadlock resolution
         if action == 'resolve_deadlock':
-            # Get deadlock info
-            deadlock_info = resource_manager.detect_deadlock()
-            if deadlock_info['has_deadlock']:
-                # Release resources from affected processes to break deadlock
-                for process_id in deadlock_info['affected_processes']:
-                    process = resource_manager.processes.get(process_id)
-                    if process:
-                        # Release all resources held by this process
-                        for resource_id in list(process.allocated_resources.keys()):
-                            resource_manager.release_resource(process_id, resource_id)
+            try:
+                cost = RecoveryCost.from_dict(data.get('cost'))
+                plan = resource_manager.recover_deadlock(data.get('recovery', 'preempt'), cost,
+                                                         dry_run=bool(data.get('dry_run')))
+            except (TypeError, ValueError) as e:
                 return jsonify({
-                    'success': True,
-                    'message': 'Deadlock resolved by releasing resources from affected processes'
-                })
+                    'success': False,
+                    'message': str(e)
+                }), 400
             return jsonify({
-                'success': False,
-                'message': 'No deadlock detected'
+                'success': bool(plan.victims),
+                'message': plan.describe(),
+                'dry_run': bool(data.get('dry_run')),
+                'plan': plan.to_dict()
             })
             
         # Handle resource-specific actions
@@ -369,19 +550,19 @@ def api_apply_optimization():
             
         if action == 'decrease_units':
             # Decrease units if utilization is low
-            if resource.total_units > 1:
-                resource.total_units -= 1
-                resource.recalculate_available_units()
-                message = f'Reduced {resource.name} units by 1'
-            else:
+            try:
+                with resource_manager.lock:
+                    resource_manager.set_resource_units(resource_id, resource.total_units - 1)
+            except ValueError as e:
                 return jsonify({
                     'success': False,
-                    'message': 'Cannot reduce units below 1'
+                    'message': str(e)
                 }), 400
+            message = f'Reduced {resource.name} units by 1'
         elif action == 'increase_units':
             # Increase units if utilization is high
-            resource.total_units += 1
-            resource.recalculate_available_units()
+            with resource_manager.lock:
+                resource_manager.set_resource_units(resource_id, resource.total_units + 1)
             message = f'Increased {resource.name} units by 1'
         else:
             return jsonify({
@@ -389,8 +570,11 @@ def api_apply_optimization():
                 'message': 'Invalid action'
             }), 400
             
-        # Get updated recommendations
-        recommendations = resource_manager.get_optimization_recommendations()
+        # Get updated recommendations, unless they take too long
+        try:
+            recommendations = analytics.result('recommendations')
+        except AnalysisTimeout:
+            recommendations = None
         
         return jsonify({
             'success': True,
@@ -404,10 +588,129 @@ def api_apply_optimization():
             'message': str(e)
         }), 500
 
+@app.route('/api/batch', methods=['POST'])
+def api_batch():
+    """
+    API endpoint applying a list of operations atomically.
+
+    Accepts {"operations": [{"op": "allocate", "process_id": ..., ...}, ...]}
+    (or the bare list) and applies it with ResourceAllocationManager.apply_batch;
+    if any operation fails nothing is applied.
+    """
+    data = request.get_json(silent=True)
+    operations = data.get('operations') if isinstance(data, dict) else data
+    if not isinstance(operations, list):
+        return jsonify({
+            'success': False,
+            'message': 'Expected a JSON list of operations'
+        }), 400
+    
+    try:
+        result = resource_manager.apply_batch(operations)
+    except BatchError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e),
+            'index': e.index
+        }), 400
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        logger.exception("Error applying batch")
+        metrics.increment('errors_total', where='api_batch')
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+    
+    metrics.increment('batch_operations_total', len(operations))
+    return jsonify({
+        'success': True,
+        **result
+    })
+
+def page_arguments() -> dict:
+    """Cursor and page size of a listing request."""
+    return {
+        'after': request.args.get('after', type=int),
+        'limit': request.args.get('limit', DEFAULT_PAGE_SIZE, type=int),
+    }
+
+@app.route('/api/processes')
+def api_processes():
+    """
+    API endpoint listing processes, one page at a time.
+
+    Filters: name, holding (resource ID), waiting_for (resource ID),
+    deadlocked=1. Pages: limit, and after=<next_cursor of the previous page>.
+    """
+    with resource_manager.lock:
+        page = resource_manager.find_processes(
+            name=request.args.get('name'),
+            holding=request.args.get('holding'),
+            waiting_for=request.args.get('waiting_for'),
+            deadlocked=request.args.get('deadlocked', '').lower() in ('1', 'true'),
+            **page_arguments()
+        )
+        deadlocked = resource_manager.deadlocked_processes()
+        items = [process_record(process, deadlocked) for process in page.items]
+    return jsonify({'items': items, 'total': page.total, 'next_cursor': page.next_cursor})
+
+@app.route('/api/resources')
+def api_resources():
+    """
+    API endpoint listing resources, one page at a time.
+
+    Filters: name, held_by (process ID), awaited_by (process ID),
+    utilization (idle, low, high or full). Pages as for /api/processes.
+    """
+    try:
+        with resource_manager.lock:
+            page = resource_manager.find_resources(
+                name=request.args.get('name'),
+                held_by=request.args.get('held_by'),
+                awaited_by=request.args.get('awaited_by'),
+                utilization=request.args.get('utilization'),
+                **page_arguments()
+            )
+            items = [resource_record(resource) for resource in page.items]
+    except ValueError as e:
+        return jsonify({'error': True, 'message': str(e)}), 400
+    return jsonify({'items': items, 'total': page.total, 'next_cursor': page.next_cursor})
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Counters and latency histograms in the Prometheus text format."""
+    return app.response_class(metrics.exposition(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/profile')
+def api_profile():
+    """
+    Profile this worker for ?seconds= (default 10) and return the folded
+    stacks, ready for a flame graph. Only when RAG_PROFILING is enabled.
+    """
+    if not profiling_enabled():
+        return jsonify({'error': True, 'message': 'Profiling is disabled'}), 404
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        interval = float(request.args.get('interval', DEFAULT_INTERVAL))
+        profile = capture(seconds, interval)
+    except ProfilerBusy as e:
+        return jsonify({'error': True, 'message': str(e)}), 409
+    except ValueError as e:
+        return jsonify({'error': True, 'message': str(e)}), 400
+    response = app.response_class(profile, mimetype='text/plain')
+    response.headers['X-Profile-Pid'] = str(os.getpid())
+    return response
+
 if __name__ == '__main__':
-    # Add some sample data for testing
-    resource_manager.add_resource("CPU", 4)
-    resource_manager.add_resource("Memory", 8)
-    resource_manager.add_resource("Printer", 2)
+    # Add some sample data for testing, unless state was restored from storage
+    if not resource_manager.resources:
+        resource_manager.add_resource("CPU", 4)
+        resource_manager.add_resource("Memory", 8)
+        resource_manager.add_resource("Printer", 2)
     
     app.run(debug=True) 
\ No newline at end of file
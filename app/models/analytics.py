@@ -0,0 +1,209 @@
+"""
+Analytics Engine Module
+
+This module runs the expensive, read-only analyses of a
+ResourceAllocationManager (usage analysis, optimization recommendations,
+deadlock detection with cycle enumeration) in a pool of worker processes,
+so that they neither hold the manager's lock nor compete with allocation
+traffic for the GIL.
+
+Each computation works on a snapshot of the state (export_state()), taken
+once per state version and restored by the worker into a private manager.
+Snapshots only carry the history events the analysis reads, so analyses of
+the graph alone do not ship the whole history. Results are cached per
+version: until the next mutation every caller gets the same result, or
+waits for the same computation in progress.
+
+Listing a few deadlock cycles is cheap and is better answered in-process
+(see inline_cycle_listing()); only full enumerations are worth a worker.
+"""
+
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Tuple
+
+from app.models.history import AllocationHistory
+from app.models.resource_allocation import ResourceAllocationManager, TREND_EVENTS
+from app.telemetry import get_logger, metrics
+
+logger = get_logger('analytics')
+
+# Analysis name -> (manager method computing it, most recent history
+# events it reads)
+ANALYSES = {
+    'analysis': ('analyze_resource_usage', TREND_EVENTS),
+    'recommendations': ('get_optimization_recommendations', TREND_EVENTS),
+    'deadlock': ('detect_deadlock', 0),
+}
+
+# Seconds result() waits for a computation by default
+DEFAULT_TIMEOUT = 10.0
+
+# Default number of worker processes
+DEFAULT_WORKERS = 2
+
+# Upper bound of cycles listed when enumerating all of them
+FULL_CYCLE_LIMIT = 10_000
+
+# Most cycles listed in-process rather than by a worker
+INLINE_CYCLE_LIMIT = 100
+
+# Manager restored in a worker process, with the version tag of its state
+_worker_state: Optional[Tuple[str, ResourceAllocationManager]] = None
+
+
+def inline_cycle_listing(max_cycles: int) -> bool:
+    """Whether a deadlock detection listing up to max_cycles cycles is cheap enough to run in-process."""
+    return max_cycles <= INLINE_CYCLE_LIMIT
+
+
+def _compute(tag: str, state: bytes, method: str, params: dict):
+    """Run an analysis in a worker process on the state of version tag (and history extent)."""
+    global _worker_state
+    if _worker_state is None or _worker_state[0] != tag:
+        manager = ResourceAllocationManager(history=AllocationHistory(max_events=None))
+        manager.restore_state(state)
+        _worker_state = (tag, manager)
+    return getattr(_worker_state[1], method)(**params)
+
+
+class AnalyticsEngine:
+    """
+    Process pool computing manager analyses off the request path.
+
+    submit() returns a Future for the result at the current state version,
+    shared with every other caller asking for the same analysis before the
+    state changes. A newer version supersedes older computations: those that
+    have not started yet are cancelled, results of finished ones are
+    dropped. result() waits up to a timeout; a computation that times out
+    keeps running and its result is still served if the state has not
+    changed by the time it finishes.
+
+    The worker processes are only started on first use, or by start(), so
+    creating an engine (e.g. by importing the application) has no side
+    effects. They are started from a fork server where available, which
+    preloads this module only: workers inherit neither the application's
+    threads nor its open files.
+    """
+
+    def __init__(self, manager: ResourceAllocationManager, workers: int = DEFAULT_WORKERS,
+                 timeout: float = DEFAULT_TIMEOUT):
+        """Set up an engine computing analyses of manager; no process is started yet."""
+        self.manager = manager
+        self.workers = workers
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        # Analysis key -> (version tag, future)
+        self._results: Dict[tuple, Tuple[str, Future]] = {}
+        # Version tag and exported states of that version, by history events kept
+        self._state: Optional[Tuple[str, Dict[int, bytes]]] = None
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def start(self) -> None:
+        """Start the worker processes now instead of on the first submit()."""
+        with self._lock:
+            executor = self._pool()
+        executor.submit(int).result()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = self._start()
+        return self._executor
+
+    def _start(self) -> ProcessPoolExecutor:
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('forkserver')
+            context.set_forkserver_preload([__name__])
+        else:
+            context = multiprocessing.get_context('spawn')
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+
+    def submit(self, analysis: str, **params) -> Future:
+        """
+        Return a Future for an analysis (see ANALYSES) of the current state.
+
+        params are passed to the manager method, e.g. max_cycles for
+        'deadlock'.
+        """
+        if analysis not in ANALYSES:
+            raise ValueError(f"Unknown analysis: {analysis}")
+        key = (analysis, tuple(sorted(params.items())))
+        method, history_events = ANALYSES[analysis]
+        with self._lock:
+            tag, state = self._snapshot(history_events)
+            # Workers cache the last state they restored by this tag
+            tag = f"{tag}/{history_events}"
+            cached = self._results.get(key)
+            if cached is not None:
+                cached_tag, future = cached
+                if cached_tag == tag and not future.cancelled() and not (future.done() and future.exception()):
+                    metrics.increment('analytics_requests_total', analysis=analysis, cached='true')
+                    return future
+                future.cancel()
+            metrics.increment('analytics_requests_total', analysis=analysis, cached='false')
+            try:
+                future = self._pool().submit(_compute, tag, state, method, params)
+            except BrokenProcessPool:
+                logger.warning("Analytics worker died, restarting the pool")
+                metrics.increment('errors_total', where='analytics_pool')
+                self._executor = self._start()
+                future = self._executor.submit(_compute, tag, state, method, params)
+            self._results[key] = (tag, future)
+            future.add_done_callback(self._timer(analysis))
+            return future
+
+    def result(self, analysis: str, timeout: Optional[float] = None, **params):
+        """
+        Return an analysis of the current state, computing it if needed.
+
+        Raises:
+            concurrent.futures.TimeoutError: if it takes longer than timeout
+                seconds (default: the engine's timeout)
+        """
+        future = self.submit(analysis, **params)
+        return future.result(timeout=self.timeout if timeout is None else timeout)
+
+    def cancel(self) -> None:
+        """Cancel the computations that have not started and forget every result."""
+        with self._lock:
+            for _, future in self._results.values():
+                future.cancel()
+            self._results = {}
+
+    def shutdown(self) -> None:
+        """Cancel pending computations and stop the worker processes."""
+        self.cancel()
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    @staticmethod
+    def _timer(analysis: str):
+        """Done callback recording how long a computation took from submission."""
+        histogram = metrics.histogram('analytics_seconds', analysis=analysis)
+        started = time.perf_counter()
+
+        def done(future: Future) -> None:
+            if not future.cancelled():
+                histogram.observe(time.perf_counter() - started)
+        return done
+
+    def _snapshot(self, history_events: int) -> Tuple[str, bytes]:
+        """Return the version tag and the exported state (with history_events events) of the current version."""
+        with self.manager.lock:
+            tag = self.manager.version_tag()
+            if self._state is None or self._state[0] != tag:
+                self._state = (tag, {})
+                # Results of older versions can no longer be served
+                for key, (result_tag, future) in list(self._results.items()):
+                    if not result_tag.startswith(f"{tag}/"):
+                        future.cancel()
+                        del self._results[key]
+            states = self._state[1]
+            if history_events not in states:
+                states[history_events] = self.manager.export_state(history_events=history_events)
+            return tag, states[history_events]
@@ -0,0 +1,71 @@
+"""
+Batch Mutation Module
+
+This module provides the pieces behind ResourceAllocationManager.apply_batch:
+the table of supported operations and the journal that records what a batch
+changed so it can be rolled back, plus the events and checks it defers
+until the batch commits.
+"""
+
+from typing import Dict, List, Set, Tuple
+
+# Batch operation name -> (manager method, accepted arguments)
+BATCH_OPERATIONS: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    'add_resource': ('add_resource', ('name', 'units', 'resource_id')),
+    'add_process': ('add_process', ('name', 'max_claims', 'priority', 'process_id')),
+    'remove_process': ('remove_process', ('process_id',)),
+    'delete_resource': ('delete_resource', ('resource_id',)),
+    'allocate': ('allocate_resource', ('process_id', 'resource_id', 'units')),
+    'request': ('request_resource', ('process_id', 'resource_id', 'units')),
+    'release': ('release_resource', ('process_id', 'resource_id')),
+    'cancel': ('cancel_request', ('process_id', 'resource_id')),
+    'set_units': ('set_resource_units', ('resource_id', 'total_units')),
+    'declare_max_claim': ('declare_max_claim', ('process_id', 'resource_id', 'units')),
+}
+
+
+class BatchError(ValueError):
+    """Raised when an operation of a batch fails; the whole batch is rolled back."""
+
+    def __init__(self, index: int, message: str):
+        super().__init__(f"Operation {index} failed: {message}")
+        self.index = index
+
+
+class BatchJournal:
+    """
+    Record of a batch in progress.
+
+    The first time a batch touches a process or resource its edges (and,
+    for resources, units and wait queue) are saved, so that rolling back
+    only restores what the batch actually changed. Entities the batch
+    creates are only remembered by ID. History events are held back until
+    the batch commits, and queued grants until its operations have all run
+    (granting is then set). The state version and the views
+    cached for it are kept too: a rolled back batch leaves the state as it
+    was, so they still hold.
+    """
+
+    def __init__(self, version: int = 0, cached: tuple = ()):
+        self.version = version
+        self.cached = cached
+        self.processes: Dict[str, tuple] = {}
+        self.resources: Dict[str, tuple] = {}
+        self.added: Set[str] = set()
+        self.touched: Dict[str, None] = {}
+        self.events: List[tuple] = []
+        self.pending_grants: Dict[str, None] = {}
+        self.granting = False
+        self.forgotten_resources: List[str] = []
+
+    def save_process(self, process) -> None:
+        if process.id in self.processes or process.id in self.added:
+            return
+        self.processes[process.id] = (process, dict(process.allocated_resources),
+                                      dict(process.requested_resources), dict(process.max_claims))
+
+    def save_resource(self, resource, queue) -> None:
+        if resource.id in self.resources or resource.id in self.added:
+            return
+        self.resources[resource.id] = (resource, resource.total_units, dict(resource.allocated_to),
+                                       dict(resource.requested_by), queue.copy() if queue is not None else None)
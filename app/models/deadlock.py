@@ -0,0 +1,249 @@
+"""
+Deadlock Detection Module
+
+This module keeps the process wait-for graph derived from the resource
+allocation graph up to date as edges are added and removed, so that the
+manager can answer deadlock queries without re-enumerating cycles, and
+provides the multi-unit graph reduction used to decide which processes
+are actually stuck.
+"""
+
+import heapq
+from collections import deque
+from typing import Dict, Iterable, List, Mapping, Set, Tuple
+
+
+def find_blocked_processes(available: Mapping[str, int],
+                           holdings: Mapping[str, Mapping[str, int]],
+                           demands: Mapping[str, Mapping[str, int]],
+                           process_ids: Iterable[str] = None) -> Set[str]:
+    """
+    Reduce the allocation graph and return the processes that cannot finish.
+
+    A process can finish once every one of its demands fits in the work
+    vector (initially the available units); when it finishes its holdings
+    are returned to the work vector. Waiters are kept in a min-heap per
+    resource keyed by demanded units, and each process tracks how many of
+    its demands are still unsatisfied, so every demand edge is pushed and
+    popped at most once.
+
+    Args:
+        available: resource_id -> free units
+        holdings: process_id -> {resource_id: units held}
+        demands: process_id -> {resource_id: units still needed}
+        process_ids: processes to consider, defaults to every key in
+            holdings and demands
+    """
+    if process_ids is None:
+        process_ids = set(holdings) | set(demands)
+    
+    work = dict(available)
+    waiting: Dict[str, List[Tuple[int, str]]] = {}
+    unsatisfied: Dict[str, int] = {}
+    ready = deque()
+    
+    for process_id in process_ids:
+        count = 0
+        for resource_id, units in demands.get(process_id, {}).items():
+            if units > work.get(resource_id, 0):
+                waiting.setdefault(resource_id, []).append((units, process_id))
+                count += 1
+        if count:
+            unsatisfied[process_id] = count
+        else:
+            ready.append(process_id)
+    
+    for heap in waiting.values():
+        heapq.heapify(heap)
+    
+    while ready:
+        process_id = ready.popleft()
+        for resource_id, units in holdings.get(process_id, {}).items():
+            free = work.get(resource_id, 0) + units
+            work[resource_id] = free
+            heap = waiting.get(resource_id)
+            while heap and heap[0][0] <= free:
+                _, waiter_id = heapq.heappop(heap)
+                unsatisfied[waiter_id] -= 1
+                if not unsatisfied[waiter_id]:
+                    del unsatisfied[waiter_id]
+                    ready.append(waiter_id)
+    
+    return set(unsatisfied)
+
+
+class WaitForGraph:
+    """
+    Incrementally maintained wait-for graph over processes.
+
+    Process P waits for process Q when P requests a resource that Q holds.
+    Because the same pair can be linked through several resources, every
+    edge carries a reference count and only disappears when the last
+    resource linking the two processes goes away.
+
+    Deadlock state is computed lazily: mutations only record what changed,
+    and the next query either keeps the cached answer (deleting edges from
+    an acyclic graph cannot create a cycle), checks the newly added edges
+    for a path back to their source, or recomputes the strongly connected
+    components from scratch.
+    """
+
+    def __init__(self):
+        """Initialize an empty wait-for graph."""
+        self.successors: Dict[str, Dict[str, int]] = {}
+        self.predecessors: Dict[str, Dict[str, int]] = {}
+        self._deadlocked: Set[str] = set()
+        self._dirty = False
+        # Edges added since the last query, as an ordered set
+        self._pending_edges: Dict[Tuple[str, str], None] = {}
+
+    # Edge maintenance, called by the manager around its own bookkeeping
+
+    def holder_added(self, resource, process_id: str) -> None:
+        """Record that a process started holding units of a resource."""
+        for waiter_id in resource.requested_by:
+            self._add_edge(waiter_id, process_id)
+
+    def holder_removed(self, resource, process_id: str) -> None:
+        """Record that a process no longer holds any units of a resource."""
+        for waiter_id in resource.requested_by:
+            self._remove_edge(waiter_id, process_id)
+
+    def waiter_added(self, resource, process_id: str) -> None:
+        """Record that a process started waiting on a resource."""
+        for holder_id in resource.allocated_to:
+            self._add_edge(process_id, holder_id)
+
+    def waiter_removed(self, resource, process_id: str) -> None:
+        """Record that a process no longer waits on a resource."""
+        for holder_id in resource.allocated_to:
+            self._remove_edge(process_id, holder_id)
+
+    def remove_process(self, process_id: str) -> None:
+        """Drop a process that no longer has any edges."""
+        self.successors.pop(process_id, None)
+        self.predecessors.pop(process_id, None)
+        self._deadlocked.discard(process_id)
+
+    def reset(self) -> None:
+        """Forget every edge."""
+        self.__init__()
+
+    def _add_edge(self, source: str, target: str) -> None:
+        targets = self.successors.setdefault(source, {})
+        count = targets.get(target, 0)
+        targets[target] = count + 1
+        self.predecessors.setdefault(target, {})[source] = count + 1
+        if count == 0 and not self._dirty:
+            if self._deadlocked:
+                # Membership of existing cycles may grow
+                self._dirty = True
+            else:
+                self._pending_edges[(source, target)] = None
+
+    def _remove_edge(self, source: str, target: str) -> None:
+        targets = self.successors.get(source)
+        if not targets or target not in targets:
+            return
+        count = targets[target] - 1
+        if count > 0:
+            targets[target] = count
+            self.predecessors[target][source] = count
+            return
+        del targets[target]
+        del self.predecessors[target][source]
+        if not targets:
+            del self.successors[source]
+        if not self.predecessors[target]:
+            del self.predecessors[target]
+        if self._deadlocked:
+            self._dirty = True
+        # Removing an edge from an acyclic graph keeps it acyclic, but a
+        # pending edge that was just removed no longer needs checking
+        else:
+            self._pending_edges.pop((source, target), None)
+
+    # Queries
+
+    def has_cycle(self) -> bool:
+        """Return True if any process is part of a circular wait."""
+        return bool(self.cyclic_processes())
+
+    def cyclic_processes(self) -> Set[str]:
+        """Return the processes that lie on at least one wait-for cycle."""
+        if not self._dirty and self._pending_edges:
+            for source, target in self._pending_edges:
+                if self._reaches(target, source):
+                    self._dirty = True
+                    break
+            self._pending_edges = {}
+        if self._dirty:
+            self._deadlocked = self._cyclic_components()
+            self._dirty = False
+            self._pending_edges = {}
+        return self._deadlocked
+
+    def _reaches(self, start: str, goal: str) -> bool:
+        """Check whether goal is reachable from start."""
+        if start == goal:
+            return True
+        seen = {start}
+        stack = [start]
+        while stack:
+            node = stack.pop()
+            for successor in self.successors.get(node, ()):
+                if successor == goal:
+                    return True
+                if successor not in seen:
+                    seen.add(successor)
+                    stack.append(successor)
+        return False
+
+    def _cyclic_components(self) -> Set[str]:
+        """Iterative Tarjan SCC returning every node on a cycle."""
+        index: Dict[str, int] = {}
+        lowlink: Dict[str, int] = {}
+        on_stack: Set[str] = set()
+        stack: List[str] = []
+        cyclic: Set[str] = set()
+        counter = 0
+
+        for root in self.successors:
+            if root in index:
+                continue
+            work = [(root, iter(self.successors.get(root, ())))]
+            index[root] = lowlink[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack.add(root)
+            while work:
+                node, successors = work[-1]
+                advanced = False
+                for successor in successors:
+                    if successor not in index:
+                        index[successor] = lowlink[successor] = counter
+                        counter += 1
+                        stack.append(successor)
+                        on_stack.add(successor)
+                        work.append((successor, iter(self.successors.get(successor, ()))))
+                        advanced = True
+                        break
+                    if successor in on_stack:
+                        lowlink[node] = min(lowlink[node], index[successor])
+                if advanced:
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    if len(component) > 1 or node in self.successors.get(node, ()):
+                        cyclic.update(component)
+        return cyclic
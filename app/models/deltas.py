@@ -0,0 +1,98 @@
+"""
+Graph Delta Module
+
+This module provides the bounded log of typed graph changes that
+ResourceAllocationManager publishes for streaming clients. Every mutation
+of the manager records the node and edge changes it caused under the state
+version it produced, so a client holding the graph at some version can
+catch up by replaying the batches recorded after it.
+"""
+
+import threading
+from collections import deque
+from typing import Callable, List, Optional, Tuple
+
+# Default number of version batches kept for resuming clients
+DEFAULT_MAX_BATCHES = 10_000
+
+# Kinds of deltas, stored under the 'type' key of each delta dict:
+#   node_added / units_changed   -- carry the full 'node' or 'edge' dict
+#   node_removed / edge_removed  -- carry the 'id' of the removed element
+#   edge_added                   -- carries the full 'edge' dict
+#   deadlock_changed             -- carries the deadlocked 'processes'
+#   reset                        -- the whole graph was cleared
+DELTA_TYPES = ('node_added', 'node_removed', 'edge_added', 'edge_removed',
+               'units_changed', 'deadlock_changed', 'reset')
+
+
+class DeltaLog:
+    """
+    Bounded, version-ordered log of graph delta batches.
+
+    Batches are (version, deltas) pairs with strictly increasing versions.
+    When the log is full the oldest batch is dropped and clients older than
+    it must start over from a full snapshot; since() reports this by
+    returning None. Readers may block in wait() until a newer batch arrives,
+    or register a listener to be called with the version of every new batch
+    (from the writing thread, so it must be quick and must not block).
+    """
+
+    def __init__(self, max_batches: int = DEFAULT_MAX_BATCHES):
+        """Initialize an empty log keeping at most max_batches batches."""
+        if max_batches < 1:
+            raise ValueError("max_batches must be at least 1")
+        self.max_batches = max_batches
+        self._batches: deque = deque()
+        self._floor = 0
+        self._latest = 0
+        self._changed = threading.Condition()
+        self._listeners: List[Callable[[int], None]] = []
+
+    @property
+    def latest_version(self) -> int:
+        """Version of the newest recorded batch."""
+        return self._latest
+
+    def record(self, version: int, deltas: List[dict]) -> None:
+        """Append the deltas produced by the mutation that led to version."""
+        if not deltas:
+            return
+        with self._changed:
+            self._batches.append((version, deltas))
+            if len(self._batches) > self.max_batches:
+                self._floor = self._batches.popleft()[0]
+            self._latest = version
+            self._changed.notify_all()
+        for listener in self._listeners:
+            listener(version)
+
+    def add_listener(self, listener: Callable[[int], None]) -> None:
+        """Call listener(version) whenever a batch is recorded."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[int], None]) -> None:
+        """Stop calling a listener added with add_listener()."""
+        self._listeners.remove(listener)
+
+    def since(self, version: int) -> Optional[List[Tuple[int, List[dict]]]]:
+        """
+        Return the batches recorded after version, oldest first.
+
+        Returns None if some of them have already been dropped.
+        """
+        with self._changed:
+            if version < self._floor:
+                return None
+            batches = []
+            # Clients are normally close to the tail, so scan from the end
+            for batch in reversed(self._batches):
+                if batch[0] <= version:
+                    break
+                batches.append(batch)
+        batches.reverse()
+        return batches
+
+    def wait(self, version: int, timeout: Optional[float] = None) -> bool:
+        """Block until a batch newer than version exists; False on timeout."""
+        with self._changed:
+            return self._changed.wait_for(lambda: self._latest > version, timeout)
@@ -0,0 +1,310 @@
+"""
+Graph Views Module
+
+This module selects parts of the resource allocation graph for clients that
+cannot take all of it: the deadlocked subgraph, the neighborhood of a node,
+the resources of one kind (by name) or the most contended resources, and
+collapses views that are still too large into clustered super-nodes.
+
+A view is described by a GraphViewSpec. Filters narrow the view down
+together (a node must pass every one), and each is computed from the
+manager's adjacency and indexes, so the cost of a view follows its size
+rather than the size of the graph (top-N by contention, which ranks every
+resource, excepted).
+
+Clustering groups every resource with the processes anchored to it (the
+selected resource a process holds the most units of, or else requests the
+most of); processes with no edge in the view form one more cluster. The
+largest clusters are collapsed first until the view fits in max_nodes.
+Edges to collapsed members are merged into one edge per cluster, edge
+type and direction, carrying the number of edges and units merged.
+"""
+
+import hashlib
+import heapq
+import json
+from dataclasses import asdict, dataclass
+from typing import Callable, Collection, Dict, List, Mapping, Optional, Set, Tuple
+
+# Largest neighborhood radius accepted
+MAX_HOPS = 5
+
+# Largest top-N and node budget accepted
+MAX_TOP = 10_000
+MAX_VIEW_NODES = 20_000
+
+# Cluster of the processes with no edge in the view
+IDLE_CLUSTER = 'cluster:idle'
+
+
+@dataclass(frozen=True)
+class GraphViewSpec:
+    """
+    Filters and size budget of a graph view.
+
+    Attributes:
+        deadlocked: only deadlocked processes and the resources they hold or request
+        around: only the nodes within hops edges of this process or resource
+        hops: radius of the around neighborhood
+        resource: only resources with this name (case-insensitive) and their
+            holders and waiters
+        top: only the top resources by contention (waiting processes, then
+            units requested) and their holders and waiters
+        max_nodes: collapse clusters until the view has at most this many nodes
+    """
+    deadlocked: bool = False
+    around: Optional[str] = None
+    hops: int = 1
+    resource: Optional[str] = None
+    top: Optional[int] = None
+    max_nodes: Optional[int] = None
+
+    def __post_init__(self):
+        if not 0 <= self.hops <= MAX_HOPS:
+            raise ValueError(f"hops must be between 0 and {MAX_HOPS}")
+        if self.top is not None and not 0 < self.top <= MAX_TOP:
+            raise ValueError(f"top must be between 1 and {MAX_TOP}")
+        if self.max_nodes is not None and not 0 < self.max_nodes <= MAX_VIEW_NODES:
+            raise ValueError(f"max_nodes must be between 1 and {MAX_VIEW_NODES}")
+
+    @classmethod
+    def from_args(cls, args: Mapping[str, str]) -> Optional['GraphViewSpec']:
+        """
+        Parse the view arguments of a request (e.g. its query string).
+
+        Returns None when there are none, i.e. the client wants the whole graph.
+
+        Raises:
+            ValueError: if an argument is malformed or out of range
+        """
+        if not any(args.get(name) for name in ('deadlocked', 'around', 'resource', 'top', 'max_nodes')):
+            return None
+
+        def integer(name: str, default: Optional[int]) -> Optional[int]:
+            value = args.get(name)
+            if not value:
+                return default
+            try:
+                return int(value)
+            except ValueError:
+                raise ValueError(f"{name} must be an integer") from None
+
+        return cls(
+            deadlocked=str(args.get('deadlocked', '')).lower() in ('1', 'true', 'yes'),
+            around=args.get('around') or None,
+            hops=integer('hops', 1),
+            resource=args.get('resource') or None,
+            top=integer('top', None),
+            max_nodes=integer('max_nodes', None),
+        )
+
+    @property
+    def digest(self) -> str:
+        """Short stable hash of the spec, used in the ETag of its views."""
+        encoded = json.dumps(asdict(self), sort_keys=True).encode('utf-8')
+        return hashlib.blake2b(encoded, digest_size=6).hexdigest()
+
+
+def contention(resource) -> Tuple[int, int, int]:
+    """Ranking key of a resource for top-N: waiting processes, units requested, units allocated."""
+    return (len(resource.requested_by), sum(resource.requested_by.values()),
+            resource.total_units - resource.available_units)
+
+
+def select_nodes(spec: GraphViewSpec, processes: Mapping, resources: Mapping,
+                 deadlocked: Callable[[], Set[str]],
+                 named: Callable[[str], Collection[str]]) -> Tuple[Set[str], Set[str]]:
+    """
+    Return the IDs of the processes and resources in a view.
+
+    Args:
+        processes, resources: the manager's entity dicts
+        deadlocked: returns the deadlocked processes
+        named: returns the IDs of the resources with a name
+    """
+    selections: List[Tuple[Set[str], Set[str]]] = []
+
+    def with_edges(resource_ids: Collection[str]) -> Tuple[Set[str], Set[str]]:
+        process_ids = set()
+        for resource_id in resource_ids:
+            resource = resources[resource_id]
+            process_ids.update(resource.allocated_to)
+            process_ids.update(resource.requested_by)
+        return process_ids, set(resource_ids)
+
+    if spec.deadlocked:
+        process_ids = set(deadlocked())
+        resource_ids = set()
+        for process_id in process_ids:
+            process = processes[process_id]
+            resource_ids.update(process.allocated_resources)
+            resource_ids.update(process.requested_resources)
+        selections.append((process_ids, resource_ids))
+    if spec.around is not None:
+        selections.append(neighborhood(spec.around, spec.hops, processes, resources))
+    if spec.resource is not None:
+        selections.append(with_edges(named(spec.resource)))
+    if spec.top is not None:
+        ranked = heapq.nlargest(spec.top, resources.values(), key=contention)
+        selections.append(with_edges([resource.id for resource in ranked]))
+
+    if not selections:
+        return set(processes), set(resources)
+    selections.sort(key=lambda selection: len(selection[0]) + len(selection[1]))
+    process_ids, resource_ids = selections[0]
+    for other_processes, other_resources in selections[1:]:
+        process_ids &= other_processes
+        resource_ids &= other_resources
+    return process_ids, resource_ids
+
+
+def neighborhood(node_id: str, hops: int, processes: Mapping,
+                 resources: Mapping) -> Tuple[Set[str], Set[str]]:
+    """Processes and resources within hops edges of a node, in either direction."""
+    if node_id in processes:
+        process_ids, resource_ids = {node_id}, set()
+    elif node_id in resources:
+        process_ids, resource_ids = set(), {node_id}
+    else:
+        return set(), set()
+    frontier = [node_id]
+    for _ in range(hops):
+        reached = []
+        for current in frontier:
+            process = processes.get(current)
+            if process is not None:
+                for resource_id in (*process.allocated_resources, *process.requested_resources):
+                    if resource_id not in resource_ids:
+                        resource_ids.add(resource_id)
+                        reached.append(resource_id)
+            else:
+                resource = resources[current]
+                for process_id in (*resource.allocated_to, *resource.requested_by):
+                    if process_id not in process_ids:
+                        process_ids.add(process_id)
+                        reached.append(process_id)
+        if not reached:
+            break
+        frontier = reached
+    return process_ids, resource_ids
+
+
+def anchor(process, resource_ids: Collection[str]) -> Optional[str]:
+    """The selected resource a process is clustered with, None if it has no edge in the view."""
+    for edges in (process.allocated_resources, process.requested_resources):
+        best, best_units = None, 0
+        for resource_id, units in edges.items():
+            if resource_id in resource_ids and units > best_units:
+                best, best_units = resource_id, units
+        if best is not None:
+            return best
+    return None
+
+
+def cluster_view(nodes: List[dict], edges: List[dict], max_nodes: int, processes: Mapping,
+                 resources: Mapping, deadlocked: Collection[str]) -> Tuple[List[dict], List[dict], dict]:
+    """
+    Collapse the largest clusters of a view until it has at most max_nodes nodes.
+
+    Returns:
+        the nodes and edges of the clustered view, and a summary with the
+        number of 'clusters' collapsed and whether clusters had to be
+        left out ('truncated') because even collapsed they did not fit
+    """
+    if len(nodes) <= max_nodes:
+        return nodes, edges, {'clusters': 0, 'truncated': False}
+
+    resource_ids = {node['id'] for node in nodes if node['type'] == 'resource'}
+    membership: Dict[str, str] = {}
+    members: Dict[str, List[str]] = {}
+    for node in nodes:
+        node_id = node['id']
+        if node['type'] == 'resource':
+            key = f"cluster:{node_id}"
+        else:
+            center = anchor(processes[node_id], resource_ids)
+            key = f"cluster:{center}" if center is not None else IDLE_CLUSTER
+        membership[node_id] = key
+        members.setdefault(key, []).append(node_id)
+
+    # Collapse the largest clusters first; each one saves size - 1 nodes
+    ordered = sorted(members, key=lambda key: (-len(members[key]), key))
+    count, collapsed = len(nodes), []
+    for key in ordered:
+        if count <= max_nodes:
+            break
+        if len(members[key]) > 1:
+            collapsed.append(key)
+            count -= len(members[key]) - 1
+    truncated = count > max_nodes
+    collapsed_set = set(collapsed)
+    dropped: Set[str] = set()
+    if truncated:
+        # Even fully clustered the view is too large: keep the largest clusters
+        kept = set(ordered[:max_nodes])
+        dropped = {key for key in ordered if key not in kept}
+        collapsed_set = {key for key in kept if len(members[key]) > 1}
+
+    def visible(node_id: str) -> Optional[str]:
+        key = membership[node_id]
+        if key in dropped:
+            return None
+        return key if key in collapsed_set else node_id
+
+    result_nodes = [node for node in nodes if visible(node['id']) == node['id']]
+    positions = {node['id']: (node['x'], node['y']) for node in nodes if 'x' in node}
+    for key in sorted(collapsed_set, key=lambda key: (-len(members[key]), key)):
+        node = cluster_node(key, members[key], processes, resources, deadlocked)
+        # Laid out graphs: draw the cluster where its members are, on average
+        placed = [positions[member] for member in members[key] if member in positions]
+        if placed:
+            node['x'] = round(sum(x for x, _ in placed) / len(placed))
+            node['y'] = round(sum(y for _, y in placed) / len(placed))
+        result_nodes.append(node)
+
+    result_edges, merged = [], {}
+    for edge in edges:
+        source, target = visible(edge['from']), visible(edge['to'])
+        if source is None or target is None:
+            continue
+        if source == edge['from'] and target == edge['to']:
+            result_edges.append(edge)
+            continue
+        if source == target:
+            continue  # inside a cluster
+        key = (source, target, edge['type'])
+        if key not in merged:
+            merged[key] = {'id': f"{source}->{target}:{edge['type']}", 'from': source, 'to': target,
+                           'type': edge['type'], 'units': 0, 'count': 0}
+        merged[key]['units'] += edge['units']
+        merged[key]['count'] += 1
+    for edge in merged.values():
+        edge['title'] = (f"{edge['count']} {'allocation' if edge['type'] == 'allocation' else 'request'}"
+                         f"{'s' if edge['count'] > 1 else ''}, {edge['units']} units")
+        result_edges.append(edge)
+    return result_nodes, result_edges, {'clusters': len(collapsed_set), 'truncated': truncated}
+
+
+def cluster_node(key: str, member_ids: List[str], processes: Mapping, resources: Mapping,
+                 deadlocked: Collection[str]) -> dict:
+    """Super-node of a collapsed cluster."""
+    process_count = sum(1 for member in member_ids if member in processes)
+    resource_count = len(member_ids) - process_count
+    blocked = sum(1 for member in member_ids if member in deadlocked)
+    center = key.partition(':')[2] if key != IDLE_CLUSTER else None
+    name = resources[center].name if center is not None else 'Idle processes'
+    label = f"{name}\n+{process_count} processes" if center is not None else f"{name}\n({process_count})"
+    return {
+        'id': key,
+        'label': label,
+        'type': 'cluster',
+        'center': center,
+        'size': len(member_ids),
+        'processes': process_count,
+        'resources': resource_count,
+        'deadlocked': blocked,
+        'title': (f"Cluster: {name}<br>"
+                  f"Processes: {process_count}<br>"
+                  f"Resources: {resource_count}<br>"
+                  f"Deadlocked: {blocked}")
+    }
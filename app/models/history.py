@@ -0,0 +1,418 @@
+"""
+Allocation History Module
+
+This module provides the bounded, columnar event log behind
+ResourceAllocationManager.allocation_history. Events are stored in typed
+NumPy columns (epoch-ns timestamps, an event type code, interned process and
+resource ids and units) inside a ring buffer with count and age based
+retention, optionally spilling evicted segments to disk.
+"""
+
+import os
+import sys
+import time
+from datetime import datetime
+from enum import IntEnum
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+# Default number of events kept in memory
+DEFAULT_MAX_EVENTS = 100_000
+
+# Initial capacity of an unbounded history
+INITIAL_CAPACITY = 1024
+
+# Interned ids are compacted once there are this many times more of them
+# than in-memory events (each event refers to at most two)
+ID_COMPACTION_RATIO = 4
+
+# Record layout of spilled segments, readable with np.fromfile(path, dtype=SPILL_DTYPE)
+SPILL_DTYPE = np.dtype([
+    ('timestamp', '<i8'),
+    ('type', 'i1'),
+    ('process', '<i4'),
+    ('resource', '<i4'),
+    ('units', '<i4'),
+])
+
+
+class EventType(IntEnum):
+    """Kinds of allocation events, stored as one byte per event."""
+    ALLOCATION = 0
+    REQUEST = 1
+    RELEASE = 2
+    CANCEL_REQUEST = 3
+
+    @property
+    def label(self) -> str:
+        """Name used in the dict form of an event."""
+        return self.name.lower()
+
+    @classmethod
+    def from_label(cls, label: str) -> 'EventType':
+        return cls[label.upper()]
+
+
+class IdRegistry:
+    """
+    Two-way mapping between external UUID strings and dense integer ids.
+
+    An id stays valid until the history compacts its registry, renumbering
+    the ids its in-memory events still refer to and dropping the others.
+    """
+
+    __slots__ = ('_index', '_external')
+
+    def __init__(self):
+        """Initialize an empty registry."""
+        self._index: Dict[str, int] = {}
+        self._external: List[str] = []
+
+    def intern(self, external_id: str) -> int:
+        """Return the integer id of an external id, assigning one if needed."""
+        index = self._index.get(external_id)
+        if index is None:
+            index = len(self._external)
+            external_id = sys.intern(external_id)
+            self._index[external_id] = index
+            self._external.append(external_id)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._external)
+
+    def external(self, index: int) -> str:
+        """Return the external id of an integer id."""
+        return self._external[index]
+
+
+def _renumber(processes: np.ndarray, resources: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Renumber the ids of process and resource columns densely.
+
+    Returns:
+        (used, processes, resources) -- the sorted old ids the columns refer
+        to, and the columns with each id replaced by its index in used
+    """
+    used, inverse = np.unique(np.concatenate([processes, resources]), return_inverse=True)
+    count = len(processes)
+    return used, inverse[:count].astype(np.int32), inverse[count:].astype(np.int32)
+
+
+class AllocationHistory:
+    """
+    Ring buffer of allocation events stored column by column.
+
+    Retention:
+        max_events -- keep at most this many events in memory (None for no
+            limit); when full, the oldest segment of the buffer is evicted
+        max_age -- evict events older than this many seconds
+        spill_path -- append evicted events to this file (SPILL_DTYPE
+            records) and the ids they refer to to spill_path + '.ids'
+
+    Ids no in-memory event refers to anymore are dropped from the registry
+    once they outnumber the events, so churning entities do not make it
+    grow without bound.
+
+    Indexing and iteration return events in the dict form the rest of the
+    application uses ({'timestamp': datetime, 'type': str, 'process_id',
+    'resource_id', 'units'}), while columns() exposes the raw arrays for
+    vectorized analyses.
+    """
+
+    def __init__(self, max_events: Optional[int] = DEFAULT_MAX_EVENTS,
+                 max_age: Optional[float] = None, spill_path: Optional[str] = None):
+        """Initialize an empty history with the given retention policy."""
+        if max_events is not None and max_events < 1:
+            raise ValueError("max_events must be at least 1")
+        self.max_events = max_events
+        self.max_age = max_age
+        self.spill_path = spill_path
+        self.ids = IdRegistry()
+        self.total_recorded = 0
+        self._segment = max(1, max_events // 16) if max_events else 0
+        self._spilled_ids = 0
+        self._allocate(max_events or INITIAL_CAPACITY)
+
+    def _allocate(self, capacity: int) -> None:
+        self._timestamps = np.zeros(capacity, dtype=np.int64)
+        self._types = np.zeros(capacity, dtype=np.int8)
+        self._processes = np.zeros(capacity, dtype=np.int32)
+        self._resources = np.zeros(capacity, dtype=np.int32)
+        self._units = np.zeros(capacity, dtype=np.int32)
+        self._start = 0
+        self._count = 0
+
+    @property
+    def capacity(self) -> int:
+        return len(self._timestamps)
+
+    # Recording
+
+    def record(self, event_type: EventType, process_id: str, resource_id: str,
+               units: int, timestamp_ns: Optional[int] = None) -> None:
+        """Append one event, applying the retention policy."""
+        if timestamp_ns is None:
+            timestamp_ns = time.time_ns()
+        # Never before the last event, even if the wall clock stepped back
+        timestamp_ns = max(timestamp_ns, self._last_timestamp())
+        if self.max_age is not None:
+            self._evict_older_than(timestamp_ns - int(self.max_age * 1e9))
+        if self._count == self.capacity:
+            if self.max_events is None:
+                self._grow()
+            else:
+                self._evict(self._segment)
+
+        position = (self._start + self._count) % self.capacity
+        self._timestamps[position] = timestamp_ns
+        self._types[position] = event_type
+        self._processes[position] = self.ids.intern(process_id)
+        self._resources[position] = self.ids.intern(resource_id)
+        self._units[position] = units
+        self._count += 1
+        self.total_recorded += 1
+        self._compact_ids()
+
+    def record_many(self, events: Sequence[Tuple[EventType, str, str, int, int]]) -> None:
+        """
+        Append (event_type, process_id, resource_id, units, timestamp_ns)
+        events in bulk, in chronological order.
+
+        Equivalent to calling record() for each event, but the columns are
+        written slice by slice.
+        """
+        if not events:
+            return
+        timestamps = np.fromiter((event[4] for event in events), dtype=np.int64, count=len(events))
+        timestamps[0] = max(timestamps[0], self._last_timestamp())
+        np.maximum.accumulate(timestamps, out=timestamps)
+        types = np.fromiter((event[0] for event in events), dtype=np.int8, count=len(events))
+        processes = np.fromiter((self.ids.intern(event[1]) for event in events), dtype=np.int32, count=len(events))
+        resources = np.fromiter((self.ids.intern(event[2]) for event in events), dtype=np.int32, count=len(events))
+        units = np.fromiter((event[3] for event in events), dtype=np.int32, count=len(events))
+        written = 0
+        while written < len(events):
+            if self._count == self.capacity:
+                if self.max_events is None:
+                    self._grow()
+                else:
+                    self._evict(self._segment)
+            chunk = min(self.capacity - self._count, len(events) - written)
+            positions = (self._start + self._count + np.arange(chunk)) % self.capacity
+            batch = slice(written, written + chunk)
+            self._timestamps[positions] = timestamps[batch]
+            self._types[positions] = types[batch]
+            self._processes[positions] = processes[batch]
+            self._resources[positions] = resources[batch]
+            self._units[positions] = units[batch]
+            self._count += chunk
+            written += chunk
+        self.total_recorded += len(events)
+        if self.max_age is not None:
+            # After appending, so that old events of the batch expire too
+            self._evict_older_than(int(timestamps[-1]) - int(self.max_age * 1e9))
+        # Not while writing: the batch's ids are interned up front
+        self._compact_ids()
+
+    def append(self, entry: dict) -> None:
+        """Append an event given in dict form."""
+        timestamp = entry.get('timestamp')
+        self.record(EventType.from_label(entry['type']), entry['process_id'], entry['resource_id'],
+                    entry['units'],
+                    int(timestamp.timestamp() * 1e9) if timestamp is not None else None)
+
+    def clear(self) -> None:
+        """Drop every in-memory event and interned id, keeping the retention policy."""
+        self.total_recorded = 0
+        self.ids = IdRegistry()
+        self._allocate(self.max_events or INITIAL_CAPACITY)
+
+    # Snapshots
+
+    def export(self, last: Optional[int] = None) -> Tuple[dict, Dict[str, np.ndarray]]:
+        """
+        Return the in-memory events as (metadata, columns) for a snapshot,
+        or only the last of them.
+
+        The process and resource columns hold indexes into metadata['ids'].
+        """
+        columns = self.columns()
+        if last is None:
+            ids = [self.ids.external(index) for index in range(len(self.ids))]
+            spilled_ids = self._spilled_ids
+        else:
+            columns = {name: column[len(column) - min(last, len(column)):] for name, column in columns.items()}
+            # Only the ids the kept events refer to, renumbered
+            used, columns['process'], columns['resource'] = _renumber(columns['process'], columns['resource'])
+            ids = [self.ids.external(int(index)) for index in used]
+            spilled_ids = 0
+        metadata = {
+            'ids': ids,
+            'total_recorded': self.total_recorded,
+            'spilled_ids': spilled_ids,
+        }
+        return metadata, columns
+
+    def restore(self, metadata: dict, columns: Dict[str, np.ndarray]) -> None:
+        """
+        Replace the events with those of an export(), keeping this history's
+        retention policy (the newest events win if it is smaller).
+        """
+        self.ids = IdRegistry()
+        for external_id in metadata['ids']:
+            self.ids.intern(external_id)
+        count = len(columns['timestamp'])
+        keep = min(count, self.max_events) if self.max_events else count
+        self._allocate(self.max_events or max(INITIAL_CAPACITY, keep))
+        recent = slice(count - keep, count)
+        self._timestamps[:keep] = columns['timestamp'][recent]
+        self._types[:keep] = columns['type'][recent]
+        self._processes[:keep] = columns['process'][recent]
+        self._resources[:keep] = columns['resource'][recent]
+        self._units[:keep] = columns['units'][recent]
+        self._count = keep
+        self.total_recorded = metadata['total_recorded']
+        self._spilled_ids = metadata['spilled_ids']
+
+    # Retention
+
+    def _grow(self) -> None:
+        columns = self.columns()
+        capacity = self.capacity * 2
+        count = self._count
+        self._allocate(capacity)
+        self._timestamps[:count] = columns['timestamp']
+        self._types[:count] = columns['type']
+        self._processes[:count] = columns['process']
+        self._resources[:count] = columns['resource']
+        self._units[:count] = columns['units']
+        self._count = count
+
+    def _last_timestamp(self) -> int:
+        if not self._count:
+            return 0
+        return int(self._timestamps[(self._start + self._count - 1) % self.capacity])
+
+    def _evict_older_than(self, cutoff_ns: int) -> None:
+        if not self._count or self._timestamps[self._start] >= cutoff_ns:
+            return
+        # Timestamps are non-decreasing (record() clamps them), so binary
+        # search the expired prefix
+        expired = int(np.searchsorted(self.columns()['timestamp'], cutoff_ns, side='left'))
+        self._evict(expired)
+
+    def _evict(self, count: int) -> None:
+        count = min(count, self._count)
+        if count <= 0:
+            return
+        if self.spill_path:
+            self._spill(count)
+        self._start = (self._start + count) % self.capacity
+        self._count -= count
+
+    def _spill(self, count: int) -> None:
+        """Write the oldest count events and the ids they refer to to disk."""
+        positions = (self._start + np.arange(count)) % self.capacity
+        segment = np.empty(count, dtype=SPILL_DTYPE)
+        segment['timestamp'] = self._timestamps[positions]
+        segment['type'] = self._types[positions]
+        segment['units'] = self._units[positions]
+
+        # In-memory ids are renumbered by compaction, so each segment appends
+        # the ids it uses to the ids file and refers to their line numbers
+        used, processes, resources = _renumber(self._processes[positions], self._resources[positions])
+        segment['process'] = processes + self._spilled_ids
+        segment['resource'] = resources + self._spilled_ids
+        with open(self.spill_path + '.ids', 'a') as ids_file:
+            for index in used:
+                ids_file.write(f"{self.ids.external(int(index))}\n")
+        self._spilled_ids += len(used)
+        with open(self.spill_path, 'ab') as spill_file:
+            segment.tofile(spill_file)
+
+    def _compact_ids(self) -> None:
+        """Drop the interned ids no in-memory event refers to, once they pile up."""
+        if len(self.ids) <= ID_COMPACTION_RATIO * (self._count + 1):
+            return
+        columns = self.columns()
+        used, processes, resources = _renumber(columns['process'], columns['resource'])
+        registry = IdRegistry()
+        for index in used:
+            registry.intern(self.ids.external(int(index)))
+        self.ids = registry
+        # columns() is chronological, so the events are stored from the start
+        count = self._count
+        timestamps, types, units = columns['timestamp'].copy(), columns['type'].copy(), columns['units'].copy()
+        self._allocate(self.capacity)
+        self._timestamps[:count] = timestamps
+        self._types[:count] = types
+        self._processes[:count] = processes
+        self._resources[:count] = resources
+        self._units[:count] = units
+        self._count = count
+
+    # Access
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __bool__(self) -> bool:
+        return self._count > 0
+
+    def _entry(self, offset: int) -> dict:
+        position = (self._start + offset) % self.capacity
+        return {
+            'timestamp': datetime.fromtimestamp(int(self._timestamps[position]) / 1e9),
+            'type': EventType(int(self._types[position])).label,
+            'process_id': self.ids.external(int(self._processes[position])),
+            'resource_id': self.ids.external(int(self._resources[position])),
+            'units': int(self._units[position]),
+        }
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[dict, List[dict]]:
+        if isinstance(index, slice):
+            return [self._entry(offset) for offset in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("history index out of range")
+        return self._entry(index)
+
+    def __iter__(self):
+        for offset in range(self._count):
+            yield self._entry(offset)
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """Return the in-memory events as chronologically ordered column arrays."""
+        end = self._start + self._count
+        if end <= self.capacity:
+            window = slice(self._start, end)
+            pick = lambda column: column[window]
+        else:
+            positions = (self._start + np.arange(self._count)) % self.capacity
+            pick = lambda column: column[positions]
+        return {
+            'timestamp': pick(self._timestamps),
+            'type': pick(self._types),
+            'process': pick(self._processes),
+            'resource': pick(self._resources),
+            'units': pick(self._units),
+        }
+
+    @staticmethod
+    def read_spill(spill_path: str) -> List[dict]:
+        """Decode a spill file written by a history back into dict events."""
+        if not os.path.exists(spill_path):
+            return []
+        with open(spill_path + '.ids') as ids_file:
+            ids = ids_file.read().splitlines()
+        records = np.fromfile(spill_path, dtype=SPILL_DTYPE)
+        return [{
+            'timestamp': datetime.fromtimestamp(int(record['timestamp']) / 1e9),
+            'type': EventType(int(record['type'])).label,
+            'process_id': ids[record['process']],
+            'resource_id': ids[record['resource']],
+            'units': int(record['units']),
+        } for record in records]
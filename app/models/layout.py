@@ -0,0 +1,279 @@
+"""
+Graph Layout Module
+
+This module computes and caches 2D positions for the nodes of the resource
+allocation graph, so clients can draw it without running a force
+simulation and nodes stay where they are between loads.
+
+The first layout is computed per connected component: small components
+with a Fruchterman-Reingold (spring) layout vectorized with NumPy over all
+the components of the same size at once, large ones with networkx's
+spectral layout, which scales to tens of thousands of nodes. Components
+are then packed in rows, largest first, with isolated nodes in a grid.
+
+After that, changes are laid out incrementally. A new node is placed next
+to the nodes it is connected to as soon as it appears, and the nodes
+touched by mutations since the last refresh, with their neighbors, are
+relaxed by a few spring iterations while the nodes around them stay fixed.
+Only when most of the graph changed is it laid out from scratch again.
+
+Positions are whole pixels, about SPACING apart for neighboring nodes.
+"""
+
+import math
+import zlib
+from typing import Callable, Collection, Dict, Iterable, List, Optional, Set, Tuple
+
+import networkx as nx
+import numpy as np
+
+# Distance between neighboring nodes, in pixels
+SPACING = 180.0
+
+# Components up to this size get a spring layout, larger ones a spectral one
+SPRING_LIMIT = 500
+
+# Spring iterations of a first layout and of an incremental relayout
+SPRING_ITERATIONS = 50
+RELAYOUT_ITERATIONS = 15
+
+# Most nodes moved by an incremental relayout; past it, only the touched
+# nodes move, not their neighbors
+RELAYOUT_LIMIT = 300
+
+# Most fixed neighbors kept around the moved nodes
+ANCHOR_LIMIT = 1000
+
+# Fraction of the graph touched since the last refresh above which it is
+# laid out from scratch
+FULL_LAYOUT_RATIO = 0.25
+
+# Most adjacency matrix cells of the components laid out in one batch
+BATCH_CELLS = 4_000_000
+
+Neighbors = Callable[[str], Iterable[str]]
+
+
+def _offset(node_id: str) -> Tuple[float, float]:
+    """Deterministic unit vector for a node, to spread nodes placed at the same point."""
+    angle = (zlib.crc32(node_id.encode('utf-8')) % 3600) / 3600 * 2 * math.pi
+    return math.cos(angle), math.sin(angle)
+
+
+def spring(positions: np.ndarray, adjacency: np.ndarray, iterations: int, k: float = 1.0,
+           fixed: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Fruchterman-Reingold layout of a batch of graphs of the same size.
+
+    Nodes repel each other with force k^2/d and neighbors attract with
+    d^2/k, so neighbors settle about k apart; moves are capped by a
+    temperature cooling linearly to zero over the iterations.
+
+    Args:
+        positions: initial positions, shape (graphs, n, 2)
+        adjacency: symmetric 0/1 adjacency matrices, shape (graphs, n, n)
+        fixed: optional mask (graphs, n) of nodes that keep their position
+
+    Returns:
+        the new positions, shape (graphs, n, 2)
+    """
+    positions = positions.copy()
+    extent = (positions.max(axis=1) - positions.min(axis=1)).max(axis=1)
+    temperature = np.maximum(extent, k) * 0.1
+    cooling = temperature / (iterations + 1)
+    movable = None if fixed is None else ~fixed[..., None]
+    for _ in range(iterations):
+        delta = positions[:, :, None, :] - positions[:, None, :, :]
+        distance = np.maximum(np.sqrt((delta ** 2).sum(axis=-1)), 0.01)
+        force = k * k / distance ** 2 - adjacency * distance / k
+        displacement = np.einsum('gijc,gij->gic', delta, force)
+        length = np.maximum(np.sqrt((displacement ** 2).sum(axis=-1)), 0.01)
+        step = displacement * (np.minimum(length, temperature[:, None]) / length)[..., None]
+        positions += step if movable is None else step * movable
+        temperature = temperature - cooling
+    return positions
+
+
+def _normalized(coordinates: np.ndarray) -> np.ndarray:
+    """Move a component to the origin and scale it so neighbors are about one unit apart."""
+    coordinates = coordinates - coordinates.min(axis=0)
+    extent = coordinates.max()
+    # A component of n nodes spans about sqrt(n) units
+    return coordinates * (math.sqrt(len(coordinates)) * 1.5 / extent) if extent > 0 else coordinates
+
+
+def _component_layouts(graph: nx.Graph, components: List[List[str]], seed: int) -> List[np.ndarray]:
+    """Positions (n, 2) of every component, in SPACING units, with the minimum at the origin."""
+    rng = np.random.default_rng(seed)
+    layouts: List[Optional[np.ndarray]] = [None] * len(components)
+    by_size: Dict[int, List[int]] = {}
+    for index, nodes in enumerate(components):
+        if len(nodes) <= SPRING_LIMIT:
+            by_size.setdefault(len(nodes), []).append(index)
+        else:
+            pos = nx.spectral_layout(graph.subgraph(nodes))
+            layouts[index] = _normalized(np.array([pos[node] for node in nodes], dtype=np.float64))
+
+    for size, indexes in by_size.items():
+        per_batch = max(1, BATCH_CELLS // (size * size))
+        for start in range(0, len(indexes), per_batch):
+            batch = indexes[start:start + per_batch]
+            adjacency = np.zeros((len(batch), size, size))
+            for slot, index in enumerate(batch):
+                nodes = components[index]
+                position = {node: row for row, node in enumerate(nodes)}
+                for row, node in enumerate(nodes):
+                    adjacency[slot, row, [position[other] for other in graph[node]]] = 1
+            positions = spring(rng.random((len(batch), size, 2)), adjacency, SPRING_ITERATIONS,
+                               k=1 / math.sqrt(size))
+            for slot, index in enumerate(batch):
+                layouts[index] = _normalized(positions[slot])
+    return layouts
+
+
+class GraphLayout:
+    """
+    Cached node positions of a graph that changes incrementally.
+
+    The owner reports changed nodes with touch() as they change and calls
+    refresh() before reading positions; both take a neighbors function
+    returning the IDs of the nodes connected to a node (in either
+    direction). Not thread-safe: the manager calls it under its lock.
+    """
+
+    def __init__(self, spacing: float = SPACING, seed: int = 0):
+        self.spacing = spacing
+        self.seed = seed
+        self.positions: Dict[str, Tuple[int, int]] = {}
+        # Nodes touched since the last refresh
+        self._dirty: Set[str] = set()
+        # Where nodes without positioned neighbors are put: a column grid
+        # right of the laid out graph
+        self._free_origin = (0.0, 0.0)
+        self._free_rows = 1
+        self._free_count = 0
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def position(self, node_id: str) -> Optional[Tuple[int, int]]:
+        return self.positions.get(node_id)
+
+    def reset(self) -> None:
+        self.positions = {}
+        self._dirty = set()
+        self._free_origin = (0.0, 0.0)
+        self._free_rows = 1
+        self._free_count = 0
+
+    def touch(self, node_ids: Iterable[str], exists: Callable[[str], bool], neighbors: Neighbors) -> None:
+        """
+        Record that nodes were added, changed or removed: removed nodes lose
+        their position, new ones are placed next to their neighbors right
+        away, and all are relaxed at the next refresh().
+        """
+        if not self.positions:
+            # Nothing laid out yet: the first refresh lays out everything
+            return
+        for node_id in node_ids:
+            if not exists(node_id):
+                self.positions.pop(node_id, None)
+                self._dirty.discard(node_id)
+                continue
+            if node_id not in self.positions:
+                self.positions[node_id] = self._place(node_id, neighbors)
+            self._dirty.add(node_id)
+
+    def _place(self, node_id: str, neighbors: Neighbors) -> Tuple[int, int]:
+        placed = [self.positions[other] for other in neighbors(node_id) if other in self.positions]
+        if placed:
+            x = sum(position[0] for position in placed) / len(placed)
+            y = sum(position[1] for position in placed) / len(placed)
+            dx, dy = _offset(node_id)
+            return round(x + dx * self.spacing * 0.75), round(y + dy * self.spacing * 0.75)
+        column, row = divmod(self._free_count, self._free_rows)
+        self._free_count += 1
+        return (round(self._free_origin[0] + column * self.spacing),
+                round(self._free_origin[1] + row * self.spacing))
+
+    def refresh(self, node_ids: Collection[str], neighbors: Neighbors) -> None:
+        """Bring positions up to date for the current nodes."""
+        if not node_ids:
+            self.reset()
+            return
+        if not self.positions or len(self._dirty) > max(RELAYOUT_LIMIT, FULL_LAYOUT_RATIO * len(node_ids)):
+            self.layout(node_ids, neighbors)
+        elif self._dirty:
+            self._relayout(neighbors)
+        self._dirty = set()
+
+    def layout(self, node_ids: Collection[str], neighbors: Neighbors) -> None:
+        """Lay out the whole graph from scratch."""
+        graph = nx.Graph()
+        graph.add_nodes_from(sorted(node_ids))
+        for node_id in node_ids:
+            graph.add_edges_from((node_id, other) for other in neighbors(node_id))
+
+        components = sorted((sorted(component) for component in nx.connected_components(graph)),
+                            key=lambda component: (-len(component), component[0]))
+        isolated = [component[0] for component in components if len(component) == 1]
+        connected = [component for component in components if len(component) > 1]
+        blocks = list(zip(connected, _component_layouts(graph, connected, self.seed)))
+        if isolated:
+            side = math.ceil(math.sqrt(len(isolated)))
+            blocks.append((isolated, np.array([divmod(index, side)[::-1] for index in range(len(isolated))],
+                                              dtype=np.float64)))
+
+        # Shelf packing: blocks left to right in rows about as wide as the
+        # square root of the total area, one unit of margin around each
+        sizes = [coordinates.max(axis=0) + 1 for _, coordinates in blocks]
+        width = max(max(size[0] for size in sizes), math.sqrt(sum(size[0] * size[1] for size in sizes)) * 1.2)
+        positions = {}
+        x = y = row_height = 0.0
+        for (nodes, coordinates), size in zip(blocks, sizes):
+            if x > 0 and x + size[0] > width:
+                x, y, row_height = 0.0, y + row_height, 0.0
+            pixels = np.rint((coordinates + (x, y)) * self.spacing).astype(int).tolist()
+            positions.update(zip(nodes, map(tuple, pixels)))
+            x += size[0]
+            row_height = max(row_height, size[1])
+
+        self.positions = positions
+        self._free_origin = ((width + 1) * self.spacing, 0.0)
+        self._free_rows = max(1, math.ceil(y + row_height))
+        self._free_count = 0
+
+    def _relayout(self, neighbors: Neighbors) -> None:
+        """Relax the touched nodes and their neighbors, with the nodes around them fixed."""
+        movable = set(self._dirty)
+        grown = set(movable)
+        for node_id in self._dirty:
+            grown.update(other for other in neighbors(node_id) if other in self.positions)
+            if len(grown) > RELAYOUT_LIMIT:
+                break
+        else:
+            movable = grown
+
+        anchors: Dict[str, None] = {}
+        edges = []
+        for node_id in movable:
+            for other in neighbors(node_id):
+                if other not in self.positions:
+                    continue
+                if other not in movable:
+                    if other not in anchors and len(anchors) >= ANCHOR_LIMIT:
+                        continue
+                    anchors[other] = None
+                edges.append((node_id, other))
+
+        nodes = [*movable, *anchors]
+        row = {node: index for index, node in enumerate(nodes)}
+        adjacency = np.zeros((1, len(nodes), len(nodes)))
+        for node, other in edges:
+            adjacency[0, row[node], row[other]] = adjacency[0, row[other], row[node]] = 1
+        positions = np.array([[self.positions[node] for node in nodes]]) / self.spacing
+        fixed = np.array([[node in anchors for node in nodes]])
+        positions = spring(positions, adjacency, RELAYOUT_ITERATIONS, fixed=fixed)[0] * self.spacing
+        pixels = np.rint(positions).astype(int).tolist()
+        for node in movable:
+            self.positions[node] = tuple(pixels[row[node]])
@@ -0,0 +1,183 @@
+"""
+Allocation Matrix Module
+
+This module provides an optional dense NumPy representation of the resource
+allocation state (process x resource Allocation, Request and Maximum claim
+matrices plus Total and Available vectors), kept in sync by the
+ResourceAllocationManager so that analyses can run as vectorized operations.
+"""
+
+from typing import Dict, List, Set
+
+import numpy as np
+
+# Initial number of rows/columns reserved before the matrices need to grow
+INITIAL_CAPACITY = 64
+
+
+class AllocationMatrices:
+    """
+    Dense process x resource matrices mirroring the allocation dicts.
+
+    Every process and resource id is mapped to a row or column index.
+    Indices of removed entities are zeroed and reused, and the arrays
+    double in size when they run out of room, so updates are O(1)
+    amortized while analyses see plain contiguous arrays.
+    """
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY):
+        """Initialize empty matrices with room for capacity entities per axis."""
+        self.process_index: Dict[str, int] = {}
+        self.resource_index: Dict[str, int] = {}
+        self._process_ids: List[str] = [None] * capacity
+        self._free_rows: List[int] = []
+        self._free_columns: List[int] = []
+        self._row_count = 0
+        self._column_count = 0
+        self.allocation = np.zeros((capacity, capacity), dtype=np.int32)
+        self.request = np.zeros((capacity, capacity), dtype=np.int32)
+        self.maximum = np.zeros((capacity, capacity), dtype=np.int32)
+        self.total = np.zeros(capacity, dtype=np.int32)
+        self.available = np.zeros(capacity, dtype=np.int32)
+        self.active_processes = np.zeros(capacity, dtype=bool)
+        self.active_resources = np.zeros(capacity, dtype=bool)
+
+    # Index management
+
+    def add_process(self, process_id: str) -> int:
+        """Reserve a row for a process."""
+        if self._free_rows:
+            row = self._free_rows.pop()
+        else:
+            row = self._row_count
+            self._row_count += 1
+            if row >= self.allocation.shape[0]:
+                self._grow(rows=True)
+        self.process_index[process_id] = row
+        self._process_ids[row] = process_id
+        self.active_processes[row] = True
+        return row
+
+    def remove_process(self, process_id: str) -> None:
+        """Release the row of a process, returning its units to Available."""
+        row = self.process_index.pop(process_id)
+        self.available += self.allocation[row]
+        self.allocation[row] = 0
+        self.request[row] = 0
+        self.maximum[row] = 0
+        self.active_processes[row] = False
+        self._process_ids[row] = None
+        self._free_rows.append(row)
+
+    def add_resource(self, resource_id: str, total_units: int) -> int:
+        """Reserve a column for a resource."""
+        if self._free_columns:
+            column = self._free_columns.pop()
+        else:
+            column = self._column_count
+            self._column_count += 1
+            if column >= self.allocation.shape[1]:
+                self._grow(rows=False)
+        self.resource_index[resource_id] = column
+        self.total[column] = total_units
+        self.available[column] = total_units
+        self.active_resources[column] = True
+        return column
+
+    def remove_resource(self, resource_id: str) -> None:
+        """Release the column of a resource."""
+        column = self.resource_index.pop(resource_id)
+        self.allocation[:, column] = 0
+        self.request[:, column] = 0
+        self.maximum[:, column] = 0
+        self.total[column] = 0
+        self.available[column] = 0
+        self.active_resources[column] = False
+        self._free_columns.append(column)
+
+    def _grow(self, rows: bool) -> None:
+        """Double the number of rows or columns."""
+        old_rows, old_columns = self.allocation.shape
+        new_rows = old_rows * 2 if rows else old_rows
+        new_columns = old_columns if rows else old_columns * 2
+        for name in ('allocation', 'request', 'maximum'):
+            grown = np.zeros((new_rows, new_columns), dtype=np.int32)
+            grown[:old_rows, :old_columns] = getattr(self, name)
+            setattr(self, name, grown)
+        if rows:
+            self._process_ids.extend([None] * (new_rows - old_rows))
+            self.active_processes = np.concatenate(
+                [self.active_processes, np.zeros(new_rows - old_rows, dtype=bool)])
+        else:
+            padding = new_columns - old_columns
+            self.total = np.concatenate([self.total, np.zeros(padding, dtype=np.int32)])
+            self.available = np.concatenate([self.available, np.zeros(padding, dtype=np.int32)])
+            self.active_resources = np.concatenate(
+                [self.active_resources, np.zeros(padding, dtype=bool)])
+
+    # Cell updates
+
+    def set_allocation(self, process_id: str, resource_id: str, units: int) -> None:
+        """Set the units of a resource held by a process."""
+        row = self.process_index[process_id]
+        column = self.resource_index[resource_id]
+        self.available[column] -= units - self.allocation[row, column]
+        self.allocation[row, column] = units
+
+    def set_request(self, process_id: str, resource_id: str, units: int) -> None:
+        """Set the units of a resource requested by a process."""
+        self.request[self.process_index[process_id], self.resource_index[resource_id]] = units
+
+    def set_maximum(self, process_id: str, resource_id: str, units: int) -> None:
+        """Set the maximum claim of a process on a resource."""
+        self.maximum[self.process_index[process_id], self.resource_index[resource_id]] = units
+
+    def set_total(self, resource_id: str, total_units: int) -> None:
+        """Change the total units of a resource."""
+        column = self.resource_index[resource_id]
+        self.available[column] += total_units - self.total[column]
+        self.total[column] = total_units
+
+    # Analyses
+
+    def find_blocked(self, demand: np.ndarray = None) -> Set[str]:
+        """
+        Vectorized graph reduction returning the processes that cannot finish.
+
+        Args:
+            demand: matrix of outstanding demands, defaults to the Request
+                matrix (deadlock detection); pass Max - Allocation for a
+                Banker's safety check
+        """
+        rows, columns = self._row_count, self._column_count
+        if demand is None:
+            demand = self.request
+        demand = demand[:rows, :columns]
+        allocation = self.allocation[:rows, :columns]
+        work = self.available[:columns].astype(np.int64)
+        finished = ~self.active_processes[:rows]
+
+        while True:
+            runnable = ~finished & (demand <= work).all(axis=1)
+            if not runnable.any():
+                break
+            work += allocation[runnable].sum(axis=0)
+            finished |= runnable
+
+        return {self._process_ids[row] for row in np.flatnonzero(~finished)}
+
+    def find_unsafe(self) -> Set[str]:
+        """Return the processes with no place in a safe sequence (Banker's algorithm)."""
+        rows, columns = self._row_count, self._column_count
+        need = self.maximum[:rows, :columns] - self.allocation[:rows, :columns]
+        return self.find_blocked(np.maximum(need, 0))
+
+    def utilization(self) -> Dict[str, float]:
+        """Return the allocated percentage of every resource."""
+        columns = self._column_count
+        total = self.total[:columns]
+        allocated = total - self.available[:columns]
+        percentages = np.divide(allocated * 100.0, total,
+                                out=np.zeros(columns), where=total > 0)
+        return {resource_id: float(percentages[column])
+                for resource_id, column in self.resource_index.items()}
@@ -0,0 +1,197 @@
+"""
+Query Index Module
+
+This module keeps the processes or resources of a ResourceAllocationManager
+in insertion order with secondary indexes on their attributes (e.g. name,
+utilization bucket), so that lookups and paginated, filtered listings cost
+in proportion to their result instead of to the whole graph.
+
+Listings are paginated with cursors rather than offsets: a cursor is the
+insertion sequence number of the last entity of a page, so the next page
+starts with a binary search and stays consistent while entities are added
+or removed between requests.
+"""
+
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Collection, Dict, Hashable, List, Optional, Tuple
+
+# Default and largest number of entities per page
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Utilization buckets of resources, from free to fully allocated
+UTILIZATION_BUCKETS = ('idle', 'low', 'high', 'full')
+
+# Removed slots tolerated in the order list before it is compacted
+_MIN_COMPACTION = 64
+
+
+def utilization_bucket(resource) -> str:
+    """Bucket of a resource: idle (nothing allocated), low (< 50%), high (< 100%) or full."""
+    allocated = resource.total_units - resource.available_units
+    if allocated <= 0:
+        return 'idle'
+    if resource.available_units <= 0:
+        return 'full'
+    return 'low' if allocated < resource.total_units / 2 else 'high'
+
+
+def normalize_name(name: str) -> str:
+    """Key of the name index; names match case-insensitively."""
+    return name.strip().casefold()
+
+
+@dataclass
+class Page:
+    """One page of a listing."""
+    items: List[Any]
+    # Number of entities matching the query, on every page
+    total: int
+    # Cursor of the next page, None on the last one
+    next_cursor: Optional[int]
+
+
+class EntityIndex:
+    """
+    Insertion-ordered IDs of one kind of entity, with secondary indexes.
+
+    keys maps an index name to a function computing an entity's value in
+    that index. The owner calls update() whenever an entity is added, may
+    have changed, or was removed.
+    """
+
+    def __init__(self, **keys: Callable[[Any], Hashable]):
+        self._keys = keys
+        # Parallel lists: insertion sequence numbers (ascending) and IDs,
+        # with None in the slots of removed entities until compaction
+        self._sequences: List[int] = []
+        self._slots: List[Optional[str]] = []
+        self._removed = 0
+        self._next_sequence = 1
+        # ID -> insertion sequence number
+        self._position: Dict[str, int] = {}
+        # ID -> its value in every index
+        self._values: Dict[str, Tuple[Hashable, ...]] = {}
+        # Index name -> value -> IDs
+        self._indexes: Dict[str, Dict[Hashable, Dict[str, None]]] = {name: {} for name in keys}
+
+    def __len__(self) -> int:
+        return len(self._position)
+
+    def __contains__(self, entity_id: str) -> bool:
+        return entity_id in self._position
+
+    def update(self, entity_id: str, entity: Optional[Any]) -> None:
+        """Index an added or changed entity, or drop a removed one (entity None)."""
+        if entity is None:
+            self._remove(entity_id)
+            return
+        values = tuple(key(entity) for key in self._keys.values())
+        previous = self._values.get(entity_id)
+        if previous == values:
+            return
+        if entity_id not in self._position:
+            self._position[entity_id] = self._next_sequence
+            self._sequences.append(self._next_sequence)
+            self._slots.append(entity_id)
+            self._next_sequence += 1
+        for name, old, new in zip(self._keys, previous or (None,) * len(values), values):
+            if previous is not None and old == new:
+                continue
+            index = self._indexes[name]
+            if previous is not None:
+                self._discard(index, old, entity_id)
+            index.setdefault(new, {})[entity_id] = None
+        self._values[entity_id] = values
+
+    def _remove(self, entity_id: str) -> None:
+        sequence = self._position.pop(entity_id, None)
+        if sequence is None:
+            return
+        self._slots[bisect_left(self._sequences, sequence)] = None
+        self._removed += 1
+        for name, value in zip(self._keys, self._values.pop(entity_id)):
+            self._discard(self._indexes[name], value, entity_id)
+        if self._removed > _MIN_COMPACTION and self._removed * 2 > len(self._slots):
+            self._compact()
+
+    @staticmethod
+    def _discard(index: Dict[Hashable, Dict[str, None]], value: Hashable, entity_id: str) -> None:
+        ids = index.get(value)
+        if ids is not None:
+            ids.pop(entity_id, None)
+            if not ids:
+                del index[value]
+
+    def _compact(self) -> None:
+        kept = [(sequence, entity_id) for sequence, entity_id in zip(self._sequences, self._slots)
+                if entity_id is not None]
+        self._sequences = [sequence for sequence, _ in kept]
+        self._slots = [entity_id for _, entity_id in kept]
+        self._removed = 0
+
+    def clear(self) -> None:
+        self.__init__(**self._keys)
+
+    def matching(self, name: str, value: Hashable) -> Collection[str]:
+        """IDs whose value in an index is value (a live view, do not modify)."""
+        return self._indexes[name].get(value, {}).keys()
+
+    def page(self, ids: Optional[Collection[str]] = None, after: Optional[int] = None,
+             limit: int = DEFAULT_PAGE_SIZE) -> Tuple[List[str], Optional[int]]:
+        """
+        Return up to limit IDs in insertion order after the cursor, and the
+        cursor of the next page (None if there is none).
+
+        With ids, only those are listed: the cost is then proportional to
+        len(ids); without, to the page size.
+        """
+        after = after or 0
+        if ids is not None:
+            position = self._position
+            ordered = sorted((position[entity_id], entity_id) for entity_id in ids
+                             if position.get(entity_id, 0) > after)
+            page = [entity_id for _, entity_id in ordered[:limit]]
+            more = len(ordered) > limit
+        else:
+            page = []
+            more = False
+            for slot in range(bisect_right(self._sequences, after), len(self._slots)):
+                entity_id = self._slots[slot]
+                if entity_id is None:
+                    continue
+                if len(page) == limit:
+                    more = True
+                    break
+                page.append(entity_id)
+        return page, (self._position[page[-1]] if more and page else None)
+
+
+def process_record(process, deadlocked: Collection[str] = ()) -> dict:
+    """JSON-ready view of a process."""
+    creation_time = process.creation_time
+    return {
+        'id': process.id,
+        'name': process.name,
+        'priority': process.priority,
+        'allocated_resources': dict(process.allocated_resources),
+        'requested_resources': dict(process.requested_resources),
+        'max_claims': dict(process.max_claims),
+        'creation_time': creation_time.isoformat() if isinstance(creation_time, datetime) else creation_time,
+        'deadlocked': process.id in deadlocked,
+    }
+
+
+def resource_record(resource) -> dict:
+    """JSON-ready view of a resource."""
+    return {
+        'id': resource.id,
+        'name': resource.name,
+        'total_units': resource.total_units,
+        'available_units': resource.available_units,
+        'allocated_to': dict(resource.allocated_to),
+        'requested_by': dict(resource.requested_by),
+        'utilization': utilization_bucket(resource),
+    }
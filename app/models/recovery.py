@@ -0,0 +1,386 @@
+"""
+Deadlock Recovery Module
+
+This module plans how to break a deadlock at the lowest cost: which
+processes to pick as victims and what to take from them, either the units
+they hold of resources other deadlocked processes wait for (preempt, the
+victim keeps waiting for its own requests) or everything (abort, the
+victim is removed).
+
+Breaking every cycle of the wait graph means choosing a feedback vertex
+set, which is NP-hard, so victims are picked greedily: processes that
+cannot be on a cycle any more (nothing waits for them, or they wait for
+nothing) are trimmed away, and of the rest the one with the lowest cost
+per cycle pair through it (cost / (in-degree * out-degree)) is picked,
+until no process is left. The graph is kept bipartite (processes waiting
+for resources held by processes), so its size follows the allocation
+graph even when many processes share a resource, and picking a victim only
+updates its neighbors, for O(E log V) overall.
+
+The wait graph ignores unit counts, so the plan is then checked with the
+multi-unit reduction of app.models.deadlock: more victims are picked while
+processes would still be blocked, and victims that turn out not to be
+needed are dropped again, costliest first (within PRUNE_BUDGET).
+
+The check starts from the state the plan leaves behind: the units it frees
+are first granted to the head of each request queue, as the manager does,
+and may well go to processes that stay blocked. A preempted victim's own
+request for a resource it gives up is cancelled first, as remove_process
+does, so the units are not granted straight back to it.
+"""
+
+import heapq
+from dataclasses import asdict, dataclass, field, fields
+from datetime import datetime
+from itertools import count
+from typing import Collection, Dict, List, Mapping, Optional, Set, Tuple
+
+from app.models.deadlock import find_blocked_processes
+from app.models.scheduling import RequestQueue
+
+RECOVERY_ACTIONS = ('preempt', 'abort')
+
+# Attempts at dropping a victim when pruning the plan, and the most
+# deadlocked processes simulated in total for them: pruning pays off most
+# on small deadlocks, where one victim more stands out
+PRUNE_LIMIT = 64
+PRUNE_BUDGET = 100_000
+
+
+@dataclass(frozen=True)
+class RecoveryCost:
+    """
+    Weights of the cost of picking a process as a victim.
+
+    Attributes:
+        units: per unit taken from the process
+        age: per minute since the process was created (older processes
+            have done more work that would be lost)
+        priority: per priority level of the process
+        victim: per victim, so that at equal cost fewer processes are disturbed
+    """
+    units: float = 1.0
+    age: float = 0.1
+    priority: float = 5.0
+    victim: float = 1.0
+
+    def __post_init__(self):
+        for weight in fields(self):
+            value = getattr(self, weight.name)
+            if not isinstance(value, (int, float)) or isinstance(value, bool) or value < 0:
+                raise ValueError(f"Cost weight {weight.name} must be a non-negative number")
+
+    @classmethod
+    def from_dict(cls, weights: Optional[Mapping[str, float]]) -> 'RecoveryCost':
+        """
+        Build the weights from a request, defaults for those not given.
+
+        Raises:
+            ValueError: for unknown or invalid weights
+        """
+        weights = dict(weights or {})
+        unknown = set(weights) - {weight.name for weight in fields(cls)}
+        if unknown:
+            raise ValueError(f"Unknown cost weights: {', '.join(sorted(unknown))}")
+        return cls(**weights)
+
+    def of(self, process, units: int, now: datetime) -> float:
+        """Cost of taking units from a process."""
+        created = process.creation_time
+        age = max((now - created).total_seconds(), 0.0) / 60 if isinstance(created, datetime) else 0.0
+        return (self.victim + self.units * units + self.age * age
+                + self.priority * max(process.priority, 0))
+
+
+@dataclass
+class Victim:
+    """A process picked by a recovery plan, and what it loses."""
+    process_id: str
+    name: str
+    # Resource ID -> units released
+    resources: Dict[str, int]
+    cost: float
+    # Resources whose pending request of the victim is cancelled (preempt)
+    cancelled: List[str] = field(default_factory=list)
+
+
+@dataclass
+class RecoveryPlan:
+    """What a recovery does, computed before (or instead of) doing it."""
+    action: str
+    deadlocked: List[str]
+    victims: List[Victim] = field(default_factory=list)
+    # Whether the plan leaves no process deadlocked
+    resolved: bool = True
+
+    @property
+    def cost(self) -> float:
+        return sum(victim.cost for victim in self.victims)
+
+    def operations(self) -> List[dict]:
+        """The plan as ResourceAllocationManager.apply_batch() operations."""
+        if self.action == 'abort':
+            return [{'op': 'remove_process', 'process_id': victim.process_id} for victim in self.victims]
+        operations = []
+        for victim in self.victims:
+            operations += [{'op': 'cancel', 'process_id': victim.process_id, 'resource_id': resource_id}
+                           for resource_id in victim.cancelled]
+            operations += [{'op': 'release', 'process_id': victim.process_id, 'resource_id': resource_id}
+                           for resource_id in victim.resources]
+        return operations
+
+    def describe(self) -> str:
+        """One sentence summary of the plan."""
+        if not self.deadlocked:
+            return "No deadlock detected"
+        names = ', '.join(victim.name for victim in self.victims[:5])
+        if len(self.victims) > 5:
+            names += f" and {len(self.victims) - 5} more"
+        units = sum(sum(victim.resources.values()) for victim in self.victims)
+        if self.action == 'abort':
+            summary = f"Aborting {len(self.victims)} of {len(self.deadlocked)} deadlocked processes ({names})"
+        else:
+            summary = (f"Preempting {units} unit{'s' if units != 1 else ''} from {len(self.victims)} "
+                       f"of {len(self.deadlocked)} deadlocked processes ({names})")
+        return summary + (" breaks the deadlock" if self.resolved else " does not fully break the deadlock")
+
+    def to_dict(self) -> dict:
+        return {
+            'action': self.action,
+            'deadlocked': self.deadlocked,
+            'victims': [asdict(victim) for victim in self.victims],
+            'cost': round(self.cost, 3),
+            'resolved': self.resolved,
+            'summary': self.describe(),
+        }
+
+
+def plan_recovery(deadlocked: Collection[str], processes: Mapping, resources: Mapping,
+                  action: str = 'preempt', cost: RecoveryCost = RecoveryCost(),
+                  now: Optional[datetime] = None,
+                  queues: Optional[Mapping[str, RequestQueue]] = None) -> RecoveryPlan:
+    """
+    Plan the cheapest set of victims found that breaks a deadlock.
+
+    Args:
+        deadlocked: the deadlocked processes (by the multi-unit reduction)
+        processes, resources: the manager's entity dicts
+        action: 'preempt' or 'abort' (see the module docstring)
+        cost: weights of the cost of a victim
+        queues: the manager's request queues, to check the plan against the
+            grants it triggers; without them freed units count as available
+
+    Raises:
+        ValueError: for an unknown action
+    """
+    if action not in RECOVERY_ACTIONS:
+        raise ValueError(f"Unknown recovery action: {action}. Use one of {', '.join(RECOVERY_ACTIONS)}")
+    deadlocked = set(deadlocked)
+    plan = RecoveryPlan(action=action, deadlocked=sorted(deadlocked))
+    if not deadlocked:
+        return plan
+    now = now or datetime.now()
+
+    # What each process would lose: the units of the resources deadlocked
+    # processes wait for, or everything it holds when aborted
+    awaited = {resource_id for process_id in deadlocked
+               for resource_id in processes[process_id].requested_resources}
+    taken: Dict[str, Dict[str, int]] = {}
+    weights: Dict[str, float] = {}
+    for process_id in deadlocked:
+        process = processes[process_id]
+        taken[process_id] = {resource_id: units for resource_id, units in process.allocated_resources.items()
+                             if action == 'abort' or resource_id in awaited}
+        weights[process_id] = cost.of(process, sum(taken[process_id].values()), now)
+
+    # Grant order of the queues the plan can free units in
+    waiting = None
+    if queues is not None:
+        touched = {resource_id for process_id in deadlocked
+                   for resource_id in (*processes[process_id].allocated_resources,
+                                       *processes[process_id].requested_resources)}
+        waiting = {resource_id: queues[resource_id].waiting() for resource_id in touched if resource_id in queues}
+
+    victims = _feedback_set(deadlocked, weights, processes, resources)
+    blocked = _blocked(deadlocked, victims, action, taken, processes, resources, waiting)
+    while blocked - victims:
+        # Unit counts left processes stuck without a cycle among them (e.g.
+        # too few units even once every other waiter is served): keep
+        # picking, from the graph of the processes still blocked. Victims
+        # still blocked waiting for their own requests cannot be helped
+        # by taking more from them.
+        candidates = blocked - victims
+        victims |= (_feedback_set(candidates, weights, processes, resources)
+                    or {min(candidates, key=lambda process_id: (weights[process_id], process_id))})
+        blocked = _blocked(deadlocked, victims, action, taken, processes, resources, waiting)
+
+    # Granted units can go to processes that stay blocked, so dropping one
+    # victim may make another unnecessary: repeat until none can be dropped
+    attempts = min(PRUNE_LIMIT, PRUNE_BUDGET // len(deadlocked))
+    pruned = True
+    while pruned and attempts > 0:
+        pruned = False
+        for victim in sorted(victims, key=lambda process_id: (-weights[process_id], process_id)):
+            if attempts <= 0:
+                break
+            attempts -= 1
+            remaining = _blocked(deadlocked, victims - {victim}, action, taken, processes, resources, waiting)
+            if not remaining:
+                victims.discard(victim)
+                blocked = remaining
+                pruned = True
+
+    plan.victims = [Victim(process_id, processes[process_id].name, taken[process_id],
+                           round(weights[process_id], 3), _cancelled(processes[process_id], action, taken))
+                    for process_id in sorted(victims, key=lambda process_id: (weights[process_id], process_id))]
+    plan.resolved = not blocked
+    return plan
+
+
+def _feedback_set(process_ids: Set[str], weights: Mapping[str, float], processes: Mapping,
+                  resources: Mapping) -> Set[str]:
+    """Greedy weighted feedback vertex set of the wait graph among process_ids."""
+    # Bipartite wait graph: process -> resource it requests -> process
+    # holding it, both processes in the set. Nodes are (kind, id) pairs.
+    successors: Dict[tuple, Set[tuple]] = {}
+    predecessors: Dict[tuple, Set[tuple]] = {}
+
+    def link(source: tuple, target: tuple) -> None:
+        successors.setdefault(source, set()).add(target)
+        predecessors.setdefault(target, set()).add(source)
+        successors.setdefault(target, set())
+        predecessors.setdefault(source, set())
+
+    for process_id in process_ids:
+        for resource_id in processes[process_id].requested_resources:
+            resource = resources.get(resource_id)
+            if resource is None:
+                continue
+            holders = [holder for holder in resource.allocated_to if holder in process_ids and holder != process_id]
+            if holders:
+                link(('p', process_id), ('r', resource_id))
+                for holder in holders:
+                    link(('r', resource_id), ('p', holder))
+
+    def remove(node: tuple, changed: List[tuple]) -> None:
+        for target in successors.pop(node):
+            predecessors[target].discard(node)
+            changed.append(target)
+        for source in predecessors.pop(node):
+            successors[source].discard(node)
+            changed.append(source)
+
+    def trim(candidates: List[tuple]) -> None:
+        """Remove the nodes that can no longer be on a cycle, then update the heap."""
+        touched = []
+        while candidates:
+            node = candidates.pop()
+            if node not in successors:
+                continue
+            if not successors[node] or not predecessors[node]:
+                remove(node, candidates)
+            else:
+                touched.append(node)
+        for node in touched:
+            if node in successors and node[0] == 'p':
+                push(node)
+
+    heap: List[tuple] = []
+    order = count()
+
+    def push(node: tuple) -> None:
+        degree = len(successors[node]) * len(predecessors[node])
+        heapq.heappush(heap, (weights[node[1]] / degree, next(order), node, degree))
+
+    trim(list(successors))
+
+    victims = set()
+    while heap:
+        _, _, node, degree = heapq.heappop(heap)
+        if node not in successors or len(successors[node]) * len(predecessors[node]) != degree:
+            continue  # removed, or a newer entry has its current degree
+        victims.add(node[1])
+        changed: List[tuple] = []
+        remove(node, changed)
+        trim(changed)
+    return victims
+
+
+def _cancelled(process, action: str, taken: Mapping[str, Mapping[str, int]]) -> List[str]:
+    """Resources a victim gives up units of while waiting for more of them (preempt only)."""
+    if action == 'abort':
+        return []
+    return [resource_id for resource_id in taken[process.id] if resource_id in process.requested_resources]
+
+
+def _blocked(deadlocked: Set[str], victims: Set[str], action: str, taken: Mapping[str, Mapping[str, int]],
+             processes: Mapping, resources: Mapping,
+             waiting: Optional[Mapping[str, List[Tuple[str, int]]]] = None) -> Set[str]:
+    """
+    The processes that would still be blocked after taking from the victims.
+
+    Taking units only frees more, so processes that were not deadlocked
+    still finish and their units count as free: only the holdings of
+    deadlocked processes have to be subtracted from the total units. With
+    waiting (the grant order of request queues), the units the releases
+    grant to deadlocked processes are added to their holdings first.
+    """
+    survivors = deadlocked - victims if action == 'abort' else deadlocked
+    holdings = {}
+    demands = {}
+    for process_id in survivors:
+        held = processes[process_id].allocated_resources
+        wanted = processes[process_id].requested_resources
+        if process_id in victims:
+            held = {resource_id: units for resource_id, units in held.items()
+                    if resource_id not in taken[process_id]}
+            wanted = {resource_id: units for resource_id, units in wanted.items()
+                      if resource_id not in taken[process_id]}
+        holdings[process_id] = held
+        demands[process_id] = wanted
+    if waiting is not None:
+        _grant(victims, action, taken, processes, resources, waiting, holdings, demands)
+
+    held_units: Dict[str, int] = {}
+    for held in holdings.values():
+        for resource_id, units in held.items():
+            held_units[resource_id] = held_units.get(resource_id, 0) + units
+    available = {resource_id: resources[resource_id].total_units - held_units.get(resource_id, 0)
+                 for wanted in demands.values() for resource_id in wanted if resource_id in resources}
+    return find_blocked_processes(available, holdings, demands, survivors)
+
+
+def _grant(victims: Set[str], action: str, taken: Mapping[str, Mapping[str, int]], processes: Mapping,
+           resources: Mapping, waiting: Mapping[str, List[Tuple[str, int]]],
+           holdings: Dict[str, Dict[str, int]], demands: Dict[str, Dict[str, int]]) -> None:
+    """
+    Grant the queued requests the victims' releases and cancellations let
+    through, like ResourceAllocationManager.grant_waiting_requests(), to the
+    deadlocked processes in holdings.
+    """
+    freed: Dict[str, int] = {}
+    dequeued: Dict[str, Set[str]] = {}
+    for process_id in victims:
+        for resource_id, units in taken[process_id].items():
+            freed[resource_id] = freed.get(resource_id, 0) + units
+        requested = processes[process_id].requested_resources
+        for resource_id in (requested if action == 'abort' else taken[process_id]):
+            if resource_id in requested:
+                dequeued.setdefault(resource_id, set()).add(process_id)
+                freed.setdefault(resource_id, 0)
+    for resource_id, units in freed.items():
+        if resource_id not in waiting:
+            continue
+        left = resources[resource_id].available_units + units
+        skipped = dequeued.get(resource_id, ())
+        for process_id, wanted in waiting[resource_id]:
+            if process_id in skipped:
+                continue
+            if wanted > left:
+                break
+            left -= wanted
+            if process_id in holdings:
+                holdings[process_id] = {**holdings[process_id],
+                                        resource_id: holdings[process_id].get(resource_id, 0) + wanted}
+                demands[process_id] = {other: count for other, count in demands[process_id].items()
+                                       if other != resource_id}
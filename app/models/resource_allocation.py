@@ -7,15 +7,131 @@ and their relationships in a Resource Allocation Graph (RAG) system.
 
 import networkx as nx
 import json
+import sys
+import time
 import uuid
 from datetime import datetime
+from itertools import islice
+from collections import OrderedDict
+import inspect
+import threading
+from functools import wraps
 from typing import Dict, List, Tuple, Any, Optional, Set
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import numpy as np
 from sklearn.cluster import KMeans
 import pandas as pd
 
-@dataclass
+from app.models.deadlock import WaitForGraph, find_blocked_processes
+from app.models.matrices import AllocationMatrices
+from app.models.scheduling import RequestQueue
+from app.models.history import AllocationHistory, EventType
+from app.models.stats import HoldTimeStats, HoldTimeSummary
+from app.models.deltas import DeltaLog
+from app.models.batch import BATCH_OPERATIONS, BatchError, BatchJournal
+from app.models.storage import OperationStore
+from app.models.snapshot import encode_snapshot, decode_snapshot
+from app.models.graph_views import GraphViewSpec, cluster_view, select_nodes
+from app.models.layout import GraphLayout
+from app.models.wire import compress, encode_graph
+from app.models.recovery import RecoveryCost, RecoveryPlan, plan_recovery
+from app.models.query import (EntityIndex, Page, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, UTILIZATION_BUCKETS,
+                              normalize_name, utilization_bucket)
+from app.telemetry import get_logger, metrics
+
+logger = get_logger('allocation')
+
+# Maximum number of cycles listed by detect_deadlock unless asked otherwise
+DEFAULT_CYCLE_LIMIT = 10
+
+# Stored operations between two snapshots of the state in the operation store
+DEFAULT_CHECKPOINT_INTERVAL = 10_000
+
+# History events shown in the trend charts of the analyses
+TREND_EVENTS = 10
+
+# Graph views (filtered or clustered graph data) kept per manager
+VIEW_CACHE_SIZE = 32
+
+# Histogram of the duration of manager calls, including the wait for the lock
+CALL_METRIC = 'manager_call_seconds'
+
+def timed(method):
+    """Record the duration of every call of a ResourceAllocationManager method."""
+    return metrics.histogram(CALL_METRIC, method=method.__name__).time()(method)
+
+def synchronized(method):
+    """Run a ResourceAllocationManager method while holding the manager's lock, timed."""
+    histogram = metrics.histogram(CALL_METRIC, method=method.__name__)
+
+    @wraps(method)
+    def locked(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            with self.lock:
+                return method(self, *args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - started)
+    return locked
+
+def mutation(prepare=None):
+    """
+    Mark a public ResourceAllocationManager method that changes its state.
+
+    Like synchronized, the method runs under the manager's lock. With an
+    operation store attached, a top-level call is also recorded as an
+    operation ({'op': method name, 'args': arguments, 'ts': epoch ns,
+    stamped by _store_operation()}) so that every manager sharing the store
+    applies it too; prepare may fill
+    in arguments that must be the same everywhere, such as new IDs. Calls
+    made by other mutations and replays of stored operations run directly.
+    """
+    def decorator(method):
+        signature = inspect.signature(method)
+        histogram = metrics.histogram(CALL_METRIC, method=method.__name__)
+        
+        @wraps(method)
+        def locked(self, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                with self.lock:
+                    if self.storage is None or self._replaying:
+                        return method(self, *args, **kwargs)
+                    arguments = dict(signature.bind(self, *args, **kwargs).arguments)
+                    del arguments['self']
+                    if prepare is not None:
+                        prepare(arguments)
+                    return self._store_operation({'op': method.__name__, 'args': arguments})
+            finally:
+                histogram.observe(time.perf_counter() - started)
+        return locked
+    return decorator
+
+def _assign_id(key):
+    """Return a prepare hook giving a new entity its UUID before it is stored."""
+    def prepare(arguments):
+        arguments[key] = arguments.get(key) or str(uuid.uuid4())
+    return prepare
+
+def _assign_batch_ids(arguments):
+    """Give the entities created by a stored batch their UUIDs."""
+    operations = []
+    for operation in arguments['operations']:
+        if isinstance(operation, dict) and operation.get('op') in ('add_resource', 'add_process'):
+            operation = dict(operation)
+            _assign_id('resource_id' if operation['op'] == 'add_resource' else 'process_id')(operation)
+        operations.append(operation)
+    arguments['operations'] = operations
+
+def _interned(edges) -> Dict[str, int]:
+    """Key decoded edges by interned IDs, shared with the entities' own."""
+    return {sys.intern(entity_id): units for entity_id, units in dict(edges).items()}
+
+# Entities are slotted, without a per-instance __dict__. Their IDs are
+# interned and key every edge, so an ID is stored once however many edges
+# refer to it; benchmarks/bench_memory.py measures the entity stores about
+# 1.7x smaller than with plain dataclasses.
+@dataclass(slots=True)
 class Resource:
     name: str
     total_units: int
@@ -35,18 +151,34 @@ class Resource:
         allocated = sum(self.allocated_to.values())
         self.available_units = self.total_units - allocated
         
-@dataclass
+@dataclass(slots=True)
 class Process:
     id: str
     name: str
     allocated_resources: Dict[str, int] = None  # resource_id -> units
     requested_resources: Dict[str, int] = None  # resource_id -> units
     creation_time: datetime = None
+    max_claims: Dict[str, int] = None  # resource_id -> maximum units
+    priority: int = 0
     
     def __post_init__(self):
         self.allocated_resources = {}
         self.requested_resources = {}
         self.creation_time = datetime.now()
+        self.max_claims = {}
+
+class UnsafeAllocationError(ValueError):
+    """Raised when an allocation would leave the system in an unsafe state."""
+
+@dataclass(frozen=True)
+class GraphSnapshot:
+    """Graph data of one state version together with its JSON encoding."""
+    version: int
+    etag: str
+    data: dict
+    body: bytes
+    # Other encodings of the data, built on first use (see encoded_graph())
+    encodings: Dict[str, bytes] = field(default_factory=dict, compare=False, repr=False)
 
 class ResourceAllocationManager:
     """
@@ -54,52 +186,525 @@ class ResourceAllocationManager:
     allocation, requests, and deadlock detection.
     """
     
-    def __init__(self):
-        """Initialize the resource allocation manager with empty state."""
+    def __init__(self, matrix_backend: bool = False, avoidance: bool = False,
+                 scheduling_policy: Optional[str] = 'fifo',
+                 history: Optional[AllocationHistory] = None,
+                 deltas: Optional[DeltaLog] = None,
+                 storage: Optional[OperationStore] = None,
+                 checkpoint_interval: Optional[int] = DEFAULT_CHECKPOINT_INTERVAL,
+                 layout: bool = True):
+        """
+        Initialize the resource allocation manager with empty state.
+
+        Args:
+            matrix_backend: also keep the state in dense NumPy matrices so
+                deadlock detection and utilization stats run vectorized
+            avoidance: require processes to declare maximum claims and only
+                grant allocations that keep the system in a safe state
+                (Banker's algorithm)
+            scheduling_policy: default order ('fifo', 'priority' or
+                'shortest') in which pending requests are granted when units
+                free up; None disables automatic grants
+            history: event log to record into, defaults to an
+                AllocationHistory with the default retention policy
+            deltas: log to publish the graph changes of every mutation to,
+                for clients that follow the graph incrementally
+            storage: shared operation log; the manager restores the
+                latest snapshot in it, replays the operations stored after
+                that and from then on keeps its state in step with every
+                other manager using the same store
+            checkpoint_interval: number of stored operations after which
+                the state is snapshotted into the store and the operations
+                before it are dropped; None disables periodic snapshots
+            layout: compute node positions (see app.models.layout) and
+                include them in the graph data as x and y, so clients can
+                draw the graph without a force simulation
+        """
         self.processes: Dict[str, Process] = {}
         self.resources: Dict[str, Resource] = {}
-        self.allocation_history: List[dict] = []
-        self.graph = nx.DiGraph()
+        self.allocation_history = history if history is not None else AllocationHistory()
+        self.hold_times = HoldTimeStats()
+        self.wait_for = WaitForGraph()
+        self.matrices: Optional[AllocationMatrices] = AllocationMatrices() if matrix_backend else None
+        self.avoidance = avoidance
+        self.scheduling_policy = scheduling_policy
+        self.request_queues: Dict[str, RequestQueue] = {}
+        # Listing order and secondary indexes, kept up to date by _state_changed
+        self._process_index = EntityIndex(name=lambda process: normalize_name(process.name))
+        self._resource_index = EntityIndex(name=lambda resource: normalize_name(resource.name),
+                                           utilization=utilization_bucket)
+        # Node positions, laid out on the first graph data built and then
+        # updated around the nodes touched by mutations
+        self.layout: Optional[GraphLayout] = GraphLayout() if layout else None
+        # Single writer, many readers: every method that reads or changes
+        # processes and resources holds this lock, except graph_snapshot(),
+        # which hands out the immutable snapshot of the current version
+        # without locking. Callers combining several calls into one atomic
+        # step can hold it too (it is reentrant).
+        self.lock = threading.RLock()
+        # Incremented on every mutation; the instance tag keeps versions of
+        # different managers (e.g. across restarts) from being confused
+        self.version = 0
+        self._instance = uuid.uuid4().hex[:8]
+        self._deadlocked: Optional[Set[str]] = None
+        self._graph: Optional[nx.DiGraph] = None
+        self._snapshot: Optional[GraphSnapshot] = None
+        # Graph views of the current version by spec, least recently used first
+        self._views: 'OrderedDict[GraphViewSpec, GraphSnapshot]' = OrderedDict()
+        # What has been published to the delta log so far: rendered nodes
+        # by id, rendered edges grouped by their resource, deadlocked set
+        self.deltas = deltas
+        self._published_nodes: Dict[str, dict] = {}
+        self._published_edges: Dict[str, Dict[str, dict]] = {}
+        self._published_deadlock: Set[str] = set()
+        self._batch: Optional[BatchJournal] = None
+        # Operation log shared with other managers, and the sequence number
+        # of the last stored operation applied here
+        self.storage = storage
+        self.storage_sequence = 0
+        self.checkpoint_interval = checkpoint_interval
+        self._checkpoint_sequence = 0
+        self._replaying = False
+        self._operation_time: Optional[int] = None
+        if storage is not None:
+            self.sync()
+    
+    @synchronized
+    def sync(self) -> int:
+        """
+        Apply the operations other managers stored since the last sync.
+
+        Returns:
+            the number of operations applied
+        """
+        if self.storage is None:
+            return 0
+        return self._catch_up()
+    
+    def _catch_up(self) -> int:
+        operations = self.storage.read(self.storage_sequence)
+        if operations and operations[0][0] > self.storage_sequence + 1:
+            # Operations this manager has not applied yet were dropped after
+            # a snapshot; start over from the snapshot
+            self._load_checkpoint()
+            operations = [(sequence, operation) for sequence, operation in operations
+                          if sequence > self.storage_sequence]
+        self._replay(operations)
+        return len(operations)
+    
+    def _replay(self, operations: List[Tuple[int, dict]]) -> None:
+        for sequence, operation in operations:
+            try:
+                self._apply_stored(operation)
+            except Exception:
+                # The operation was valid where it was stored, so this
+                # manager's state has diverged; keep going with the rest
+                logger.exception("Error replaying stored operation", extra={'fields': {
+                    'sequence': sequence, 'op': operation.get('op')}})
+                metrics.increment('errors_total', where='replay')
+            self.storage_sequence = sequence
+    
+    def _apply_stored(self, operation: dict) -> Any:
+        self._replaying = True
+        self._operation_time = operation.get('ts')
+        try:
+            return getattr(self, operation['op'])(**operation['args'])
+        finally:
+            self._replaying = False
+            self._operation_time = None
+    
+    def _store_operation(self, operation: dict) -> Any:
+        """
+        Apply an operation and append it to the shared log, atomically.
+
+        Holding the store's write lock, the manager first catches up so the
+        operation is validated against the latest shared state; it is only
+        appended if applying it here succeeded. The operation is timestamped
+        under that lock too, so the log is in time order across processes
+        (the history's age-based eviction relies on it).
+        """
+        with self.storage.exclusive():
+            self._catch_up()
+            operation['ts'] = time.time_ns()
+            result = self._apply_stored(operation)
+            self.storage_sequence = self.storage.append(operation)
+        if (self.checkpoint_interval
+                and self.storage_sequence - self._checkpoint_sequence >= self.checkpoint_interval):
+            # Another manager may have stored a snapshot in the meantime
+            self._checkpoint_sequence = max(self._checkpoint_sequence, self.storage.snapshot_sequence())
+            if self.storage_sequence - self._checkpoint_sequence >= self.checkpoint_interval:
+                try:
+                    self.checkpoint()
+                except Exception:
+                    # The operation itself is stored; the next one retries
+                    logger.exception("Error storing state snapshot")
+                    metrics.increment('errors_total', where='checkpoint')
+        return result
+    
+    @synchronized
+    def checkpoint(self) -> int:
+        """
+        Store a snapshot of the current state in the operation store.
+
+        Operations stored before the snapshot are dropped from the log, so
+        that a manager starting up restores the snapshot and only replays
+        the operations stored after it.
+
+        Returns:
+            the sequence number of the last operation the snapshot includes
+        """
+        if self.storage is None:
+            raise RuntimeError("No operation store attached")
+        with self.storage.exclusive():
+            self._catch_up()
+            if self.storage_sequence > self.storage.snapshot_sequence():
+                started = time.perf_counter()
+                data = self.export_state()
+                self.storage.save_snapshot(self.storage_sequence, data)
+                logger.info("Stored state snapshot", extra={'fields': {
+                    'sequence': self.storage_sequence, 'bytes': len(data),
+                    'ms': round((time.perf_counter() - started) * 1000, 1)}})
+        self._checkpoint_sequence = self.storage_sequence
+        return self.storage_sequence
+    
+    def _load_checkpoint(self) -> None:
+        sequence, data = self.storage.load_snapshot()
+        self.restore_state(data)
+        self.storage_sequence = self._checkpoint_sequence = sequence
+    
+    @synchronized
+    def export_state(self, history_events: Optional[int] = None) -> bytes:
+        """
+        Serialize processes, resources, wait queues, the allocation history
+        and hold-time statistics into a binary snapshot (see
+        app.models.snapshot).
+
+        Args:
+            history_events: keep only this many of the most recent history
+                events (0 for none), for snapshots that do not need all of it
+        """
+        history, columns = self.allocation_history.export(last=history_events)
+        hold_times, histograms = self.hold_times.export()
+        header = {
+            'resources': [[resource_id, resource.name, resource.total_units,
+                           dict(resource.allocated_to), dict(resource.requested_by)]
+                          for resource_id, resource in self.resources.items()],
+            'processes': [[process_id, process.name, process.priority, process.creation_time.timestamp(),
+                           dict(process.allocated_resources), dict(process.requested_resources),
+                           dict(process.max_claims)]
+                          for process_id, process in self.processes.items()],
+            'queues': [[resource_id, queue.policy, queue.waiting()]
+                       for resource_id, queue in self.request_queues.items()],
+            'history': history,
+            'hold_times': hold_times,
+        }
+        arrays = {f"history.{name}": column for name, column in columns.items()}
+        arrays['hold_times'] = histograms
+        return encode_snapshot(header, arrays)
+    
+    @synchronized
+    def restore_state(self, data: bytes) -> None:
+        """
+        Replace the whole state with a snapshot made by export_state().
+
+        Only the state is restored; the manager keeps its own options
+        (avoidance, scheduling policy, history retention).
+        A manager with an operation store restores the store's snapshots
+        by itself and should not be given others.
+        """
+        header, arrays = decode_snapshot(data)
+        self.processes = {}
+        self.resources = {}
+        self.request_queues = {}
+        for resource_id, name, total_units, allocated, requested in header['resources']:
+            resource = self.resources[resource_id] = self._new_resource(resource_id, name, total_units)
+            resource.allocated_to.update(_interned(allocated))
+            resource.requested_by.update(_interned(requested))
+            resource.recalculate_available_units()
+        for process_id, name, priority, created, allocated, requested, claims in header['processes']:
+            process = self.processes[process_id] = self._new_process(process_id, name, priority)
+            process.creation_time = datetime.fromtimestamp(created)
+            process.allocated_resources.update(_interned(allocated))
+            process.requested_resources.update(_interned(requested))
+            process.max_claims.update(_interned(claims))
+        for resource_id, policy, waiting in header['queues']:
+            queue = self.request_queues[resource_id] = RequestQueue(policy)
+            for process_id, units in waiting:
+                queue.push(process_id, units, self.processes[process_id].priority)
+        
+        self.allocation_history.restore(header['history'], {
+            name.partition('.')[2]: column for name, column in arrays.items() if name.startswith('history.')})
+        self.hold_times.restore(header['hold_times'], arrays['hold_times'])
+        self._rebuild_indexes()
+        if self.layout is not None:
+            self.layout.reset()
+        self._state_changed()
+        if self.deltas is not None:
+            self._publish_reset()
+            self._state_changed(*self.processes, *self.resources)
+    
+    def _state_changed(self, *touched: str) -> None:
+        """
+        Invalidate state derived from processes, resources and their edges.
+
+        Args:
+            touched: IDs of the processes and resources whose node or edges
+                the mutation changed, used to publish deltas and update the
+                query indexes
+        """
+        if self._batch is None:
+            # A batch becomes one version, when it commits
+            self.version += 1
+        self._deadlocked = None
+        self._graph = None
+        self._snapshot = None
+        for entity_id in touched:
+            self._process_index.update(entity_id, self.processes.get(entity_id))
+            self._resource_index.update(entity_id, self.resources.get(entity_id))
+        if self.layout is not None and touched:
+            self.layout.touch(touched, self._exists, self._neighbors)
+        if self._batch is not None:
+            # Deltas of a batch are published once, when it commits
+            self._batch.touched.update(dict.fromkeys(touched))
+        elif self.deltas is not None and touched:
+            self._publish_deltas(touched)
+    
+    def _journal(self, process: Optional[Process] = None, resource: Optional[Resource] = None) -> None:
+        """Save the state of entities about to change if a batch is in progress."""
+        if self._batch is None:
+            return
+        if process is not None:
+            self._batch.save_process(process)
+        if resource is not None:
+            self._batch.save_resource(resource, self.request_queues.get(resource.id))
+    
+    def _publish_deltas(self, touched: Tuple[str, ...]) -> None:
+        """Record how the touched nodes, their edges and the deadlock state changed."""
+        added_nodes, removed_nodes, added_edges, removed_edges, changed = [], [], [], [], []
+        for node_id in touched:
+            if node_id in self.processes:
+                node = self._process_node(self.processes[node_id])
+            elif node_id in self.resources:
+                node = self._resource_node(self.resources[node_id])
+            else:
+                node = None
+            previous = self._published_nodes.get(node_id)
+            if node is None:
+                if previous is not None:
+                    del self._published_nodes[node_id]
+                    removed_nodes.append({'type': 'node_removed', 'id': node_id})
+            elif previous is None:
+                added_nodes.append({'type': 'node_added', 'node': node})
+            elif node != previous:
+                changed.append({'type': 'units_changed', 'node': node})
+            if node is not None:
+                self._published_nodes[node_id] = node
+            
+            # Every edge has a resource at one end, so edges are diffed per resource
+            if node_id in self.resources or node_id in self._published_edges:
+                resource = self.resources.get(node_id)
+                edges = {edge['id']: edge for edge in self._resource_edges(resource)} if resource else {}
+                published = self._published_edges.pop(node_id, {})
+                for edge_id, edge in edges.items():
+                    if edge_id not in published:
+                        added_edges.append({'type': 'edge_added', 'edge': edge})
+                    elif edge != published[edge_id]:
+                        changed.append({'type': 'units_changed', 'edge': edge})
+                removed_edges.extend({'type': 'edge_removed', 'id': edge_id}
+                                     for edge_id in published if edge_id not in edges)
+                if edges:
+                    self._published_edges[node_id] = edges
+        
+        # Order the deltas so that no edge ever refers to a missing node
+        deltas = added_nodes + removed_edges + added_edges + changed + removed_nodes
+        
+        # The wait-for graph tells cheaply whether a deadlock is possible at all
+        if self.wait_for.has_cycle() or self._published_deadlock:
+            deadlocked = self.deadlocked_processes()
+            if deadlocked != self._published_deadlock:
+                self._published_deadlock = set(deadlocked)
+                deltas.append({'type': 'deadlock_changed', 'processes': sorted(deadlocked)})
+        self.deltas.record(self.version, deltas)
+    
+    def version_tag(self, version: Optional[int] = None) -> str:
+        """Return an opaque tag for a state version (default: the current one)."""
+        return f"{self._instance}-{self.version if version is None else version}"
     
-    def add_resource(self, name: str, units: int) -> str:
+    def parse_version_tag(self, tag: Optional[str]) -> Optional[int]:
+        """Return the version of a tag issued by this manager, or None."""
+        instance, _, version = (tag or '').strip().strip('"').rpartition('-')
+        if instance != self._instance or not version.isdigit():
+            return None
+        return int(version)
+    
+    def _record(self, event_type: EventType, process_id: str, resource_id: str, units: int) -> None:
+        """Append an event to the history and update the hold-time statistics."""
+        # Stored operations carry their own time so every manager records the same
+        timestamp_ns = self._operation_time or time.time_ns()
+        if self._batch is not None:
+            self._batch.events.append((event_type, process_id, resource_id, units, timestamp_ns))
+            return
+        self.allocation_history.record(event_type, process_id, resource_id, units, timestamp_ns)
+        self._track_hold_time(event_type, process_id, resource_id, timestamp_ns)
+    
+    def _track_hold_time(self, event_type: EventType, process_id: str, resource_id: str,
+                         timestamp_ns: int) -> None:
+        if event_type == EventType.ALLOCATION:
+            self.hold_times.allocated(process_id, resource_id, timestamp_ns)
+        elif event_type == EventType.RELEASE:
+            self.hold_times.released(process_id, resource_id, timestamp_ns)
+    
+    @property
+    @synchronized
+    def graph(self) -> nx.DiGraph:
+        """
+        The resource allocation graph as a networkx DiGraph.
+
+        The process and resource dicts are the only source of truth; this
+        view is built from them on first access and cached until the next
+        mutation.
+        """
+        if self._graph is None:
+            graph = nx.DiGraph()
+            for process_id, process in self.processes.items():
+                graph.add_node(process_id, type='process', name=process.name)
+            for resource_id, resource in self.resources.items():
+                graph.add_node(resource_id, type='resource', name=resource.name)
+                for process_id, units in resource.allocated_to.items():
+                    graph.add_edge(resource_id, process_id, type='allocation', units=units)
+                for process_id, units in resource.requested_by.items():
+                    graph.add_edge(process_id, resource_id, type='request', units=units)
+            self._graph = graph
+        return self._graph
+    
+    @mutation(_assign_id('resource_id'))
+    def add_resource(self, name: str, units: int, resource_id: Optional[str] = None) -> str:
         """Add a new resource with the specified number of units."""
         if units <= 0:
             raise ValueError("Resource units must be greater than 0")
         
-        resource_id = str(uuid.uuid4())
-        resource = Resource(name=name, total_units=units, available_units=units)
-        resource.id = resource_id  # Add ID to the resource
-        self.resources[resource_id] = resource
-        self.graph.add_node(resource_id, type='resource', name=name)
+        resource_id = resource_id or str(uuid.uuid4())
+        if resource_id in self.resources or resource_id in self.processes:
+            raise ValueError(f"ID {resource_id} is already in use")
+        self.resources[resource_id] = self._new_resource(resource_id, name, units)
+        if self._batch is not None:
+            self._batch.added.add(resource_id)
+        if self.matrices is not None:
+            self.matrices.add_resource(resource_id, units)
+        self._state_changed(resource_id)
         return resource_id
     
-    def add_process(self, name: str) -> str:
-        """Add a new process."""
-        process_id = str(uuid.uuid4())
-        self.processes[process_id] = Process(id=process_id, name=name)
-        self.graph.add_node(process_id, type='process', name=name)
+    @mutation(_assign_id('process_id'))
+    def add_process(self, name: str, max_claims: Optional[Dict[str, int]] = None,
+                    priority: int = 0, process_id: Optional[str] = None) -> str:
+        """
+        Add a new process.
+
+        Args:
+            name: display name of the process
+            max_claims: maximum units the process may hold, by resource ID
+            priority: scheduling priority, higher values are granted first
+                under the 'priority' policy
+            process_id: ID to use instead of a new UUID
+        """
+        process_id = process_id or str(uuid.uuid4())
+        if process_id in self.processes or process_id in self.resources:
+            raise ValueError(f"ID {process_id} is already in use")
+        self.processes[process_id] = self._new_process(process_id, name, priority)
+        if self._batch is not None:
+            self._batch.added.add(process_id)
+        if self.matrices is not None:
+            self.matrices.add_process(process_id)
+        self._state_changed(process_id)
+        for resource_id, units in (max_claims or {}).items():
+            self.declare_max_claim(process_id, resource_id, units)
         return process_id
     
+    def _new_resource(self, resource_id: str, name: str, units: int) -> Resource:
+        resource = Resource(name=name, total_units=units, available_units=units)
+        resource.id = sys.intern(resource_id)  # Add ID to the resource
+        return resource
+    
+    def _new_process(self, process_id: str, name: str, priority: int) -> Process:
+        process = Process(id=sys.intern(process_id), name=name, priority=priority)
+        if self._operation_time is not None:
+            # Like history events, take the stored operation's time so every
+            # manager agrees on process ages (recovery costs depend on them)
+            process.creation_time = datetime.fromtimestamp(self._operation_time / 1e9)
+        return process
+    
+    @mutation()
+    def declare_max_claim(self, process_id: str, resource_id: str, units: int) -> None:
+        """Declare the maximum number of units of a resource a process may hold."""
+        if process_id not in self.processes:
+            raise ValueError(f"Process {process_id} not found")
+        if resource_id not in self.resources:
+            raise ValueError(f"Resource {resource_id} not found")
+        
+        resource = self.resources[resource_id]
+        process = self.processes[process_id]
+        
+        if units > resource.total_units:
+            raise ValueError(f"Maximum claim exceeds resource capacity. Claimed: {units}, Total: {resource.total_units}")
+        held = process.allocated_resources.get(resource_id, 0)
+        requested = process.requested_resources.get(resource_id, 0)
+        if units < held + requested:
+            raise ValueError(f"Maximum claim is below the {held} unit(s) already allocated "
+                             f"and {requested} unit(s) requested")
+        
+        previous = process.max_claims.get(resource_id)
+        self._journal(process)
+        self._set_max_claim(process, resource.id, units)
+        if self.avoidance and self._batch is None and units > (previous or 0) and not self.is_safe_state():
+            self._set_max_claim(process, resource_id, previous)
+            raise UnsafeAllocationError(f"Claiming {units} unit(s) of {resource.name} would leave the system in an unsafe state")
+    
+    def _set_max_claim(self, process: Process, resource_id: str, units: Optional[int]) -> None:
+        if units is None:
+            process.max_claims.pop(resource_id, None)
+        else:
+            process.max_claims[resource_id] = units
+        if self.matrices is not None:
+            self.matrices.set_maximum(process.id, resource_id, units or 0)
+    
+    @mutation()
     def remove_process(self, process_id: str) -> None:
         """Remove a process and release all its resources."""
         if process_id not in self.processes:
             raise ValueError(f"Process {process_id} not found")
         
-        # Release all allocated resources
+        # Cancel all resource requests first so released units are not
+        # granted back to the process being removed
         process = self.processes[process_id]
-        for resource_id in list(process.allocated_resources.keys()):
-            self.release_resource(process_id, resource_id)
-        
-        # Cancel all resource requests
+        self._journal(process)
         for resource_id in list(process.requested_resources.keys()):
             self.cancel_request(process_id, resource_id)
         
-        # Remove process from graph and dictionary
-        self.graph.remove_node(process_id)
+        # Release all allocated resources
+        for resource_id in list(process.allocated_resources.keys()):
+            self.release_resource(process_id, resource_id)
+        
+        # Remove process from derived structures and dictionary
+        self.wait_for.remove_process(process_id)
+        if self.matrices is not None:
+            self.matrices.remove_process(process_id)
         del self.processes[process_id]
+        self._state_changed(process_id)
     
-    def allocate_resource(self, process_id: str, resource_id: str, units: int = 1):
-        """Allocate a resource to a process."""
+    @mutation()
+    def allocate_resource(self, process_id: str, resource_id: str, units: int = 1,
+                          on_unsafe: str = 'reject') -> bool:
+        """
+        Allocate a resource to a process.
+
+        In avoidance mode the allocation must stay within the process's
+        declared maximum claim and pass the Banker's safety check. An unsafe
+        allocation raises UnsafeAllocationError, or with on_unsafe='queue'
+        is recorded as a pending request instead.
+
+        Returns:
+            True if the units were allocated, False if they were queued
+        """
         if process_id not in self.processes:
             raise ValueError(f"Process {process_id} not found")
         if resource_id not in self.resources:
@@ -107,29 +712,41 @@ class ResourceAllocationManager:
         
         resource = self.resources[resource_id]
         process = self.processes[process_id]
+        # Key the edges by the entities' own (interned) ID strings
+        process_id, resource_id = process.id, resource.id
         
         if units > resource.available_units:
             raise ValueError(f"Not enough units available. Requested: {units}, Available: {resource.available_units}")
         
+        # Inside a batch the safety check runs once, when the batch commits
+        if self.avoidance and self._batch is None and not self._allocation_is_safe(process, resource, units):
+            if on_unsafe == 'queue':
+                self.request_resource(process_id, resource_id, units)
+                return False
+            raise UnsafeAllocationError(f"Allocating {units} unit(s) of {resource.name} would leave the system in an unsafe state")
+        
+        new_holder = process_id not in resource.allocated_to
+        self._journal(process, resource)
+        
         # Update resource
         resource.allocated_to[process_id] = resource.allocated_to.get(process_id, 0) + units
-        resource.recalculate_available_units()  # Recalculate available units
+        resource.available_units -= units
         
         # Update process
         process.allocated_resources[resource_id] = process.allocated_resources.get(resource_id, 0) + units
         
-        # Update graph
-        self.graph.add_edge(resource_id, process_id, type='allocation', units=units)
+        # Update wait-for graph
+        if new_holder:
+            self.wait_for.holder_added(resource, process_id)
+        if self.matrices is not None:
+            self.matrices.set_allocation(process_id, resource_id, resource.allocated_to[process_id])
+        self._state_changed(process_id, resource_id)
         
         # Record in history
-        self.allocation_history.append({
-            'timestamp': datetime.now(),
-            'type': 'allocation',
-            'process_id': process_id,
-            'resource_id': resource_id,
-            'units': units
-        })
+        self._record(EventType.ALLOCATION, process_id, resource_id, units)
+        return True
     
+    @mutation()
     def request_resource(self, process_id: str, resource_id: str, units: int = 1):
         """Request a resource for a process."""
         if process_id not in self.processes:
@@ -139,23 +756,41 @@ class ResourceAllocationManager:
         
         resource = self.resources[resource_id]
         process = self.processes[process_id]
+        process_id, resource_id = process.id, resource.id
+        
+        pending = resource.requested_by.get(process_id, 0)
+        if units + pending > resource.total_units:
+            raise ValueError(f"Request exceeds resource capacity. Requested: {units + pending}, Total: {resource.total_units}")
+        if self.avoidance:
+            claim = process.max_claims.get(resource_id, 0)
+            held = process.allocated_resources.get(resource_id, 0)
+            if held + pending + units > claim:
+                raise ValueError(f"Request exceeds the declared maximum claim. Requested: {held + pending + units}, Claim: {claim}")
+        
+        new_waiter = process_id not in resource.requested_by
+        self._journal(process, resource)
         
         # Add request
         resource.requested_by[process_id] = resource.requested_by.get(process_id, 0) + units
         process.requested_resources[resource_id] = process.requested_resources.get(resource_id, 0) + units
         
-        # Update graph
-        self.graph.add_edge(process_id, resource_id, type='request', units=units)
+        # Update wait-for graph
+        if new_waiter:
+            self.wait_for.waiter_added(resource, process_id)
+        if self.matrices is not None:
+            self.matrices.set_request(process_id, resource_id, resource.requested_by[process_id])
+        if resource_id in self.request_queues or self.scheduling_policy:
+            queue = self.request_queues.get(resource_id)
+            if queue is None:
+                # Queues are created on first use to keep idle resources small
+                queue = self.request_queues[resource_id] = RequestQueue(self.scheduling_policy)
+            queue.push(process_id, resource.requested_by[process_id], process.priority)
+        self._state_changed(process_id, resource_id)
         
         # Record in history
-        self.allocation_history.append({
-            'timestamp': datetime.now(),
-            'type': 'request',
-            'process_id': process_id,
-            'resource_id': resource_id,
-            'units': units
-        })
+        self._record(EventType.REQUEST, process_id, resource_id, units)
     
+    @mutation()
     def release_resource(self, process_id: str, resource_id: str):
         """Release a resource from a process."""
         if process_id not in self.processes:
@@ -170,27 +805,27 @@ class ResourceAllocationManager:
             raise ValueError(f"Resource {resource_id} not allocated to process {process_id}")
         
         units = process.allocated_resources[resource_id]
+        self._journal(process, resource)
         
         # Update resource
         del resource.allocated_to[process_id]
-        resource.recalculate_available_units()  # Recalculate available units
+        resource.available_units += units
         
         # Update process
         del process.allocated_resources[resource_id]
         
-        # Update graph
-        if self.graph.has_edge(resource_id, process_id):
-            self.graph.remove_edge(resource_id, process_id)
+        # Update wait-for graph
+        self.wait_for.holder_removed(resource, process_id)
+        if self.matrices is not None:
+            self.matrices.set_allocation(process_id, resource_id, 0)
+        self._state_changed(process_id, resource_id)
         
         # Record in history
-        self.allocation_history.append({
-            'timestamp': datetime.now(),
-            'type': 'release',
-            'process_id': process_id,
-            'resource_id': resource_id,
-            'units': units
-        })
+        self._record(EventType.RELEASE, process_id, resource_id, units)
+        
+        self.grant_waiting_requests(resource_id)
     
+    @mutation()
     def cancel_request(self, process_id: str, resource_id: str):
         """Cancel a resource request."""
         if process_id not in self.processes:
@@ -204,135 +839,697 @@ class ResourceAllocationManager:
         if resource_id not in process.requested_resources:
             raise ValueError(f"No pending request for resource {resource_id} from process {process_id}")
         
+        units = self._drop_request(process, resource)
+        
+        # Record in history
+        self._record(EventType.CANCEL_REQUEST, process_id, resource_id, units)
+        
+        # The cancelled request may have been holding up the queue
+        self.grant_waiting_requests(resource_id)
+    
+    def _drop_request(self, process: Process, resource: Resource) -> int:
+        """Remove a pending request from every structure and return its units."""
+        process_id, resource_id = process.id, resource.id
         units = process.requested_resources[resource_id]
+        self._journal(process, resource)
         
         # Update resource and process
         del resource.requested_by[process_id]
         del process.requested_resources[resource_id]
         
-        # Update graph
-        if self.graph.has_edge(process_id, resource_id):
-            self.graph.remove_edge(process_id, resource_id)
+        # Update wait-for graph
+        self.wait_for.waiter_removed(resource, process_id)
+        if self.matrices is not None:
+            self.matrices.set_request(process_id, resource_id, 0)
+        queue = self.request_queues.get(resource_id)
+        if queue is not None:
+            queue.remove(process_id)
+        self._state_changed(process_id, resource_id)
         
-        # Record in history
-        self.allocation_history.append({
-            'timestamp': datetime.now(),
-            'type': 'cancel_request',
-            'process_id': process_id,
-            'resource_id': resource_id,
-            'units': units
-        })
+        return units
+    
+    @mutation()
+    def grant_waiting_requests(self, resource_id: str) -> List[str]:
+        """
+        Grant queued requests for a resource while its head fits.
+
+        Requests are taken in the order of the resource's scheduling policy.
+        Granting stops at the first request that does not fit in the
+        available units (or, in avoidance mode, would be unsafe or exceed
+        the process's claim), so large requests are not starved by smaller
+        ones behind them.
+
+        Returns:
+            IDs of the processes whose requests were granted
+        """
+        queue = self.request_queues.get(resource_id)
+        resource = self.resources.get(resource_id)
+        granted = []
+        if not queue or not resource:
+            return granted
+        if self._batch is not None and not self._batch.granting:
+            # Grants wait until the batch's operations have all run
+            self._batch.pending_grants[resource_id] = None
+            return granted
+        
+        while queue:
+            process_id, units = queue.peek()
+            process = self.processes[process_id]
+            if units > resource.available_units:
+                break
+            if self.avoidance and not (self._within_claim(process, resource, units)
+                                       and self._allocation_is_safe(process, resource, units)):
+                break
+            queue.pop()
+            self._drop_request(process, resource)
+            self.allocate_resource(process_id, resource_id, units)
+            granted.append(process_id)
+        return granted
+    
+    @mutation()
+    def set_scheduling_policy(self, resource_id: str, policy: str) -> None:
+        """Change the order in which pending requests for a resource are granted."""
+        resource = self.get_resource(resource_id)
+        if not resource:
+            raise ValueError("Resource not found")
+        
+        queue = RequestQueue(policy)
+        self._journal(resource=resource)
+        for process_id, units in resource.requested_by.items():
+            queue.push(process_id, units, self.processes[process_id].priority)
+        self.request_queues[resource_id] = queue
+        self.grant_waiting_requests(resource_id)
+    
+    @mutation(_assign_batch_ids)
+    def apply_batch(self, operations: List[dict]) -> dict:
+        """
+        Apply a list of operations atomically.
+
+        Each operation is a dict with an 'op' key naming it (see
+        BATCH_OPERATIONS) and the arguments of the matching method, e.g.
+        {'op': 'allocate', 'process_id': ..., 'resource_id': ..., 'units': 2}.
+        Operations run in order and are validated one by one as usual, but
+        the work that only matters for the end state is done once for the
+        whole batch: history events are appended in bulk, graph deltas are
+        published as a single version, the Banker's safety check (in
+        avoidance mode) runs on the final state, and queued requests are
+        granted once all operations ran, as part of the batch's version.
+
+        If any operation fails, or the final state is unsafe, every change
+        made by the batch is rolled back and BatchError (or
+        UnsafeAllocationError) is raised.
+
+        Returns:
+            dict with the per-operation 'results' (new IDs for added
+            entities, allocation outcomes), the requests 'granted' afterwards
+            by resource ID, and the 'deadlocked' processes
+        """
+        if self._batch is not None:
+            raise RuntimeError("Batches cannot be nested")
+        
+        journal = self._batch = BatchJournal(self.version, (self._deadlocked, self._graph, self._snapshot))
+        results = []
+        try:
+            for index, operation in enumerate(operations):
+                results.append(self._apply_operation(index, operation))
+            if self.avoidance and not self.is_safe_state():
+                raise UnsafeAllocationError("The batch would leave the system in an unsafe state")
+            journal.granting = True
+            granted = {}
+            for resource_id in journal.pending_grants:
+                processes = self.grant_waiting_requests(resource_id)
+                if processes:
+                    granted[resource_id] = processes
+        except Exception:
+            self._batch = None
+            self._rollback(journal)
+            raise
+        
+        self._batch = None
+        self.allocation_history.record_many(journal.events)
+        for event_type, process_id, resource_id, _, timestamp_ns in journal.events:
+            self._track_hold_time(event_type, process_id, resource_id, timestamp_ns)
+        for resource_id in journal.forgotten_resources:
+            self.hold_times.forget_resource(resource_id)
+        if journal.touched:
+            self._state_changed(*journal.touched)
+        return {
+            'results': results,
+            'granted': granted,
+            'deadlocked': sorted(self.deadlocked_processes())
+        }
+    
+    def _apply_operation(self, index: int, operation: dict) -> Any:
+        spec = BATCH_OPERATIONS.get(operation.get('op')) if isinstance(operation, dict) else None
+        if spec is None:
+            raise BatchError(index, f"Unknown operation: {operation!r}")
+        method, accepted = spec
+        arguments = {name: operation[name] for name in accepted if name in operation}
+        try:
+            return getattr(self, method)(**arguments)
+        except UnsafeAllocationError:
+            raise
+        except (ValueError, TypeError, KeyError) as e:
+            raise BatchError(index, str(e)) from e
+    
+    def _rollback(self, journal: BatchJournal) -> None:
+        """Undo every change recorded in a batch journal."""
+        # Drop the entities the batch created
+        for entity_id in journal.added:
+            self.processes.pop(entity_id, None)
+            self.resources.pop(entity_id, None)
+            self.request_queues.pop(entity_id, None)
+        
+        # Put back removed entities before restoring edges that refer to them
+        for process, *_ in journal.processes.values():
+            self.processes[process.id] = process
+        for resource, *_ in journal.resources.values():
+            self.resources[resource.id] = resource
+        
+        for process, allocated, requested, claims in journal.processes.values():
+            for edges, saved in ((process.allocated_resources, allocated),
+                                 (process.requested_resources, requested),
+                                 (process.max_claims, claims)):
+                edges.clear()
+                edges.update(saved)
+        for resource, total_units, allocated, requested, queue in journal.resources.values():
+            resource.total_units = total_units
+            for edges, saved in ((resource.allocated_to, allocated), (resource.requested_by, requested)):
+                edges.clear()
+                edges.update(saved)
+            resource.recalculate_available_units()
+            if queue is not None:
+                self.request_queues[resource.id] = queue
+            else:
+                self.request_queues.pop(resource.id, None)
+        
+        self._rebuild_indexes()
+        if self.layout is not None and journal.touched:
+            self.layout.touch(journal.touched, self._exists, self._neighbors)
+        self.version = journal.version
+        self._deadlocked, self._graph, self._snapshot = journal.cached
+    
+    def _rebuild_indexes(self) -> None:
+        """Recompute the wait-for graph, matrices and query indexes from the entity dicts."""
+        self._process_index.clear()
+        for process_id, process in self.processes.items():
+            self._process_index.update(process_id, process)
+        self._resource_index.clear()
+        for resource_id, resource in self.resources.items():
+            self._resource_index.update(resource_id, resource)
+        self.wait_for.reset()
+        for resource in self.resources.values():
+            for process_id in resource.requested_by:
+                self.wait_for.waiter_added(resource, process_id)
+        if self.matrices is not None:
+            self.matrices = AllocationMatrices()
+            for resource_id, resource in self.resources.items():
+                self.matrices.add_resource(resource_id, resource.total_units)
+            for process_id, process in self.processes.items():
+                self.matrices.add_process(process_id)
+                for resource_id, units in process.allocated_resources.items():
+                    self.matrices.set_allocation(process_id, resource_id, units)
+                for resource_id, units in process.requested_resources.items():
+                    self.matrices.set_request(process_id, resource_id, units)
+                for resource_id, units in process.max_claims.items():
+                    self.matrices.set_maximum(process_id, resource_id, units)
     
+    @synchronized
     def get_processes(self) -> List[Process]:
         """Get all processes with their allocated and requested resources."""
         return list(self.processes.values())
     
+    @synchronized
     def get_resources(self) -> List[Resource]:
         """Get all resources with their allocation status."""
         return list(self.resources.values())
     
+    @timed
     def get_graph_data(self) -> dict:
         """Get the current state of the resource allocation graph."""
+        return self.graph_snapshot().data
+    
+    @timed
+    def graph_snapshot(self) -> GraphSnapshot:
+        """
+        Return the graph data of the current state version.
+
+        The node and edge dicts, stats and their JSON encoding are built once
+        per version and shared by every caller until the next mutation, so
+        callers must not modify the returned data. Returning an up-to-date
+        snapshot does not take the lock; building one waits for the writer.
+        """
+        snapshot = self.cached_graph_snapshot()
+        if snapshot is not None:
+            return snapshot
+        with self.lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.version != self.version:
+                data = self._build_graph_data()
+                snapshot = self._snapshot = GraphSnapshot(
+                    version=self.version,
+                    etag=self.version_tag(),
+                    data=data,
+                    body=json.dumps(data, separators=(',', ':')).encode('utf-8'),
+                )
+            return snapshot
+    
+    def cached_graph_snapshot(self) -> Optional[GraphSnapshot]:
+        """
+        Return the snapshot of the current version if it is already built,
+        else None. Never takes the lock, so it is safe to call from code
+        that must not block, such as an event loop.
+        """
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == self.version:
+            return snapshot
+        return None
+    
+    @timed
+    def _build_graph_data(self) -> dict:
+        """Build the node and edge dicts of the current state."""
         try:
-            # Initialize empty lists for nodes and edges
-            nodes = []
-            edges = []
-            
-            # Add process nodes
-            for process_id, process in self.processes.items():
-                nodes.append({
-                    'id': process_id,
-                    'label': f"{process.name}",
-                    'type': 'process',
-                    'title': (f"Process: {process.name}<br>"
-                             f"Allocated Resources: {len(process.allocated_resources)}<br>"
-                             f"Requested Resources: {len(process.requested_resources)}")
-                })
-            
-            # Add resource nodes
-            for resource_id, resource in self.resources.items():
-                nodes.append({
-                    'id': resource_id,
-                    'label': f"{resource.name}\n({resource.available_units}/{resource.total_units})",
-                    'type': 'resource',
-                    'title': (f"Resource: {resource.name}<br>"
-                             f"Available: {resource.available_units}/{resource.total_units} units<br>"
-                             f"Allocated: {resource.total_units - resource.available_units} units")
-                })
-            
-            # Add allocation edges (resource -> process)
-            for resource_id, resource in self.resources.items():
-                for process_id, units in resource.allocated_to.items():
-                    if process_id in self.processes:  # Ensure process still exists
-                        edges.append({
-                            'from': resource_id,
-                            'to': process_id,
-                            'type': 'allocation',
-                            'units': units,
-                            'title': f"{units} unit{'s' if units > 1 else ''} allocated"
-                        })
-            
-            # Add request edges (process -> resource)
-            for resource_id, resource in self.resources.items():
-                for process_id, units in resource.requested_by.items():
-                    if process_id in self.processes:  # Ensure process still exists
-                        edges.append({
-                            'from': process_id,
-                            'to': resource_id,
-                            'type': 'request',
-                            'units': units,
-                            'title': f"{units} unit{'s' if units > 1 else ''} requested"
-                        })
+            self._refresh_layout()
+            nodes = [self._process_node(process) for process in self.processes.values()]
+            nodes += [self._resource_node(resource) for resource in self.resources.values()]
+            edges = [edge for resource in self.resources.values()
+                     for edge in self._resource_edges(resource)]
             
             return {
+                'version': self.version_tag(),
                 'nodes': nodes,
-                'edges': edges
+                'edges': edges,
+                'deadlocked': sorted(self.deadlocked_processes()),
+                'stats': {
+                    'processes': len(self.processes),
+                    'resources': len(self.resources),
+                    'allocations': sum(len(p.allocated_resources) for p in self.processes.values()),
+                    'requests': sum(len(p.requested_resources) for p in self.processes.values())
+                }
             }
             
         except Exception as e:
-            print(f"Error generating graph data: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error generating graph data")
+            metrics.increment('errors_total', where='graph_data')
             return {
                 'nodes': [],
                 'edges': [],
                 'error': str(e)
             }
     
-    def detect_deadlock(self) -> dict:
-        """Detect deadlocks in the current state."""
+    @synchronized
+    def graph_view(self, spec: GraphViewSpec) -> GraphSnapshot:
+        """
+        Return the graph data of a view (see GraphViewSpec) of the current
+        state version, like graph_snapshot() but filtered and, past
+        spec.max_nodes, clustered.
+
+        Views are cached per version for the last VIEW_CACHE_SIZE specs; the
+        ETag combines the version and the spec. The data has the fields of
+        get_graph_data(), with the stats and deadlocked list of the view, and
+        a 'view' dict with the filters, the collapsed 'clusters', whether
+        clusters were left out ('truncated') and the 'total' graph size.
+        """
+        snapshot = self._views.get(spec)
+        if snapshot is not None and snapshot.version == self.version:
+            self._views.move_to_end(spec)
+            return snapshot
+        data = self._build_view(spec)
+        snapshot = self._views[spec] = GraphSnapshot(
+            version=self.version,
+            etag=f"{self.version_tag()}-{spec.digest}",
+            data=data,
+            body=json.dumps(data, separators=(',', ':')).encode('utf-8'),
+        )
+        self._views.move_to_end(spec)
+        while len(self._views) > VIEW_CACHE_SIZE:
+            self._views.popitem(last=False)
+        return snapshot
+    
+    @synchronized
+    def encoded_graph(self, spec: Optional[GraphViewSpec] = None,
+                      gzipped: bool = False) -> Tuple[GraphSnapshot, bytes]:
+        """
+        Return the snapshot of the current version (of a view with spec)
+        and its data in the binary encoding of app.models.wire, gzipped if
+        asked. Encodings are built once per snapshot, like its JSON body.
+        """
+        snapshot = self.graph_snapshot() if spec is None else self.graph_view(spec)
+        name = 'binary+gzip' if gzipped else 'binary'
+        body = snapshot.encodings.get(name)
+        if body is None:
+            body = snapshot.encodings.get('binary')
+            if body is None:
+                # Under the lock the entities are still at the snapshot's version
+                body = snapshot.encodings['binary'] = encode_graph(snapshot.data, self.processes, self.resources)
+            if gzipped:
+                body = snapshot.encodings[name] = compress(body)
+        return snapshot, body
+    
+    def _build_view(self, spec: GraphViewSpec) -> dict:
+        self._refresh_layout()
+        process_ids, resource_ids = select_nodes(
+            spec, self.processes, self.resources, self.deadlocked_processes,
+            lambda name: self._resource_index.matching('name', normalize_name(name)))
+        deadlocked = self.deadlocked_processes()
+        nodes = [self._process_node(self.processes[process_id]) for process_id in sorted(process_ids)]
+        nodes += [self._resource_node(self.resources[resource_id]) for resource_id in sorted(resource_ids)]
+        edges = [edge for resource_id in sorted(resource_ids)
+                 for edge in self._resource_edges(self.resources[resource_id])
+                 if edge['from'] in process_ids or edge['to'] in process_ids]
+        stats = {
+            'processes': len(process_ids),
+            'resources': len(resource_ids),
+            'allocations': sum(1 for edge in edges if edge['type'] == 'allocation'),
+            'requests': sum(1 for edge in edges if edge['type'] == 'request')
+        }
+        summary = {'clusters': 0, 'truncated': False}
+        if spec.max_nodes is not None:
+            nodes, edges, summary = cluster_view(nodes, edges, spec.max_nodes, self.processes,
+                                                 self.resources, deadlocked)
+        return {
+            'version': self.version_tag(),
+            'nodes': nodes,
+            'edges': edges,
+            'deadlocked': sorted(deadlocked & process_ids),
+            'stats': stats,
+            'view': {
+                'filters': {key: value for key, value in spec.__dict__.items() if value not in (None, False)},
+                **summary,
+                'total': {'processes': len(self.processes), 'resources': len(self.resources)}
+            }
+        }
+    
+    @timed
+    def _refresh_layout(self) -> None:
+        """Lay out the nodes touched since the last graph data was built."""
+        if self.layout is not None:
+            self.layout.refresh(self.processes.keys() | self.resources.keys(), self._neighbors)
+    
+    def _exists(self, node_id: str) -> bool:
+        return node_id in self.processes or node_id in self.resources
+    
+    def _neighbors(self, node_id: str) -> Tuple[str, ...]:
+        """IDs of the nodes connected to a process or resource, in either direction."""
+        process = self.processes.get(node_id)
+        if process is not None:
+            return (*process.allocated_resources, *process.requested_resources)
+        resource = self.resources.get(node_id)
+        if resource is not None:
+            return tuple(process_id for process_id in (*resource.allocated_to, *resource.requested_by)
+                         if process_id in self.processes)
+        return ()
+    
+    def _positioned(self, node: dict) -> dict:
+        """Add the laid out position of a node, if it has one, as x and y."""
+        if self.layout is not None:
+            position = self.layout.position(node['id'])
+            if position is not None:
+                node['x'], node['y'] = position
+        return node
+    
+    def _process_node(self, process: Process) -> dict:
+        return self._positioned({
+            'id': process.id,
+            'label': f"{process.name}",
+            'type': 'process',
+            'title': (f"Process: {process.name}<br>"
+                     f"Allocated Resources: {len(process.allocated_resources)}<br>"
+                     f"Requested Resources: {len(process.requested_resources)}")
+        })
+    
+    def _resource_node(self, resource: Resource) -> dict:
+        return self._positioned({
+            'id': resource.id,
+            'label': f"{resource.name}\n({resource.available_units}/{resource.total_units})",
+            'type': 'resource',
+            'title': (f"Resource: {resource.name}<br>"
+                     f"Available: {resource.available_units}/{resource.total_units} units<br>"
+                     f"Allocated: {resource.total_units - resource.available_units} units")
+        })
+    
+    def _resource_edges(self, resource: Resource) -> List[dict]:
+        """Allocation edges (resource -> process) and request edges (process -> resource)."""
+        edges = []
+        for process_id, units in resource.allocated_to.items():
+            if process_id in self.processes:  # Ensure process still exists
+                edges.append(self._edge(resource.id, process_id, 'allocation', units))
+        for process_id, units in resource.requested_by.items():
+            if process_id in self.processes:  # Ensure process still exists
+                edges.append(self._edge(process_id, resource.id, 'request', units))
+        return edges
+    
+    @staticmethod
+    def _edge(source: str, target: str, edge_type: str, units: int) -> dict:
+        return {
+            'id': f"{source}->{target}",
+            'from': source,
+            'to': target,
+            'type': edge_type,
+            'units': units,
+            'title': f"{units} unit{'s' if units > 1 else ''} {'allocated' if edge_type == 'allocation' else 'requested'}"
+        }
+    
+    @mutation()
+    def set_resource_units(self, resource_id: str, total_units: int) -> None:
+        """Change the total number of units of a resource."""
+        resource = self.get_resource(resource_id)
+        if not resource:
+            raise ValueError("Resource not found")
+        if total_units < 1:
+            raise ValueError("Cannot reduce units below 1")
+        
+        allocated = sum(resource.allocated_to.values())
+        if total_units < allocated:
+            raise ValueError(f"Cannot reduce {resource.name} below the {allocated} allocated unit(s)")
+        largest_request = max(resource.requested_by.values(), default=0)
+        if total_units < largest_request:
+            raise ValueError(f"Cannot reduce {resource.name} below a pending request of {largest_request} unit(s)")
+        if self.avoidance:
+            largest_claim = max((process.max_claims.get(resource_id, 0) for process in self.processes.values()), default=0)
+            if total_units < largest_claim:
+                raise ValueError(f"Cannot reduce {resource.name} below a maximum claim of {largest_claim} unit(s)")
+        
+        previous = resource.total_units
+        self._journal(resource=resource)
+        self._set_total_units(resource, total_units)
+        if self.avoidance and self._batch is None and total_units < previous and not self.is_safe_state():
+            self._set_total_units(resource, previous)
+            raise UnsafeAllocationError(f"Reducing {resource.name} to {total_units} unit(s) would leave the system in an unsafe state")
+        self._state_changed(resource_id)
+        
+        if total_units > previous:
+            self.grant_waiting_requests(resource_id)
+    
+    def _set_total_units(self, resource: Resource, total_units: int) -> None:
+        resource.total_units = total_units
+        resource.recalculate_available_units()
+        if self.matrices is not None:
+            self.matrices.set_total(resource.id, total_units)
+    
+    @synchronized
+    def is_safe_state(self) -> bool:
+        """
+        Run the Banker's safety algorithm on the current state.
+
+        Each process may still ask for up to its maximum claim minus what
+        it holds; the state is safe if every process can finish in some
+        order using the available units plus those released before it.
+        """
+        if self.matrices is not None:
+            return not self.matrices.find_unsafe()
+        needs = {}
+        for process_id, process in self.processes.items():
+            need = {resource_id: claim - process.allocated_resources.get(resource_id, 0)
+                    for resource_id, claim in process.max_claims.items()
+                    if claim > process.allocated_resources.get(resource_id, 0)}
+            if need:
+                needs[process_id] = need
+        return not find_blocked_processes(
+            {resource_id: resource.available_units for resource_id, resource in self.resources.items()},
+            {process_id: process.allocated_resources for process_id, process in self.processes.items()},
+            needs
+        )
+    
+    def _within_claim(self, process: Process, resource: Resource, units: int) -> bool:
+        """Check that granting units keeps the process within its declared claim."""
+        claim = process.max_claims.get(resource.id)
+        return claim is not None and process.allocated_resources.get(resource.id, 0) + units <= claim
+    
+    def _allocation_is_safe(self, process: Process, resource: Resource, units: int) -> bool:
+        """Check an allocation against the process's claim and the safety algorithm."""
+        claim = process.max_claims.get(resource.id)
+        if claim is None:
+            raise ValueError(f"Process {process.name} has not declared a maximum claim for {resource.name}")
+        held = process.allocated_resources.get(resource.id, 0)
+        if held + units > claim:
+            raise ValueError(f"Allocation exceeds the declared maximum claim. Requested: {held + units}, Claim: {claim}")
+        
+        # Fast path: if the process could run to completion right after the
+        # grant, it can go first in the safe sequence of the current
+        # (already safe) state, so the new state is safe as well
+        def remaining_fits(resource_id, claim_units):
+            if resource_id == resource.id:
+                return claim_units - held - units <= resource.available_units - units
+            return (claim_units - process.allocated_resources.get(resource_id, 0)
+                    <= self.resources[resource_id].available_units)
+        if all(remaining_fits(resource_id, claim_units)
+               for resource_id, claim_units in process.max_claims.items()):
+            return True
+        
+        # Otherwise apply the allocation tentatively and run the full check
+        process.allocated_resources[resource.id] = held + units
+        resource.available_units -= units
+        if self.matrices is not None:
+            self.matrices.set_allocation(process.id, resource.id, held + units)
         try:
-            cycles = list(nx.simple_cycles(self.graph))
-            deadlock_cycles = []
-            affected_processes = set()
-            
-            for cycle in cycles:
-                # Verify if cycle contains alternating process and resource nodes
-                is_valid_cycle = True
-                for i in range(len(cycle)):
-                    node = cycle[i]
-                    next_node = cycle[(i + 1) % len(cycle)]
-                    
-                    if (self.graph.nodes[node]['type'] == self.graph.nodes[next_node]['type'] or
-                        not (self.graph.nodes[node]['type'] in ['process', 'resource'] and
-                             self.graph.nodes[next_node]['type'] in ['process', 'resource'])):
-                        is_valid_cycle = False
-                        break
-                        
-                if is_valid_cycle:
-                    deadlock_cycles.append(cycle)
-                    affected_processes.update([node for node in cycle 
-                                            if self.graph.nodes[node]['type'] == 'process'])
-                    
+            return self.is_safe_state()
+        finally:
+            if held:
+                process.allocated_resources[resource.id] = held
+            else:
+                del process.allocated_resources[resource.id]
+            resource.available_units += units
+            if self.matrices is not None:
+                self.matrices.set_allocation(process.id, resource.id, held)
+    
+    @synchronized
+    def deadlocked_processes(self) -> Set[str]:
+        """
+        Return the processes that are deadlocked, taking unit counts into account.
+
+        Without a circular wait there can be no deadlock, so the wait-for
+        graph is consulted first. Only when it contains a cycle is the
+        allocation graph reduced against the available units, which clears
+        cycles through multi-unit resources that still have enough free
+        units for a waiter. The result is cached until the next mutation.
+        """
+        if self._deadlocked is None:
+            if not self.wait_for.has_cycle():
+                self._deadlocked = set()
+            elif self.matrices is not None:
+                self._deadlocked = self.matrices.find_blocked()
+            else:
+                self._deadlocked = find_blocked_processes(
+                    {resource_id: resource.available_units
+                     for resource_id, resource in self.resources.items()},
+                    {process_id: process.allocated_resources
+                     for process_id, process in self.processes.items()},
+                    {process_id: process.requested_resources
+                     for process_id, process in self.processes.items()}
+                )
+        return self._deadlocked
+    
+    @synchronized
+    def resource_utilization(self) -> Dict[str, float]:
+        """Return the allocated percentage of every resource, keyed by resource ID."""
+        if self.matrices is not None:
+            return self.matrices.utilization()
+        return {
+            resource_id: ((resource.total_units - resource.available_units) / resource.total_units) * 100
+            if resource.total_units > 0 else 0
+            for resource_id, resource in self.resources.items()
+        }
+    
+    @synchronized
+    def detect_deadlock(self, max_cycles: int = DEFAULT_CYCLE_LIMIT) -> dict:
+        """
+        Detect deadlocks in the current state.
+
+        Affected processes are those left over by the multi-unit graph
+        reduction. Cycles are only listed for deadlocked processes and at
+        most max_cycles of them are returned (pass 0 to skip listing).
+        """
+        try:
+            affected_processes = self.deadlocked_processes()
+            cycles = self.find_cycles(max_cycles) if affected_processes and max_cycles > 0 else []
             return {
-                'has_deadlock': len(deadlock_cycles) > 0,
-                'cycles': deadlock_cycles,
-                'affected_processes': list(affected_processes)
+                'has_deadlock': bool(affected_processes),
+                'cycles': cycles,
+                'affected_processes': sorted(affected_processes)
             }
         except Exception as e:
-            print(f"Error in deadlock detection: {str(e)}")
+            logger.exception("Error in deadlock detection")
+            metrics.increment('errors_total', where='deadlock_detection')
             return {'has_deadlock': False, 'cycles': [], 'affected_processes': []}
     
+    @synchronized
+    def plan_recovery(self, action: str = 'preempt', cost: Optional[RecoveryCost] = None) -> RecoveryPlan:
+        """
+        Plan how to break the current deadlock at the lowest cost, without
+        changing anything (see app.models.recovery).
+
+        Args:
+            action: 'preempt' releases the units victims hold of resources
+                other deadlocked processes wait for; 'abort' removes victims
+            cost: weights of the cost of a victim, defaults to RecoveryCost()
+
+        Raises:
+            ValueError: for an unknown action
+        """
+        return plan_recovery(self.deadlocked_processes(), self.processes, self.resources,
+                             action, cost or RecoveryCost(), queues=self.request_queues)
+    
+    @synchronized
+    def recover_deadlock(self, action: str = 'preempt', cost: Optional[RecoveryCost] = None,
+                         dry_run: bool = False) -> RecoveryPlan:
+        """
+        Plan a recovery like plan_recovery() and, unless dry_run, apply it
+        as one batch (one version, one stored operation).
+
+        Returns:
+            the plan, applied unless dry_run
+        """
+        plan = self.plan_recovery(action, cost)
+        if plan.victims and not dry_run:
+            self.apply_batch(plan.operations())
+            metrics.increment('deadlock_recoveries_total', action=action)
+            logger.info("Deadlock recovered", extra={'fields': {
+                'action': action,
+                'deadlocked': len(plan.deadlocked),
+                'victims': len(plan.victims),
+                'cost': round(plan.cost, 3),
+                'resolved': plan.resolved,
+            }})
+        return plan
+    
+    @synchronized
+    def find_cycles(self, limit: int = DEFAULT_CYCLE_LIMIT) -> List[List[str]]:
+        """
+        List up to limit cycles of the resource allocation graph.
+
+        Only the part of the graph spanned by deadlocked processes is
+        searched, so the cost depends on the size of the deadlock rather
+        than on the size of the whole graph.
+        """
+        affected_processes = self.deadlocked_processes()
+        if not affected_processes or limit <= 0:
+            return []
+        
+        edges = []
+        for process_id in affected_processes:
+            for resource_id in self.processes[process_id].requested_resources:
+                resource = self.resources.get(resource_id)
+                if not resource:
+                    continue
+                holders = [holder_id for holder_id in resource.allocated_to
+                           if holder_id in affected_processes]
+                if holders:
+                    edges.append((process_id, resource_id))
+                    edges.extend((resource_id, holder_id) for holder_id in holders)
+        
+        # networkx walks sets of nodes, whose order depends on the hash seed
+        # for strings (analytics workers run with their own); small integers
+        # hash to themselves, so searching integer labels given in ID order
+        # lists the same cycles in every process
+        nodes = sorted({node for edge in edges for node in edge})
+        index = {node: position for position, node in enumerate(nodes)}
+        subgraph = nx.DiGraph()
+        subgraph.add_edges_from(sorted((index[source], index[target]) for source, target in edges))
+        return [[nodes[position] for position in cycle]
+                for cycle in islice(nx.simple_cycles(subgraph), limit)]
+    
+    @synchronized
     def analyze_resource_usage(self):
         """Analyze resource usage patterns."""
         try:
@@ -359,32 +1556,16 @@ class ResourceAllocationManager:
             total_utilization = 0.0
             active_resources = 0
             
+            utilization = self.resource_utilization()
             for resource_id, resource in self.resources.items():
-                allocated_units = sum(resource.allocated_to.values())
-                usage_percentage = (allocated_units / resource.total_units) * 100 if resource.total_units > 0 else 0
+                allocated_units = resource.total_units - resource.available_units
+                usage_percentage = utilization[resource_id]
                 total_utilization += usage_percentage
                 active_resources += 1
                 
-                # Calculate average allocation time for this resource
-                resource_history = [entry for entry in self.allocation_history 
-                                  if entry['resource_id'] == resource_id]
-                total_allocation_time = 0
-                allocation_count = 0
-                
-                for i in range(len(resource_history)):
-                    if resource_history[i]['type'] == 'allocation':
-                        # Look for the next release of this resource
-                        for j in range(i + 1, len(resource_history)):
-                            if (resource_history[j]['type'] == 'release' and 
-                                resource_history[j]['process_id'] == resource_history[i]['process_id']):
-                                time_diff = (resource_history[j]['timestamp'] - 
-                                           resource_history[i]['timestamp']).total_seconds()
-                                total_allocation_time += time_diff
-                                allocation_count += 1
-                                break
-                
-                avg_allocation_time = (total_allocation_time / allocation_count 
-                                     if allocation_count > 0 else 0)
+                # Hold times are accumulated as allocations are released
+                summary = self.hold_times.summary(resource_id)
+                avg_allocation_time = summary.mean if summary else 0
                 
                 resource_usage[resource.name] = {
                     'total_units': resource.total_units,
@@ -392,7 +1573,8 @@ class ResourceAllocationManager:
                     'usage_percentage': round(usage_percentage, 1),
                     'allocation_count': len(resource.allocated_to),
                     'request_count': len(resource.requested_by),
-                    'average_allocation_time': round(avg_allocation_time, 1)
+                    'average_allocation_time': round(avg_allocation_time, 1),
+                    'hold_time': summary.to_dict() if summary else HoldTimeSummary().to_dict()
                 }
                 
                 total_allocations += len(resource.allocated_to)
@@ -415,7 +1597,8 @@ class ResourceAllocationManager:
                 'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             }
         except Exception as e:
-            print(f"Error in resource usage analysis: {str(e)}")
+            logger.exception("Error in resource usage analysis")
+            metrics.increment('errors_total', where='usage_analysis')
             return {
                 'error': str(e),
                 'resource_usage': {},
@@ -431,6 +1614,7 @@ class ResourceAllocationManager:
                 'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             }
     
+    @synchronized
     def get_optimization_recommendations(self):
         """Get AI-powered optimization recommendations."""
         try:
@@ -449,9 +1633,10 @@ class ResourceAllocationManager:
             resource_usage = {}
             
             # Analyze each resource
+            utilization = self.resource_utilization()
             for resource_id, resource in self.resources.items():
-                allocated_units = sum(resource.allocated_to.values())
-                usage_percentage = (allocated_units / resource.total_units) * 100 if resource.total_units > 0 else 0
+                allocated_units = resource.total_units - resource.available_units
+                usage_percentage = utilization[resource_id]
                 
                 resource_data = analysis['resource_usage'].get(resource.name, {})
                 avg_allocation_time = resource_data.get('average_allocation_time', 0)
@@ -502,14 +1687,17 @@ class ResourceAllocationManager:
             # Check for potential deadlocks
             deadlock_info = self.detect_deadlock()
             if deadlock_info['has_deadlock']:
+                # Say what resolving it would do before it is applied
+                plan = self.plan_recovery()
                 suggestions.append({
                     'type': 'danger',
                     'priority': 'critical',
                     'title': 'Potential Deadlock Detected',
                     'message': 'System may be in a deadlock state',
-                    'description': 'Review resource allocation strategy to prevent deadlock situation.',
+                    'description': f"{plan.describe()}.",
                     'action': 'resolve_deadlock',
-                    'affected_processes': deadlock_info['affected_processes']
+                    'affected_processes': deadlock_info['affected_processes'],
+                    'recovery': plan.to_dict()
                 })
             
             # Generate trend data
@@ -517,8 +1705,8 @@ class ResourceAllocationManager:
             allocations = []
             datasets = []
             
-            # Get the last 10 allocation history entries
-            recent_history = self.allocation_history[-10:] if self.allocation_history else []
+            # Get the most recent allocation history entries
+            recent_history = self.allocation_history[-TREND_EVENTS:] if self.allocation_history else []
             
             for entry in recent_history:
                 timestamps.append(entry['timestamp'].strftime('%H:%M:%S'))
@@ -553,7 +1741,8 @@ class ResourceAllocationManager:
             }
             
         except Exception as e:
-            print(f"Error generating optimization recommendations: {str(e)}")
+            logger.exception("Error generating optimization recommendations")
+            metrics.increment('errors_total', where='recommendations')
             return {
                 'error': str(e),
                 'active_processes': 0,
@@ -570,8 +1759,8 @@ class ResourceAllocationManager:
     def _generate_trend_data(self):
         """Generate trend data for visualization."""
         try:
-            # Get the last 10 allocation history entries
-            recent_history = self.allocation_history[-10:] if self.allocation_history else []
+            # Get the most recent allocation history entries
+            recent_history = self.allocation_history[-TREND_EVENTS:] if self.allocation_history else []
             
             timestamps = []
             allocations = []
@@ -591,7 +1780,8 @@ class ResourceAllocationManager:
             }
             
         except Exception as e:
-            print(f"Error generating trend data: {str(e)}")
+            logger.exception("Error generating trend data")
+            metrics.increment('errors_total', where='trend_data')
             return {
                 'timestamps': [],
                 'allocations': []
@@ -621,17 +1811,115 @@ class ResourceAllocationManager:
         except Exception:
             return 0
     
+    @mutation()
     def reset(self) -> None:
         """Reset the entire resource allocation graph state."""
         self.processes = {}
         self.resources = {}
-        self.allocation_history = []
-        self.graph = nx.DiGraph()
+        self.allocation_history.clear()
+        self.hold_times.reset()
+        self.wait_for.reset()
+        if self.matrices is not None:
+            self.matrices = AllocationMatrices()
+        self.request_queues = {}
+        self._process_index.clear()
+        self._resource_index.clear()
+        if self.layout is not None:
+            self.layout.reset()
+        self._state_changed()
+        if self.deltas is not None:
+            self._publish_reset()
+    
+    def _publish_reset(self) -> None:
+        """Tell streaming clients the whole graph was replaced."""
+        self._published_nodes = {}
+        self._published_edges = {}
+        self._published_deadlock = set()
+        self.deltas.record(self.version, [{'type': 'reset'}])
     
     def get_resource(self, resource_id: str) -> Optional[Resource]:
         """Get a resource by its ID."""
         return self.resources.get(resource_id)
     
+    def get_process(self, process_id: str) -> Optional[Process]:
+        """Get a process by its ID."""
+        return self.processes.get(process_id)
+    
+    @synchronized
+    def find_processes(self, name: Optional[str] = None, holding: Optional[str] = None,
+                       waiting_for: Optional[str] = None, deadlocked: bool = False,
+                       after: Optional[int] = None, limit: int = DEFAULT_PAGE_SIZE) -> Page:
+        """
+        List processes in creation order, one page at a time.
+
+        Args:
+            name: only processes with this name (case-insensitive)
+            holding: only processes holding units of this resource
+            waiting_for: only processes with a pending request for this resource
+            deadlocked: only deadlocked processes
+            after: cursor of the page, the next_cursor of the previous one
+            limit: processes per page, at most MAX_PAGE_SIZE
+
+        The cost depends on the page size, or with filters on the number of
+        matching processes, not on the number of processes. The returned
+        processes are live objects; callers serializing them outside the
+        manager's lock must hold it.
+        """
+        filters = []
+        if name is not None:
+            filters.append(self._process_index.matching('name', normalize_name(name)))
+        for resource_id, edges in ((holding, 'allocated_to'), (waiting_for, 'requested_by')):
+            if resource_id is not None:
+                resource = self.resources.get(resource_id)
+                filters.append(getattr(resource, edges).keys() if resource is not None else ())
+        if deadlocked:
+            filters.append(self.deadlocked_processes())
+        return self._query(self._process_index, self.processes, filters, after, limit)
+    
+    @synchronized
+    def find_resources(self, name: Optional[str] = None, held_by: Optional[str] = None,
+                       awaited_by: Optional[str] = None, utilization: Optional[str] = None,
+                       after: Optional[int] = None, limit: int = DEFAULT_PAGE_SIZE) -> Page:
+        """
+        List resources in creation order, one page at a time.
+
+        Args:
+            name: only resources with this name (case-insensitive)
+            held_by: only resources this process holds units of
+            awaited_by: only resources this process has a pending request for
+            utilization: only resources in this bucket (see UTILIZATION_BUCKETS)
+            after: cursor of the page, the next_cursor of the previous one
+            limit: resources per page, at most MAX_PAGE_SIZE
+
+        Costs and returned objects are as for find_processes.
+        """
+        if utilization is not None and utilization not in UTILIZATION_BUCKETS:
+            raise ValueError(f"Unknown utilization bucket: {utilization}")
+        filters = []
+        if name is not None:
+            filters.append(self._resource_index.matching('name', normalize_name(name)))
+        for process_id, edges in ((held_by, 'allocated_resources'), (awaited_by, 'requested_resources')):
+            if process_id is not None:
+                process = self.processes.get(process_id)
+                filters.append(getattr(process, edges).keys() if process is not None else ())
+        if utilization is not None:
+            filters.append(self._resource_index.matching('utilization', utilization))
+        return self._query(self._resource_index, self.resources, filters, after, limit)
+    
+    @staticmethod
+    def _query(index: EntityIndex, entities: dict, filters: list, after: Optional[int], limit: int) -> Page:
+        """Page through the entities matching every filter (collections of IDs)."""
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        if not filters:
+            ids, cursor = index.page(after=after, limit=limit)
+            return Page([entities[entity_id] for entity_id in ids], len(index), cursor)
+        # Walk the smallest filter, probe the others
+        smallest, *others = sorted(filters, key=len)
+        matching = [entity_id for entity_id in smallest if all(entity_id in other for other in others)]
+        ids, cursor = index.page(matching, after, limit)
+        return Page([entities[entity_id] for entity_id in ids], len(matching), cursor)
+    
+    @mutation()
     def delete_resource(self, resource_id: str) -> None:
         """Delete a resource if it exists and is not allocated."""
         resource = self.get_resource(resource_id)
@@ -641,12 +1929,31 @@ class ResourceAllocationManager:
         # Check if resource is allocated
         if self.is_resource_allocated(resource_id):
             raise ValueError("Cannot delete resource that is currently allocated")
+        
+        # Drop pending requests so no process keeps waiting on a missing
+        # resource; not through cancel_request, which would grant the
+        # requests queued behind them
+        self._journal(resource=resource)
+        for process_id in list(resource.requested_by.keys()):
+            units = self._drop_request(self.processes[process_id], resource)
+            self._record(EventType.CANCEL_REQUEST, process_id, resource_id, units)
+        for process in self.processes.values():
+            if resource_id in process.max_claims:
+                self._journal(process)
+                del process.max_claims[resource_id]
+        self.request_queues.pop(resource_id, None)
+        if self._batch is not None:
+            self._batch.forgotten_resources.append(resource_id)
+        else:
+            self.hold_times.forget_resource(resource_id)
             
-        # Remove the resource from the graph and dictionary
-        if self.graph.has_node(resource_id):
-            self.graph.remove_node(resource_id)
+        # Remove the resource from derived structures and dictionary
+        if self.matrices is not None:
+            self.matrices.remove_resource(resource_id)
         del self.resources[resource_id]
+        self._state_changed(resource_id)
     
+    @synchronized
     def is_resource_allocated(self, resource_id: str) -> bool:
         """Check if a resource is allocated to any process."""
         resource = self.get_resource(resource_id)
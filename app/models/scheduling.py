@@ -0,0 +1,108 @@
+"""
+Request Scheduling Module
+
+This module provides the per-resource wait queues used to grant pending
+requests automatically when units are released.
+"""
+
+import heapq
+from itertools import count
+from typing import Dict, List, Optional, Tuple
+
+# Supported orderings of a resource's wait queue
+SCHEDULING_POLICIES = ('fifo', 'priority', 'shortest')
+
+
+class RequestQueue:
+    """
+    Heap-ordered queue of the processes waiting on one resource.
+
+    Ordering depends on the policy:
+        fifo      -- oldest request first
+        priority  -- highest process priority first, then oldest
+        shortest  -- smallest number of requested units first, then oldest
+
+    A process has at most one live entry. Updating or removing it marks the
+    old heap entry as stale instead of searching the heap, so push, pop and
+    remove are all O(log n); stale entries are discarded when they surface
+    and the heap is rebuilt once they make up more than half of it.
+    """
+
+    def __init__(self, policy: str = 'fifo'):
+        """Initialize an empty queue ordered by policy."""
+        if policy not in SCHEDULING_POLICIES:
+            raise ValueError(f"Unknown scheduling policy: {policy}")
+        self.policy = policy
+        self._heap: List[list] = []
+        self._entries: Dict[str, list] = {}
+        self._counter = count()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, process_id: str) -> bool:
+        return process_id in self._entries
+
+    def push(self, process_id: str, units: int, priority: int = 0) -> None:
+        """Add a waiting process or update the units it waits for."""
+        previous = self._entries.get(process_id)
+        if previous is not None:
+            # Keep the original arrival order when a request grows
+            sequence = previous[1]
+            self._invalidate(previous)
+        else:
+            sequence = next(self._counter)
+        entry = [self._key(sequence, units, priority), sequence, process_id, units, priority, True]
+        self._entries[process_id] = entry
+        heapq.heappush(self._heap, entry)
+
+    def remove(self, process_id: str) -> None:
+        """Remove a waiting process if it is queued."""
+        entry = self._entries.pop(process_id, None)
+        if entry is not None:
+            self._invalidate(entry, popped=True)
+
+    def peek(self) -> Optional[Tuple[str, int]]:
+        """Return (process_id, units) of the next request to grant."""
+        while self._heap and not self._heap[0][5]:
+            heapq.heappop(self._heap)
+        if not self._heap:
+            return None
+        entry = self._heap[0]
+        return entry[2], entry[3]
+
+    def pop(self) -> Optional[Tuple[str, int]]:
+        """Remove and return (process_id, units) of the next request to grant."""
+        head = self.peek()
+        if head is not None:
+            entry = heapq.heappop(self._heap)
+            del self._entries[entry[2]]
+        return head
+
+    def copy(self) -> 'RequestQueue':
+        """Return an independent queue with the same live entries and order."""
+        clone = RequestQueue(self.policy)
+        clone._entries = {process_id: list(entry) for process_id, entry in self._entries.items()}
+        clone._heap = list(clone._entries.values())
+        heapq.heapify(clone._heap)
+        clone._counter = count(max((entry[1] for entry in self._entries.values()), default=-1) + 1)
+        return clone
+
+    def waiting(self) -> List[Tuple[str, int]]:
+        """Return the queued (process_id, units) pairs in grant order."""
+        return [(entry[2], entry[3]) for entry in sorted(self._entries.values())]
+
+    def _key(self, sequence: int, units: int, priority: int) -> tuple:
+        if self.policy == 'priority':
+            return (-priority, sequence)
+        if self.policy == 'shortest':
+            return (units, sequence)
+        return (sequence,)
+
+    def _invalidate(self, entry: list, popped: bool = False) -> None:
+        entry[5] = False
+        if not popped:
+            del self._entries[entry[2]]
+        if len(self._heap) > 2 * len(self._entries) + 16:
+            self._heap = [live for live in self._heap if live[5]]
+            heapq.heapify(self._heap)
@@ -0,0 +1,57 @@
+"""
+State Snapshot Module
+
+This module provides the binary format ResourceAllocationManager snapshots
+are stored in. A snapshot is a JSON header describing the entities plus any
+number of NumPy arrays (the allocation history columns, hold-time
+histograms) stored as raw little-endian bytes, so that restoring even a
+history of millions of events is a few memory copies rather than a replay:
+
+    MAGIC | header length (u4) | header JSON | array bytes, in header order
+
+The header lists every array as [name, dtype, shape] under '_arrays'.
+Other formats built on the same layout (see app.models.wire) pass their own
+magic bytes.
+"""
+
+import json
+import struct
+from typing import Dict, Tuple
+
+import numpy as np
+
+# Leading bytes of every snapshot, with the format version in the last byte
+MAGIC = b'RAGS\x01'
+
+_LENGTH = struct.Struct('<I')
+
+
+def encode_snapshot(header: dict, arrays: Dict[str, np.ndarray], magic: bytes = MAGIC) -> bytes:
+    """Serialize a JSON-compatible header and named arrays into one buffer."""
+    arrays = {name: np.ascontiguousarray(array, dtype=array.dtype.newbyteorder('<'))
+              for name, array in arrays.items()}
+    header = dict(header, _arrays=[[name, array.dtype.str, list(array.shape)]
+                                   for name, array in arrays.items()])
+    encoded = json.dumps(header, separators=(',', ':')).encode()
+    parts = [magic, _LENGTH.pack(len(encoded)), encoded]
+    parts.extend(array.tobytes() for array in arrays.values())
+    return b''.join(parts)
+
+
+def decode_snapshot(data: bytes, magic: bytes = MAGIC) -> Tuple[dict, Dict[str, np.ndarray]]:
+    """Split a buffer written by encode_snapshot back into header and arrays."""
+    if not data.startswith(magic):
+        raise ValueError("Not a snapshot or unsupported snapshot format")
+    offset = len(magic)
+    (length,) = _LENGTH.unpack_from(data, offset)
+    offset += _LENGTH.size
+    header = json.loads(data[offset:offset + length])
+    offset += length
+
+    arrays = {}
+    for name, dtype, shape in header.pop('_arrays'):
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape, dtype=np.int64))
+        arrays[name] = np.frombuffer(data, dtype=dtype, count=count, offset=offset).reshape(shape)
+        offset += count * dtype.itemsize
+    return header, arrays
@@ -0,0 +1,140 @@
+"""
+Hold Time Statistics Module
+
+This module keeps per-resource statistics about how long processes hold
+resources, updated incrementally as allocations and releases happen so
+that analyses can read them without scanning the allocation history.
+"""
+
+import math
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Log-scale histogram used for percentiles: bucket i holds durations in
+# [BUCKET_MIN * BUCKET_GROWTH**(i-1), BUCKET_MIN * BUCKET_GROWTH**i), so
+# percentiles are accurate to within one bucket (about 19%)
+BUCKET_MIN = 0.001
+BUCKET_GROWTH = 2 ** 0.25
+BUCKET_COUNT = 128
+
+
+def _bucket(seconds: float) -> int:
+    if seconds < BUCKET_MIN:
+        return 0
+    return min(BUCKET_COUNT - 1, 1 + int(math.log(seconds / BUCKET_MIN, BUCKET_GROWTH)))
+
+
+def _bucket_upper_bound(bucket: int) -> float:
+    return BUCKET_MIN * BUCKET_GROWTH ** bucket
+
+
+class HoldTimeSummary:
+    """Running count, total, extremes and histogram of hold times for one resource."""
+
+    __slots__ = ('count', 'total', 'minimum', 'maximum', 'histogram')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.minimum = math.inf
+        self.maximum = 0.0
+        self.histogram = np.zeros(BUCKET_COUNT, dtype=np.int64)
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.minimum = min(self.minimum, seconds)
+        self.maximum = max(self.maximum, seconds)
+        self.histogram[_bucket(seconds)] += 1
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, percent: float) -> float:
+        """Approximate the given percentile (0-100) from the histogram."""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(self.count * percent / 100))
+        bucket = int(np.searchsorted(np.cumsum(self.histogram), rank))
+        return min(max(_bucket_upper_bound(bucket), self.minimum), self.maximum)
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'total': round(self.total, 3),
+            'mean': round(self.mean, 3),
+            'min': round(self.minimum, 3) if self.count else 0.0,
+            'max': round(self.maximum, 3),
+            'p50': round(self.percentile(50), 3),
+            'p90': round(self.percentile(90), 3),
+            'p99': round(self.percentile(99), 3),
+        }
+
+
+class HoldTimeStats:
+    """
+    Incremental hold-time accounting for all resources.
+
+    Every allocation of a resource to a process is paired with the next
+    release of that resource by the same process; the time between the two
+    is added to the resource's summary when the release happens.
+    """
+
+    def __init__(self):
+        """Initialize empty statistics."""
+        self.summaries: Dict[str, HoldTimeSummary] = {}
+        self._open: Dict[Tuple[str, str], List[int]] = {}
+
+    def allocated(self, process_id: str, resource_id: str, timestamp_ns: int) -> None:
+        """Record the start of a hold."""
+        self._open.setdefault((process_id, resource_id), []).append(timestamp_ns)
+
+    def released(self, process_id: str, resource_id: str, timestamp_ns: int) -> None:
+        """Close every open hold of the resource by the process."""
+        starts = self._open.pop((process_id, resource_id), None)
+        if not starts:
+            return
+        summary = self.summaries.get(resource_id)
+        if summary is None:
+            summary = self.summaries[resource_id] = HoldTimeSummary()
+        for start in starts:
+            summary.add((timestamp_ns - start) / 1e9)
+
+    def summary(self, resource_id: str) -> Optional[HoldTimeSummary]:
+        """Return the summary of a resource, or None if it was never released."""
+        return self.summaries.get(resource_id)
+
+    def forget_resource(self, resource_id: str) -> None:
+        """Drop the statistics of a deleted resource."""
+        self.summaries.pop(resource_id, None)
+
+    def reset(self) -> None:
+        """Drop all statistics."""
+        self.summaries = {}
+        self._open = {}
+
+    def export(self) -> Tuple[dict, np.ndarray]:
+        """Return the statistics as (metadata, histograms) for a snapshot."""
+        resource_ids = list(self.summaries)
+        summaries = [self.summaries[resource_id] for resource_id in resource_ids]
+        metadata = {
+            'resources': resource_ids,
+            'totals': [[summary.count, summary.total, summary.minimum, summary.maximum]
+                       for summary in summaries],
+            'open': [[process_id, resource_id, starts]
+                     for (process_id, resource_id), starts in self._open.items()],
+        }
+        histograms = np.array([summary.histogram for summary in summaries], dtype=np.int64)
+        return metadata, histograms.reshape(len(summaries), BUCKET_COUNT)
+
+    def restore(self, metadata: dict, histograms: np.ndarray) -> None:
+        """Replace the statistics with those of an export()."""
+        self.reset()
+        for resource_id, totals, histogram in zip(metadata['resources'], metadata['totals'], histograms):
+            summary = self.summaries[resource_id] = HoldTimeSummary()
+            summary.count, summary.total, summary.minimum, summary.maximum = totals
+            summary.histogram = histogram.copy()
+        for process_id, resource_id, starts in metadata['open']:
+            self._open[(process_id, resource_id)] = list(starts)
@@ -0,0 +1,193 @@
+"""
+Operation Storage Module
+
+This module provides the storage backends that let several
+ResourceAllocationManager instances, typically one per server worker
+process, share one allocation graph. Instead of storing the graph itself, a
+backend keeps the ordered log of mutating operations; every manager applies
+the log to its own in-memory state, so reads stay local and only writes
+are coordinated.
+
+A write runs inside exclusive(): the manager catches up on operations other
+writers appended, applies its own operation locally (which validates it
+against the now current state) and appends it only if that succeeded. The
+check and the write are therefore atomic across processes.
+
+So that the log does not grow without bound, a manager periodically stores
+a snapshot of its state together with the sequence number of the last
+operation it includes; operations before that one are then dropped. A
+manager starting up (or falling behind the dropped part) restores the
+snapshot and replays only the operations after it.
+"""
+
+import json
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import ContextManager, Iterator, List, Optional, Tuple
+
+
+class OperationStore(ABC):
+    """Interface of an ordered, shared log of manager operations."""
+
+    @abstractmethod
+    def read(self, after: int) -> List[Tuple[int, dict]]:
+        """Return the (sequence, operation) pairs appended after sequence after."""
+
+    @abstractmethod
+    def exclusive(self) -> ContextManager[None]:
+        """
+        Context manager holding the write lock of the log.
+
+        Operations appended inside are committed when the block exits
+        normally and discarded if it raises.
+        """
+
+    @abstractmethod
+    def append(self, operation: dict) -> int:
+        """Append an operation (inside exclusive()) and return its sequence number."""
+
+    @abstractmethod
+    def save_snapshot(self, sequence: int, data: bytes) -> None:
+        """
+        Store a snapshot of the state after operation sequence (inside
+        exclusive()), replacing the previous one, and drop the operations
+        before it.
+
+        Operation sequence itself is kept, so a manager that has not read it
+        yet sees a gap in the sequence numbers and knows to restore the
+        snapshot.
+        """
+
+    @abstractmethod
+    def load_snapshot(self) -> Optional[Tuple[int, bytes]]:
+        """Return the (sequence, data) of the latest snapshot, or None."""
+
+    def snapshot_sequence(self) -> int:
+        """Return the sequence number of the latest snapshot, 0 if there is none."""
+        snapshot = self.load_snapshot()
+        return snapshot[0] if snapshot else 0
+
+    def close(self) -> None:
+        """Release the resources held by the store."""
+
+
+class MemoryOperationStore(OperationStore):
+    """Operation log shared by managers within one process."""
+
+    def __init__(self):
+        self._operations: List[dict] = []
+        # Number of operations dropped from the front of the log
+        self._dropped = 0
+        self._snapshot: Optional[Tuple[int, bytes]] = None
+        self._lock = threading.RLock()
+        self._pending: List[dict] = []
+        self._pending_snapshot: Optional[Tuple[int, bytes]] = None
+
+    def read(self, after: int) -> List[Tuple[int, dict]]:
+        with self._lock:
+            start = max(after, self._dropped)
+            return [(sequence, operation) for sequence, operation
+                    in enumerate(self._operations[start - self._dropped:], start=start + 1)]
+
+    @contextmanager
+    def exclusive(self) -> Iterator[None]:
+        with self._lock:
+            self._pending = []
+            self._pending_snapshot = None
+            try:
+                yield
+            except BaseException:
+                self._pending = []
+                self._pending_snapshot = None
+                raise
+            self._operations.extend(self._pending)
+            self._pending = []
+            if self._pending_snapshot is not None:
+                self._snapshot, self._pending_snapshot = self._pending_snapshot, None
+                dropped = self._snapshot[0] - 1
+                if dropped > self._dropped:
+                    del self._operations[:dropped - self._dropped]
+                    self._dropped = dropped
+
+    def append(self, operation: dict) -> int:
+        self._pending.append(operation)
+        return self._dropped + len(self._operations) + len(self._pending)
+
+    def save_snapshot(self, sequence: int, data: bytes) -> None:
+        self._pending_snapshot = (sequence, data)
+
+    def load_snapshot(self) -> Optional[Tuple[int, bytes]]:
+        with self._lock:
+            return self._snapshot
+
+
+class SQLiteOperationStore(OperationStore):
+    """
+    Operation log in an SQLite database in WAL mode.
+
+    WAL lets any number of processes read the log while one writes, and
+    BEGIN IMMEDIATE gives exclusive() its cross-process write lock. The
+    connection is shared by the threads of a process; the owning manager's
+    lock serializes its use.
+    """
+
+    def __init__(self, path: str, timeout: float = 30.0):
+        """Open (creating if needed) the log stored at path."""
+        self.path = path
+        self._connection = sqlite3.connect(path, timeout=timeout, isolation_level=None,
+                                           check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS operations ('
+            'seq INTEGER PRIMARY KEY AUTOINCREMENT, '
+            'operation TEXT NOT NULL)'
+        )
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS snapshots ('
+            'seq INTEGER PRIMARY KEY, '
+            'state BLOB NOT NULL)'
+        )
+
+    def read(self, after: int) -> List[Tuple[int, dict]]:
+        rows = self._connection.execute(
+            'SELECT seq, operation FROM operations WHERE seq > ? ORDER BY seq', (after,)
+        ).fetchall()
+        return [(sequence, json.loads(operation)) for sequence, operation in rows]
+
+    @contextmanager
+    def exclusive(self) -> Iterator[None]:
+        self._connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            self._connection.execute('ROLLBACK')
+            raise
+        self._connection.execute('COMMIT')
+
+    def append(self, operation: dict) -> int:
+        cursor = self._connection.execute(
+            'INSERT INTO operations (operation) VALUES (?)',
+            (json.dumps(operation, separators=(',', ':')),)
+        )
+        return cursor.lastrowid
+
+    def save_snapshot(self, sequence: int, data: bytes) -> None:
+        self._connection.execute('DELETE FROM snapshots')
+        self._connection.execute('INSERT INTO snapshots (seq, state) VALUES (?, ?)', (sequence, data))
+        self._connection.execute('DELETE FROM operations WHERE seq < ?', (sequence,))
+
+    def load_snapshot(self) -> Optional[Tuple[int, bytes]]:
+        row = self._connection.execute(
+            'SELECT seq, state FROM snapshots ORDER BY seq DESC LIMIT 1'
+        ).fetchone()
+        return (row[0], bytes(row[1])) if row else None
+
+    def snapshot_sequence(self) -> int:
+        row = self._connection.execute('SELECT MAX(seq) FROM snapshots').fetchone()
+        return row[0] or 0
+
+    def close(self) -> None:
+        self._connection.close()
@@ -0,0 +1,226 @@
+"""
+Graph Wire Format Module
+
+This module provides a compact binary encoding of graph data (the dicts of
+ResourceAllocationManager.get_graph_data() and graph_view()), served by
+/api/graph-data to clients that ask for GRAPH_MEDIA_TYPE in their Accept
+header, as an alternative to JSON.
+
+It uses the layout of state snapshots (app.models.snapshot) with its own
+magic bytes: a JSON header followed by little-endian arrays. Nodes are
+referred to by their index, so IDs are sent once, packed into 16 bytes
+each when they are UUIDs; names go into a string table; numbers go into
+typed columns; and the labels, titles and edge IDs, which are derived from
+those, are rebuilt by the decoder instead of being sent:
+
+    ids | uuids          node IDs (header list, or (n, 16) uint8 array)
+    strings            string table of node names (header)
+    node_kind          0 process, 1 resource
+    node_name          index into strings
+    node_a, node_b     processes: allocated and requested resources;
+                       resources: available and total units
+    node_x, node_y     positions, when every node has one
+    nodes              other nodes (e.g. clusters) as dicts (header), indexed
+                       after the columnar ones
+    edge_from, edge_to node indexes
+    edge_kind          0 allocation, 1 request
+    edge_units         units of the edge
+    edge_count         edges merged into each (cluster views only)
+    deadlocked         node indexes; deadlocked IDs not among the nodes stay
+                       in the header
+
+Integer columns use the smallest of the 8, 16 and 32 bit types their
+values fit in.
+
+Every other field of the graph data (version, stats, view...) is copied
+into the header. decode_graph() here and decodeGraph() in
+static/js/graph_wire.js rebuild the same dicts as the JSON encoding; they
+must follow the formats of ResourceAllocationManager._process_node(),
+_resource_node() and _edge(), and of graph_views.cluster_view().
+"""
+
+import gzip
+import re
+from typing import Dict, List, Mapping
+
+import numpy as np
+
+from app.models.snapshot import decode_snapshot, encode_snapshot
+
+# Media type of the binary encoding, and its leading bytes (with the format
+# version in the last byte)
+GRAPH_MEDIA_TYPE = 'application/vnd.rag.graph'
+GRAPH_MAGIC = b'RAGG\x01'
+
+# gzip level of compressed responses; low levels already remove most of the
+# redundancy left at a fraction of the cost
+COMPRESSION_LEVEL = 1
+
+NODE_KINDS = ('process', 'resource')
+EDGE_KINDS = ('allocation', 'request')
+
+_UNSIGNED = (np.uint8, np.uint16, np.uint32)
+_SIGNED = (np.int8, np.int16, np.int32)
+
+_UUIDS = re.compile(r'(?:[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})*')
+
+
+def _accepts(header: str, token: str) -> bool:
+    """Whether an Accept or Accept-Encoding header lists token with a nonzero quality."""
+    for item in (header or '').split(','):
+        value, _, params = item.partition(';')
+        if value.strip().lower() != token:
+            continue
+        for param in params.split(';'):
+            name, _, quality = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    return float(quality) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+
+def accepts_binary(accept: str) -> bool:
+    """Whether a request's Accept header asks for the binary encoding (explicitly; */* gets JSON)."""
+    return _accepts(accept, GRAPH_MEDIA_TYPE)
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    return _accepts(accept_encoding, 'gzip')
+
+
+def _integers(values: List[int]) -> np.ndarray:
+    """Array of the values in the smallest integer type holding them all."""
+    array = np.array(values, dtype=np.int64)
+    low, high = (int(array.min()), int(array.max())) if len(array) else (0, 0)
+    for dtype in (_UNSIGNED if low >= 0 else _SIGNED):
+        limits = np.iinfo(dtype)
+        if limits.min <= low and high <= limits.max:
+            return array.astype(dtype)
+    raise ValueError("Graph value out of the 32-bit range")
+
+
+def encode_graph(data: dict, processes: Mapping, resources: Mapping) -> bytes:
+    """
+    Encode graph data. processes and resources are the manager's entity
+    dicts at the version of the data, read for the names and numbers the
+    labels are built from.
+    """
+    nodes = data.get('nodes', [])
+    columnar = [node for node in nodes if node['type'] in NODE_KINDS]
+    others = [node for node in nodes if node['type'] not in NODE_KINDS]
+    ids = [node['id'] for node in columnar]
+    index = {node_id: position for position, node_id in enumerate(ids)}
+    for node in others:
+        index[node['id']] = len(index)
+
+    header = {key: value for key, value in data.items() if key not in ('nodes', 'edges', 'deadlocked')}
+    arrays: Dict[str, np.ndarray] = {}
+    joined = ''.join(ids)
+    if len(joined) == 36 * len(ids) and _UUIDS.fullmatch(joined):
+        arrays['uuids'] = np.frombuffer(bytes.fromhex(joined.replace('-', '')), dtype=np.uint8).reshape(-1, 16)
+    else:
+        header['ids'] = ids
+
+    # One pass per column: comprehensions are much cheaper than a loop
+    # appending to several lists
+    is_resource = [node['type'] == 'resource' for node in columnar]
+    entities = [resources[node_id] if resource else processes[node_id]
+                for node_id, resource in zip(ids, is_resource)]
+    names = [entity.name for entity in entities]
+    strings = {name: position for position, name in enumerate(dict.fromkeys(names))}
+    header['strings'] = list(strings)
+    header['nodes'] = others
+    arrays['node_kind'] = np.array(is_resource, dtype=np.uint8)
+    arrays['node_name'] = _integers([strings[name] for name in names])
+    arrays['node_a'] = _integers([entity.available_units if resource else len(entity.allocated_resources)
+                                  for entity, resource in zip(entities, is_resource)])
+    arrays['node_b'] = _integers([entity.total_units if resource else len(entity.requested_resources)
+                                  for entity, resource in zip(entities, is_resource)])
+    if columnar and all('x' in node for node in columnar):
+        arrays['node_x'] = _integers([node['x'] for node in columnar])
+        arrays['node_y'] = _integers([node['y'] for node in columnar])
+
+    edges = data.get('edges', [])
+    arrays['edge_from'] = _integers([index[edge['from']] for edge in edges])
+    arrays['edge_to'] = _integers([index[edge['to']] for edge in edges])
+    arrays['edge_kind'] = np.array([edge['type'] == 'request' for edge in edges], dtype=np.uint8)
+    arrays['edge_units'] = _integers([edge['units'] for edge in edges])
+    if any('count' in edge for edge in edges):
+        arrays['edge_count'] = _integers([edge.get('count', 0) for edge in edges])
+
+    deadlocked = data.get('deadlocked', [])
+    arrays['deadlocked'] = _integers([index[node_id] for node_id in deadlocked if node_id in index])
+    header['deadlocked'] = [node_id for node_id in deadlocked if node_id not in index]
+    return encode_snapshot(header, arrays, magic=GRAPH_MAGIC)
+
+
+def compress(body: bytes) -> bytes:
+    """gzip a body for Content-Encoding: gzip (no timestamp, so equal bodies compress equally)."""
+    return gzip.compress(body, compresslevel=COMPRESSION_LEVEL, mtime=0)
+
+
+def decode_graph(body: bytes) -> dict:
+    """Rebuild the graph data dict encoded by encode_graph()."""
+    header, arrays = decode_snapshot(body, magic=GRAPH_MAGIC)
+    strings = header.pop('strings')
+    others = header.pop('nodes')
+    if 'uuids' in arrays:
+        hexes = arrays['uuids'].tobytes().hex()
+        ids = [f"{hexes[i:i + 8]}-{hexes[i + 8:i + 12]}-{hexes[i + 12:i + 16]}-{hexes[i + 16:i + 20]}-"
+               f"{hexes[i + 20:i + 32]}" for i in range(0, len(hexes), 32)]
+    else:
+        ids = header.pop('ids')
+
+    nodes: List[dict] = []
+    positions = 'node_x' in arrays
+    columns = [arrays[name].tolist() for name in ('node_kind', 'node_name', 'node_a', 'node_b')]
+    for position, (kind, name, first, second) in enumerate(zip(*columns)):
+        name = strings[name]
+        if kind == 0:
+            node = {
+                'id': ids[position],
+                'label': name,
+                'type': 'process',
+                'title': (f"Process: {name}<br>"
+                          f"Allocated Resources: {first}<br>"
+                          f"Requested Resources: {second}")
+            }
+        else:
+            node = {
+                'id': ids[position],
+                'label': f"{name}\n({first}/{second})",
+                'type': 'resource',
+                'title': (f"Resource: {name}<br>"
+                          f"Available: {first}/{second} units<br>"
+                          f"Allocated: {second - first} units")
+            }
+        if positions:
+            node['x'], node['y'] = int(arrays['node_x'][position]), int(arrays['node_y'][position])
+        nodes.append(node)
+    nodes.extend(others)
+    all_ids = ids + [node['id'] for node in others]
+
+    edges = []
+    counts = arrays['edge_count'].tolist() if 'edge_count' in arrays else None
+    columns = [arrays[name].tolist() for name in ('edge_from', 'edge_to', 'edge_kind', 'edge_units')]
+    for position, (source, target, kind, units) in enumerate(zip(*columns)):
+        source, target, kind = all_ids[source], all_ids[target], EDGE_KINDS[kind]
+        count = counts[position] if counts is not None else 0
+        if count:
+            edges.append({
+                'id': f"{source}->{target}:{kind}", 'from': source, 'to': target, 'type': kind,
+                'units': units, 'count': count,
+                'title': (f"{count} {'allocation' if kind == 'allocation' else 'request'}"
+                          f"{'s' if count > 1 else ''}, {units} units")
+            })
+        else:
+            edges.append({
+                'id': f"{source}->{target}", 'from': source, 'to': target, 'type': kind, 'units': units,
+                'title': f"{units} unit{'s' if units > 1 else ''} {'allocated' if kind == 'allocation' else 'requested'}"
+            })
+
+    deadlocked = sorted([all_ids[position] for position in arrays['deadlocked'].tolist()] + header.pop('deadlocked'))
+    return {**header, 'nodes': nodes, 'edges': edges, 'deadlocked': deadlocked}
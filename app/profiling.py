@@ -0,0 +1,106 @@
+"""
+Profiling Module
+
+This module provides a sampling profiler for a live process. While a capture
+runs, the thread that asked for it records the Python stack of every other
+thread at a fixed interval; nothing is hooked into the profiled code, so the
+overhead is bounded by the sampling rate and stops with the capture.
+
+Profiles are returned in the folded stack format (one
+'thread;outer;...;inner count' line per distinct stack), which
+flamegraph.pl, speedscope and most flame graph viewers read directly.
+Samples are wall-clock: threads waiting on a lock or for I/O are counted
+too, which shows where requests wait as well as where they compute.
+
+Captures are opt-in (RAG_PROFILING=1 enables the endpoints serving them)
+and bounded to MAX_SECONDS; only one runs at a time per process.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict
+
+# Default seconds between two samples
+DEFAULT_INTERVAL = 0.005
+
+# Longest capture accepted, in seconds
+MAX_SECONDS = 60.0
+
+# Stack frames kept per sample, innermost first
+MAX_DEPTH = 128
+
+_capture_lock = threading.Lock()
+
+
+class ProfilerBusy(RuntimeError):
+    """Raised when a capture is requested while another one is running."""
+
+
+def profiling_enabled() -> bool:
+    """Whether RAG_PROFILING allows captures in this process."""
+    return os.environ.get('RAG_PROFILING', '').lower() in ('1', 'true', 'yes', 'on')
+
+
+def _frame_label(code) -> str:
+    filename = code.co_filename
+    for path in sys.path:
+        if path and filename.startswith(path):
+            filename = filename[len(path):].lstrip(os.sep)
+            break
+    # ';' separates frames in the folded format
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(';', ':')
+
+
+def sample_stacks(seconds: float, interval: float = DEFAULT_INTERVAL) -> Dict[str, int]:
+    """
+    Sample the stacks of every other thread of this process for seconds,
+    and return the number of samples of each folded stack.
+
+    Raises:
+        ValueError: if seconds or interval is out of range
+        ProfilerBusy: if another capture is running
+    """
+    if not 0 < seconds <= MAX_SECONDS:
+        raise ValueError(f"Profile duration must be between 0 and {MAX_SECONDS:g} seconds")
+    if not 0.0001 <= interval <= 1:
+        raise ValueError("Sampling interval must be between 0.0001 and 1 second")
+    if not _capture_lock.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already being captured")
+    try:
+        own = threading.get_ident()
+        stacks: Counter = Counter()
+        labels: Dict[object, str] = {}
+        deadline = time.perf_counter() + seconds
+        while True:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                frames = []
+                while frame is not None and len(frames) < MAX_DEPTH:
+                    code = frame.f_code
+                    label = labels.get(code)
+                    if label is None:
+                        label = labels[code] = _frame_label(code)
+                    frames.append(label)
+                    frame = frame.f_back
+                frames.append(names.get(ident, f"thread-{ident}").replace(";", ":"))
+                stacks[';'.join(reversed(frames))] += 1
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return dict(stacks)
+            time.sleep(min(interval, remaining))
+    finally:
+        _capture_lock.release()
+
+
+def capture(seconds: float, interval: float = DEFAULT_INTERVAL) -> str:
+    """
+    Profile this process for seconds and return the folded stacks, heaviest
+    first. Blocks the calling thread for the duration of the capture.
+    """
+    stacks = sample_stacks(seconds, interval)
+    return ''.join(f"{stack} {count}\n" for stack, count in sorted(stacks.items(), key=lambda item: -item[1]))
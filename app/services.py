@@ -0,0 +1,51 @@
+"""
+Services Module
+
+This module builds the objects both entry points (app.py and asgi.py) serve
+from, configured through the same environment variables, so the two apps
+cannot drift apart:
+
+    RAG_STORAGE              SQLite file the state is persisted to; state is
+                             kept in memory only when unset
+    RAG_CHECKPOINT_INTERVAL  operations between two snapshots (0 disables them)
+    RAG_ANALYTICS_WORKERS    analytics worker processes
+"""
+
+import atexit
+import os
+
+from app.models.analytics import AnalyticsEngine, DEFAULT_WORKERS
+from app.models.deltas import DeltaLog
+from app.models.resource_allocation import ResourceAllocationManager, DEFAULT_CHECKPOINT_INTERVAL
+from app.models.storage import SQLiteOperationStore
+
+
+def create_manager() -> ResourceAllocationManager:
+    """
+    Create the resource manager, with a delta log for graph streams.
+
+    State is kept in memory unless RAG_STORAGE names a SQLite file, in which
+    it is persisted as an operation log with periodic snapshots. Every
+    process keeps its manager in step through that log, so the apps can then
+    run with several workers, and share one state file. A snapshot is taken
+    at exit so that the next start has no operations to replay.
+    """
+    storage_path = os.environ.get('RAG_STORAGE')
+    if storage_path:
+        os.makedirs(os.path.dirname(os.path.abspath(storage_path)), exist_ok=True)
+    manager = ResourceAllocationManager(
+        deltas=DeltaLog(),
+        storage=SQLiteOperationStore(storage_path) if storage_path else None,
+        checkpoint_interval=int(os.environ.get('RAG_CHECKPOINT_INTERVAL', DEFAULT_CHECKPOINT_INTERVAL)) or None
+    )
+    if manager.storage is not None:
+        atexit.register(manager.checkpoint)
+    return manager
+
+
+def create_analytics(manager: ResourceAllocationManager) -> AnalyticsEngine:
+    """
+    Create the engine running manager's expensive analyses in worker
+    processes; the workers start on the first analysis.
+    """
+    return AnalyticsEngine(manager, workers=int(os.environ.get('RAG_ANALYTICS_WORKERS', DEFAULT_WORKERS)))
@@ -0,0 +1,113 @@
+/**
+ * Resource Allocation Graph Simulator
+ * Decoder of the binary graph encoding served by /api/graph-data to clients
+ * that send "Accept: application/vnd.rag.graph" (see app/models/wire.py).
+ * decodeGraph() returns the same object as the JSON encoding.
+ */
+
+const GRAPH_MEDIA_TYPE = 'application/vnd.rag.graph';
+const GRAPH_MAGIC = [0x52, 0x41, 0x47, 0x47, 0x01];  // "RAGG" + format version
+
+const WIRE_ARRAY_TYPES = {
+    '|u1': Uint8Array,
+    '|i1': Int8Array,
+    '<u2': Uint16Array,
+    '<i2': Int16Array,
+    '<u4': Uint32Array,
+    '<i4': Int32Array,
+    '<f4': Float32Array,
+    '<f8': Float64Array
+};
+
+const HEX_BYTES = Array.from({ length: 256 }, (_, byte) => byte.toString(16).padStart(2, '0'));
+
+function decodeGraph(buffer) {
+    const bytes = new Uint8Array(buffer);
+    if (GRAPH_MAGIC.some((byte, i) => bytes[i] !== byte)) {
+        throw new Error('Not a graph encoding or unsupported version');
+    }
+    let offset = GRAPH_MAGIC.length;
+    const headerLength = new DataView(buffer).getUint32(offset, true);
+    offset += 4;
+    const header = JSON.parse(new TextDecoder().decode(bytes.subarray(offset, offset + headerLength)));
+    offset += headerLength;
+
+    // Arrays follow the header unaligned: copy each into its own buffer
+    const arrays = {};
+    header._arrays.forEach(([name, dtype, shape]) => {
+        const ArrayType = WIRE_ARRAY_TYPES[dtype];
+        if (!ArrayType) {
+            throw new Error('Unsupported array type ' + dtype);
+        }
+        const count = shape.reduce((product, size) => product * size, 1);
+        const length = count * ArrayType.BYTES_PER_ELEMENT;
+        arrays[name] = new ArrayType(buffer.slice(offset, offset + length));
+        offset += length;
+    });
+    const { _arrays, strings, nodes: others, ids: listedIds, deadlocked: listedDeadlocked, ...fields } = header;
+
+    let ids = listedIds;
+    if (arrays.uuids) {
+        ids = new Array(arrays.uuids.length / 16);
+        const hex = Array.from(arrays.uuids, byte => HEX_BYTES[byte]);
+        for (let i = 0; i < ids.length; i++) {
+            const h = hex.slice(i * 16, i * 16 + 16).join('');
+            ids[i] = `${h.slice(0, 8)}-${h.slice(8, 12)}-${h.slice(12, 16)}-${h.slice(16, 20)}-${h.slice(20)}`;
+        }
+    }
+
+    const nodes = new Array(ids.length);
+    const { node_kind: kinds, node_name: names, node_a: first, node_b: second, node_x: xs, node_y: ys } = arrays;
+    for (let i = 0; i < ids.length; i++) {
+        const name = strings[names[i]];
+        const a = first[i];
+        const b = second[i];
+        nodes[i] = kinds[i] === 0 ? {
+            id: ids[i],
+            label: name,
+            type: 'process',
+            title: `Process: ${name}<br>Allocated Resources: ${a}<br>Requested Resources: ${b}`
+        } : {
+            id: ids[i],
+            label: `${name}\n(${a}/${b})`,
+            type: 'resource',
+            title: `Resource: ${name}<br>Available: ${a}/${b} units<br>Allocated: ${b - a} units`
+        };
+        if (xs) {
+            nodes[i].x = xs[i];
+            nodes[i].y = ys[i];
+        }
+    }
+    const allIds = ids.concat(others.map(node => node.id));
+
+    const { edge_from: sources, edge_to: targets, edge_kind: edgeKinds, edge_units: units, edge_count: counts } = arrays;
+    const edges = new Array(sources.length);
+    for (let i = 0; i < sources.length; i++) {
+        const from = allIds[sources[i]];
+        const to = allIds[targets[i]];
+        const type = edgeKinds[i] === 0 ? 'allocation' : 'request';
+        const count = counts ? counts[i] : 0;
+        edges[i] = count ? {
+            id: `${from}->${to}:${type}`, from, to, type, units: units[i], count,
+            title: `${count} ${type}${count > 1 ? 's' : ''}, ${units[i]} units`
+        } : {
+            id: `${from}->${to}`, from, to, type, units: units[i],
+            title: `${units[i]} unit${units[i] > 1 ? 's' : ''} ${type === 'allocation' ? 'allocated' : 'requested'}`
+        };
+    }
+
+    const deadlocked = Array.from(arrays.deadlocked, i => allIds[i]).concat(listedDeadlocked).sort();
+    return { ...fields, nodes: nodes.concat(others), edges, deadlocked };
+}
+
+/**
+ * Parse a /api/graph-data response in whichever encoding the server chose
+ * (errors are always JSON).
+ */
+function readGraphResponse(response) {
+    const type = response.headers.get('Content-Type') || '';
+    if (type.startsWith(GRAPH_MEDIA_TYPE)) {
+        return response.arrayBuffer().then(decodeGraph);
+    }
+    return response.json();
+}
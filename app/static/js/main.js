@@ -86,7 +86,7 @@ function initializeGraphVisualization() {
         renderGraph(graphData);
     } else {
         // Fetch graph data from API
-        fetch('/api/graph-data')
+        fetch('/api/graph-data', { cache: 'no-cache' })
             .then(response => response.json())
             .then(data => {
                 renderGraph(data);
@@ -0,0 +1,243 @@
+"""
+Telemetry Module
+
+This module provides structured logging and in-process metrics for the
+application. Log records are emitted as one JSON object per line with any
+structured fields passed through extra={'fields': {...}}; records below
+WARNING can be sampled so that chatty debug output stays cheap under load.
+Metrics (counters and latency histograms) can be exposed in the Prometheus
+text format.
+
+Configuration comes from the environment unless given explicitly:
+    RAG_LOG_LEVEL   -- minimum level to emit (default INFO)
+    RAG_LOG_SAMPLE  -- fraction (0-1) of DEBUG and INFO records kept (default 1)
+"""
+
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Dict, List, Optional, Tuple
+
+# Root of every logger created through get_logger
+LOGGER_NAMESPACE = 'rag'
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Return the logger of a component, e.g. get_logger('api')."""
+    return logging.getLogger(f"{LOGGER_NAMESPACE}.{name}")
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as single-line JSON objects."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a random fraction of records below WARNING; warnings and errors always pass."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or self.rate >= 1 or random.random() < self.rate
+
+
+def configure_logging(level: Optional[str] = None, sample_rate: Optional[float] = None,
+                      stream=None) -> logging.Logger:
+    """
+    Install the JSON handler on the application's root logger.
+
+    Calling it again replaces the previous configuration.
+    """
+    level = (level or os.environ.get('RAG_LOG_LEVEL') or 'INFO').upper()
+    if sample_rate is None:
+        sample_rate = float(os.environ.get('RAG_LOG_SAMPLE', 1))
+
+    root = logging.getLogger(LOGGER_NAMESPACE)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(JsonFormatter())
+    handler.addFilter(SamplingFilter(sample_rate))
+    root.addHandler(handler)
+    root.setLevel(level)
+    root.propagate = False
+    return root
+
+
+# Upper bounds (seconds) of the latency histogram buckets, from 10 us to 10 s
+DEFAULT_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+MetricKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _key(name: str, labels: dict) -> MetricKey:
+    return name, tuple(sorted((label, str(v)) for label, v in labels.items()))
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ''
+    escaped = (v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in labels)
+    return '{' + ','.join(f'{label}="{v}"' for (label, _), v in zip(labels, escaped)) + '}'
+
+
+class Histogram:
+    """
+    Distribution of observed values over fixed buckets.
+
+    Obtained once from Metrics.histogram() and kept, so that observe() on a
+    hot path only finds the bucket (outside the lock) and bumps two numbers.
+    Updates and reads hold the registry's lock, as counters do, so no
+    observation is lost and a scrape sees counts and sum of the same
+    observations.
+    """
+
+    __slots__ = ('bounds', 'counts', 'sum', '_lock')
+
+    def __init__(self, bounds: Tuple[float, ...] = DEFAULT_BUCKETS,
+                 lock: Optional[threading.Lock] = None):
+        self.bounds = bounds
+        # One count per bucket, plus the values above the last bound
+        self.counts: List[int] = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = lock or threading.Lock()
+
+    def observe(self, value: float) -> None:
+        bucket = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[bucket] += 1
+            self.sum += value
+
+    @property
+    def count(self) -> int:
+        return sum(self.state()[0])
+
+    def time(self):
+        """Decorator recording the duration of every call of a function, in seconds."""
+        def decorator(function):
+            @wraps(function)
+            def timed(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - started)
+            return timed
+        return decorator
+
+    def state(self) -> Tuple[List[int], float]:
+        with self._lock:
+            return list(self.counts), self.sum
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counts = [0] * (len(self.bounds) + 1)
+            self.sum = 0.0
+
+
+class Metrics:
+    """
+    Registry of monotonically increasing counters and histograms.
+
+    Counters are identified by a name and optional labels, e.g.
+    metrics.increment('errors_total', where='graph_data'); so are
+    histograms, e.g. metrics.observe('http_request_seconds', 0.002,
+    route='/api/graph-data').
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[MetricKey, float] = defaultdict(float)
+        self._histograms: Dict[MetricKey, Histogram] = {}
+
+    def increment(self, name: str, value: float = 1, **labels) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] += value
+
+    def value(self, name: str, **labels) -> float:
+        return self._counters.get(_key(name, labels), 0)
+
+    def histogram(self, name: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, **labels) -> Histogram:
+        """Return the histogram of a name and labels, creating it on first use."""
+        key = _key(name, labels)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram(buckets, self._lock))
+        return histogram
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        self.histogram(name, **labels).observe(value)
+
+    def snapshot(self) -> Dict[str, float]:
+        """Return every counter keyed by 'name{label="value",...}'."""
+        with self._lock:
+            items = list(self._counters.items())
+        result = {}
+        for (name, labels), value in sorted(items):
+            suffix = ','.join(f'{label}="{v}"' for label, v in labels)
+            result[f"{name}{{{suffix}}}" if suffix else name] = value
+        return result
+
+    def exposition(self) -> str:
+        """Return every counter and histogram in the Prometheus text format (version 0.0.4)."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+        lines = []
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_format_labels(labels)} {value:g}")
+        for (name, labels), histogram in histograms:
+            counts, total = histogram.state()
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, count in zip(histogram.bounds + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else f"{bound:g}"
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total:g}")
+            lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+        return '\n'.join(lines) + '\n'
+
+    def reset(self) -> None:
+        """Zero every metric; histograms handed out stay registered."""
+        with self._lock:
+            self._counters.clear()
+            histograms = list(self._histograms.values())
+        for histogram in histograms:
+            histogram.reset()
+
+
+# Process-wide metrics registry
+metrics = Metrics()
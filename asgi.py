@@ -0,0 +1,573 @@
+"""
+Asyncio entry point for the Resource Allocation Graph API.
+
+A dependency-free ASGI application serving the JSON API of app.py for
+clients that poll or stream the graph, so that many concurrent connections
+are served by one process instead of pinning a worker thread each:
+
+    GET  /api/graph-data           graph data or a view of it, with ETag / 304
+    GET  /api/graph-stream         Server-Sent Events stream of graph deltas
+    GET  /api/check-deadlock       deadlock detection
+    GET  /api/analysis             resource usage analysis
+    GET  /api/recommendations      optimization recommendations
+    POST /api/apply_optimization   apply a recommendation or resolve a deadlock
+    POST /api/batch                atomic list of mutations
+    GET  /api/processes            paged, filtered process listing
+    GET  /api/resources            paged, filtered resource listing
+    GET  /metrics                  counters and latency histograms (Prometheus)
+    GET  /api/profile              folded stacks of this process (RAG_PROFILING)
+
+Run it with any ASGI server, e.g. ``uvicorn asgi:app``. Everything that
+takes the manager's lock runs in a thread pool (RAG_EXECUTOR_WORKERS
+threads), so the event loop never waits for a writer; up-to-date graph
+snapshots are served straight from the loop. Analyses run in the worker
+processes of an AnalyticsEngine, as in app.py. The manager and the engine
+are built by app.services for both apps, from the same environment
+variables, so both can share one state file.
+
+The ASGI surface is the JSON API only: the HTML pages and their form routes
+(adding, allocating, releasing, deleting one process or resource at a time)
+are served by app.py. Clients of this app make those changes through
+POST /api/batch, with a list of one operation if need be.
+"""
+
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qs
+
+import numpy as np
+
+from app.models.analytics import FULL_CYCLE_LIMIT, inline_cycle_listing
+from app.models.batch import BatchError
+from app.models.deltas import DeltaLog
+from app.models.graph_views import GraphViewSpec
+from app.models.query import DEFAULT_PAGE_SIZE, process_record, resource_record
+from app.models.recovery import RecoveryCost
+from app.models.wire import GRAPH_MEDIA_TYPE, accepts_binary, accepts_gzip
+from app.models.resource_allocation import DEFAULT_CYCLE_LIMIT
+from app.telemetry import configure_logging, get_logger, metrics
+from app.profiling import DEFAULT_INTERVAL, ProfilerBusy, capture, profiling_enabled
+from app.services import create_analytics, create_manager
+
+configure_logging()
+logger = get_logger('asgi')
+
+resource_manager = create_manager()
+analytics = create_analytics(resource_manager)
+
+executor = ThreadPoolExecutor(max_workers=int(os.environ.get('RAG_EXECUTOR_WORKERS', 8)),
+                              thread_name_prefix='rag')
+
+# Seconds between keep-alive comments on idle graph streams
+STREAM_KEEPALIVE = 15
+
+# Seconds between checks for operations stored by other processes
+SYNC_INTERVAL = 0.25
+
+# Largest accepted request body, in bytes
+MAX_BODY = 1 << 20
+
+
+async def offload(function, *args, **kwargs):
+    """Run a blocking manager call in the executor."""
+    return await asyncio.get_running_loop().run_in_executor(executor, partial(function, *args, **kwargs))
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def encode_json(payload) -> bytes:
+    return json.dumps(payload, separators=(',', ':'), default=_json_default).encode('utf-8')
+
+
+async def analysis(name: str, **params):
+    """Return an analysis from the analytics engine without blocking the loop."""
+    future = await offload(analytics.submit, name, **params)
+    # Shielded: other requests may be waiting for the same computation
+    return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), analytics.timeout)
+
+
+class PayloadTooLarge(Exception):
+    """Raised when a request body exceeds MAX_BODY."""
+
+
+class Request:
+    """The parts of an ASGI HTTP scope the handlers use."""
+
+    def __init__(self, scope: dict, receive: Callable[[], Awaitable[dict]]):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.query = {key: values[-1] for key, values in parse_qs(scope.get('query_string', b'').decode()).items()}
+        self.headers = {name.decode('latin-1').lower(): value.decode('latin-1')
+                        for name, value in scope.get('headers', [])}
+        self.receive = receive
+
+    async def body(self) -> bytes:
+        chunks, size = [], 0
+        while True:
+            message = await self.receive()
+            if message['type'] == 'http.disconnect':
+                raise ConnectionError("Client disconnected")
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > MAX_BODY:
+                raise PayloadTooLarge()
+            chunks.append(chunk)
+            if not message.get('more_body'):
+                return b''.join(chunks)
+
+    async def disconnected(self) -> None:
+        """Return once the client has gone away."""
+        while (await self.receive())['type'] != 'http.disconnect':
+            pass
+
+
+async def respond(send, status: int, body: bytes = b'', content_type: Optional[str] = 'application/json',
+                  headers: Tuple[Tuple[str, str], ...] = ()) -> None:
+    raw_headers = [(name.encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+    if content_type:
+        raw_headers.append((b'content-type', content_type.encode('latin-1')))
+    raw_headers.append((b'content-length', str(len(body)).encode('latin-1')))
+    await send({'type': 'http.response.start', 'status': status, 'headers': raw_headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def respond_json(send, payload, status: int = 200) -> None:
+    await respond(send, status, encode_json(payload))
+
+
+class DeltaNotifier:
+    """
+    Wakes streaming handlers on the event loop when the manager's delta log
+    records a batch, which happens on whatever thread ran the mutation.
+    """
+
+    def __init__(self, deltas: DeltaLog, loop: asyncio.AbstractEventLoop):
+        self._deltas = deltas
+        self._loop = loop
+        self._event = asyncio.Event()
+        deltas.add_listener(self._recorded)
+
+    def _recorded(self, version: int) -> None:
+        self._loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self) -> None:
+        # Waiters hold the old event; the next waiters get a fresh one
+        self._event.set()
+        self._event = asyncio.Event()
+
+    async def wait(self, version: int, timeout: float, disconnected: asyncio.Future) -> bool:
+        """Wait until a batch newer than version exists; False on timeout or disconnect."""
+        if self._deltas.latest_version > version:
+            return True
+        changed = asyncio.ensure_future(self._event.wait())
+        try:
+            done, _ = await asyncio.wait({changed, disconnected}, timeout=timeout,
+                                         return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            changed.cancel()
+        return changed in done
+
+    def close(self) -> None:
+        self._deltas.remove_listener(self._recorded)
+
+
+notifier: Optional[DeltaNotifier] = None
+
+
+async def graph_snapshot():
+    """Return the current graph snapshot, building it off the loop if needed."""
+    return resource_manager.cached_graph_snapshot() or await offload(resource_manager.graph_snapshot)
+
+
+async def api_graph_data(request: Request, send) -> None:
+    """
+    Graph data or a view of it, revalidated through the ETag and in JSON or
+    the binary encoding like in app.py.
+    """
+    try:
+        spec = GraphViewSpec.from_args(request.query)
+    except ValueError as e:
+        await respond_json(send, {'error': True, 'message': str(e)}, 400)
+        return
+    binary = accepts_binary(request.headers.get('accept', ''))
+    gzipped = binary and accepts_gzip(request.headers.get('accept-encoding', ''))
+    if binary:
+        snapshot, body = await offload(resource_manager.encoded_graph, spec, gzipped=gzipped)
+        suffix = 'bz' if gzipped else 'b'
+        etag = f'"{snapshot.etag}-{suffix}"'
+    else:
+        snapshot = await graph_snapshot() if spec is None else await offload(resource_manager.graph_view, spec)
+        body, etag = snapshot.body, f'"{snapshot.etag}"'
+    headers = (('etag', etag), ('cache-control', 'no-cache'), ('vary', 'Accept, Accept-Encoding'))
+    matches = request.headers.get('if-none-match', '')
+    if etag in (tag.strip() for tag in matches.split(',')) or matches.strip() == '*':
+        metrics.increment('graph_data_requests_total', status=304)
+        await respond(send, 304, content_type=None, headers=headers)
+        return
+    if gzipped:
+        headers += (('content-encoding', 'gzip'),)
+    metrics.increment('graph_data_requests_total', status=200)
+    await respond(send, 200, body, content_type=GRAPH_MEDIA_TYPE if binary else 'application/json',
+                  headers=headers)
+
+
+async def api_graph_stream(request: Request, send) -> None:
+    """
+    Server-Sent Events stream of graph deltas, with the same events and
+    resume rules as /api/graph-stream in app.py. Idle streams wait on the
+    event loop instead of in a thread.
+    """
+    tag = request.headers.get('last-event-id') or request.query.get('since')
+    version = resource_manager.parse_version_tag(tag)
+    await send({'type': 'http.response.start', 'status': 200, 'headers': [
+        (b'content-type', b'text/event-stream'),
+        (b'cache-control', b'no-cache'),
+        (b'x-accel-buffering', b'no'),
+    ]})
+
+    async def emit(text: str) -> None:
+        await send({'type': 'http.response.body', 'body': text.encode('utf-8'), 'more_body': True})
+
+    async def send_snapshot() -> int:
+        snapshot = await graph_snapshot()
+        await emit(f"id: {snapshot.etag}\nevent: snapshot\ndata: {snapshot.body.decode('utf-8')}\n\n")
+        return snapshot.version
+
+    disconnected = asyncio.ensure_future(request.disconnected())
+    metrics.increment('graph_streams_total')
+    try:
+        if version is None:
+            version = await send_snapshot()
+        while not disconnected.done():
+            batches = resource_manager.deltas.since(version)
+            if batches is None or any(delta['type'] == 'reset' for _, batch in batches for delta in batch):
+                version = await send_snapshot()
+                continue
+            for batch_version, batch in batches:
+                version = batch_version
+                await emit(f"id: {resource_manager.version_tag(batch_version)}\nevent: delta\n"
+                           f"data: {json.dumps(batch, separators=(',', ':'))}\n\n")
+            if batches:
+                continue
+            if not await notifier.wait(version, STREAM_KEEPALIVE, disconnected) and not disconnected.done():
+                await emit(": keep-alive\n\n")
+    except OSError:
+        # The server failed to write to a client that went away
+        pass
+    finally:
+        disconnected.cancel()
+
+
+async def api_check_deadlock(request: Request, send) -> None:
+    """Deadlock detection; long cycle listings are enumerated by the analytics engine."""
+    try:
+        max_cycles = int(request.query.get('max_cycles', DEFAULT_CYCLE_LIMIT))
+    except ValueError:
+        max_cycles = DEFAULT_CYCLE_LIMIT
+    if request.query.get('all'):
+        max_cycles = FULL_CYCLE_LIMIT
+    if inline_cycle_listing(max_cycles) or not await offload(resource_manager.deadlocked_processes):
+        deadlock_info = await offload(resource_manager.detect_deadlock, max_cycles=max_cycles)
+    else:
+        deadlock_info = await analysis('deadlock', max_cycles=max_cycles)
+    await respond_json(send, {
+        'has_deadlock': deadlock_info['has_deadlock'],
+        'message': 'Cycles detected in the resource allocation graph.' if deadlock_info['has_deadlock'] else 'No cycles detected.',
+        'cycles': deadlock_info['cycles'],
+        'affected_processes': deadlock_info['affected_processes']
+    })
+
+
+async def api_analysis(request: Request, send) -> None:
+    """Resource usage analysis, computed by the analytics engine."""
+    await respond_json(send, await analysis('analysis'))
+
+
+async def api_recommendations(request: Request, send) -> None:
+    """Optimization recommendations, computed by the analytics engine."""
+    await respond_json(send, await analysis('recommendations'))
+
+
+async def api_batch(request: Request, send) -> None:
+    """Apply a list of operations atomically, like /api/batch in app.py."""
+    try:
+        data = json.loads(await request.body() or b'null')
+    except ValueError:
+        data = None
+    operations = data.get('operations') if isinstance(data, dict) else data
+    if not isinstance(operations, list):
+        await respond_json(send, {
+            'success': False,
+            'message': 'Expected a JSON list of operations'
+        }, 400)
+        return
+
+    try:
+        result = await offload(resource_manager.apply_batch, operations)
+    except BatchError as e:
+        await respond_json(send, {'success': False, 'message': str(e), 'index': e.index}, 400)
+        return
+    except ValueError as e:
+        await respond_json(send, {'success': False, 'message': str(e)}, 400)
+        return
+
+    metrics.increment('batch_operations_total', len(operations))
+    await respond_json(send, {'success': True, **result})
+
+
+def change_units(resource_id: str, action: str) -> str:
+    """Apply a units recommendation to a resource and describe it."""
+    with resource_manager.lock:
+        resource = resource_manager.get_resource(resource_id)
+        if not resource:
+            raise KeyError(resource_id)
+        if action == 'decrease_units':
+            resource_manager.set_resource_units(resource_id, resource.total_units - 1)
+            return f'Reduced {resource.name} units by 1'
+        resource_manager.set_resource_units(resource_id, resource.total_units + 1)
+        return f'Increased {resource.name} units by 1'
+
+
+async def api_apply_optimization(request: Request, send) -> None:
+    """Apply an optimization recommendation, like /api/apply_optimization in app.py."""
+    try:
+        data = json.loads(await request.body() or b'null')
+    except ValueError:
+        data = None
+    action = data.get('action') if isinstance(data, dict) else None
+    if not action:
+        await respond_json(send, {'success': False, 'message': 'Missing required parameter: action'}, 400)
+        return
+
+    if action == 'resolve_deadlock':
+        try:
+            cost = RecoveryCost.from_dict(data.get('cost'))
+            plan = await offload(resource_manager.recover_deadlock, data.get('recovery', 'preempt'), cost,
+                                 dry_run=bool(data.get('dry_run')))
+        except (TypeError, ValueError) as e:
+            await respond_json(send, {'success': False, 'message': str(e)}, 400)
+            return
+        await respond_json(send, {
+            'success': bool(plan.victims),
+            'message': plan.describe(),
+            'dry_run': bool(data.get('dry_run')),
+            'plan': plan.to_dict()
+        })
+        return
+
+    resource_id = data.get('resource_id')
+    if not resource_id:
+        await respond_json(send, {'success': False, 'message': 'Missing required parameter: resource_id'}, 400)
+        return
+    if action not in ('decrease_units', 'increase_units'):
+        await respond_json(send, {'success': False, 'message': 'Invalid action'}, 400)
+        return
+    try:
+        message = await offload(change_units, resource_id, action)
+    except KeyError:
+        await respond_json(send, {'success': False, 'message': 'Resource not found'}, 404)
+        return
+    except ValueError as e:
+        await respond_json(send, {'success': False, 'message': str(e)}, 400)
+        return
+
+    # Updated recommendations, unless they take too long
+    try:
+        recommendations = await analysis('recommendations')
+    except asyncio.TimeoutError:
+        recommendations = None
+    await respond_json(send, {'success': True, 'message': message, 'recommendations': recommendations})
+
+
+def query_int(request: Request, name: str, default: Optional[int] = None) -> Optional[int]:
+    """An integer query parameter; default when missing or malformed, as Flask's type=int."""
+    try:
+        return int(request.query[name])
+    except (KeyError, ValueError):
+        return default
+
+
+def page_arguments(request: Request) -> dict:
+    """Cursor and page size of a listing request."""
+    return {
+        'after': query_int(request, 'after'),
+        'limit': query_int(request, 'limit', DEFAULT_PAGE_SIZE),
+    }
+
+
+def list_processes(filters: dict) -> dict:
+    with resource_manager.lock:
+        page = resource_manager.find_processes(**filters)
+        deadlocked = resource_manager.deadlocked_processes()
+        items = [process_record(process, deadlocked) for process in page.items]
+    return {'items': items, 'total': page.total, 'next_cursor': page.next_cursor}
+
+
+def list_resources(filters: dict) -> dict:
+    with resource_manager.lock:
+        page = resource_manager.find_resources(**filters)
+        items = [resource_record(resource) for resource in page.items]
+    return {'items': items, 'total': page.total, 'next_cursor': page.next_cursor}
+
+
+async def api_processes(request: Request, send) -> None:
+    """Processes, one page at a time, with the filters of /api/processes in app.py."""
+    await respond_json(send, await offload(list_processes, {
+        'name': request.query.get('name'),
+        'holding': request.query.get('holding'),
+        'waiting_for': request.query.get('waiting_for'),
+        'deadlocked': request.query.get('deadlocked', '').lower() in ('1', 'true'),
+        **page_arguments(request)
+    }))
+
+
+async def api_resources(request: Request, send) -> None:
+    """Resources, one page at a time, with the filters of /api/resources in app.py."""
+    try:
+        page = await offload(list_resources, {
+            'name': request.query.get('name'),
+            'held_by': request.query.get('held_by'),
+            'awaited_by': request.query.get('awaited_by'),
+            'utilization': request.query.get('utilization'),
+            **page_arguments(request)
+        })
+    except ValueError as e:
+        await respond_json(send, {'error': True, 'message': str(e)}, 400)
+        return
+    await respond_json(send, page)
+
+
+async def prometheus_metrics(request: Request, send) -> None:
+    """Counters and latency histograms in the Prometheus text format."""
+    await respond(send, 200, metrics.exposition().encode('utf-8'),
+                  content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+async def api_profile(request: Request, send) -> None:
+    """Profile this process like /api/profile in app.py; the capture runs in the executor."""
+    if not profiling_enabled():
+        await respond_json(send, {'error': True, 'message': 'Profiling is disabled'}, 404)
+        return
+    try:
+        seconds = float(request.query.get('seconds', 10))
+        interval = float(request.query.get('interval', DEFAULT_INTERVAL))
+        profile = await offload(capture, seconds, interval)
+    except ProfilerBusy as e:
+        await respond_json(send, {'error': True, 'message': str(e)}, 409)
+        return
+    except ValueError as e:
+        await respond_json(send, {'error': True, 'message': str(e)}, 400)
+        return
+    await respond(send, 200, profile.encode('utf-8'), content_type='text/plain',
+                  headers=(('x-profile-pid', str(os.getpid())),))
+
+
+ROUTES: Dict[Tuple[str, str], Callable[[Request, Callable], Awaitable[None]]] = {
+    ('GET', '/api/graph-data'): api_graph_data,
+    ('GET', '/api/graph-stream'): api_graph_stream,
+    ('GET', '/api/check-deadlock'): api_check_deadlock,
+    ('GET', '/api/analysis'): api_analysis,
+    ('GET', '/api/recommendations'): api_recommendations,
+    ('POST', '/api/apply_optimization'): api_apply_optimization,
+    ('POST', '/api/batch'): api_batch,
+    ('GET', '/api/processes'): api_processes,
+    ('GET', '/api/resources'): api_resources,
+    ('GET', '/metrics'): prometheus_metrics,
+    ('GET', '/api/profile'): api_profile,
+}
+
+
+async def sync_shared_state() -> None:
+    """Apply the operations other processes store, so streams see their changes."""
+    while True:
+        try:
+            await offload(resource_manager.sync)
+        except Exception:
+            logger.exception("Error syncing shared state")
+            metrics.increment('errors_total', where='asgi_sync')
+        await asyncio.sleep(SYNC_INTERVAL)
+
+
+async def lifespan(receive, send) -> None:
+    global notifier
+    syncer = None
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            notifier = DeltaNotifier(resource_manager.deltas, asyncio.get_running_loop())
+            if resource_manager.storage is not None:
+                syncer = asyncio.ensure_future(sync_shared_state())
+            # Start the analytics workers before the first request needs them
+            await offload(analytics.start)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            if syncer is not None:
+                syncer.cancel()
+            notifier.close()
+            if resource_manager.storage is not None:
+                # Snapshot on shutdown so the next start has no operations to replay
+                await offload(resource_manager.checkpoint)
+            executor.shutdown(wait=True)
+            analytics.shutdown()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send) -> None:
+    """The ASGI application."""
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    global notifier
+    if notifier is None:
+        # Servers that do not implement the lifespan protocol
+        notifier = DeltaNotifier(resource_manager.deltas, asyncio.get_running_loop())
+
+    request = Request(scope, receive)
+    handler = ROUTES.get((request.method, request.path))
+    route = request.path if handler is not None else 'unmatched'
+    received = time.perf_counter()
+    started = False
+
+    async def tracked_send(message: dict) -> None:
+        nonlocal started
+        if not started:
+            # Timed to the start of the response, so streams count like the rest
+            started = True
+            metrics.observe('http_request_seconds', time.perf_counter() - received,
+                            method=request.method, route=route)
+            metrics.increment('http_requests_total', method=request.method, route=route,
+                              status=message.get('status', 0))
+        await send(message)
+
+    if handler is None:
+        allowed = any(path == request.path for _, path in ROUTES)
+        await respond_json(tracked_send, {'error': True, 'message': 'Method not allowed' if allowed else 'Not found'},
+                           405 if allowed else 404)
+        return
+    try:
+        await handler(request, tracked_send)
+    except ConnectionError:
+        pass
+    except PayloadTooLarge:
+        await respond_json(tracked_send, {'error': True, 'message': 'Request body too large'}, 413)
+    except asyncio.TimeoutError:
+        await respond(tracked_send, 503, encode_json({'error': True, 'message': 'Analysis is still running, retry shortly'}),
+                      headers=(('retry-after', '1'),))
+    except Exception as e:
+        logger.exception("Error handling request", extra={'fields': {'path': request.path}})
+        metrics.increment('errors_total', where='asgi')
+        if not started:
+            await respond_json(tracked_send, {'error': True, 'message': str(e)}, 500)
@@ -0,0 +1,112 @@
+"""
+Concurrency stress benchmark for ResourceAllocationManager.
+
+Runs the same mixed workload on one shared manager with an increasing number
+of threads. Writers allocate, request and release units of a small pool of
+contended resources; readers poll graph_snapshot() the way /api/graph-data
+does. Every operation is followed by a short sleep standing in for the
+request handling a WSGI worker does outside the manager (parsing, I/O).
+
+After each run the manager is checked for over-allocation: no resource may
+hand out more units than it has, and the units held by processes must add up
+to what each resource reports as allocated.
+
+With --think-ms 0 the workload is pure Python under the GIL and cannot scale
+with threads; the numbers then show the cost of lock contention instead.
+
+Usage:
+    python -m benchmarks.bench_concurrency [--threads 1,2,4,8] [--seconds S]
+        [--resources M] [--units U] [--read-ratio F] [--think-ms T]
+"""
+
+import argparse
+import random
+import threading
+import time
+
+from app.models.resource_allocation import ResourceAllocationManager
+
+
+def worker(manager, resource_ids, stop, counts, index, read_ratio, think):
+    """Run operations until stop is set, counting them in counts[index]."""
+    rng = random.Random(index)
+    process_id = manager.add_process(f"worker-{index}")
+    operations = 0
+    while not stop.is_set():
+        if rng.random() < read_ratio:
+            manager.graph_snapshot()
+        else:
+            resource_id = rng.choice(resource_ids)
+            held = manager.processes[process_id].allocated_resources
+            try:
+                if resource_id in held:
+                    manager.release_resource(process_id, resource_id)
+                elif manager.resources[resource_id].available_units > 0:
+                    manager.allocate_resource(process_id, resource_id, 1)
+                elif resource_id not in manager.processes[process_id].requested_resources:
+                    manager.request_resource(process_id, resource_id, 1)
+                else:
+                    manager.cancel_request(process_id, resource_id)
+            except ValueError:
+                # Lost a race for the last units; the manager refused cleanly
+                pass
+        operations += 1
+        if think:
+            time.sleep(think)
+    counts[index] = operations
+
+
+def check_invariants(manager) -> None:
+    """Raise AssertionError if any resource is over-allocated or inconsistent."""
+    for resource_id, resource in manager.resources.items():
+        allocated = sum(resource.allocated_to.values())
+        held = sum(process.allocated_resources.get(resource_id, 0)
+                   for process in manager.processes.values())
+        assert allocated <= resource.total_units, f"{resource.name} over-allocated"
+        assert resource.available_units == resource.total_units - allocated, f"{resource.name} units drifted"
+        assert held == allocated, f"{resource.name} allocations disagree with process holdings"
+
+
+def run(threads: int, seconds: float, resources: int, units: int, read_ratio: float, think: float) -> dict:
+    manager = ResourceAllocationManager()
+    resource_ids = [manager.add_resource(f"R{i}", units) for i in range(resources)]
+    stop = threading.Event()
+    counts = [0] * threads
+    pool = [threading.Thread(target=worker, args=(manager, resource_ids, stop, counts, index, read_ratio, think))
+            for index in range(threads)]
+    for thread in pool:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in pool:
+        thread.join()
+    check_invariants(manager)
+    total = sum(counts)
+    return {
+        'threads': threads,
+        'operations': total,
+        'throughput': total / seconds,
+        'events': manager.allocation_history.total_recorded,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--threads', default='1,2,4,8,16')
+    parser.add_argument('--seconds', type=float, default=2.0)
+    parser.add_argument('--resources', type=int, default=8)
+    parser.add_argument('--units', type=int, default=3)
+    parser.add_argument('--read-ratio', type=float, default=0.5)
+    parser.add_argument('--think-ms', type=float, default=1.0)
+    args = parser.parse_args()
+
+    baseline = None
+    for threads in (int(value) for value in args.threads.split(',')):
+        result = run(threads, args.seconds, args.resources, args.units, args.read_ratio, args.think_ms / 1000)
+        baseline = baseline or result['throughput']
+        print(f"{result['threads']:>3} threads: {result['throughput']:10.0f} ops/s "
+              f"({result['throughput'] / baseline:5.2f}x), {result['events']} events, invariants ok")
+
+
+if __name__ == '__main__':
+    main()
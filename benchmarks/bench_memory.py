@@ -0,0 +1,143 @@
+"""
+Memory benchmark for the process and resource entities.
+
+Builds a seeded workload the way the web app does, with every ID arriving
+as a new string (parsed from a request), and measures the memory held by the
+process and resource stores, counting shared objects once:
+
+    slotted  -- the manager's entities: __slots__ classes with interned IDs
+                that key every edge
+    plain    -- the same entities as plain dataclasses with an instance
+                __dict__, and edges keyed by the ID strings they were
+                created with, as before entities were slotted
+
+Usage:
+    python -m benchmarks.bench_memory [--processes N] [--resources M] [--edges E]
+"""
+
+import argparse
+import random
+import sys
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict
+
+from app.models.resource_allocation import ResourceAllocationManager
+
+
+@dataclass
+class PlainResource:
+    name: str
+    total_units: int
+    available_units: int
+    allocated_to: Dict[str, int]
+    requested_by: Dict[str, int]
+    id: str
+
+
+@dataclass
+class PlainProcess:
+    id: str
+    name: str
+    allocated_resources: Dict[str, int]
+    requested_resources: Dict[str, int]
+    creation_time: datetime
+    max_claims: Dict[str, int]
+    priority: int
+
+
+def fresh(entity_id: str) -> str:
+    """A new string equal to entity_id, as decoding a request yields."""
+    return entity_id.encode().decode()
+
+
+def build(processes: int, resources: int, edges: int, seed: int) -> ResourceAllocationManager:
+    """Build a manager holding the given number of entities and edges."""
+    rng = random.Random(seed)
+    manager = ResourceAllocationManager(scheduling_policy=None, layout=False)
+    resource_ids = [manager.add_resource(f"R{i}", 2 * edges // resources + 2) for i in range(resources)]
+    process_ids = [manager.add_process(f"P{i}") for i in range(processes)]
+    for _ in range(edges):
+        process_id = fresh(rng.choice(process_ids))
+        resource_id = fresh(rng.choice(resource_ids))
+        if rng.random() < 0.5:
+            manager.allocate_resource(process_id, resource_id)
+        else:
+            manager.request_resource(process_id, resource_id)
+    return manager
+
+
+def plain_copies(manager) -> list:
+    """The manager's entities as plain dataclasses keyed by unshared ID strings."""
+    def edges(mapping):
+        return {fresh(entity_id): units for entity_id, units in mapping.items()}
+
+    resources = {fresh(resource.id): PlainResource(resource.name, resource.total_units, resource.available_units,
+                                                   edges(resource.allocated_to), edges(resource.requested_by),
+                                                   fresh(resource.id))
+                 for resource in manager.resources.values()}
+    processes = {fresh(process.id): PlainProcess(fresh(process.id), process.name, edges(process.allocated_resources),
+                                                 edges(process.requested_resources), process.creation_time,
+                                                 edges(process.max_claims), process.priority)
+                 for process in manager.processes.values()}
+    return [processes, resources]
+
+
+def deep_size(root) -> int:
+    """Approximate the bytes reachable from root, counting shared objects once."""
+    seen = set()
+    stack = [root]
+    total = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, type):
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif isinstance(obj, (str, bytes, int, float, datetime)):
+            continue
+        else:
+            if hasattr(obj, '__dict__'):
+                stack.append(obj.__dict__)
+            for slot in getattr(type(obj), '__slots__', ()):
+                if hasattr(obj, slot):
+                    stack.append(getattr(obj, slot))
+    return total
+
+
+def measure(processes: int, resources: int, edges: int, seed: int) -> dict:
+    manager = build(processes, resources, edges, seed)
+    entities = processes + resources
+    slotted = deep_size([manager.processes, manager.resources])
+    plain = deep_size(plain_copies(manager))
+    return {
+        'entities': entities,
+        'edges': sum(len(process.allocated_resources) + len(process.requested_resources)
+                     for process in manager.processes.values()),
+        'slotted': slotted / entities,
+        'plain': plain / entities,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--processes', type=int, default=20000)
+    parser.add_argument('--resources', type=int, default=2000)
+    parser.add_argument('--edges', type=int, default=40000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    result = measure(args.processes, args.resources, args.edges, args.seed)
+    print(f"{result['entities']} entities, {result['edges']} process edges")
+    print(f"   plain: {result['plain']:7.1f} B/entity")
+    print(f" slotted: {result['slotted']:7.1f} B/entity")
+    print(f"   ratio: {result['plain'] / result['slotted']:.2f}x smaller entity stores")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Restart benchmark for a manager persisted in an SQLite operation store.
+
+Builds a state whose allocation history holds --events events (stored as
+batches of allocations and releases, so building it stays quick), then
+measures how long a new manager takes to come back up on the same file:
+
+    replay    -- no snapshot, every stored operation is replayed
+    snapshot  -- time to write a snapshot (and drop the operations before it)
+    restore   -- after --tail more operations, restore the snapshot and
+                 replay only the tail
+
+Each restarted manager is compared with the one that built the state.
+
+Usage:
+    python -m benchmarks.bench_restart [--events N] [--batch B]
+        [--resources M] [--processes P] [--tail T]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from app.models.history import AllocationHistory
+from app.models.resource_allocation import ResourceAllocationManager
+from app.models.storage import SQLiteOperationStore
+
+
+def open_manager(path: str) -> ResourceAllocationManager:
+    return ResourceAllocationManager(storage=SQLiteOperationStore(path),
+                                     history=AllocationHistory(max_events=None),
+                                     checkpoint_interval=None)
+
+
+def fingerprint(manager) -> tuple:
+    """Summarize the state and history for comparison."""
+    return (
+        sorted((resource_id, resource.available_units, sorted(resource.allocated_to.items()))
+               for resource_id, resource in manager.resources.items()),
+        sorted(manager.processes),
+        len(manager.allocation_history),
+        manager.allocation_history[-1] if manager.allocation_history else None,
+        {resource_id: summary.count for resource_id, summary in manager.hold_times.summaries.items()},
+    )
+
+
+def build(manager, events: int, batch: int, resources: int, processes: int, rng) -> None:
+    resource_ids = [manager.add_resource(f"R{i}", processes) for i in range(resources)]
+    process_ids = [manager.add_process(f"P{i}") for i in range(processes)]
+    held = set()
+    while len(manager.allocation_history) < events:
+        operations = []
+        for _ in range(min(batch, events - len(manager.allocation_history))):
+            edge = (rng.choice(process_ids), rng.choice(resource_ids))
+            if edge in held:
+                held.remove(edge)
+                operations.append({'op': 'release', 'process_id': edge[0], 'resource_id': edge[1]})
+            else:
+                held.add(edge)
+                operations.append({'op': 'allocate', 'process_id': edge[0], 'resource_id': edge[1], 'units': 1})
+        manager.apply_batch(operations)
+
+
+def timed(function):
+    started = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--events', type=int, default=1_000_000)
+    parser.add_argument('--batch', type=int, default=1000)
+    parser.add_argument('--resources', type=int, default=50)
+    parser.add_argument('--processes', type=int, default=200)
+    parser.add_argument('--tail', type=int, default=1000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    path = os.path.join(tempfile.mkdtemp(), 'state.db')
+    manager = open_manager(path)
+    _, seconds = timed(lambda: build(manager, args.events, args.batch, args.resources, args.processes, rng))
+    print(f"built {len(manager.allocation_history)} events in {manager.storage_sequence} operations "
+          f"({seconds:.1f}s, {os.path.getsize(path) / 2**20:.0f} MiB)")
+
+    replayed, seconds = timed(lambda: open_manager(path))
+    assert fingerprint(replayed) == fingerprint(manager), "replay diverged"
+    print(f"replay:   {seconds:8.2f}s")
+
+    sequence, seconds = timed(manager.checkpoint)
+    snapshot = manager.storage.load_snapshot()[1]
+    print(f"snapshot: {seconds:8.2f}s ({len(snapshot) / 2**20:.1f} MiB at operation {sequence})")
+
+    resource_ids, process_ids = list(manager.resources), list(manager.processes)
+    for _ in range(args.tail):
+        process_id, resource_id = rng.choice(process_ids), rng.choice(resource_ids)
+        if resource_id in manager.processes[process_id].allocated_resources:
+            manager.release_resource(process_id, resource_id)
+        else:
+            manager.allocate_resource(process_id, resource_id, 1)
+    restored, seconds = timed(lambda: open_manager(path))
+    assert fingerprint(restored) == fingerprint(manager), "restore diverged"
+    print(f"restore:  {seconds:8.2f}s (snapshot + {args.tail} operations)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Multi-process benchmark for managers sharing an SQLite operation log.
+
+Starts N worker processes, each with its own ResourceAllocationManager on
+the same SQLiteOperationStore, the way N server workers would run with
+RAG_STORAGE set. Each worker handles a stream of requests: reads sync and
+fetch the graph snapshot, writes allocate, request and release units of a
+shared pool of resources through the store. Every request is followed by a
+short sleep standing in for the rest of the request handling.
+
+After each run a fresh manager replays the whole log and the allocation
+invariants are checked, and every worker's final state is compared with
+it.
+
+Workers only scale while there are cores to run them and the requests spend
+time outside the manager; with --think-ms 0 on fewer cores than workers the
+numbers show the cost of the shared write lock instead.
+
+Usage:
+    python -m benchmarks.bench_workers [--workers 1,2,4] [--seconds S]
+        [--resources M] [--units U] [--read-ratio F] [--think-ms T]
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from app.models.resource_allocation import ResourceAllocationManager
+from app.models.storage import SQLiteOperationStore
+from benchmarks.bench_concurrency import check_invariants
+
+
+def fingerprint(manager) -> tuple:
+    """Summarize the allocation state for comparison across processes."""
+    return tuple(sorted(
+        (resource_id, resource.available_units, tuple(sorted(resource.allocated_to.items())),
+         tuple(sorted(resource.requested_by.items())))
+        for resource_id, resource in manager.resources.items()
+    ))
+
+
+def worker(path, index, seconds, read_ratio, think, results):
+    manager = ResourceAllocationManager(storage=SQLiteOperationStore(path))
+    rng = random.Random(index)
+    resource_ids = list(manager.resources)
+    process_id = manager.add_process(f"worker-{index}")
+    operations = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        manager.sync()
+        if rng.random() < read_ratio:
+            manager.graph_snapshot()
+        else:
+            resource_id = rng.choice(resource_ids)
+            process = manager.processes[process_id]
+            try:
+                if resource_id in process.allocated_resources:
+                    manager.release_resource(process_id, resource_id)
+                elif resource_id in process.requested_resources:
+                    manager.cancel_request(process_id, resource_id)
+                elif manager.resources[resource_id].available_units > 0:
+                    manager.allocate_resource(process_id, resource_id, 1)
+                else:
+                    manager.request_resource(process_id, resource_id, 1)
+            except ValueError:
+                # Another worker took the units first; the store refused cleanly
+                pass
+        operations += 1
+        if think:
+            time.sleep(think)
+    results.put((index, operations))
+    # Let every worker finish writing before comparing states
+    time.sleep(0.5)
+    manager.sync()
+    results.put((index, fingerprint(manager)))
+
+
+def run(workers: int, seconds: float, resources: int, units: int, read_ratio: float, think: float) -> dict:
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'state.db')
+    setup = ResourceAllocationManager(storage=SQLiteOperationStore(path))
+    for i in range(resources):
+        setup.add_resource(f"R{i}", units)
+
+    results = multiprocessing.Queue()
+    pool = [multiprocessing.Process(target=worker, args=(path, index, seconds, read_ratio, think, results))
+            for index in range(workers)]
+    for process in pool:
+        process.start()
+    reports = [results.get() for _ in range(2 * workers)]
+    for process in pool:
+        process.join()
+
+    replayed = ResourceAllocationManager(storage=SQLiteOperationStore(path))
+    check_invariants(replayed)
+    expected = fingerprint(replayed)
+    operations = sum(value for _, value in reports if isinstance(value, int))
+    states = [value for _, value in reports if isinstance(value, tuple)]
+    assert all(state == expected for state in states), "workers diverged from the stored log"
+    return {
+        'workers': workers,
+        'operations': operations,
+        'throughput': operations / seconds,
+        'stored': replayed.storage_sequence,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--workers', default='1,2,4')
+    parser.add_argument('--seconds', type=float, default=3.0)
+    parser.add_argument('--resources', type=int, default=8)
+    parser.add_argument('--units', type=int, default=3)
+    parser.add_argument('--read-ratio', type=float, default=0.8)
+    parser.add_argument('--think-ms', type=float, default=1.0)
+    args = parser.parse_args()
+
+    baseline = None
+    for workers in (int(value) for value in args.workers.split(',')):
+        result = run(workers, args.seconds, args.resources, args.units, args.read_ratio, args.think_ms / 1000)
+        baseline = baseline or result['throughput']
+        print(f"{result['workers']:>3} workers: {result['throughput']:10.0f} requests/s "
+              f"({result['throughput'] / baseline:5.2f}x), {result['stored']} stored operations, consistent")
+
+
+if __name__ == '__main__':
+    main()
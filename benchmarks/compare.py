@@ -0,0 +1,87 @@
+"""
+Compare two result files of benchmarks.suite.
+
+Targets are matched by scenario and name. A target regresses when its
+throughput drops, or its p99 latency or peak memory grows, by more than the
+threshold (a fraction, 0.25 by default). Exits with status 1 if any target
+regressed, so it can gate a CI job.
+
+Usage:
+    python -m benchmarks.compare baseline.json current.json [--threshold 0.25]
+        [--all]
+"""
+
+import argparse
+import json
+import sys
+from typing import Dict, List, Optional, Tuple
+
+# Metric -> whether higher is better
+METRICS = {
+    'ops_per_sec': True,
+    'p99_us': False,
+    'peak_bytes': False,
+}
+
+
+def load(path: str) -> Tuple[dict, Dict[Tuple[str, str], dict]]:
+    with open(path) as source:
+        data = json.load(source)
+    return data.get('meta', {}), {(result['scenario'], result['target']): result for result in data['results']}
+
+
+def change(baseline: Optional[float], current: Optional[float]) -> Optional[float]:
+    """Relative change from baseline to current, None if either is missing."""
+    if baseline is None or current is None or baseline == 0:
+        return None
+    return current / baseline - 1
+
+
+def compare(baseline: Dict[tuple, dict], current: Dict[tuple, dict], threshold: float) -> List[dict]:
+    """Return one row per target present in both files, with its changes and regressions."""
+    rows = []
+    for key in sorted(baseline.keys() & current.keys()):
+        changes = {metric: change(baseline[key].get(metric), current[key].get(metric)) for metric in METRICS}
+        regressions = [metric for metric, higher_is_better in METRICS.items()
+                       if changes[metric] is not None
+                       and (-changes[metric] if higher_is_better else changes[metric]) > threshold]
+        rows.append({'scenario': key[0], 'target': key[1], 'changes': changes, 'regressions': regressions})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type=float, default=0.25)
+    parser.add_argument('--all', action='store_true', help="list every target, not only regressions")
+    args = parser.parse_args()
+
+    baseline_meta, baseline = load(args.baseline)
+    current_meta, current = load(args.current)
+    rows = compare(baseline, current, args.threshold)
+    print(f"baseline {baseline_meta.get('commit')} ({baseline_meta.get('timestamp')}), "
+          f"current {current_meta.get('commit')} ({current_meta.get('timestamp')})")
+    for key in sorted(baseline.keys() ^ current.keys()):
+        print(f"only in {'baseline' if key in baseline else 'current'}: {key[0]} / {key[1]}")
+
+    def fmt(value: Optional[float]) -> str:
+        return '-' if value is None else f"{value * 100:+.0f}%"
+
+    print(f"\n{'scenario':<10} {'target':<44} {'ops/s':>8} {'p99':>8} {'peak':>8}")
+    regressed = 0
+    for row in rows:
+        if row['regressions']:
+            regressed += 1
+        elif not args.all:
+            continue
+        changes = row['changes']
+        print(f"{row['scenario']:<10} {row['target']:<44} {fmt(changes['ops_per_sec']):>8} "
+              f"{fmt(changes['p99_us']):>8} {fmt(changes['peak_bytes']):>8}"
+              f"{'  REGRESSED ' + ', '.join(row['regressions']) if row['regressions'] else ''}")
+    print(f"\n{regressed} of {len(rows)} targets regressed beyond {args.threshold * 100:.0f}%")
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,361 @@
+"""
+Benchmark suite for ResourceAllocationManager and the JSON API.
+
+For every scenario of benchmarks.workloads, replays the generated operation
+stream on a fresh manager and measures every manager method:
+
+    mutations   -- each operation of the stream, by manager method, and
+                   the whole stream again through apply_batch in chunks
+    reads       -- every read method, called at regular points of the
+                   stream so that they see a changing state
+    endpoints   -- the JSON endpoints of app.py (Flask test client) and
+                   asgi.py (in-process ASGI calls) on the final state
+
+Each target gets its call count, throughput (calls per second spent in the
+call), p50/p99/mean latency and the peak memory allocated during one call
+(measured in a separate pass under tracemalloc, which would distort the
+timings). Results are written as JSON for benchmarks.compare.
+
+Usage:
+    python -m benchmarks.suite [--scenarios testfield,mixed,hotspot,cycles]
+        [--scale F] [--output results.json] [--batch-size B]
+        [--endpoint-calls N] [--no-endpoints] [--no-memory]
+"""
+
+import argparse
+import asyncio
+import gc
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+
+import networkx as nx
+import numpy as np
+
+from app.models.batch import BATCH_OPERATIONS
+from app.models.deltas import DeltaLog
+from app.models.resource_allocation import ResourceAllocationManager, DEFAULT_CYCLE_LIMIT
+from benchmarks.workloads import SCENARIOS, Workload, generate, scaled
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Read methods measured between operations, by name
+READ_METHODS: Dict[str, Callable[[ResourceAllocationManager], object]] = {
+    'get_graph_data': lambda manager: manager.get_graph_data(),
+    'get_processes': lambda manager: manager.get_processes(),
+    'get_resources': lambda manager: manager.get_resources(),
+    'find_processes': lambda manager: manager.find_processes(),
+    'find_resources': lambda manager: manager.find_resources(utilization='full'),
+    'deadlocked_processes': lambda manager: manager.deadlocked_processes(),
+    'detect_deadlock': lambda manager: manager.detect_deadlock(),
+    'find_cycles': lambda manager: manager.find_cycles(DEFAULT_CYCLE_LIMIT),
+    'is_safe_state': lambda manager: manager.is_safe_state(),
+    'resource_utilization': lambda manager: manager.resource_utilization(),
+    'analyze_resource_usage': lambda manager: manager.analyze_resource_usage(),
+    'get_optimization_recommendations': lambda manager: manager.get_optimization_recommendations(),
+    'export_state': lambda manager: manager.export_state(),
+}
+
+# Calls of each read method per scenario
+READ_CALLS = 100
+
+# Operations replayed under tracemalloc for the memory pass
+MEMORY_OPERATIONS = 2000
+
+
+class Samples:
+    """Latencies (ns) and rejections collected per target."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[int]] = defaultdict(list)
+        self.rejected: Dict[str, int] = defaultdict(int)
+        self.peak_bytes: Dict[str, int] = defaultdict(int)
+
+    def time(self, target: str, call: Callable[[], object]) -> None:
+        started = time.perf_counter_ns()
+        try:
+            call()
+        except ValueError:
+            self.rejected[target] += 1
+        finally:
+            self.latencies[target].append(time.perf_counter_ns() - started)
+
+    def results(self, scenario: str, kind: str) -> List[dict]:
+        results = []
+        for target, latencies in self.latencies.items():
+            latencies = np.array(latencies, dtype=np.int64)
+            results.append({
+                'scenario': scenario,
+                'kind': kind,
+                'target': target,
+                'calls': len(latencies),
+                'rejected': self.rejected.get(target, 0),
+                'ops_per_sec': round(len(latencies) / (latencies.sum() / 1e9), 1),
+                'p50_us': round(float(np.percentile(latencies, 50)) / 1e3, 2),
+                'p99_us': round(float(np.percentile(latencies, 99)) / 1e3, 2),
+                'mean_us': round(float(latencies.mean()) / 1e3, 2),
+                'peak_bytes': self.peak_bytes.get(target),
+            })
+        return results
+
+
+def operation_call(manager, operation: dict):
+    """Return (method name, zero-argument call) for an apply_batch style operation."""
+    method, accepted = BATCH_OPERATIONS[operation['op']]
+    arguments = {name: operation[name] for name in accepted if name in operation}
+    return method, lambda: getattr(manager, method)(**arguments)
+
+
+def run_methods(workload: Workload, batch_size: int) -> Samples:
+    """Time every operation of the stream and the read methods in between."""
+    samples = Samples()
+    manager = ResourceAllocationManager()
+    workload.apply_setup(manager)
+    read_every = max(1, len(workload.operations) // READ_CALLS)
+    for index, operation in enumerate(workload.operations):
+        method, call = operation_call(manager, operation)
+        samples.time(method, call)
+        if index % read_every == 0:
+            for name, read in READ_METHODS.items():
+                samples.time(name, lambda: read(manager))
+
+    manager = ResourceAllocationManager()
+    workload.apply_setup(manager)
+    for start in range(0, len(workload.operations), batch_size):
+        batch = workload.operations[start:start + batch_size]
+        samples.time('apply_batch', lambda: manager.apply_batch(batch))
+    return samples
+
+
+def measure_memory(workload: Workload, samples: Samples, batch_size: int) -> int:
+    """
+    Record the peak bytes allocated by one call of each target in samples,
+    and return the memory held by the manager after the whole stream.
+    """
+    def traced(target: str, call: Callable[[], object]) -> None:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        try:
+            call()
+        except ValueError:
+            pass
+        samples.peak_bytes[target] = max(samples.peak_bytes[target],
+                                         tracemalloc.get_traced_memory()[1] - before)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        manager = ResourceAllocationManager()
+        workload.apply_setup(manager)
+        operations = workload.operations[:MEMORY_OPERATIONS]
+        read_every = max(1, len(operations) // 10)
+        for index, operation in enumerate(operations):
+            traced(*operation_call(manager, operation))
+            if index % read_every == 0:
+                for name, read in READ_METHODS.items():
+                    traced(name, lambda: read(manager))
+        traced('apply_batch', lambda: manager.apply_batch(workload.operations[:batch_size]))
+
+        del manager
+        gc.collect()
+        before = tracemalloc.get_traced_memory()[0]
+        manager = ResourceAllocationManager()
+        workload.apply_setup(manager)
+        for operation in workload.operations:
+            try:
+                operation_call(manager, operation)[1]()
+            except ValueError:
+                pass
+        gc.collect()
+        return tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+
+def load_flask_app():
+    """Import app.py (shadowed by the app package) without persistent storage."""
+    os.environ['RAG_STORAGE'] = ''
+    spec = importlib.util.spec_from_file_location('rag_web', os.path.join(ROOT, 'app.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def attach(module, manager) -> None:
+    """Point an entry point module at manager, with its own analytics engine."""
+    from app.models.analytics import AnalyticsEngine
+    module.resource_manager = manager
+    module.analytics.shutdown()
+    module.analytics = AnalyticsEngine(manager)
+    if getattr(module, 'notifier', None) is not None:
+        # Bound to the previous manager and event loop
+        module.notifier.close()
+        module.notifier = None
+
+
+def endpoint_cases(manager) -> List[tuple]:
+    """
+    Return (name, method, path, headers, body, prepare) cases; prepare runs
+    untimed before each call, e.g. to change the state so caches are cold.
+    """
+    resource_id = manager.add_resource('bench', 2)
+    process_id = manager.add_process('bench')
+    units = iter(range(10 ** 9))
+
+    def touch():
+        manager.set_resource_units(resource_id, 2 + next(units) % 2)
+
+    def current_etag():
+        return manager.graph_snapshot().etag
+
+    batch = json.dumps([
+        {'op': 'allocate', 'process_id': process_id, 'resource_id': resource_id, 'units': 1},
+        {'op': 'release', 'process_id': process_id, 'resource_id': resource_id},
+    ]).encode()
+    return [
+        ('GET /api/graph-data', 'GET', '/api/graph-data', lambda: {}, b'', touch),
+        ('GET /api/graph-data (304)', 'GET', '/api/graph-data',
+         lambda: {'If-None-Match': f'"{current_etag()}"'}, b'', None),
+        ('GET /api/check-deadlock', 'GET', '/api/check-deadlock', lambda: {}, b'', touch),
+        ('POST /api/batch', 'POST', '/api/batch', lambda: {'Content-Type': 'application/json'}, batch, None),
+    ]
+
+
+ASGI_ONLY_CASES = [
+    ('GET /api/analysis', 'GET', '/api/analysis'),
+    ('GET /api/recommendations', 'GET', '/api/recommendations'),
+]
+
+
+def run_endpoints(manager, flask_module, asgi_module, calls: int) -> Samples:
+    samples = Samples()
+    cases = endpoint_cases(manager)
+    touch = cases[0][5]
+    # Analyses are recomputed in the worker processes after every change
+    cases += [(name, method, path, lambda: {}, b'', touch) for name, method, path in ASGI_ONLY_CASES]
+
+    attach(flask_module, manager)
+    client = flask_module.app.test_client()
+    for name, method, path, headers, body, prepare in cases:
+        if path in ('/api/analysis', '/api/recommendations'):
+            continue
+        for _ in range(calls):
+            if prepare:
+                prepare()
+            request_headers = headers()
+            samples.time(f"flask {name}", lambda: client.open(path, method=method, headers=request_headers,
+                                                               data=body))
+    flask_module.analytics.shutdown()
+
+    attach(asgi_module, manager)
+
+    async def call(method, path, headers, body):
+        async def receive():
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        async def send(message):
+            pass
+
+        await asgi_module.app({'type': 'http', 'method': method, 'path': path, 'query_string': b'',
+                               'headers': [(key.lower().encode(), value.encode()) for key, value in headers.items()]},
+                              receive, send)
+
+    async def run_cases():
+        for name, method, path, headers, body, prepare in cases:
+            count = calls if path not in ('/api/analysis', '/api/recommendations') else max(1, calls // 10)
+            for _ in range(count):
+                if prepare:
+                    await asyncio.get_running_loop().run_in_executor(None, prepare)
+                request_headers = headers()
+                started = time.perf_counter_ns()
+                await call(method, path, request_headers, body)
+                samples.latencies[f"asgi {name}"].append(time.perf_counter_ns() - started)
+
+    asyncio.run(run_cases())
+    asgi_module.analytics.shutdown()
+    return samples
+
+
+def metadata(args) -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'numpy': np.__version__,
+        'networkx': nx.__version__,
+        'arguments': vars(args),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--scale', type=float, default=1.0)
+    parser.add_argument('--output')
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--endpoint-calls', type=int, default=200)
+    parser.add_argument('--no-endpoints', action='store_true')
+    parser.add_argument('--no-memory', action='store_true')
+    args = parser.parse_args()
+
+    if not args.no_endpoints:
+        flask_module = load_flask_app()
+        sys.path.insert(0, ROOT)
+        import asgi as asgi_module
+
+    results, scenarios = [], {}
+    for name in args.scenarios.split(','):
+        workload = generate(scaled(SCENARIOS[name], args.scale))
+        started = time.perf_counter()
+        samples = run_methods(workload, args.batch_size)
+        manager_bytes = None if args.no_memory else measure_memory(workload, samples, args.batch_size)
+        results += samples.results(name, 'method')
+        if not args.no_endpoints:
+            manager = ResourceAllocationManager(deltas=DeltaLog())
+            workload.apply_setup(manager)
+            for operation in workload.operations:
+                try:
+                    operation_call(manager, operation)[1]()
+                except ValueError:
+                    pass
+            results += run_endpoints(manager, flask_module, asgi_module, args.endpoint_calls).results(name, 'endpoint')
+        scenarios[name] = {
+            'spec': dict(workload.spec.__dict__),
+            'operations': len(workload.operations),
+            'manager_bytes': manager_bytes,
+            'seconds': round(time.perf_counter() - started, 2),
+        }
+
+        print(f"\n{name}: {len(workload.operations)} operations, "
+              f"{(manager_bytes or 0) / 1024:.0f} KB held by the manager")
+        print(f"{'target':<44} {'calls':>7} {'ops/s':>11} {'p50 us':>10} {'p99 us':>10} {'peak KB':>9}")
+        for result in results:
+            if result['scenario'] == name:
+                peak = result['peak_bytes']
+                print(f"{result['target']:<44} {result['calls']:>7} {result['ops_per_sec']:>11.0f} "
+                      f"{result['p50_us']:>10.1f} {result['p99_us']:>10.1f} "
+                      f"{'-' if peak is None else f'{peak / 1024:.1f}':>9}")
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'meta': metadata(args), 'scenarios': scenarios, 'results': results}, output, indent=1)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
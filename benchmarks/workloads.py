@@ -0,0 +1,172 @@
+"""
+Seeded synthetic workloads for ResourceAllocationManager benchmarks.
+
+A workload is a setup phase (resources and processes with fixed IDs) and a
+stream of operations in the apply_batch format ({'op': 'allocate', ...}),
+generated from a WorkloadSpec and a seed only, so the same spec always
+produces the same workload on every machine and every version. Operations
+are drawn from a weighted mix and kept mostly valid by tracking the edges
+they create; the few the manager still rejects (e.g. no units left) are
+part of the workload.
+
+Shapes:
+    random  -- operations pick processes and resources uniformly
+    hotspot -- most operations target a few resources, so requests queue up
+    cycles  -- every process holds one single-unit resource and requests
+               the ones held by the next processes in a ring, which
+               deadlocks them in many overlapping cycles before the mix
+               runs (adversarial for cycle enumeration)
+"""
+
+import random
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+# Default operation mix, as relative weights
+DEFAULT_MIX = {
+    'allocate': 4,
+    'request': 3,
+    'release': 4,
+    'cancel': 1,
+    'add_process': 0.2,
+    'remove_process': 0.2,
+    'set_units': 0.1,
+}
+
+SHAPES = ('random', 'hotspot', 'cycles')
+
+
+@dataclass(frozen=True)
+class WorkloadSpec:
+    """Parameters of a generated workload."""
+    name: str
+    processes: int
+    resources: int
+    operations: int
+    shape: str = 'random'
+    min_units: int = 1
+    max_units: int = 4
+    mix: Dict[str, float] = field(default_factory=lambda: dict(DEFAULT_MIX))
+    # For 'cycles': how many of the next processes each one waits for
+    ring_span: int = 2
+    seed: int = 0
+
+
+@dataclass
+class Workload:
+    """Setup and operation stream of a WorkloadSpec."""
+    spec: WorkloadSpec
+    setup: List[dict]
+    operations: List[dict]
+
+    def apply_setup(self, manager) -> None:
+        """Create the workload's resources and processes (and, for 'cycles', its deadlock)."""
+        manager.apply_batch(self.setup)
+
+
+# Named scenarios of the benchmark suite, at scale 1
+SCENARIOS = {
+    # Scenario 9 of Testfield.rtf: 20 resources with 1-10 units, 50 processes
+    'testfield': WorkloadSpec('testfield', processes=50, resources=20, operations=5000,
+                              min_units=1, max_units=10),
+    'mixed': WorkloadSpec('mixed', processes=2000, resources=200, operations=20000),
+    'hotspot': WorkloadSpec('hotspot', processes=1000, resources=100, operations=20000, shape='hotspot',
+                            mix=dict(DEFAULT_MIX, request=6)),
+    'cycles': WorkloadSpec('cycles', processes=300, resources=300, operations=5000, shape='cycles',
+                           min_units=1, max_units=1, ring_span=3),
+}
+
+
+def scaled(spec: WorkloadSpec, scale: float) -> WorkloadSpec:
+    """Return spec with its entity and operation counts multiplied by scale."""
+    return WorkloadSpec(**dict(spec.__dict__,
+                               processes=max(2, int(spec.processes * scale)),
+                               resources=max(2, int(spec.resources * scale)),
+                               operations=max(1, int(spec.operations * scale))))
+
+
+def generate(spec: WorkloadSpec) -> Workload:
+    """Generate the workload of a spec; deterministic for a given spec."""
+    if spec.shape not in SHAPES:
+        raise ValueError(f"Unknown workload shape: {spec.shape}")
+    rng = random.Random(spec.seed)
+    resource_ids = [f"R{i}" for i in range(spec.resources)]
+    process_ids = [f"P{i}" for i in range(spec.processes)]
+    setup = [{'op': 'add_resource', 'name': f"Resource {i}", 'resource_id': resource_id,
+              'units': rng.randint(spec.min_units, spec.max_units)}
+             for i, resource_id in enumerate(resource_ids)]
+    setup += [{'op': 'add_process', 'name': f"Process {i}", 'process_id': process_id}
+              for i, process_id in enumerate(process_ids)]
+
+    held: Dict[Tuple[str, str], None] = {}
+    requested: Dict[Tuple[str, str], None] = {}
+    if spec.shape == 'cycles':
+        for i, process_id in enumerate(process_ids):
+            resource_id = resource_ids[i % len(resource_ids)]
+            setup.append({'op': 'allocate', 'process_id': process_id, 'resource_id': resource_id, 'units': 1})
+            held[(process_id, resource_id)] = None
+        for i, process_id in enumerate(process_ids):
+            for step in range(1, spec.ring_span + 1):
+                resource_id = resource_ids[(i + step) % len(resource_ids)]
+                if (process_id, resource_id) not in held:
+                    setup.append({'op': 'request', 'process_id': process_id, 'resource_id': resource_id,
+                                  'units': 1})
+                    requested[(process_id, resource_id)] = None
+
+    hot = resource_ids[:max(1, len(resource_ids) // 20)]
+    kinds = list(spec.mix)
+    weights = [spec.mix[kind] for kind in kinds]
+    live = list(process_ids)
+    next_process = len(process_ids)
+
+    def pick_resource() -> str:
+        if spec.shape == 'hotspot' and rng.random() < 0.8:
+            return rng.choice(hot)
+        return rng.choice(resource_ids)
+
+    def pick_edge(edges: Dict[Tuple[str, str], None]) -> Tuple[str, str]:
+        # Sample one of the first edges; random enough, and O(1)
+        for index, edge in enumerate(edges):
+            if index >= 8 or rng.random() < 0.5:
+                return edge
+        return edge
+
+    operations = []
+    while len(operations) < spec.operations:
+        kind = rng.choices(kinds, weights)[0]
+        if kind in ('allocate', 'request'):
+            if not live:
+                continue
+            edge = (rng.choice(live), pick_resource())
+            if edge in held or edge in requested:
+                continue
+            (held if kind == 'allocate' else requested)[edge] = None
+            operations.append({'op': kind, 'process_id': edge[0], 'resource_id': edge[1],
+                               'units': 1 if spec.max_units == 1 else rng.randint(1, 2)})
+        elif kind in ('release', 'cancel'):
+            edges = held if kind == 'release' else requested
+            if not edges:
+                continue
+            edge = pick_edge(edges)
+            del edges[edge]
+            operations.append({'op': kind, 'process_id': edge[0], 'resource_id': edge[1]})
+        elif kind == 'add_process':
+            process_id = f"P{next_process}"
+            next_process += 1
+            live.append(process_id)
+            operations.append({'op': 'add_process', 'name': f"Process {process_id[1:]}",
+                               'process_id': process_id})
+        elif kind == 'remove_process':
+            if len(live) < 2:
+                continue
+            process_id = live.pop(rng.randrange(len(live)))
+            for edges in (held, requested):
+                for edge in [edge for edge in edges if edge[0] == process_id]:
+                    del edges[edge]
+            operations.append({'op': 'remove_process', 'process_id': process_id})
+        elif kind == 'set_units':
+            operations.append({'op': 'set_units', 'resource_id': pick_resource(),
+                               'total_units': rng.randint(spec.min_units, spec.max_units + 2)})
+        else:
+            raise ValueError(f"Unknown operation in mix: {kind}")
+    return Workload(spec, setup, operations)
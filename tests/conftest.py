@@ -0,0 +1,188 @@
+"""
+Shared fixtures and helpers of the test suite.
+
+Run from the repository root with ``python -m pytest``. The web entry
+points are loaded with persistence off (RAG_STORAGE unset) and attached to
+a fresh manager for every test.
+"""
+
+import asyncio
+import importlib.util
+import os
+import sys
+from typing import Iterable, Tuple
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app.models.analytics import AnalyticsEngine  # noqa: E402
+from app.models.batch import BATCH_OPERATIONS  # noqa: E402
+from app.models.deltas import DeltaLog  # noqa: E402
+from app.models.resource_allocation import ResourceAllocationManager  # noqa: E402
+from benchmarks.workloads import WorkloadSpec, generate  # noqa: E402
+
+os.environ.pop('RAG_STORAGE', None)
+
+
+def apply_operations(manager, operations: Iterable[dict]) -> int:
+    """
+    Apply apply_batch style operations one call at a time, skipping those
+    the manager rejects (as generated workloads expect). Returns how many
+    were applied.
+    """
+    applied = 0
+    for operation in operations:
+        method, accepted = BATCH_OPERATIONS[operation['op']]
+        try:
+            getattr(manager, method)(**{name: operation[name] for name in accepted if name in operation})
+        except ValueError:
+            continue
+        applied += 1
+    return applied
+
+
+def workload_manager(seed: int, processes: int = 30, resources: int = 10, operations: int = 300,
+                     shape: str = 'random', **options) -> ResourceAllocationManager:
+    """A manager after the setup and operations of a generated workload."""
+    workload = generate(WorkloadSpec(f"test-{seed}", processes=processes, resources=resources,
+                                     operations=operations, shape=shape, seed=seed))
+    manager = ResourceAllocationManager(**options)
+    workload.apply_setup(manager)
+    apply_operations(manager, workload.operations)
+    return manager
+
+
+def state_of(manager) -> dict:
+    """Everything observable about a manager's entities and queues, for equality checks."""
+    return {
+        'processes': {
+            process_id: (process.name, process.priority, dict(process.allocated_resources),
+                         dict(process.requested_resources), dict(process.max_claims))
+            for process_id, process in manager.processes.items()
+        },
+        'resources': {
+            resource_id: (resource.name, resource.total_units, resource.available_units,
+                          dict(resource.allocated_to), dict(resource.requested_by))
+            for resource_id, resource in manager.resources.items()
+        },
+        'queues': {resource_id: (queue.policy, queue.waiting())
+                   for resource_id, queue in manager.request_queues.items() if queue},
+    }
+
+
+def brute_force_blocked(available, holdings, demands) -> set:
+    """
+    Textbook graph reduction: repeatedly let any process whose demands all
+    fit finish and return its holdings, until none can; the rest are blocked.
+    """
+    work = dict(available)
+    unfinished = set(holdings) | set(demands)
+    progress = True
+    while progress:
+        progress = False
+        for process_id in sorted(unfinished):
+            if all(units <= work.get(resource_id, 0)
+                   for resource_id, units in demands.get(process_id, {}).items()):
+                for resource_id, units in holdings.get(process_id, {}).items():
+                    work[resource_id] = work.get(resource_id, 0) + units
+                unfinished.discard(process_id)
+                progress = True
+    return unfinished
+
+
+def manager_blocked(manager) -> set:
+    """brute_force_blocked() on a manager's current state."""
+    return brute_force_blocked(
+        {resource_id: resource.available_units for resource_id, resource in manager.resources.items()},
+        {process_id: process.allocated_resources for process_id, process in manager.processes.items()},
+        {process_id: process.requested_resources for process_id, process in manager.processes.items()})
+
+
+def _load_flask_module():
+    spec = importlib.util.spec_from_file_location('rag_web', os.path.join(ROOT, 'app.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _attach(module, manager) -> None:
+    module.resource_manager = manager
+    module.analytics.shutdown()
+    module.analytics = AnalyticsEngine(manager, workers=1)
+    if getattr(module, 'notifier', None) is not None:
+        module.notifier.close()
+        module.notifier = None
+
+
+@pytest.fixture
+def manager():
+    return ResourceAllocationManager()
+
+
+@pytest.fixture(scope='session')
+def flask_module():
+    module = _load_flask_module()
+    module.app.config['TESTING'] = True
+    yield module
+    module.analytics.shutdown()
+
+
+@pytest.fixture(scope='session')
+def asgi_module():
+    import asgi
+    yield asgi
+    asgi.analytics.shutdown()
+
+
+@pytest.fixture
+def web_manager(flask_module, asgi_module):
+    """A fresh manager (with a delta log) served by both entry points."""
+    manager = ResourceAllocationManager(deltas=DeltaLog())
+    _attach(flask_module, manager)
+    _attach(asgi_module, manager)
+    yield manager
+    flask_module.analytics.shutdown()
+    asgi_module.analytics.shutdown()
+
+
+@pytest.fixture
+def client(flask_module, web_manager):
+    return flask_module.app.test_client()
+
+
+@pytest.fixture
+def asgi_call(asgi_module, web_manager):
+    """
+    Call the ASGI app in-process: asgi_call(method, path, query=b'', body=b'',
+    headers=()) returns (status, headers dict, body bytes).
+    """
+    def call(method: str, path: str, query: bytes = b'', body: bytes = b'',
+             headers: Iterable[Tuple[str, str]] = ()):
+        messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        sent = []
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            await asyncio.sleep(3600)
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query,
+                 'headers': [(name.encode('latin-1'), value.encode('latin-1')) for name, value in headers]}
+        try:
+            asyncio.run(asgi_module.app(scope, receive, send))
+        finally:
+            # The notifier is bound to the event loop of this call
+            if asgi_module.notifier is not None:
+                asgi_module.notifier.close()
+                asgi_module.notifier = None
+        start = sent[0]
+        return (start['status'],
+                {name.decode('latin-1'): value.decode('latin-1') for name, value in start['headers']},
+                b''.join(message.get('body', b'') for message in sent[1:]))
+    return call
@@ -0,0 +1,85 @@
+"""Analyses computed in worker processes equal the in-process ones."""
+
+import pytest
+
+from app.models.analytics import (FULL_CYCLE_LIMIT, INLINE_CYCLE_LIMIT, AnalyticsEngine,
+                                  inline_cycle_listing)
+from conftest import workload_manager
+
+
+@pytest.fixture
+def engine_for():
+    """engine_for(manager) -> a one-worker engine, shut down after the test."""
+    engines = []
+
+    def create(manager):
+        engines.append(AnalyticsEngine(manager, workers=1, timeout=60))
+        return engines[-1]
+    yield create
+    for engine in engines:
+        engine.shutdown()
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_deadlock_detection_matches(engine_for, seed):
+    manager = workload_manager(seed, processes=25, resources=25, operations=200, shape='cycles')
+    engine = engine_for(manager)
+    for max_cycles in (5, FULL_CYCLE_LIMIT):
+        assert engine.result('deadlock', max_cycles=max_cycles) == manager.detect_deadlock(max_cycles=max_cycles)
+
+
+def test_usage_analyses_match(engine_for):
+    manager = workload_manager(3, processes=30, resources=8, operations=600)
+    engine = engine_for(manager)
+    assert engine.result('analysis') == manager.analyze_resource_usage()
+    assert engine.result('recommendations') == manager.get_optimization_recommendations()
+
+
+def test_results_are_cached_per_version(engine_for):
+    manager = workload_manager(4, operations=100)
+    engine = engine_for(manager)
+    first = engine.submit('deadlock', max_cycles=10)
+    assert engine.submit('deadlock', max_cycles=10) is first
+    assert engine.submit('deadlock', max_cycles=20) is not first
+    first.result(timeout=60)
+
+    process = manager.add_process('New')
+    second = engine.submit('deadlock', max_cycles=10)
+    assert second is not first
+    assert second.result(timeout=60) == manager.detect_deadlock(max_cycles=10)
+    assert process not in second.result()['affected_processes']
+
+
+def test_workers_are_restarted_after_shutdown(engine_for, manager):
+    manager.add_resource('R', 1)
+    engine = engine_for(manager)
+    expected = manager.detect_deadlock()
+    assert engine.result('deadlock') == expected
+    engine.shutdown()
+    assert engine.result('deadlock') == expected
+
+
+def test_unknown_analyses_are_rejected(engine_for, manager):
+    with pytest.raises(ValueError):
+        engine_for(manager).submit('nonsense')
+
+
+def test_short_listings_run_inline():
+    assert inline_cycle_listing(INLINE_CYCLE_LIMIT)
+    assert not inline_cycle_listing(INLINE_CYCLE_LIMIT + 1)
+    assert not inline_cycle_listing(FULL_CYCLE_LIMIT)
+
+
+def test_full_listing_endpoint(client, web_manager):
+    resources = [web_manager.add_resource(f"R{i}", 1) for i in range(4)]
+    processes = [web_manager.add_process(f"P{i}") for i in range(4)]
+    for i, process_id in enumerate(processes):
+        web_manager.allocate_resource(process_id, resources[i])
+        web_manager.request_resource(process_id, resources[(i + 1) % 4])
+        web_manager.request_resource(process_id, resources[(i + 2) % 4])
+    expected = web_manager.detect_deadlock(max_cycles=FULL_CYCLE_LIMIT)
+    result = client.get('/api/check-deadlock?all=1').get_json()
+    assert result['has_deadlock']
+    assert result['cycles'] == expected['cycles']
+    assert result['affected_processes'] == expected['affected_processes']
+    assert len(result['cycles']) > len(client.get('/api/check-deadlock?max_cycles=1').get_json()['cycles'])
@@ -0,0 +1,184 @@
+"""The ASGI app answers like the Flask app."""
+
+import asyncio
+import json
+
+import pytest
+
+from app.models.wire import GRAPH_MEDIA_TYPE
+
+
+@pytest.fixture
+def deadlocked(web_manager):
+    """A three-process deadlock plus a process holding part of a spare resource."""
+    resources = [web_manager.add_resource(f"R{i}", 1) for i in range(3)]
+    processes = [web_manager.add_process(f"P{i}") for i in range(3)]
+    for i, process_id in enumerate(processes):
+        web_manager.allocate_resource(process_id, resources[i])
+        web_manager.request_resource(process_id, resources[(i + 1) % 3])
+    spare = web_manager.add_resource('Spare', 4)
+    waiter = web_manager.add_process('Waiter')
+    web_manager.allocate_resource(waiter, spare, 2)
+    return resources, processes
+
+
+@pytest.fixture
+def both(client, asgi_call):
+    """both(method, path, query='', payload=None) -> ((status, json) from Flask, (status, json) from ASGI)."""
+    def call(method: str, path: str, query: str = '', payload=None):
+        body = json.dumps(payload).encode() if payload is not None else b''
+        flask_response = client.open(f"{path}?{query}" if query else path, method=method,
+                                     data=body or None, content_type='application/json')
+        status, _, asgi_body = asgi_call(method, path, query.encode(), body,
+                                         (('content-type', 'application/json'),))
+        return (flask_response.status_code, flask_response.get_json()), (status, json.loads(asgi_body))
+    return call
+
+
+@pytest.mark.parametrize('path, query', [
+    ('/api/graph-data', ''),
+    ('/api/graph-data', 'deadlocked=1'),
+    ('/api/graph-data', 'around=P0&hops=2'),
+    ('/api/graph-data', 'max_nodes=2'),
+    ('/api/graph-data', 'top=abc'),
+    ('/api/check-deadlock', ''),
+    ('/api/check-deadlock', 'max_cycles=1'),
+    ('/api/processes', 'limit=2'),
+    ('/api/processes', 'deadlocked=1'),
+    ('/api/resources', 'utilization=full'),
+    ('/api/resources', 'utilization=nonsense'),
+])
+def test_reads_match(both, deadlocked, path, query):
+    flask_result, asgi_result = both('GET', path, query)
+    assert asgi_result == flask_result
+
+
+def test_graph_data_etags_and_binary(client, asgi_call, deadlocked):
+    response = client.get('/api/graph-data')
+    status, headers, body = asgi_call('GET', '/api/graph-data')
+    assert status == 200
+    assert headers['etag'] == response.headers['ETag']
+    assert json.loads(body) == response.get_json()
+    status, _, _ = asgi_call('GET', '/api/graph-data', headers=(('if-none-match', headers['etag']),))
+    assert status == 304
+
+    accept = (('accept', GRAPH_MEDIA_TYPE),)
+    binary = client.get('/api/graph-data', headers=dict(accept))
+    status, headers, body = asgi_call('GET', '/api/graph-data', headers=accept)
+    assert headers['content-type'] == GRAPH_MEDIA_TYPE
+    assert body == binary.data
+
+
+def test_resolve_deadlock_dry_run_matches(both, deadlocked, web_manager):
+    version = web_manager.version
+    flask_result, asgi_result = both('POST', '/api/apply_optimization', payload={
+        'action': 'resolve_deadlock', 'dry_run': True, 'recovery': 'abort'})
+    assert asgi_result == flask_result
+    assert asgi_result[1]['plan']['victims']
+    assert web_manager.version == version
+
+
+@pytest.mark.parametrize('payload', [
+    {},
+    {'action': 'increase_units'},
+    {'action': 'increase_units', 'resource_id': 'missing'},
+    {'action': 'resolve_deadlock', 'recovery': 'nonsense'},
+    {'action': 'resolve_deadlock', 'cost': {'victim': -1}},
+])
+def test_rejected_optimizations_match(both, deadlocked, payload):
+    flask_result, asgi_result = both('POST', '/api/apply_optimization', payload=payload)
+    assert flask_result[0] in (400, 404)
+    assert asgi_result == flask_result
+
+
+def test_unit_changes(asgi_call, deadlocked, web_manager):
+    resource = deadlocked[0][0]
+
+    def change(action):
+        status, _, body = asgi_call('POST', '/api/apply_optimization',
+                                    body=json.dumps({'action': action, 'resource_id': resource}).encode())
+        return status, json.loads(body)
+
+    status, result = change('increase_units')
+    assert status == 200 and result['success']
+    # The new unit went to the process waiting for it, which ends the deadlock
+    assert web_manager.resources[resource].total_units == 2
+    assert len(web_manager.resources[resource].allocated_to) == 2
+    assert not web_manager.deadlocked_processes()
+    # Units that are allocated cannot be taken away
+    status, result = change('decrease_units')
+    assert status == 400 and not result['success']
+
+
+def test_batches_match(client, asgi_call, web_manager):
+    operations = [{'op': 'add_resource', 'name': 'R', 'units': 2, 'resource_id': 'R'},
+                  {'op': 'add_process', 'name': 'P', 'process_id': 'P'},
+                  {'op': 'allocate', 'process_id': 'P', 'resource_id': 'R', 'units': 2},
+                  {'op': 'request', 'process_id': 'P', 'resource_id': 'missing'}]
+    for payload in (operations[:3], {'operations': operations}, {'operations': {}}, 'nonsense'):
+        web_manager.reset()
+        flask_response = client.post('/api/batch', json=payload)
+        flask_state = web_manager.get_graph_data()
+        web_manager.reset()
+        status, _, body = asgi_call('POST', '/api/batch', body=json.dumps(payload).encode())
+        assert (status, json.loads(body)) == (flask_response.status_code, flask_response.get_json())
+        assert web_manager.get_graph_data()['nodes'] == flask_state['nodes']
+    assert json.loads(body)['success'] is False
+
+
+def test_unknown_routes_methods_and_large_bodies(asgi_call):
+    status, _, body = asgi_call('GET', '/api/nothing')
+    assert status == 404
+    status, _, body = asgi_call('GET', '/api/batch')
+    assert status == 405
+    status, _, body = asgi_call('POST', '/api/batch', body=b' ' * ((1 << 20) + 1))
+    assert status == 413
+    assert json.loads(body)['error']
+
+
+def test_metrics_are_exposed(asgi_call):
+    asgi_call('GET', '/api/graph-data')
+    status, headers, body = asgi_call('GET', '/metrics')
+    assert status == 200
+    assert headers['content-type'].startswith('text/plain')
+    assert b'http_requests_total{method="GET",route="/api/graph-data",status="200"}' in body
+
+
+def test_graph_stream(asgi_module, web_manager):
+    web_manager.add_resource('R', 1)
+    events = []
+    finished = None
+
+    async def run():
+        nonlocal finished
+        finished = asyncio.Event()
+        requested = False
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await finished.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] != 'http.response.body':
+                return
+            events.append(message['body'].decode())
+            if len(events) == 1:
+                web_manager.add_process('P')
+            else:
+                finished.set()
+
+        scope = {'type': 'http', 'method': 'GET', 'path': '/api/graph-stream', 'query_string': b'', 'headers': []}
+        await asyncio.wait_for(asgi_module.app(scope, receive, send), timeout=10)
+
+    try:
+        asyncio.run(run())
+    finally:
+        asgi_module.notifier.close()
+        asgi_module.notifier = None
+    assert events[0].startswith(f"id: {web_manager.version_tag(web_manager.version - 1)}\nevent: snapshot\n")
+    assert events[1].startswith(f"id: {web_manager.version_tag()}\nevent: delta\n")
+    assert json.loads(events[1].split('data: ', 1)[1])[0]['node']['label'] == 'P'
@@ -0,0 +1,137 @@
+"""Banker's algorithm safety check and avoidance mode."""
+
+import itertools
+import random
+
+import pytest
+
+from app.models.resource_allocation import ResourceAllocationManager, UnsafeAllocationError
+from app.models.storage import MemoryOperationStore
+from conftest import state_of
+
+
+def safe_by_permutations(manager) -> bool:
+    """Safe if some order of the processes lets each finish with its maximum claim."""
+    processes = list(manager.processes.values())
+    for order in itertools.permutations(processes):
+        work = {resource_id: resource.available_units for resource_id, resource in manager.resources.items()}
+        for process in order:
+            need = {resource_id: claim - process.allocated_resources.get(resource_id, 0)
+                    for resource_id, claim in process.max_claims.items()}
+            if any(units > work[resource_id] for resource_id, units in need.items()):
+                break
+            for resource_id, units in process.allocated_resources.items():
+                work[resource_id] += units
+        else:
+            return True
+    return False
+
+
+def textbook(matrix_backend: bool = False) -> ResourceAllocationManager:
+    """The five process, three resource example of Silberschatz et al., in a safe state."""
+    manager = ResourceAllocationManager(avoidance=True, matrix_backend=matrix_backend)
+    for name, units in (('A', 10), ('B', 5), ('C', 7)):
+        manager.add_resource(name, units, resource_id=name)
+    maximum = [(7, 5, 3), (3, 2, 2), (9, 0, 2), (2, 2, 2), (4, 3, 3)]
+    allocation = [(0, 1, 0), (2, 0, 0), (3, 0, 2), (2, 1, 1), (0, 0, 2)]
+    for i, (claims, held) in enumerate(zip(maximum, allocation)):
+        process_id = manager.add_process(f"P{i}", process_id=f"P{i}",
+                                         max_claims={r: u for r, u in zip('ABC', claims) if u})
+        for resource_id, units in zip('ABC', held):
+            if units:
+                manager.allocate_resource(process_id, resource_id, units)
+    return manager
+
+
+@pytest.mark.parametrize('matrix_backend', [False, True])
+def test_textbook_state_is_safe_and_grants_follow_the_algorithm(matrix_backend):
+    manager = textbook(matrix_backend)
+    assert manager.is_safe_state()
+    # P1 asking for (1, 0, 2) keeps the state safe
+    manager.allocate_resource('P1', 'A', 1)
+    manager.allocate_resource('P1', 'C', 2)
+    assert manager.is_safe_state()
+    # P0 asking for (0, 2, 0) would leave it unsafe
+    with pytest.raises(UnsafeAllocationError):
+        manager.allocate_resource('P0', 'B', 2)
+    assert manager.processes['P0'].allocated_resources == {'B': 1}
+    assert manager.is_safe_state()
+
+
+def test_unsafe_allocation_can_be_queued_instead():
+    manager = textbook()
+    manager.allocate_resource('P1', 'A', 1)
+    manager.allocate_resource('P1', 'C', 2)
+    assert manager.allocate_resource('P0', 'B', 2, on_unsafe='queue') is False
+    assert manager.processes['P0'].requested_resources == {'B': 2}
+    assert manager.processes['P0'].allocated_resources == {'B': 1}
+
+
+def test_allocations_must_stay_within_the_declared_claim():
+    manager = textbook()
+    with pytest.raises(ValueError, match='maximum claim'):
+        manager.allocate_resource('P3', 'A', 1)
+    manager.add_process('Undeclared', process_id='U')
+    with pytest.raises(ValueError, match='not declared'):
+        manager.allocate_resource('U', 'A', 1)
+
+
+def test_claims_above_capacity_or_below_holdings_are_rejected():
+    manager = textbook()
+    with pytest.raises(ValueError):
+        manager.declare_max_claim('P4', 'A', 11)
+    with pytest.raises(ValueError):
+        manager.declare_max_claim('P2', 'A', 2)
+
+
+def test_claims_cannot_drop_below_pending_requests():
+    store = MemoryOperationStore()
+    manager = ResourceAllocationManager(avoidance=True, storage=store, checkpoint_interval=None)
+    follower = ResourceAllocationManager(avoidance=True, storage=store, checkpoint_interval=None)
+    resource = manager.add_resource('R', 2)
+    holder = manager.add_process('A', max_claims={resource: 2})
+    waiter = manager.add_process('B', max_claims={resource: 2})
+    manager.allocate_resource(holder, resource, 2)
+    manager.request_resource(waiter, resource, 2)
+    with pytest.raises(ValueError, match='requested'):
+        manager.declare_max_claim(waiter, resource, 1)
+    assert manager.processes[waiter].max_claims == {resource: 2}
+
+    manager.release_resource(holder, resource)
+    assert manager.processes[waiter].allocated_resources == {resource: 2}
+    follower.sync()
+    assert state_of(follower) == state_of(manager)
+
+
+def test_grants_stop_at_requests_beyond_their_claim():
+    manager = ResourceAllocationManager(avoidance=True)
+    resource = manager.add_resource('R', 2)
+    holder = manager.add_process('A', max_claims={resource: 2})
+    waiter = manager.add_process('B', max_claims={resource: 2})
+    manager.allocate_resource(holder, resource, 2)
+    manager.request_resource(waiter, resource, 2)
+    # A claim lowered behind the manager's back holds the request up
+    # instead of failing the release that frees the units
+    manager.processes[waiter].max_claims[resource] = 1
+    manager.release_resource(holder, resource)
+    assert manager.resources[resource].allocated_to == {}
+    assert manager.resources[resource].requested_by == {waiter: 2}
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_safety_check_matches_permutations(seed):
+    rng = random.Random(seed)
+    manager = ResourceAllocationManager()
+    resource_ids = [manager.add_resource(f"R{i}", rng.randint(1, 6)) for i in range(rng.randint(1, 3))]
+    for i in range(rng.randint(1, 5)):
+        process_id = manager.add_process(f"P{i}")
+        for resource_id in resource_ids:
+            total = manager.resources[resource_id].total_units
+            held = rng.randint(0, manager.resources[resource_id].available_units)
+            manager.declare_max_claim(process_id, resource_id, rng.randint(held, total))
+            if held:
+                manager.allocate_resource(process_id, resource_id, held)
+    assert manager.is_safe_state() == safe_by_permutations(manager)
+    vectorized = ResourceAllocationManager(matrix_backend=True)
+    vectorized.restore_state(manager.export_state())
+    assert vectorized.is_safe_state() == safe_by_permutations(manager)
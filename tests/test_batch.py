@@ -0,0 +1,167 @@
+"""Atomic batches: one version when they apply, the exact prior state when they fail."""
+
+import copy
+import random
+
+import pytest
+
+from app.models.batch import BatchError
+from app.models.resource_allocation import ResourceAllocationManager, UnsafeAllocationError
+from benchmarks.workloads import WorkloadSpec, generate
+from conftest import apply_operations, state_of, workload_manager
+
+
+def full_state(manager) -> dict:
+    """state_of() plus the derived structures a rollback must also restore."""
+    return {
+        'entities': state_of(manager),
+        'version': manager.version,
+        'history': len(manager.allocation_history),
+        'hold_times': {resource_id: summary.to_dict()
+                       for resource_id, summary in manager.hold_times.summaries.items()},
+        'wait_for': copy.deepcopy(manager.wait_for.successors),
+        'deadlocked': manager.deadlocked_processes(),
+        'process_order': [process.id for process in manager.find_processes(limit=1000).items],
+        'resource_order': [resource.id for resource in manager.find_resources(limit=1000).items],
+        'matrices': matrix_cells(manager.matrices) if manager.matrices is not None else None,
+    }
+
+
+def matrix_cells(matrices) -> dict:
+    """Non-zero matrix cells by entity ID; rebuilt matrices may number rows differently."""
+    cells = {}
+    for name in ('allocation', 'request', 'maximum'):
+        matrix = getattr(matrices, name)
+        cells[name] = {(process_id, resource_id): int(matrix[row, column])
+                       for process_id, row in matrices.process_index.items()
+                       for resource_id, column in matrices.resource_index.items() if matrix[row, column]}
+    for name in ('total', 'available'):
+        cells[name] = {resource_id: int(getattr(matrices, name)[column])
+                       for resource_id, column in matrices.resource_index.items()}
+    return cells
+
+
+@pytest.mark.parametrize('seed', range(6))
+@pytest.mark.parametrize('matrix_backend', [False, True])
+def test_failed_batch_restores_the_exact_state(seed, matrix_backend):
+    manager = workload_manager(seed, processes=20, resources=8, operations=300, matrix_backend=matrix_backend)
+    workload = generate(WorkloadSpec(f"batch-{seed}", processes=20, resources=8, operations=60,
+                                     seed=seed + 100))
+    # Stay within what the workload's entities allow, then fail at the end
+    operations = [operation for operation in workload.operations if operation['op'] != 'add_process']
+    operations.append({'op': 'allocate', 'process_id': 'missing', 'resource_id': 'missing'})
+    graph = manager.get_graph_data()
+    before = full_state(manager)
+
+    with pytest.raises(BatchError):
+        manager.apply_batch(operations)
+    assert full_state(manager) == before
+    assert manager.get_graph_data() is graph
+
+
+def test_rollback_of_added_and_removed_entities(manager):
+    resource = manager.add_resource('R', 2)
+    process = manager.add_process('P')
+    manager.allocate_resource(process, resource)
+    before = full_state(manager)
+    with pytest.raises(BatchError) as error:
+        manager.apply_batch([
+            {'op': 'add_resource', 'name': 'New', 'units': 1, 'resource_id': 'R_new'},
+            {'op': 'remove_process', 'process_id': process},
+            {'op': 'set_units', 'resource_id': resource, 'total_units': 5},
+            {'op': 'delete_resource', 'resource_id': resource},
+            {'op': 'nonsense'},
+        ])
+    assert error.value.index == 4
+    assert full_state(manager) == before
+    assert 'R_new' not in manager.resources
+
+
+def test_batch_matches_applying_the_operations_one_by_one():
+    rng = random.Random(7)
+    batched = ResourceAllocationManager()
+    single = ResourceAllocationManager()
+    workload = generate(WorkloadSpec('batch-parity', processes=15, resources=6, operations=0, seed=7))
+    workload.apply_setup(batched)
+    workload.apply_setup(single)
+    applied = 0
+    for _ in range(20):
+        operations = []
+        for process_id in rng.sample(sorted(single.processes), 4):
+            process = single.processes[process_id]
+            free = sorted(set(single.resources) - set(process.requested_resources)
+                          - set(process.allocated_resources))
+            if process.allocated_resources and (not free or rng.random() < 0.4):
+                operations.append({'op': 'release', 'process_id': process_id,
+                                   'resource_id': rng.choice(sorted(process.allocated_resources))})
+            elif free:
+                operations.append({'op': 'request', 'process_id': process_id, 'resource_id': rng.choice(free)})
+        version = batched.version
+        try:
+            batched.apply_batch(operations)
+        except BatchError:
+            assert batched.version == version
+            continue
+        assert batched.version == version + 1
+        applied += 1
+        assert apply_operations(single, operations) == len(operations)
+        assert state_of(batched) == state_of(single)
+        assert batched.deadlocked_processes() == single.deadlocked_processes()
+    assert applied
+
+
+def test_results_and_grants(manager):
+    version = manager.version
+    result = manager.apply_batch([
+        {'op': 'add_resource', 'name': 'R', 'units': 1, 'resource_id': 'R'},
+        {'op': 'add_process', 'name': 'A', 'process_id': 'A'},
+        {'op': 'add_process', 'name': 'B', 'process_id': 'B'},
+        {'op': 'allocate', 'process_id': 'A', 'resource_id': 'R'},
+        {'op': 'request', 'process_id': 'B', 'resource_id': 'R'},
+        {'op': 'release', 'process_id': 'A', 'resource_id': 'R'},
+    ])
+    assert result['results'][:3] == ['R', 'A', 'B']
+    assert result['granted'] == {'R': ['B']}
+    assert result['deadlocked'] == []
+    assert manager.processes['B'].allocated_resources == {'R': 1}
+    # The grants are part of the batch's one version
+    assert manager.version == version + 1
+    history = list(manager.allocation_history)
+    assert len(history) == 4
+
+
+def test_unsafe_batches_are_rolled_back():
+    manager = ResourceAllocationManager(avoidance=True)
+    resource = manager.add_resource('R', 2)
+    first = manager.add_process('A', max_claims={resource: 2})
+    second = manager.add_process('B', max_claims={resource: 2})
+    before = full_state(manager)
+    with pytest.raises(UnsafeAllocationError):
+        manager.apply_batch([{'op': 'allocate', 'process_id': first, 'resource_id': resource},
+                             {'op': 'allocate', 'process_id': second, 'resource_id': resource}])
+    assert full_state(manager) == before
+
+
+def test_batches_cannot_be_nested(manager):
+    manager._batch = object()
+    with pytest.raises(RuntimeError):
+        manager.apply_batch([])
+
+
+def test_batch_endpoint(client, web_manager):
+    response = client.post('/api/batch', json={'operations': [
+        {'op': 'add_resource', 'name': 'R', 'units': 1, 'resource_id': 'R'},
+        {'op': 'add_process', 'name': 'P', 'process_id': 'P'},
+        {'op': 'allocate', 'process_id': 'P', 'resource_id': 'R'},
+    ]})
+    assert response.status_code == 200
+    assert response.get_json()['success']
+    version = web_manager.version
+
+    response = client.post('/api/batch', json=[{'op': 'release', 'process_id': 'P', 'resource_id': 'R'},
+                                               {'op': 'allocate', 'process_id': 'P', 'resource_id': 'nope'}])
+    assert response.status_code == 400
+    assert response.get_json()['index'] == 1
+    assert web_manager.version == version
+    assert web_manager.processes['P'].allocated_resources == {'R': 1}
+    assert client.post('/api/batch', json={'operations': 'x'}).status_code == 400
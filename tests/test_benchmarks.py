@@ -0,0 +1,101 @@
+"""Seeded workloads, the benchmark suite and the regression comparison."""
+
+import json
+import subprocess
+import sys
+
+import pytest
+
+from app.models.resource_allocation import ResourceAllocationManager
+from benchmarks import compare
+from benchmarks.workloads import SCENARIOS, WorkloadSpec, generate, scaled
+from conftest import ROOT, apply_operations, manager_blocked
+
+
+@pytest.mark.parametrize('shape', ['random', 'hotspot', 'cycles'])
+def test_workloads_depend_on_the_spec_only(shape):
+    spec = WorkloadSpec('w', processes=40, resources=40, operations=500, shape=shape, seed=5)
+    first, second = generate(spec), generate(spec)
+    assert (first.setup, first.operations) == (second.setup, second.operations)
+    other = generate(WorkloadSpec(**dict(spec.__dict__, seed=6)))
+    assert other.operations != first.operations
+    assert len(first.operations) == 500
+
+
+def test_operations_only_fail_for_lack_of_units():
+    # With units to spare, what is left to reject is mostly requests granted
+    # on the spot (so their cancel fails) and unit counts below the allocation
+    spec = WorkloadSpec('valid', processes=50, resources=20, operations=2000, min_units=100, max_units=100, seed=1)
+    workload = generate(spec)
+    manager = ResourceAllocationManager()
+    workload.apply_setup(manager)
+    assert apply_operations(manager, workload.operations) > 0.85 * len(workload.operations)
+
+
+def test_cycles_deadlock_every_process():
+    workload = generate(scaled(SCENARIOS['cycles'], 0.1))
+    manager = ResourceAllocationManager()
+    workload.apply_setup(manager)
+    assert manager.deadlocked_processes() == set(manager.processes)
+    assert manager_blocked(manager) == set(manager.processes)
+
+
+def test_hotspot_concentrates_on_few_resources():
+    spec = WorkloadSpec('hot', processes=100, resources=100, operations=3000, shape='hotspot', seed=2)
+    workload = generate(spec)
+    targets = [operation['resource_id'] for operation in workload.operations
+               if operation['op'] in ('allocate', 'request')]
+    hot = {f"R{i}" for i in range(5)}
+    assert sum(target in hot for target in targets) > 0.7 * len(targets)
+
+
+def test_scaling_and_validation():
+    spec = scaled(SCENARIOS['mixed'], 0.01)
+    assert (spec.processes, spec.resources, spec.operations) == (20, 2, 200)
+    assert scaled(SCENARIOS['mixed'], 0).processes == 2
+    with pytest.raises(ValueError):
+        generate(WorkloadSpec('bad', processes=2, resources=2, operations=1, shape='nonsense'))
+
+
+def result(target, ops_per_sec, p99_us, peak_bytes=None, scenario='mixed'):
+    return {'scenario': scenario, 'target': target, 'ops_per_sec': ops_per_sec, 'p99_us': p99_us,
+            'peak_bytes': peak_bytes}
+
+
+def test_compare_flags_regressions_in_the_right_direction():
+    baseline = {('mixed', target): result(target, *values) for target, values in {
+        'faster': (100, 10, 1000), 'slower': (100, 10, 1000), 'bigger': (100, 10, 1000),
+        'noisy': (100, 10, None)}.items()}
+    current = {('mixed', target): result(target, *values) for target, values in {
+        'faster': (200, 5, 500), 'slower': (70, 10, 1000), 'bigger': (100, 13, 1300),
+        'noisy': (90, 11, 2000)}.items()}
+    rows = {row['target']: row for row in compare.compare(baseline, current, 0.25)}
+    assert rows['faster']['regressions'] == []
+    assert rows['slower']['regressions'] == ['ops_per_sec']
+    assert rows['bigger']['regressions'] == ['p99_us', 'peak_bytes']
+    assert rows['noisy']['regressions'] == []
+    assert rows['noisy']['changes']['peak_bytes'] is None
+    assert compare.change(0, 5) is None
+
+
+def test_suite_results_compare_and_gate(tmp_path):
+    output = tmp_path / 'results.json'
+    subprocess.run([sys.executable, '-m', 'benchmarks.suite', '--scenarios', 'testfield', '--scale', '0.05',
+                    '--no-endpoints', '--no-memory', '--output', str(output)],
+                   check=True, cwd=ROOT, capture_output=True)
+    data = json.loads(output.read_text())
+    targets = {entry['target'] for entry in data['results']}
+    assert {'allocate_resource', 'apply_batch', 'detect_deadlock', 'export_state'} <= targets
+    assert data['scenarios']['testfield']['operations'] == 250
+
+    same = subprocess.run([sys.executable, '-m', 'benchmarks.compare', str(output), str(output)],
+                          cwd=ROOT, capture_output=True, text=True)
+    assert same.returncode == 0
+
+    slowed = dict(data, results=[dict(entry, ops_per_sec=entry['ops_per_sec'] / 2) for entry in data['results']])
+    slowed_path = tmp_path / 'slowed.json'
+    slowed_path.write_text(json.dumps(slowed))
+    regressed = subprocess.run([sys.executable, '-m', 'benchmarks.compare', str(output), str(slowed_path)],
+                               cwd=ROOT, capture_output=True, text=True)
+    assert regressed.returncode == 1
+    assert 'REGRESSED ops_per_sec' in regressed.stdout
@@ -0,0 +1,135 @@
+"""Thread safety of the shared manager under concurrent writers and readers."""
+
+import random
+import sys
+import threading
+
+import pytest
+
+from app.models.history import AllocationHistory
+from app.models.resource_allocation import ResourceAllocationManager
+from benchmarks.bench_concurrency import check_invariants
+
+
+@pytest.fixture(autouse=True)
+def frequent_switches():
+    """Switch threads often so that unsynchronized check-then-act code would lose races."""
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def run_threads(target, count: int) -> None:
+    errors = []
+
+    def guarded(index):
+        try:
+            target(index)
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=guarded, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+
+def test_the_last_unit_is_granted_once(manager):
+    resource = manager.add_resource('R', 1)
+    processes = [manager.add_process(f"P{i}") for i in range(16)]
+    start = threading.Barrier(len(processes))
+    granted = []
+
+    def allocate(index):
+        start.wait()
+        try:
+            manager.allocate_resource(processes[index], resource)
+            granted.append(processes[index])
+        except ValueError:
+            pass
+
+    run_threads(allocate, len(processes))
+    assert len(granted) == 1
+    assert manager.resources[resource].allocated_to == {granted[0]: 1}
+    check_invariants(manager)
+
+
+def test_concurrent_churn_keeps_the_invariants():
+    manager = ResourceAllocationManager(history=AllocationHistory(max_events=None))
+    resources = [manager.add_resource(f"R{i}", 3) for i in range(4)]
+    processes = [manager.add_process(f"P{i}") for i in range(8)]
+    allocations = [0] * len(processes)
+
+    def churn(index):
+        rng = random.Random(index)
+        process_id = processes[index]
+        for _ in range(400):
+            resource_id = rng.choice(resources)
+            process = manager.processes[process_id]
+            try:
+                if resource_id in process.allocated_resources:
+                    manager.release_resource(process_id, resource_id)
+                elif resource_id in process.requested_resources:
+                    manager.cancel_request(process_id, resource_id)
+                elif rng.random() < 0.7:
+                    if manager.allocate_resource(process_id, resource_id):
+                        allocations[index] += 1
+                else:
+                    manager.request_resource(process_id, resource_id)
+            except ValueError:
+                pass
+
+    run_threads(churn, len(processes))
+    check_invariants(manager)
+    for resource_id, resource in manager.resources.items():
+        for process_id, units in resource.requested_by.items():
+            assert manager.processes[process_id].requested_resources[resource_id] == units
+    # Every successful allocation was recorded once (queued requests granted on release add more)
+    recorded = sum(1 for event in manager.allocation_history if event['type'] == 'allocation')
+    assert 0 < sum(allocations) <= recorded
+
+
+def test_readers_only_see_whole_batches(manager):
+    resource = manager.add_resource('R', 1000)
+    stop = threading.Event()
+    seen = []
+
+    def write(index):
+        for round_index in range(150):
+            manager.apply_batch([
+                {'op': 'add_process', 'name': f"A{index}-{round_index}"},
+                {'op': 'add_process', 'name': f"B{index}-{round_index}"},
+            ])
+
+    def read():
+        while not stop.is_set():
+            snapshot = manager.graph_snapshot()
+            stats = snapshot.data['stats']
+            seen.append((stats['processes'], len(snapshot.data['nodes']) - stats['resources']))
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    try:
+        run_threads(write, 4)
+    finally:
+        stop.set()
+        reader.join()
+    assert seen
+    assert all(processes % 2 == 0 and nodes == processes for processes, nodes in seen)
+    assert len(manager.processes) == 4 * 150 * 2
+    assert resource in manager.resources
+
+
+def test_concurrent_deadlock_queries_agree():
+    manager = ResourceAllocationManager()
+    resources = [manager.add_resource(f"R{i}", 1) for i in range(3)]
+    processes = [manager.add_process(f"P{i}") for i in range(3)]
+    for i, process_id in enumerate(processes):
+        manager.allocate_resource(process_id, resources[i])
+        manager.request_resource(process_id, resources[(i + 1) % 3])
+    results = []
+    run_threads(lambda index: results.append(manager.deadlocked_processes()), 8)
+    assert all(result == set(processes) for result in results)
@@ -0,0 +1,122 @@
+"""Graph deltas: replaying them onto a snapshot reproduces the graph."""
+
+import json
+
+import pytest
+
+from app.models.deltas import DeltaLog
+from conftest import workload_manager
+
+
+def replay(graph: dict, batches) -> dict:
+    """Apply delta batches to graph data the way a streaming client does."""
+    nodes = {node['id']: node for node in graph['nodes']}
+    edges = {edge['id']: edge for edge in graph['edges']}
+    deadlocked = list(graph['deadlocked'])
+    for _, deltas in batches:
+        for delta in deltas:
+            kind = delta['type']
+            if kind == 'node_added':
+                assert delta['node']['id'] not in nodes
+                nodes[delta['node']['id']] = delta['node']
+            elif kind == 'node_removed':
+                del nodes[delta['id']]
+            elif kind == 'edge_added':
+                edge = delta['edge']
+                assert edge['from'] in nodes and edge['to'] in nodes
+                edges[edge['id']] = edge
+            elif kind == 'edge_removed':
+                del edges[delta['id']]
+            elif kind == 'units_changed':
+                element = delta.get('node') or delta['edge']
+                target = nodes if 'node' in delta else edges
+                assert element['id'] in target
+                target[element['id']] = element
+            elif kind == 'deadlock_changed':
+                deadlocked = delta['processes']
+            elif kind == 'reset':
+                nodes, edges, deadlocked = {}, {}, []
+    return {'nodes': nodes, 'edges': edges, 'deadlocked': deadlocked}
+
+
+def unpositioned(graph: dict) -> dict:
+    """
+    Graph data keyed by id, without layout positions: those are computed
+    when graph data is built, so deltas carry them only once known.
+    """
+    nodes = graph['nodes'].values() if isinstance(graph['nodes'], dict) else graph['nodes']
+    edges = graph['edges'].values() if isinstance(graph['edges'], dict) else graph['edges']
+    return {'nodes': {node['id']: {key: value for key, value in node.items() if key not in ('x', 'y')}
+                      for node in nodes},
+            'edges': {edge['id']: edge for edge in edges},
+            'deadlocked': list(graph['deadlocked'])}
+
+
+@pytest.mark.parametrize('shape', ['random', 'hotspot', 'cycles'])
+def test_replayed_deltas_reproduce_the_graph(shape):
+    log = DeltaLog()
+    manager = workload_manager(12, processes=20, resources=20, operations=800, shape=shape, deltas=log)
+    replayed = replay({'nodes': [], 'edges': [], 'deadlocked': []}, log.since(0))
+    assert unpositioned(replayed) == unpositioned(manager.get_graph_data())
+
+
+def test_clients_resume_from_a_snapshot_version():
+    log = DeltaLog()
+    manager = workload_manager(13, operations=200, deltas=log)
+    snapshot = manager.graph_snapshot()
+    held = json.loads(snapshot.body)
+    process = manager.add_process('Late')
+    manager.request_resource(process, next(iter(manager.resources)), 1)
+    batches = log.since(snapshot.version)
+    assert [version for version, _ in batches] == list(range(snapshot.version + 1, manager.version + 1))
+    assert unpositioned(replay(held, batches)) == unpositioned(manager.get_graph_data())
+
+
+def test_a_batch_is_one_version(manager):
+    manager.deltas = log = DeltaLog()
+    resource = manager.add_resource('R', 3)
+    version = manager.version
+    manager.apply_batch([{'op': 'add_process', 'name': 'P', 'process_id': 'P'},
+                         {'op': 'allocate', 'process_id': 'P', 'resource_id': resource, 'units': 2}])
+    batches = log.since(version)
+    assert len(batches) == 1
+    assert sorted(delta['type'] for delta in batches[0][1]) == ['edge_added', 'node_added', 'units_changed']
+
+
+def test_reset_is_recorded(manager):
+    manager.deltas = log = DeltaLog()
+    manager.add_resource('R', 1)
+    version = manager.version
+    manager.reset()
+    assert log.since(version) == [(manager.version, [{'type': 'reset'}])]
+
+
+def test_dropped_batches_force_a_snapshot():
+    log = DeltaLog(max_batches=3)
+    for version in range(1, 6):
+        log.record(version, [{'type': 'reset'}])
+    log.record(6, [])
+    assert log.latest_version == 5
+    assert log.since(1) is None
+    assert [version for version, _ in log.since(2)] == [3, 4, 5]
+    assert log.since(5) == []
+    assert log.wait(4, timeout=0)
+    assert not log.wait(5, timeout=0.01)
+    with pytest.raises(ValueError):
+        DeltaLog(max_batches=0)
+
+
+def test_stream_starts_with_a_snapshot_then_deltas(client, web_manager):
+    web_manager.add_resource('R', 1)
+    response = client.get('/api/graph-stream')
+    assert response.mimetype == 'text/event-stream'
+    events = iter(response.response)
+    first = next(events)
+    first = first.decode() if isinstance(first, bytes) else first
+    assert first.startswith(f"id: {web_manager.version_tag()}\nevent: snapshot\n")
+    web_manager.add_process('P')
+    second = next(events)
+    second = second.decode() if isinstance(second, bytes) else second
+    assert second.startswith(f"id: {web_manager.version_tag()}\nevent: delta\n")
+    assert json.loads(second.split('data: ', 1)[1])[0]['type'] == 'node_added'
+    response.close()
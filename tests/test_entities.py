@@ -0,0 +1,91 @@
+"""Process and resource bookkeeping under churn, and the entities' compact layout."""
+
+import pytest
+
+from app.models.history import IdRegistry
+from app.models.resource_allocation import ResourceAllocationManager
+from benchmarks.bench_memory import fresh, measure
+from conftest import workload_manager
+
+
+def assert_consistent(manager):
+    for resource_id, resource in manager.resources.items():
+        # available_units is updated in place by allocate and release
+        assert resource.available_units == resource.total_units - sum(resource.allocated_to.values())
+        assert resource.available_units >= 0
+        for process_id, units in resource.allocated_to.items():
+            assert manager.processes[process_id].allocated_resources[resource_id] == units
+        for process_id, units in resource.requested_by.items():
+            assert manager.processes[process_id].requested_resources[resource_id] == units
+    for process_id, process in manager.processes.items():
+        for resource_id, units in process.allocated_resources.items():
+            assert manager.resources[resource_id].allocated_to[process_id] == units
+        for resource_id, units in process.requested_resources.items():
+            assert manager.resources[resource_id].requested_by[process_id] == units
+
+
+@pytest.mark.parametrize('shape', ['random', 'hotspot'])
+def test_edges_stay_mirrored_through_churn(shape):
+    manager = workload_manager(11, processes=60, resources=10, operations=2000, shape=shape)
+    assert_consistent(manager)
+
+
+def test_removing_a_process_leaves_no_reference_behind(manager):
+    resource_ids = [manager.add_resource(f"R{i}", 2) for i in range(3)]
+    leaving = manager.add_process('Leaving')
+    staying = manager.add_process('Staying')
+    manager.allocate_resource(leaving, resource_ids[0], 2)
+    manager.request_resource(leaving, resource_ids[1])
+    manager.allocate_resource(staying, resource_ids[1], 2)
+    manager.request_resource(staying, resource_ids[0])
+
+    manager.remove_process(leaving)
+    assert leaving not in manager.processes
+    for resource in manager.resources.values():
+        assert leaving not in resource.allocated_to
+        assert leaving not in resource.requested_by
+    assert leaving not in manager.wait_for.successors
+    assert leaving not in manager.wait_for.predecessors
+    # The freed units went to the waiter
+    assert manager.processes[staying].allocated_resources == {resource_ids[1]: 2, resource_ids[0]: 1}
+    assert_consistent(manager)
+
+
+def test_id_registry_interns_once_and_never_reuses():
+    registry = IdRegistry()
+    first = registry.intern('a' * 36)
+    assert registry.intern('a' * 36) == first
+    second = registry.intern('b' * 36)
+    assert second == first + 1
+    assert registry.external(second) == 'b' * 36
+    assert len(registry) == 2
+
+
+def test_entities_are_slotted_and_share_their_ids(manager):
+    resource_id = manager.add_resource('R', 4)
+    process_id = manager.add_process('P')
+    for entity in (manager.resources[resource_id], manager.processes[process_id]):
+        assert not hasattr(entity, '__dict__')
+        with pytest.raises(AttributeError):
+            entity.extra = 1
+    manager.allocate_resource(fresh(process_id), fresh(resource_id))
+    manager.request_resource(fresh(process_id), fresh(resource_id))
+    manager.declare_max_claim(fresh(process_id), fresh(resource_id), 3)
+
+    def keys_are_ids(manager):
+        process = manager.processes[process_id]
+        resource = manager.resources[resource_id]
+        for key in (*resource.allocated_to, *resource.requested_by):
+            assert key is process.id
+        for key in (*process.allocated_resources, *process.requested_resources, *process.max_claims):
+            assert key is resource.id
+
+    keys_are_ids(manager)
+    copy = ResourceAllocationManager()
+    copy.restore_state(manager.export_state())
+    keys_are_ids(copy)
+
+
+def test_slotted_entities_are_smaller():
+    result = measure(processes=2000, resources=200, edges=4000, seed=1)
+    assert result['plain'] / result['slotted'] > 1.4
@@ -0,0 +1,38 @@
+"""The networkx graph as a lazily built, cached view of the entity dicts."""
+
+from conftest import workload_manager
+
+
+def test_graph_is_built_on_demand_and_cached_per_version(manager):
+    resource = manager.add_resource('R', 2)
+    process = manager.add_process('P')
+    assert manager._graph is None
+    graph = manager.graph
+    assert manager.graph is graph
+    manager.allocate_resource(process, resource)
+    assert manager._graph is None
+    assert manager.graph is not graph
+    assert manager.graph.edges[resource, process] == {'type': 'allocation', 'units': 1}
+
+
+def test_graph_matches_the_entity_dicts():
+    manager = workload_manager(5, operations=500)
+    graph = manager.graph
+    assert {node for node, data in graph.nodes(data=True) if data['type'] == 'process'} == set(manager.processes)
+    assert {node for node, data in graph.nodes(data=True) if data['type'] == 'resource'} == set(manager.resources)
+    expected = set()
+    for resource_id, resource in manager.resources.items():
+        expected.update((resource_id, process_id, 'allocation', units)
+                        for process_id, units in resource.allocated_to.items())
+        expected.update((process_id, resource_id, 'request', units)
+                        for process_id, units in resource.requested_by.items())
+    assert {(source, target, data['type'], data['units'])
+            for source, target, data in graph.edges(data=True)} == expected
+
+
+def test_mutations_and_graph_data_do_not_build_the_graph():
+    manager = workload_manager(6, operations=300)
+    assert manager._graph is None
+    manager.detect_deadlock()
+    manager.get_graph_data()
+    assert manager._graph is None
@@ -0,0 +1,55 @@
+"""Graph data snapshots cached per state version, and ETag revalidation."""
+
+import json
+
+import pytest
+
+from app.models.resource_allocation import ResourceAllocationManager
+
+
+def test_snapshot_is_shared_until_the_next_mutation(manager):
+    resource = manager.add_resource('R', 2)
+    first = manager.graph_snapshot()
+    assert manager.graph_snapshot() is first
+    assert manager.cached_graph_snapshot() is first
+    assert json.loads(first.body) == first.data
+
+    manager.add_process('P')
+    assert manager.cached_graph_snapshot() is None
+    second = manager.graph_snapshot()
+    assert second.version > first.version
+    assert second.etag != first.etag
+    assert second.data['stats']['processes'] == 1
+    assert manager.get_graph_data() is second.data
+    assert resource in {node['id'] for node in second.data['nodes']}
+
+
+def test_failed_mutations_keep_the_snapshot(manager):
+    resource = manager.add_resource('R', 1)
+    snapshot = manager.graph_snapshot()
+    with pytest.raises(ValueError):
+        manager.allocate_resource('missing', resource)
+    assert manager.graph_snapshot() is snapshot
+
+
+def test_version_tags_are_specific_to_a_manager(manager):
+    tag = manager.version_tag()
+    assert manager.parse_version_tag(tag) == manager.version
+    assert manager.parse_version_tag(f'"{tag}"') == manager.version
+    assert ResourceAllocationManager().parse_version_tag(tag) is None
+    assert manager.parse_version_tag('garbage') is None
+
+
+def test_graph_data_is_revalidated_with_the_etag(client, web_manager):
+    web_manager.add_resource('R', 2)
+    response = client.get('/api/graph-data')
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'no-cache'
+    etag = response.headers['ETag']
+    assert response.get_json() == web_manager.get_graph_data()
+
+    assert client.get('/api/graph-data', headers={'If-None-Match': etag}).status_code == 304
+    web_manager.add_process('P')
+    response = client.get('/api/graph-data', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
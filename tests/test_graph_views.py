@@ -0,0 +1,168 @@
+"""Filtered and clustered graph views against walking the whole graph."""
+
+import heapq
+
+import pytest
+
+from app.models.graph_views import IDLE_CLUSTER, MAX_HOPS, GraphViewSpec, anchor, contention
+from conftest import workload_manager
+
+
+@pytest.fixture(scope='module')
+def large():
+    return workload_manager(21, processes=120, resources=30, operations=1500, shape='hotspot')
+
+
+@pytest.fixture(scope='module')
+def deadlocked_large():
+    return workload_manager(22, processes=40, resources=40, operations=20, shape='cycles')
+
+
+def adjacency(manager) -> dict:
+    """Undirected adjacency of the whole graph."""
+    neighbors = {node_id: set() for node_id in (*manager.processes, *manager.resources)}
+    for process in manager.processes.values():
+        for resource_id in (*process.allocated_resources, *process.requested_resources):
+            neighbors[process.id].add(resource_id)
+            neighbors[resource_id].add(process.id)
+    return neighbors
+
+
+def ball(manager, node_id: str, hops: int) -> set:
+    neighbors = adjacency(manager)
+    reached = {node_id}
+    for _ in range(hops):
+        reached |= {other for current in reached for other in neighbors[current]}
+    return reached
+
+
+def view_ids(data: dict) -> set:
+    return {node['id'] for node in data['nodes']}
+
+
+def test_view_arguments():
+    assert GraphViewSpec.from_args({}) is None
+    assert GraphViewSpec.from_args({'hops': '2'}) is None
+    assert GraphViewSpec.from_args({'around': 'P1', 'hops': '2', 'max_nodes': '10', 'deadlocked': 'true'}) == \
+        GraphViewSpec(deadlocked=True, around='P1', hops=2, max_nodes=10)
+    for args in ({'top': 'abc'}, {'top': '0'}, {'around': 'P1', 'hops': str(MAX_HOPS + 1)},
+                 {'max_nodes': '-1'}, {'around': 'P1', 'hops': '1.5'}):
+        with pytest.raises(ValueError):
+            GraphViewSpec.from_args(args)
+    assert GraphViewSpec(top=3).digest == GraphViewSpec(top=3).digest != GraphViewSpec(top=4).digest
+
+
+@pytest.mark.parametrize('hops', [0, 1, 2, 3])
+def test_neighborhoods_match_a_breadth_first_search(large, hops):
+    for node_id in (*list(large.processes)[:5], *list(large.resources)[:5]):
+        data = large.graph_view(GraphViewSpec(around=node_id, hops=hops)).data
+        assert view_ids(data) == ball(large, node_id, hops)
+    assert large.graph_view(GraphViewSpec(around='missing')).data['nodes'] == []
+
+
+def test_deadlocked_view(deadlocked_large):
+    manager = deadlocked_large
+    deadlocked = manager.deadlocked_processes()
+    assert deadlocked and len(deadlocked) < len(manager.processes)
+    data = manager.graph_view(GraphViewSpec(deadlocked=True)).data
+    expected = set(deadlocked)
+    for process_id in deadlocked:
+        process = manager.processes[process_id]
+        expected |= process.allocated_resources.keys() | process.requested_resources.keys()
+    assert view_ids(data) == expected
+    assert data['deadlocked'] == sorted(deadlocked)
+    for edge in data['edges']:
+        assert {edge['from'], edge['to']} <= expected
+
+
+def test_top_resources_and_names(large):
+    ranked = heapq.nlargest(3, large.resources.values(), key=contention)
+    data = large.graph_view(GraphViewSpec(top=3)).data
+    resources = {node['id'] for node in data['nodes'] if node['type'] == 'resource'}
+    assert resources == {resource.id for resource in ranked}
+    expected = set(resources)
+    for resource in ranked:
+        expected |= resource.allocated_to.keys() | resource.requested_by.keys()
+    assert view_ids(data) == expected
+
+    resource = next(iter(large.resources.values()))
+    data = large.graph_view(GraphViewSpec(resource=resource.name.upper())).data
+    assert {node['id'] for node in data['nodes'] if node['type'] == 'resource'} == {resource.id}
+
+
+def test_filters_intersect(large):
+    process_id = next(iter(large.processes))
+    both = view_ids(large.graph_view(GraphViewSpec(around=process_id, hops=2, top=5)).data)
+    around = view_ids(large.graph_view(GraphViewSpec(around=process_id, hops=2)).data)
+    top = view_ids(large.graph_view(GraphViewSpec(top=5)).data)
+    assert both == around & top
+
+
+@pytest.mark.parametrize('max_nodes', [5, 20, 35, 60, 1000])
+def test_clustering_accounts_for_every_node_and_unit(large, max_nodes):
+    full = large.get_graph_data()
+    data = large.graph_view(GraphViewSpec(max_nodes=max_nodes)).data
+    view = data['view']
+    if max_nodes >= len(full['nodes']):
+        assert view_ids(data) == view_ids(full) and view['clusters'] == 0
+    if view['truncated']:
+        assert len(data['nodes']) == max_nodes
+        return
+    assert len(data['nodes']) <= max_nodes
+    assert view['clusters'] == sum(node['type'] == 'cluster' for node in data['nodes'])
+
+    # Every node is shown, or counted in the cluster of its anchor resource
+    shown = {node['id'] for node in data['nodes'] if node['type'] != 'cluster'}
+    clusters = {node['id']: node for node in data['nodes'] if node['type'] == 'cluster'}
+    resource_ids = set(large.resources)
+
+    def visible(node_id):
+        if node_id in shown:
+            return node_id
+        if node_id in resource_ids:
+            return f"cluster:{node_id}"
+        center = anchor(large.processes[node_id], resource_ids)
+        return f"cluster:{center}" if center is not None else IDLE_CLUSTER
+
+    sizes = {}
+    for node_id in view_ids(full) - shown:
+        sizes[visible(node_id)] = sizes.get(visible(node_id), 0) + 1
+    assert sizes == {key: node['size'] for key, node in clusters.items()}
+
+    # Edges between clusters carry the units of the edges they merge;
+    # edges inside one cluster are hidden
+    expected = {}
+    for edge in full['edges']:
+        key = (visible(edge['from']), visible(edge['to']), edge['type'])
+        if key[0] != key[1]:
+            expected[key] = expected.get(key, 0) + edge['units']
+    actual = {}
+    for edge in data['edges']:
+        key = (edge['from'], edge['to'], edge['type'])
+        actual[key] = actual.get(key, 0) + edge['units']
+    assert actual == expected
+
+
+def test_views_are_cached_per_version(manager):
+    resource = manager.add_resource('R', 1)
+    spec = GraphViewSpec(around=resource)
+    first = manager.graph_view(spec)
+    assert manager.graph_view(spec) is first
+    manager.add_process('P')
+    second = manager.graph_view(spec)
+    assert second is not first
+    assert second.etag.endswith(spec.digest)
+
+
+def test_view_endpoint(client, web_manager):
+    resource = web_manager.add_resource('Printer', 1)
+    holder = web_manager.add_process('Holder')
+    web_manager.add_process('Idle')
+    web_manager.allocate_resource(holder, resource)
+    response = client.get(f"/api/graph-data?around={resource}")
+    data = response.get_json()
+    assert view_ids(data) == {resource, holder}
+    assert data['view']['total'] == {'processes': 2, 'resources': 1}
+    assert client.get(f"/api/graph-data?around={resource}",
+                      headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+    assert client.get('/api/graph-data?top=0').status_code == 400
@@ -0,0 +1,165 @@
+"""Columnar allocation history with ring-buffer retention."""
+
+import random
+import threading
+
+import numpy as np
+import pytest
+
+from app.models.history import ID_COMPACTION_RATIO, AllocationHistory, EventType
+from app.models.resource_allocation import ResourceAllocationManager
+from app.models.storage import MemoryOperationStore
+
+SECOND = 1_000_000_000
+
+
+def events(count: int, seed: int = 0, start: int = 10 * SECOND):
+    rng = random.Random(seed)
+    timestamp = start
+    result = []
+    for _ in range(count):
+        timestamp += rng.randint(0, SECOND // 10)
+        result.append((EventType(rng.randrange(4)), f"P{rng.randrange(9)}", f"R{rng.randrange(5)}",
+                       rng.randint(1, 4), timestamp))
+    return result
+
+
+def as_tuples(history: AllocationHistory):
+    columns = history.columns()
+    return [(EventType(int(event_type)), history.ids.external(int(process)), history.ids.external(int(resource)),
+             int(units), int(timestamp))
+            for timestamp, event_type, process, resource, units
+            in zip(columns['timestamp'], columns['type'], columns['process'], columns['resource'], columns['units'])]
+
+
+def test_count_retention_keeps_the_newest_events():
+    history = AllocationHistory(max_events=32)
+    recorded = events(500)
+    for event in recorded:
+        history.record(*event)
+    assert len(history) <= 32
+    assert as_tuples(history) == recorded[-len(history):]
+    assert history.total_recorded == 500
+    assert history[-1]['process_id'] == recorded[-1][1]
+    assert history[0]['type'] == recorded[-len(history)][0].label
+
+
+@pytest.mark.parametrize('max_events, max_age', [(None, None), (16, None), (1000, None), (None, 1.0)])
+def test_record_many_is_record_in_bulk(max_events, max_age):
+    one_by_one = AllocationHistory(max_events=max_events, max_age=max_age)
+    bulk = AllocationHistory(max_events=max_events, max_age=max_age)
+    recorded = events(300, seed=1)
+    for event in recorded:
+        one_by_one.record(*event)
+    for start in range(0, 300, 37):
+        bulk.record_many(recorded[start:start + 37])
+    assert as_tuples(bulk) == as_tuples(one_by_one)
+
+
+def test_age_retention_evicts_older_events():
+    history = AllocationHistory(max_events=None, max_age=1.0)
+    recorded = events(400, seed=2)
+    for event in recorded:
+        history.record(*event)
+    newest = recorded[-1][4]
+    assert as_tuples(history) == [event for event in recorded if event[4] >= newest - SECOND]
+
+
+def test_timestamps_never_go_back():
+    history = AllocationHistory(max_events=None, max_age=1.0)
+    history.record(EventType.ALLOCATION, 'P', 'R', 1, 5 * SECOND)
+    # The wall clock stepped back
+    history.record(EventType.RELEASE, 'P', 'R', 1, 3 * SECOND)
+    history.record_many([(EventType.REQUEST, 'P', 'R', 1, 2 * SECOND),
+                         (EventType.ALLOCATION, 'P', 'R', 1, 7 * SECOND)])
+    timestamps = history.columns()['timestamp']
+    assert (np.diff(timestamps) >= 0).all()
+    # Age eviction still finds every expired event
+    assert timestamps.tolist() == [7 * SECOND]
+
+
+def test_evicted_events_are_spilled(tmp_path):
+    spill_path = str(tmp_path / 'history.spill')
+    history = AllocationHistory(max_events=64, spill_path=spill_path)
+    recorded = events(1000, seed=3)
+    for event in recorded:
+        history.record(*event)
+    spilled = AllocationHistory.read_spill(spill_path)
+    assert len(spilled) + len(history) == 1000
+    assert [(event['type'], event['process_id'], event['units']) for event in spilled + list(history)] == \
+        [(event[0].label, event[1], event[3]) for event in recorded]
+
+
+def churn(count: int, seed: int = 0, start: int = 10 * SECOND):
+    """Events of short-lived processes and resources, each with new ids."""
+    rng = random.Random(seed)
+    return [(EventType(rng.randrange(4)), f"P{index // 3}", f"R{index // 5}", rng.randint(1, 4), start + index)
+            for index in range(count)]
+
+
+@pytest.mark.parametrize('max_events, max_age', [(64, None), (None, 1e-6), (500, 1e-6)])
+def test_registry_stays_bounded_under_churn(tmp_path, max_events, max_age):
+    spill_path = str(tmp_path / 'history.spill')
+    history = AllocationHistory(max_events=max_events, max_age=max_age, spill_path=spill_path)
+    recorded = churn(6000, seed=5)
+    for index, event in enumerate(recorded):
+        if index % 2:
+            history.record(*event)
+        else:
+            history.record_many([event])
+        # Each event adds at most two ids before the next compaction
+        assert len(history.ids) <= ID_COMPACTION_RATIO * (len(history) + 1) + 2
+    # Renumbering keeps both the in-memory events and the spill file decoding
+    assert as_tuples(history) == recorded[len(recorded) - len(history):]
+    spilled = AllocationHistory.read_spill(spill_path)
+    assert [(event['process_id'], event['resource_id']) for event in spilled + list(history)] == \
+        [(event[1], event[2]) for event in recorded]
+
+
+def test_removed_entities_leave_the_registry():
+    manager = ResourceAllocationManager(history=AllocationHistory(max_events=100))
+    resource = manager.add_resource('R', 1)
+    for i in range(2000):
+        process = manager.add_process(f"P{i}")
+        manager.allocate_resource(process, resource)
+        manager.remove_process(process)
+    assert len(manager.allocation_history.ids) <= ID_COMPACTION_RATIO * 101
+    assert manager.allocation_history[-1]['process_id'] == process
+
+
+def test_export_and_restore_round_trip():
+    history = AllocationHistory(max_events=100)
+    for event in events(250, seed=4):
+        history.record(*event)
+    restored = AllocationHistory(max_events=100)
+    restored.restore(*history.export())
+    assert as_tuples(restored) == as_tuples(history)
+    assert restored.total_recorded == history.total_recorded
+
+    partial = AllocationHistory(max_events=None)
+    partial.restore(*history.export(last=10))
+    assert as_tuples(partial) == as_tuples(history)[-10:]
+    assert len(partial.ids) <= 14
+
+
+def test_stored_operations_are_stamped_in_log_order():
+    store = MemoryOperationStore()
+    managers = [ResourceAllocationManager(storage=store, checkpoint_interval=None) for _ in range(2)]
+    resource = managers[0].add_resource('R', 100)
+    processes = [managers[0].add_process(f"P{i}") for i in range(2)]
+
+    def churn(manager, process_id):
+        for _ in range(200):
+            manager.allocate_resource(process_id, resource)
+            manager.release_resource(process_id, resource)
+
+    threads = [threading.Thread(target=churn, args=pair) for pair in zip(managers, processes)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stamps = [operation['ts'] for _, operation in store.read(0)]
+    assert stamps == sorted(stamps)
+    for manager in managers:
+        manager.sync()
+        assert (np.diff(manager.allocation_history.columns()['timestamp']) >= 0).all()
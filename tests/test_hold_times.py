@@ -0,0 +1,78 @@
+"""Incremental hold-time accounting against a scan of the history."""
+
+import math
+import random
+
+import numpy as np
+import pytest
+
+from app.models.history import AllocationHistory
+from app.models.stats import BUCKET_GROWTH, HoldTimeStats
+from conftest import workload_manager
+
+
+def holds_by_scan(events):
+    """Hold durations per resource, pairing each allocation with the next release by the same process."""
+    open_holds, durations = {}, {}
+    for event in events:
+        key = (event['process_id'], event['resource_id'])
+        timestamp = event['timestamp'].timestamp()
+        if event['type'] == 'allocation':
+            open_holds.setdefault(key, []).append(timestamp)
+        elif event['type'] == 'release':
+            for start in open_holds.pop(key, []):
+                durations.setdefault(event['resource_id'], []).append(timestamp - start)
+    return durations
+
+
+def test_summaries_match_a_scan_of_the_history():
+    manager = workload_manager(8, processes=40, resources=6, operations=1500,
+                               history=AllocationHistory(max_events=None))
+    durations = holds_by_scan(manager.allocation_history)
+    assert set(manager.hold_times.summaries) == set(durations)
+    for resource_id, values in durations.items():
+        summary = manager.hold_times.summary(resource_id)
+        assert summary.count == len(values)
+        assert summary.total == pytest.approx(sum(values), abs=1e-5)
+        assert summary.maximum == pytest.approx(max(values), abs=1e-5)
+
+    usage = manager.analyze_resource_usage()['resource_usage']
+    for resource_id, resource in manager.resources.items():
+        expected = np.mean(durations[resource_id]) if resource_id in durations else 0
+        assert usage[resource.name]['average_allocation_time'] == pytest.approx(round(expected, 1), abs=0.051)
+
+
+def test_percentiles_are_within_one_bucket():
+    rng = random.Random(0)
+    stats = HoldTimeStats()
+    values = [rng.lognormvariate(0, 2) for _ in range(5000)]
+    for i, seconds in enumerate(values):
+        stats.allocated(f"P{i}", 'R', 0)
+        stats.released(f"P{i}", 'R', int(seconds * 1e9))
+    summary = stats.summary('R')
+    ordered = sorted(values)
+    for percent in (50, 90, 99):
+        exact = ordered[math.ceil(len(ordered) * percent / 100) - 1]
+        assert exact / BUCKET_GROWTH <= summary.percentile(percent) <= exact * BUCKET_GROWTH
+
+
+def test_export_and_restore_round_trip():
+    stats = HoldTimeStats()
+    stats.allocated('P', 'R', 0)
+    stats.released('P', 'R', 2_000_000_000)
+    stats.allocated('Q', 'R', 5)
+    restored = HoldTimeStats()
+    restored.restore(*stats.export())
+    assert restored.summary('R').to_dict() == stats.summary('R').to_dict()
+    restored.released('Q', 'R', 1_000_000_005)
+    assert restored.summary('R').count == 2
+
+
+def test_deleted_resources_are_forgotten(manager):
+    resource = manager.add_resource('R', 1)
+    process = manager.add_process('P')
+    manager.allocate_resource(process, resource)
+    manager.release_resource(process, resource)
+    assert manager.hold_times.summary(resource).count == 1
+    manager.delete_resource(resource)
+    assert manager.hold_times.summary(resource) is None
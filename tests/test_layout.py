@@ -0,0 +1,133 @@
+"""Precomputed node positions and their incremental updates."""
+
+import math
+import random
+
+import numpy as np
+import pytest
+
+from app.models.layout import RELAYOUT_LIMIT, SPACING, SPRING_LIMIT, GraphLayout, spring
+from app.models.resource_allocation import ResourceAllocationManager
+from conftest import workload_manager
+
+
+def positions_of(manager) -> dict:
+    return {node['id']: (node['x'], node['y']) for node in manager.get_graph_data()['nodes']}
+
+
+def distance(a, b) -> float:
+    return math.hypot(a[0] - b[0], a[1] - b[1])
+
+
+def edge_pairs(manager) -> list:
+    return [(process.id, resource_id) for process in manager.processes.values()
+            for resource_id in (*process.allocated_resources, *process.requested_resources)]
+
+
+def mean_edge_length(positions: dict, pairs) -> float:
+    return sum(distance(positions[a], positions[b]) for a, b in pairs) / len(pairs)
+
+
+def mean_pair_distance(positions: dict, seed: int = 0) -> float:
+    rng = random.Random(seed)
+    ids = sorted(positions)
+    pairs = [rng.sample(ids, 2) for _ in range(500)]
+    return mean_edge_length(positions, pairs)
+
+
+def test_layouts_are_deterministic():
+    first = workload_manager(41, processes=60, resources=20, operations=400)
+    second = workload_manager(41, processes=60, resources=20, operations=400)
+    assert positions_of(first) == positions_of(second)
+
+
+def test_every_node_is_placed_and_neighbors_are_close():
+    manager = workload_manager(42, processes=80, resources=25, operations=600)
+    positions = positions_of(manager)
+    assert positions.keys() == manager.processes.keys() | manager.resources.keys()
+    assert len(set(positions.values())) == len(positions)
+    assert mean_edge_length(positions, edge_pairs(manager)) < mean_pair_distance(positions) / 2
+
+
+def test_large_components_are_laid_out_too():
+    chain = [f"N{i}" for i in range(SPRING_LIMIT + 100)]
+    neighbors = {node: set() for node in chain}
+    for a, b in zip(chain, chain[1:]):
+        neighbors[a].add(b)
+        neighbors[b].add(a)
+    layout = GraphLayout()
+    layout.refresh(chain, neighbors.__getitem__)
+    assert len(layout) == len(chain)
+    positions = layout.positions
+    pairs = list(zip(chain, chain[1:]))
+    assert mean_edge_length(positions, pairs) < mean_pair_distance(positions) / 10
+
+
+def test_relayout_only_moves_what_changed():
+    manager = workload_manager(43, processes=80, resources=25, operations=600)
+    before = positions_of(manager)
+    resource = next(iter(manager.resources))
+    process = manager.add_process('Newcomer')
+    manager.request_resource(process, resource)
+    after = positions_of(manager)
+
+    moved = {process, resource} | set(manager.resources[resource].allocated_to) \
+        | set(manager.resources[resource].requested_by)
+    for node_id, position in before.items():
+        if node_id not in moved:
+            assert after[node_id] == position, node_id
+    # The new node sits with its resource, not somewhere else on the canvas
+    assert distance(after[process], after[resource]) < 3 * SPACING
+
+
+def test_new_nodes_are_placed_next_to_their_neighbors():
+    layout = GraphLayout()
+    graph = {'A': {'B'}, 'B': {'A'}}
+    layout.refresh(graph, lambda node: graph[node])
+    graph['C'] = {'A', 'B'}
+    graph['A'].add('C')
+    graph['B'].add('C')
+    layout.touch(['C'], graph.__contains__, lambda node: graph[node])
+    middle = ((layout.positions['A'][0] + layout.positions['B'][0]) / 2,
+              (layout.positions['A'][1] + layout.positions['B'][1]) / 2)
+    assert distance(layout.positions['C'], middle) == pytest.approx(0.75 * SPACING, abs=1)
+
+    # Nodes with no placed neighbor go to the free grid, one slot each
+    graph['D'] = set()
+    graph['E'] = set()
+    layout.touch(['D', 'E'], graph.__contains__, lambda node: graph[node])
+    assert layout.positions['D'] != layout.positions['E']
+    del graph['D']
+    layout.touch(['D'], graph.__contains__, lambda node: graph[node])
+    assert layout.position('D') is None
+
+
+def test_large_changes_lay_out_from_scratch(monkeypatch):
+    manager = workload_manager(44, processes=40, resources=10, operations=200)
+    manager.get_graph_data()
+    calls = []
+    original = GraphLayout.layout
+    monkeypatch.setattr(GraphLayout, 'layout', lambda self, *args: calls.append(True) or original(self, *args))
+    manager.add_process('One more')
+    manager.get_graph_data()
+    assert calls == []
+    for i in range(RELAYOUT_LIMIT + 1):
+        manager.add_process(f"Many {i}")
+    manager.get_graph_data()
+    assert calls == [True]
+
+
+def test_spring_keeps_fixed_nodes():
+    rng = np.random.default_rng(0)
+    positions = rng.random((1, 6, 2))
+    adjacency = np.ones((1, 6, 6)) - np.eye(6)
+    fixed = np.array([[True, False, True, False, False, True]])
+    result = spring(positions, adjacency, 20, fixed=fixed)
+    assert np.array_equal(result[fixed], positions[fixed])
+    assert not np.array_equal(result[~fixed], positions[~fixed])
+
+
+def test_layout_can_be_disabled():
+    manager = ResourceAllocationManager(layout=False)
+    manager.add_resource('R', 1)
+    assert 'x' not in manager.get_graph_data()['nodes'][0]
@@ -0,0 +1,98 @@
+"""Structured, sampled logging instead of debug prints."""
+
+import io
+import json
+import logging
+
+import pytest
+
+from app.telemetry import LOGGER_NAMESPACE, JsonFormatter, SamplingFilter, configure_logging, get_logger, metrics
+
+
+@pytest.fixture
+def log_stream():
+    """Configure JSON logging into a buffer, restoring the previous setup afterwards."""
+    root = logging.getLogger(LOGGER_NAMESPACE)
+    handlers, level = list(root.handlers), root.level
+    stream = io.StringIO()
+    yield stream, configure_logging('DEBUG', 1, stream)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+def records(stream):
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_records_are_single_json_lines(log_stream):
+    stream, _ = log_stream
+    logger = get_logger('test')
+    logger.info("hello\nworld", extra={'fields': {'nodes': 3}})
+    try:
+        raise RuntimeError('boom')
+    except RuntimeError:
+        logger.exception("failed")
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 2
+    first, second = (json.loads(line) for line in lines)
+    assert first['logger'] == 'rag.test'
+    assert first['level'] == 'info'
+    assert first['msg'] == "hello\nworld"
+    assert first['nodes'] == 3
+    assert second['level'] == 'error'
+    assert 'RuntimeError: boom' in second['exc']
+
+
+def test_sampling_only_drops_records_below_warning():
+    def record(level):
+        return logging.LogRecord('rag.test', level, __file__, 1, 'msg', None, None)
+
+    dropping = SamplingFilter(0)
+    assert not dropping.filter(record(logging.DEBUG))
+    assert not dropping.filter(record(logging.INFO))
+    assert dropping.filter(record(logging.WARNING))
+    assert dropping.filter(record(logging.ERROR))
+    assert all(SamplingFilter(1).filter(record(logging.DEBUG)) for _ in range(100))
+
+
+def test_configure_logging_replaces_the_handler(log_stream):
+    stream, root = log_stream
+    configure_logging('WARNING', 1, stream)
+    assert len(root.handlers) == 1
+    assert isinstance(root.handlers[0].formatter, JsonFormatter)
+    assert not root.propagate
+    get_logger('test').info("dropped")
+    get_logger('test').warning("kept")
+    assert [record['msg'] for record in records(stream)] == ['kept']
+
+
+def test_graph_data_logs_instead_of_printing(client, web_manager, log_stream, capsys):
+    stream, _ = log_stream
+    web_manager.add_resource('R', 2)
+    web_manager.add_process('P')
+    before = metrics.value('graph_data_requests_total', status=200)
+    assert client.get('/api/graph-data').status_code == 200
+    assert capsys.readouterr().out == ''
+    served = [record for record in records(stream) if record['msg'] == 'graph data served']
+    assert len(served) == 1
+    assert served[0]['nodes'] == 2 and served[0]['edges'] == 0 and served[0]['status'] == 200
+    assert metrics.value('graph_data_requests_total', status=200) == before + 1
+
+
+def test_errors_are_logged_and_counted(client, web_manager, log_stream, monkeypatch, capsys):
+    stream, _ = log_stream
+
+    def broken(*args, **kwargs):
+        raise RuntimeError('snapshot failed')
+
+    monkeypatch.setattr(web_manager, 'graph_snapshot', broken)
+    before = metrics.value('errors_total', where='api_graph_data')
+    response = client.get('/api/graph-data')
+    assert response.status_code == 500
+    assert response.get_json()['error']
+    assert capsys.readouterr().out == ''
+    assert any('snapshot failed' in record.get('exc', '') for record in records(stream))
+    assert metrics.value('errors_total', where='api_graph_data') == before + 1
@@ -0,0 +1,66 @@
+"""NumPy allocation matrices kept in step with the manager's dicts."""
+
+import pytest
+
+from app.models.matrices import AllocationMatrices
+from app.models.resource_allocation import ResourceAllocationManager
+from benchmarks.workloads import WorkloadSpec, generate
+from conftest import apply_operations, manager_blocked
+
+
+def assert_mirrors_dicts(manager):
+    matrices = manager.matrices
+    assert set(matrices.process_index) == set(manager.processes)
+    assert set(matrices.resource_index) == set(manager.resources)
+    for resource_id, resource in manager.resources.items():
+        column = matrices.resource_index[resource_id]
+        assert matrices.total[column] == resource.total_units
+        assert matrices.available[column] == resource.available_units
+    for process_id, process in manager.processes.items():
+        row = matrices.process_index[process_id]
+        for resource_id, column in matrices.resource_index.items():
+            assert matrices.allocation[row, column] == process.allocated_resources.get(resource_id, 0)
+            assert matrices.request[row, column] == process.requested_resources.get(resource_id, 0)
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_matrix_backend_agrees_with_the_dicts(seed):
+    workload = generate(WorkloadSpec('matrices', processes=80, resources=12, operations=800,
+                                     shape='hotspot', seed=seed))
+    plain = ResourceAllocationManager()
+    vectorized = ResourceAllocationManager(matrix_backend=True)
+    for manager in (plain, vectorized):
+        workload.apply_setup(manager)
+    # In chunks, comparing the analyses along the way
+    for start in range(0, len(workload.operations), 100):
+        chunk = workload.operations[start:start + 100]
+        apply_operations(plain, chunk)
+        apply_operations(vectorized, chunk)
+        assert vectorized.deadlocked_processes() == plain.deadlocked_processes() == manager_blocked(plain)
+        assert vectorized.resource_utilization() == pytest.approx(plain.resource_utilization())
+    assert_mirrors_dicts(vectorized)
+
+
+def test_rows_of_removed_processes_are_zeroed_and_reused():
+    matrices = AllocationMatrices(capacity=2)
+    matrices.add_resource('R', 3)
+    matrices.add_process('A')
+    matrices.set_allocation('A', 'R', 2)
+    matrices.set_request('A', 'R', 1)
+    row = matrices.process_index['A']
+    matrices.remove_process('A')
+    assert matrices.add_process('B') == row
+    assert matrices.allocation[row].sum() == 0
+    assert matrices.request[row].sum() == 0
+
+
+def test_matrices_grow_past_their_capacity():
+    manager = ResourceAllocationManager(matrix_backend=True)
+    manager.matrices = AllocationMatrices(capacity=2)
+    resource_ids = [manager.add_resource(f"R{i}", 2) for i in range(5)]
+    process_ids = [manager.add_process(f"P{i}") for i in range(7)]
+    for i, process_id in enumerate(process_ids):
+        manager.allocate_resource(process_id, resource_ids[i % 5])
+    assert_mirrors_dicts(manager)
+    assert manager.matrices.utilization() == pytest.approx(
+        {resource_id: (2 - manager.resources[resource_id].available_units) * 50.0 for resource_id in resource_ids})
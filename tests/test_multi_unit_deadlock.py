@@ -0,0 +1,73 @@
+"""Multi-unit deadlock detection (find_blocked_processes) against brute force."""
+
+import random
+
+import pytest
+
+from app.models.deadlock import find_blocked_processes
+from conftest import brute_force_blocked, manager_blocked, workload_manager
+
+
+def random_state(rng: random.Random, processes: int, resources: int):
+    """Random holdings and demands within random capacities."""
+    totals = {f"R{i}": rng.randint(1, 5) for i in range(resources)}
+    available = dict(totals)
+    holdings, demands = {}, {}
+    for i in range(processes):
+        process_id = f"P{i}"
+        holdings[process_id], demands[process_id] = {}, {}
+        for resource_id, total in totals.items():
+            if available[resource_id] and rng.random() < 0.3:
+                units = rng.randint(1, available[resource_id])
+                holdings[process_id][resource_id] = units
+                available[resource_id] -= units
+            elif rng.random() < 0.3:
+                demands[process_id][resource_id] = rng.randint(1, total)
+    return available, holdings, demands
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_reduction_matches_brute_force(seed):
+    rng = random.Random(seed)
+    available, holdings, demands = random_state(rng, rng.randint(1, 12), rng.randint(1, 6))
+    assert find_blocked_processes(available, holdings, demands) == brute_force_blocked(available, holdings, demands)
+
+
+def test_cycle_through_a_resource_with_spare_units_is_not_a_deadlock(manager):
+    shared = manager.add_resource('Shared', 2)
+    single = manager.add_resource('Single', 1)
+    a = manager.add_process('A')
+    b = manager.add_process('B')
+    manager.allocate_resource(a, shared)
+    manager.allocate_resource(b, single)
+    manager.request_resource(a, single)
+    manager.request_resource(b, shared)
+    # B waits for A in the wait-for graph, but a unit of Shared is free
+    assert manager.wait_for.has_cycle()
+    assert manager.deadlocked_processes() == set()
+    assert manager.detect_deadlock()['has_deadlock'] is False
+
+
+def test_cycle_without_spare_units_is_a_deadlock(manager):
+    shared = manager.add_resource('Shared', 2)
+    single = manager.add_resource('Single', 1)
+    a = manager.add_process('A')
+    b = manager.add_process('B')
+    manager.allocate_resource(a, shared, 2)
+    manager.allocate_resource(b, single)
+    manager.request_resource(a, single)
+    manager.request_resource(b, shared)
+    assert manager.deadlocked_processes() == {a, b}
+
+
+def test_only_the_processes_given_are_considered():
+    holdings = {'A': {'R': 1}, 'B': {}}
+    demands = {'A': {}, 'B': {'R': 1}}
+    assert find_blocked_processes({'R': 0}, holdings, demands) == set()
+    assert find_blocked_processes({'R': 0}, holdings, demands, process_ids=['B']) == {'B'}
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_manager_matches_brute_force_on_multi_unit_workloads(seed):
+    manager = workload_manager(seed, processes=40, resources=8, operations=600, shape='hotspot')
+    assert manager.deadlocked_processes() == manager_blocked(manager)
@@ -0,0 +1,148 @@
+"""Snapshots plus the tail of the operation log restore the exact state."""
+
+import numpy as np
+import pytest
+
+from app.models.deltas import DeltaLog
+from app.models.history import AllocationHistory
+from app.models.resource_allocation import ResourceAllocationManager
+from app.models.snapshot import decode_snapshot, encode_snapshot
+from app.models.storage import MemoryOperationStore, SQLiteOperationStore
+from benchmarks.workloads import WorkloadSpec, generate
+from conftest import apply_operations, state_of
+
+
+def persisted_state(manager) -> dict:
+    """state_of() plus the history and hold-time statistics a snapshot carries."""
+    history = manager.allocation_history
+    columns = history.columns()
+    return {
+        'entities': state_of(manager),
+        'created': {process_id: process.creation_time for process_id, process in manager.processes.items()},
+        'history': [(history.ids.external(int(process)), history.ids.external(int(resource)), int(event_type),
+                     int(units), int(timestamp))
+                    for timestamp, event_type, process, resource, units
+                    in zip(columns['timestamp'], columns['type'], columns['process'], columns['resource'],
+                           columns['units'])],
+        'hold_times': {resource_id: summary.to_dict()
+                       for resource_id, summary in manager.hold_times.summaries.items()},
+        'deadlocked': manager.deadlocked_processes(),
+    }
+
+
+def run_workload(manager, seed: int, operations: int = 400) -> None:
+    workload = generate(WorkloadSpec(f"persist-{seed}", processes=20, resources=8, operations=operations,
+                                     seed=seed))
+    workload.apply_setup(manager)
+    apply_operations(manager, workload.operations)
+
+
+@pytest.mark.parametrize('interval', [None, 1, 37, 100])
+def test_restart_restores_the_snapshot_and_replays_the_tail(tmp_path, interval):
+    path = str(tmp_path / 'state.db')
+    store = SQLiteOperationStore(path)
+    manager = ResourceAllocationManager(storage=store, checkpoint_interval=interval,
+                                        history=AllocationHistory(max_events=None))
+    run_workload(manager, seed=31)
+    expected = persisted_state(manager)
+    snapshot_sequence = store.snapshot_sequence()
+    if interval:
+        # Only the operations from the last snapshot on are kept
+        assert snapshot_sequence > manager.storage_sequence - interval
+        assert store.read(0)[0][0] == snapshot_sequence
+    else:
+        assert snapshot_sequence == 0
+    store.close()
+
+    reopened = SQLiteOperationStore(path)
+    restarted = ResourceAllocationManager(storage=reopened, checkpoint_interval=interval,
+                                          history=AllocationHistory(max_events=None))
+    assert persisted_state(restarted) == expected
+    assert restarted.storage_sequence == manager.storage_sequence
+    reopened.close()
+
+
+def test_recovery_applies_only_the_operations_after_the_snapshot(tmp_path, monkeypatch):
+    path = str(tmp_path / 'state.db')
+    store = SQLiteOperationStore(path)
+    manager = ResourceAllocationManager(storage=store, checkpoint_interval=None)
+    run_workload(manager, seed=32, operations=200)
+    manager.checkpoint()
+    resource = next(iter(manager.resources))
+    for i in range(5):
+        manager.add_process(f"Tail {i}")
+    manager.set_resource_units(resource, 50)
+    store.close()
+
+    replayed = []
+    original = ResourceAllocationManager._apply_stored
+    monkeypatch.setattr(ResourceAllocationManager, '_apply_stored',
+                        lambda self, operation: replayed.append(operation['op']) or original(self, operation))
+    restarted = ResourceAllocationManager(storage=SQLiteOperationStore(path), checkpoint_interval=None)
+    assert replayed == ['add_process'] * 5 + ['set_resource_units']
+    assert state_of(restarted) == state_of(manager)
+    restarted.storage.close()
+
+
+def test_lagging_manager_restores_the_snapshot():
+    store = MemoryOperationStore()
+    lagging = ResourceAllocationManager(storage=store, checkpoint_interval=None)
+    writer = ResourceAllocationManager(storage=store, checkpoint_interval=25)
+    run_workload(writer, seed=33, operations=300)
+    # The operations lagging has not applied were dropped by the checkpoints
+    assert store.read(0)[0][0] > 1
+    lagging.sync()
+    assert persisted_state(lagging) == persisted_state(writer)
+
+
+def test_export_and_restore_round_trip():
+    manager = ResourceAllocationManager(scheduling_policy='priority', history=AllocationHistory(max_events=None))
+    run_workload(manager, seed=34)
+    claims = ResourceAllocationManager(avoidance=True)
+    resource = claims.add_resource('R', 3)
+    claims.add_process('P', max_claims={resource: 2}, priority=4)
+
+    for source in (manager, claims):
+        restored = ResourceAllocationManager(history=AllocationHistory(max_events=None))
+        restored.restore_state(source.export_state())
+        assert persisted_state(restored) == persisted_state(source)
+        assert list(restored.processes) == list(source.processes)
+
+
+def test_partial_history_export():
+    manager = ResourceAllocationManager(history=AllocationHistory(max_events=None))
+    run_workload(manager, seed=35, operations=100)
+    restored = ResourceAllocationManager()
+    restored.restore_state(manager.export_state(history_events=10))
+    assert state_of(restored) == state_of(manager)
+    assert len(restored.allocation_history) == 10
+    assert list(restored.allocation_history) == list(manager.allocation_history)[-10:]
+
+
+def test_restore_publishes_a_reset():
+    source = ResourceAllocationManager()
+    run_workload(source, seed=36, operations=50)
+    target = ResourceAllocationManager(deltas=DeltaLog())
+    target.add_resource('Old', 1)
+    version = target.version
+    target.restore_state(source.export_state())
+    batches = target.deltas.since(version)
+    assert batches[0][1] == [{'type': 'reset'}]
+    added = {delta['node']['id'] for _, batch in batches[1:] for delta in batch if delta['type'] == 'node_added'}
+    assert added == set(source.processes) | set(source.resources)
+
+
+def test_snapshot_format():
+    arrays = {'a': np.arange(5, dtype=np.int64), 'b': np.ones((2, 3), dtype=np.float32)}
+    header, decoded = decode_snapshot(encode_snapshot({'key': [1, 'x']}, arrays))
+    assert header['key'] == [1, 'x']
+    for name, array in arrays.items():
+        assert decoded[name].dtype == array.dtype
+        assert np.array_equal(decoded[name], array)
+    with pytest.raises(ValueError):
+        decode_snapshot(b'nonsense')
+
+
+def test_checkpoint_needs_a_store(manager):
+    with pytest.raises(RuntimeError):
+        manager.checkpoint()
@@ -0,0 +1,176 @@
+"""Indexed, paginated listings equal filtering every entity."""
+
+import random
+
+import pytest
+
+from app.models.query import (EntityIndex, MAX_PAGE_SIZE, UTILIZATION_BUCKETS, process_record, resource_record,
+                              utilization_bucket)
+from conftest import workload_manager
+
+
+def all_pages(find, limit: int, **filters) -> list:
+    """IDs of every page of a listing, checking the total on each page."""
+    ids = []
+    after = None
+    total = None
+    while True:
+        page = find(after=after, limit=limit, **filters)
+        assert total is None or page.total == total
+        total = page.total
+        ids += [entity.id for entity in page.items]
+        if page.next_cursor is None:
+            assert len(ids) == total
+            return ids
+        assert len(page.items) == limit
+        after = page.next_cursor
+
+
+@pytest.fixture
+def busy_manager():
+    manager = workload_manager(11, processes=60, resources=12, operations=800)
+    # A few shared names, to exercise the name index
+    for i in range(5):
+        manager.add_process('Twin', priority=i)
+        manager.add_resource('twin', 2)
+    return manager
+
+
+@pytest.mark.parametrize('limit', [1, 7, 500])
+def test_process_listings_match_brute_force(busy_manager, limit):
+    manager = busy_manager
+    processes = list(manager.processes.values())
+    rng = random.Random(limit)
+    resource_ids = list(manager.resources)
+    deadlocked = manager.deadlocked_processes()
+    queries = [{}, {'name': 'twin'}, {'name': 'Nobody'}, {'deadlocked': True}, {'holding': 'missing'}]
+    for resource_id in rng.sample(resource_ids, 4):
+        queries += [{'holding': resource_id}, {'waiting_for': resource_id},
+                    {'holding': resource_id, 'deadlocked': True}]
+    for query in queries:
+        expected = [process.id for process in processes
+                    if ('name' not in query or process.name.casefold() == query['name'].casefold())
+                    and ('holding' not in query or query['holding'] in process.allocated_resources)
+                    and ('waiting_for' not in query or query['waiting_for'] in process.requested_resources)
+                    and (not query.get('deadlocked') or process.id in deadlocked)]
+        assert all_pages(manager.find_processes, limit, **query) == expected, query
+
+
+@pytest.mark.parametrize('limit', [1, 5, 500])
+def test_resource_listings_match_brute_force(busy_manager, limit):
+    manager = busy_manager
+    resources = list(manager.resources.values())
+    queries = [{}, {'name': 'TWIN'}]
+    queries += [{'utilization': bucket} for bucket in UTILIZATION_BUCKETS]
+    for process_id in list(manager.processes)[:10]:
+        queries += [{'held_by': process_id}, {'awaited_by': process_id},
+                    {'held_by': process_id, 'utilization': 'full'}]
+    for query in queries:
+        expected = [resource.id for resource in resources
+                    if ('name' not in query or resource.name.casefold() == query['name'].casefold())
+                    and ('held_by' not in query or query['held_by'] in resource.allocated_to)
+                    and ('awaited_by' not in query or query['awaited_by'] in resource.requested_by)
+                    and ('utilization' not in query or utilization_bucket(resource) == query['utilization'])]
+        assert all_pages(manager.find_resources, limit, **query) == expected, query
+
+
+def test_indexes_follow_mutations(manager):
+    resource = manager.add_resource('Disk', 4)
+    process = manager.add_process('Writer')
+    assert [r.id for r in manager.find_resources(utilization='idle').items] == [resource]
+    manager.allocate_resource(process, resource, 3)
+    assert [r.id for r in manager.find_resources(utilization='high').items] == [resource]
+    manager.set_resource_units(resource, 3)
+    assert [r.id for r in manager.find_resources(utilization='full').items] == [resource]
+    manager.remove_process(process)
+    assert [r.id for r in manager.find_resources(utilization='idle').items] == [resource]
+    assert manager.find_processes(name='writer').items == []
+    assert manager.get_process(process) is None
+
+
+def test_cursors_survive_changes_between_pages(manager):
+    ids = [manager.add_process(f"P{i}") for i in range(10)]
+    first = manager.find_processes(limit=4)
+    assert [p.id for p in first.items] == ids[:4]
+    # Removing listed and unlisted processes and adding new ones
+    # neither repeats nor skips the processes that remain
+    manager.remove_process(ids[3])
+    manager.remove_process(ids[5])
+    added = manager.add_process('Late')
+    rest = []
+    cursor = first.next_cursor
+    while cursor is not None:
+        page = manager.find_processes(after=cursor, limit=3)
+        rest += [process.id for process in page.items]
+        cursor = page.next_cursor
+    assert rest == ids[4:5] + ids[6:] + [added]
+
+
+def test_compaction_keeps_the_order():
+    index = EntityIndex(parity=lambda entity: entity % 2)
+    for i in range(300):
+        index.update(f"E{i}", i)
+    for i in range(0, 300, 3):
+        index.update(f"E{i}", None)
+    for i in range(300, 310):
+        index.update(f"E{i}", i)
+    kept = [f"E{i}" for i in range(310) if i >= 300 or i % 3]
+    assert len(index) == len(kept)
+    ids, cursor = index.page(limit=1000)
+    assert ids == kept and cursor is None
+    ids, cursor = index.page(limit=50)
+    assert index.page(after=cursor, limit=1000)[0] == kept[50:]
+    odd = [entity_id for entity_id in kept if int(entity_id[1:]) % 2]
+    assert index.page(index.matching('parity', 1), limit=1000)[0] == odd
+
+
+def test_invalid_queries(manager, client):
+    with pytest.raises(ValueError):
+        manager.find_resources(utilization='nonsense')
+    assert manager.find_processes(limit=10_000).next_cursor is None
+    assert client.get('/api/resources?utilization=nonsense').status_code == 400
+
+
+def test_listing_endpoints(client, web_manager):
+    resource = web_manager.add_resource('R', 1)
+    ids = [web_manager.add_process(f"P{i}") for i in range(5)]
+    web_manager.allocate_resource(ids[0], resource)
+    page = client.get('/api/processes?limit=2').get_json()
+    assert [item['id'] for item in page['items']] == ids[:2]
+    assert page['total'] == 5
+    page = client.get(f"/api/processes?limit=10&after={page['next_cursor']}").get_json()
+    assert [item['id'] for item in page['items']] == ids[2:]
+    assert page['next_cursor'] is None
+    holders = client.get(f"/api/processes?holding={resource}").get_json()
+    assert [item['id'] for item in holders['items']] == ids[:1]
+    full = client.get('/api/resources?utilization=full').get_json()
+    assert full['items'][0]['allocated_to'] == {ids[0]: 1}
+
+
+def test_pages_render_records_built_under_the_lock(client, flask_module, web_manager, monkeypatch):
+    resources = [web_manager.add_resource(f"R{i}", 2) for i in range(MAX_PAGE_SIZE + 3)]
+    holder = web_manager.add_process('Holder')
+    web_manager.allocate_resource(holder, resources[-1])
+    web_manager.request_resource(holder, resources[0])
+    monkeypatch.setattr(web_manager, 'get_resources', lambda: pytest.fail('copies every resource'))
+    rendered = {}
+    render_template = flask_module.render_template
+
+    def render(template, **context):
+        # Pages render outside the lock, from copies of the listed entities
+        assert not web_manager.lock._is_owned()
+        rendered[template] = context
+        return render_template(template, **context)
+
+    monkeypatch.setattr(flask_module, 'render_template', render)
+    body = client.get('/processes').get_data(as_text=True)
+    context = rendered['processes.html']
+    assert context['processes'] == [process_record(web_manager.processes[holder])]
+    assert len(context['available_resources']) == MAX_PAGE_SIZE
+    assert context['more_resources'] == 3
+    assert context['get_resource'](resources[-1])['name'] == f"R{MAX_PAGE_SIZE + 2}"
+    assert f"R{MAX_PAGE_SIZE + 2}" in body
+    assert '3 more on the Resources page' in body
+
+    client.get('/resources')
+    assert rendered['resources.html']['resources'][0] == resource_record(web_manager.resources[resources[0]])
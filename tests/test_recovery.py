@@ -0,0 +1,164 @@
+"""Recovery plans break deadlocks, and only pick the victims they need."""
+
+import pytest
+
+from app.models.recovery import RECOVERY_ACTIONS, RecoveryCost, plan_recovery
+from app.models.resource_allocation import ResourceAllocationManager
+from conftest import manager_blocked, state_of, workload_manager
+
+
+def copy_of(manager) -> ResourceAllocationManager:
+    copy = ResourceAllocationManager()
+    copy.restore_state(manager.export_state())
+    return copy
+
+
+def ring(manager, size: int, priorities=None) -> list:
+    """A deadlock of size processes, each holding one resource and waiting for the next."""
+    resources = [manager.add_resource(f"R{i}", 1) for i in range(size)]
+    processes = [manager.add_process(f"P{i}", priority=(priorities or [0] * size)[i]) for i in range(size)]
+    for i, process_id in enumerate(processes):
+        manager.allocate_resource(process_id, resources[i])
+        manager.request_resource(process_id, resources[(i + 1) % size])
+    return processes
+
+
+def rings_manager() -> ResourceAllocationManager:
+    """Rings of single and multi-unit resources sharing some processes."""
+    manager = ResourceAllocationManager()
+    processes = ring(manager, 4) + ring(manager, 3)
+    shared = manager.add_resource('Shared', 4)
+    for process_id in processes[::2]:
+        manager.allocate_resource(process_id, shared)
+    for process_id in processes[1::2]:
+        manager.request_resource(process_id, shared, 2)
+    return manager
+
+
+DEADLOCKS = {
+    'rings': rings_manager,
+    'cycles': lambda: workload_manager(66, processes=40, resources=40, operations=20, shape='cycles'),
+    'random': lambda: workload_manager(64, processes=50, resources=10, operations=1200),
+    'small': lambda: workload_manager(61, processes=30, resources=6, operations=600),
+    'priority': lambda: workload_manager(65, processes=50, resources=10, operations=1200,
+                                         scheduling_policy='priority'),
+}
+
+
+@pytest.mark.parametrize('name', DEADLOCKS)
+@pytest.mark.parametrize('action', RECOVERY_ACTIONS)
+def test_applying_the_plan_leaves_no_deadlock(name, action):
+    manager = DEADLOCKS[name]()
+    deadlocked = manager.deadlocked_processes()
+    assert deadlocked
+    plan = manager.recover_deadlock(action)
+    assert plan.resolved
+    assert plan.deadlocked == sorted(deadlocked)
+    assert {victim.process_id for victim in plan.victims} <= deadlocked
+    assert not manager.deadlocked_processes()
+    assert not manager_blocked(manager)
+    for victim in plan.victims:
+        if action == 'abort':
+            assert victim.process_id not in manager.processes
+        else:
+            # Preempted victims stay, without the units they gave up
+            process = manager.processes[victim.process_id]
+            assert not process.allocated_resources.keys() & victim.resources.keys()
+            assert not process.requested_resources.keys() & set(victim.cancelled)
+
+
+@pytest.mark.parametrize('name', ['rings', 'cycles', 'small'])
+@pytest.mark.parametrize('action', RECOVERY_ACTIONS)
+def test_every_victim_is_needed(name, action):
+    manager = DEADLOCKS[name]()
+    plan = manager.plan_recovery(action)
+    assert plan.victims
+    for spared in plan.victims:
+        copy = copy_of(manager)
+        others = [victim for victim in plan.victims if victim is not spared]
+        copy.apply_batch([operation for operation in plan.operations()
+                          if operation['process_id'] in {victim.process_id for victim in others}])
+        assert copy.deadlocked_processes(), spared.process_id
+
+
+def test_preempted_units_are_not_granted_back():
+    manager = DEADLOCKS['random']()
+    plan = manager.plan_recovery('preempt')
+    victim = next(victim for victim in plan.victims if victim.cancelled)
+    resource_id = victim.cancelled[0]
+    operations = plan.operations()
+    assert operations.index({'op': 'cancel', 'process_id': victim.process_id, 'resource_id': resource_id}) < \
+        operations.index({'op': 'release', 'process_id': victim.process_id, 'resource_id': resource_id})
+    manager.apply_batch(operations)
+    assert resource_id not in manager.processes[victim.process_id].allocated_resources
+
+
+def test_the_cheapest_process_is_picked():
+    manager = ResourceAllocationManager()
+    processes = ring(manager, 4, priorities=[3, 3, 0, 3])
+    plan = manager.plan_recovery()
+    assert [victim.process_id for victim in plan.victims] == [processes[2]]
+    held = list(manager.processes[processes[2]].allocated_resources)
+    assert plan.operations() == [{'op': 'release', 'process_id': processes[2], 'resource_id': held[0]}]
+    # With priority weighing nothing, units decide: still one victim
+    assert len(manager.plan_recovery(cost=RecoveryCost(priority=0)).victims) == 1
+
+
+def test_two_rings_need_two_victims():
+    manager = ResourceAllocationManager()
+    first = set(ring(manager, 3))
+    second = set(ring(manager, 5))
+    plan = manager.plan_recovery('abort')
+    victims = {victim.process_id for victim in plan.victims}
+    assert len(victims) == 2
+    assert victims & first and victims & second
+    assert 'breaks the deadlock' in plan.describe()
+
+
+def test_dry_runs_change_nothing():
+    manager = DEADLOCKS['cycles']()
+    before = state_of(manager)
+    version = manager.version
+    plan = manager.recover_deadlock('abort', dry_run=True)
+    assert plan.victims
+    assert state_of(manager) == before
+    assert manager.version == version
+
+
+def test_recovery_is_one_version(manager):
+    ring(manager, 6)
+    version = manager.version
+    manager.recover_deadlock('preempt')
+    assert manager.version == version + 1
+
+
+def test_without_a_deadlock_nothing_is_planned(manager):
+    manager.add_resource('R', 1)
+    plan = manager.recover_deadlock()
+    assert plan.victims == [] and plan.resolved
+    assert plan.describe() == 'No deadlock detected'
+
+
+@pytest.mark.parametrize('weights', [{'victim': -1}, {'units': 'many'}, {'age': True}, {'nonsense': 1}])
+def test_invalid_cost_weights(weights):
+    with pytest.raises(ValueError):
+        RecoveryCost.from_dict(weights)
+
+
+def test_unknown_actions_are_rejected(manager):
+    with pytest.raises(ValueError):
+        plan_recovery(set(), {}, {}, action='nonsense')
+    with pytest.raises(ValueError):
+        manager.recover_deadlock('nonsense')
+
+
+def test_resolve_deadlock_endpoint(client, web_manager):
+    ring(web_manager, 4)
+    response = client.post('/api/apply_optimization', json={'action': 'resolve_deadlock', 'recovery': 'abort',
+                                                           'cost': {'age': 0}})
+    result = response.get_json()
+    assert response.status_code == 200 and result['success']
+    assert len(result['plan']['victims']) == 1
+    assert result['plan']['summary'] == result['message']
+    assert not web_manager.deadlocked_processes()
+    assert len(web_manager.processes) == 3
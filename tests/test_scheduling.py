@@ -0,0 +1,104 @@
+"""Request queues and automatic grants on release."""
+
+import random
+
+import pytest
+
+from app.models.resource_allocation import ResourceAllocationManager
+from app.models.scheduling import RequestQueue
+
+
+def test_queue_orders_by_policy():
+    requests = [('A', 3, 0), ('B', 1, 5), ('C', 2, 9), ('D', 1, 5)]
+    orders = {}
+    for policy in ('fifo', 'priority', 'shortest'):
+        queue = RequestQueue(policy)
+        for process_id, units, priority in requests:
+            queue.push(process_id, units, priority)
+        orders[policy] = [queue.pop()[0] for _ in range(len(queue))]
+    assert orders == {
+        'fifo': ['A', 'B', 'C', 'D'],
+        'priority': ['C', 'B', 'D', 'A'],
+        'shortest': ['B', 'D', 'C', 'A'],
+    }
+    with pytest.raises(ValueError):
+        RequestQueue('lottery')
+
+
+def test_growing_request_keeps_its_place_and_removal_is_lazy():
+    queue = RequestQueue('fifo')
+    for process_id in 'ABC':
+        queue.push(process_id, 1)
+    queue.push('A', 4)
+    queue.remove('B')
+    assert 'B' not in queue
+    assert queue.waiting() == [('A', 4), ('C', 1)]
+    clone = queue.copy()
+    assert clone.pop() == ('A', 4)
+    assert queue.peek() == ('A', 4)
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_queue_matches_a_sorted_list(seed):
+    rng = random.Random(seed)
+    queue = RequestQueue('shortest')
+    expected = {}
+    arrival = {}
+    for step in range(500):
+        process_id = f"P{rng.randrange(30)}"
+        if rng.random() < 0.6:
+            units = rng.randint(1, 5)
+            arrival.setdefault(process_id, step)
+            expected[process_id] = units
+            queue.push(process_id, units)
+        elif rng.random() < 0.5:
+            expected.pop(process_id, None)
+            arrival.pop(process_id, None)
+            queue.remove(process_id)
+        elif expected:
+            head = min(expected, key=lambda key: (expected[key], arrival[key]))
+            assert queue.pop() == (head, expected.pop(head))
+            del arrival[head]
+        assert len(queue) == len(expected)
+
+
+def test_release_grants_the_queue_head_while_it_fits(manager):
+    printer = manager.add_resource('Printer', 3)
+    owner, big, small = (manager.add_process(name) for name in ('Owner', 'Big', 'Small'))
+    manager.allocate_resource(owner, printer, 3)
+    manager.request_resource(big, printer, 3)
+    manager.request_resource(small, printer, 1)
+    assert manager.request_queues[printer].waiting() == [(big, 3), (small, 1)]
+
+    manager.release_resource(owner, printer)
+    # Big goes first; Small stays queued rather than overtaking it
+    assert manager.processes[big].allocated_resources == {printer: 3}
+    assert manager.processes[small].requested_resources == {printer: 1}
+    manager.release_resource(big, printer)
+    assert manager.processes[small].allocated_resources == {printer: 1}
+    assert not manager.resources[printer].requested_by
+
+
+def test_policy_change_reorders_and_grants(manager):
+    disk = manager.add_resource('Disk', 1)
+    holder = manager.add_process('Holder')
+    low = manager.add_process('Low', priority=1)
+    high = manager.add_process('High', priority=9)
+    manager.allocate_resource(holder, disk)
+    manager.request_resource(low, disk)
+    manager.request_resource(high, disk)
+    manager.set_scheduling_policy(disk, 'priority')
+    manager.release_resource(holder, disk)
+    assert high in manager.resources[disk].allocated_to
+    assert low in manager.resources[disk].requested_by
+
+
+def test_no_automatic_grants_without_a_policy():
+    manager = ResourceAllocationManager(scheduling_policy=None)
+    disk = manager.add_resource('Disk', 1)
+    holder, waiter = manager.add_process('Holder'), manager.add_process('Waiter')
+    manager.allocate_resource(holder, disk)
+    manager.request_resource(waiter, disk)
+    manager.release_resource(holder, disk)
+    assert manager.resources[disk].requested_by == {waiter: 1}
+    assert manager.resources[disk].available_units == 1
@@ -0,0 +1,105 @@
+"""Managers sharing one operation log stay in step."""
+
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+from app.models.resource_allocation import ResourceAllocationManager
+from app.models.storage import MemoryOperationStore, SQLiteOperationStore
+from benchmarks.workloads import WorkloadSpec, generate
+from conftest import ROOT, apply_operations, state_of
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def stores(request, tmp_path):
+    """Two handles on one log, as two worker processes would hold them."""
+    if request.param == 'memory':
+        store = MemoryOperationStore()
+        yield store, store
+        return
+    path = str(tmp_path / 'shared.db')
+    first, second = SQLiteOperationStore(path), SQLiteOperationStore(path)
+    yield first, second
+    first.close()
+    second.close()
+
+
+def test_interleaved_writers_converge(stores):
+    managers = [ResourceAllocationManager(storage=store, checkpoint_interval=None) for store in stores]
+    workload = generate(WorkloadSpec('shared', processes=15, resources=6, operations=300, seed=21))
+    workload.apply_setup(managers[0])
+    for index, operation in enumerate(workload.operations):
+        apply_operations(managers[index % 2], [operation])
+    for manager in managers:
+        manager.sync()
+    assert state_of(managers[0]) == state_of(managers[1])
+    assert managers[0].deadlocked_processes() == managers[1].deadlocked_processes()
+    assert managers[0].storage_sequence == managers[1].storage_sequence
+
+
+def test_writes_are_validated_against_the_shared_state(stores):
+    first = ResourceAllocationManager(storage=stores[0], checkpoint_interval=None)
+    second = ResourceAllocationManager(storage=stores[1], checkpoint_interval=None)
+    resource = first.add_resource('R', 1)
+    process_a = first.add_process('A')
+    process_b = first.add_process('B')
+    second.sync()
+    first.allocate_resource(process_a, resource)
+    sequence = first.storage_sequence
+
+    # second has not synced, but the write catches up before validating
+    with pytest.raises(ValueError):
+        second.allocate_resource(process_b, resource)
+    assert second.resources[resource].allocated_to == {process_a: 1}
+    # Rejected operations are not stored
+    assert stores[0].read(sequence) == []
+
+
+def test_new_ids_are_the_same_everywhere(stores):
+    first = ResourceAllocationManager(storage=stores[0], checkpoint_interval=None)
+    second = ResourceAllocationManager(storage=stores[1], checkpoint_interval=None)
+    resource = first.add_resource('R', 2)
+    result = first.apply_batch([{'op': 'add_process', 'name': 'P'}])
+    second.sync()
+    assert resource in second.resources
+    assert result['results'][0] in second.processes
+
+
+def test_managers_in_separate_processes_share_the_log(tmp_path):
+    path = str(tmp_path / 'shared.db')
+    manager = ResourceAllocationManager(storage=SQLiteOperationStore(path), checkpoint_interval=None)
+    resource = manager.add_resource('R', 3)
+    script = textwrap.dedent(f"""
+        from app.models.resource_allocation import ResourceAllocationManager
+        from app.models.storage import SQLiteOperationStore
+        manager = ResourceAllocationManager(storage=SQLiteOperationStore({path!r}), checkpoint_interval=None)
+        process = manager.add_process('Remote')
+        manager.allocate_resource(process, {resource!r}, 2)
+    """)
+    subprocess.run([sys.executable, '-c', script], check=True, cwd=ROOT,
+                   env={**os.environ, 'PYTHONPATH': ROOT})
+    assert manager.sync() == 2
+    assert manager.resources[resource].available_units == 1
+    assert [process.name for process in manager.processes.values()] == ['Remote']
+    manager.storage.close()
+
+
+def test_stateless_routes_do_not_sync(client, web_manager, monkeypatch):
+    synced = []
+    monkeypatch.setattr(web_manager, 'storage', MemoryOperationStore())
+    monkeypatch.setattr(web_manager, 'sync', lambda: synced.append(True) or 0)
+    for path in ('/', '/metrics', '/static/does-not-exist.css', '/no-such-page'):
+        client.get(path)
+    assert synced == []
+    client.get('/api/graph-data')
+    assert synced == [True]
+
+
+def test_routes_do_not_sync_without_a_store(client, web_manager, monkeypatch):
+    synced = []
+    monkeypatch.setattr(web_manager, 'sync', lambda: synced.append(True) or 0)
+    client.get('/api/graph-data')
+    assert synced == []
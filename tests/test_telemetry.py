@@ -0,0 +1,138 @@
+"""Latency histograms, the /metrics exposition and the sampling profiler."""
+
+import sys
+import threading
+import time
+
+import pytest
+
+from app import profiling
+from app.models.resource_allocation import CALL_METRIC
+from app.profiling import ProfilerBusy, capture, sample_stacks
+from app.telemetry import Histogram, Metrics, metrics
+from conftest import workload_manager
+
+
+def test_concurrent_observations_are_not_lost():
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    registry = Metrics()
+    histogram = registry.histogram('seconds', route='/')
+
+    def observe():
+        for i in range(5000):
+            histogram.observe(i * 1e-6)
+            registry.increment('calls_total')
+
+    threads = [threading.Thread(target=observe) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    sys.setswitchinterval(interval)
+    counts, total = histogram.state()
+    assert sum(counts) == histogram.count == 40_000
+    assert total == pytest.approx(8 * sum(i * 1e-6 for i in range(5000)))
+    assert registry.value('calls_total') == 40_000
+
+
+def test_values_land_in_their_bucket():
+    histogram = Histogram((1.0, 2.0))
+    for value in (0.5, 1.0, 1.5, 3.0, 4.0):
+        histogram.observe(value)
+    # Bounds are inclusive, as Prometheus 'le' buckets are
+    assert histogram.state() == ([2, 1, 2], 10.0)
+
+
+def test_exposition_format():
+    registry = Metrics()
+    registry.increment('requests_total', route='/a"b')
+    registry.observe('seconds', 0.5, buckets=(0.1, 1.0), route='/')
+    registry.observe('seconds', 5, buckets=(0.1, 1.0), route='/')
+    lines = registry.exposition().splitlines()
+    assert lines == [
+        '# TYPE requests_total counter',
+        'requests_total{route="/a\\"b"} 1',
+        '# TYPE seconds histogram',
+        'seconds_bucket{route="/",le="0.1"} 0',
+        'seconds_bucket{route="/",le="1"} 1',
+        'seconds_bucket{route="/",le="+Inf"} 2',
+        'seconds_sum{route="/"} 5.5',
+        'seconds_count{route="/"} 2',
+    ]
+    registry.reset()
+    assert 'seconds_count{route="/"} 0' in registry.exposition()
+
+
+def test_manager_calls_are_timed():
+    histogram = metrics.histogram(CALL_METRIC, method='detect_deadlock')
+    before = histogram.count
+    manager = workload_manager(0, operations=50)
+    manager.detect_deadlock()
+    assert histogram.count == before + 1
+
+
+def test_metrics_endpoint(client):
+    client.get('/api/graph-data')
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    body = response.get_data(as_text=True)
+    assert 'http_requests_total{method="GET",route="/api/graph-data",status="200"}' in body
+    assert 'http_request_seconds_count{method="GET",route="/api/graph-data"}' in body
+    assert f'{CALL_METRIC}_bucket{{method="get_graph_data",le="+Inf"}}' in body
+
+
+def test_profiles_sample_other_threads():
+    stop = threading.Event()
+
+    def busy_loop_to_find():
+        while not stop.is_set():
+            sum(range(1000))
+
+    thread = threading.Thread(target=busy_loop_to_find, name='worker')
+    thread.start()
+    try:
+        stacks = sample_stacks(0.2, 0.005)
+    finally:
+        stop.set()
+        thread.join()
+    assert any(stack.startswith('worker;') and 'busy_loop_to_find' in stack for stack in stacks)
+    assert sum(stacks.values()) >= 10
+    assert not any('sample_stacks' in stack for stack in stacks)
+    with pytest.raises(ValueError):
+        capture(0)
+    with pytest.raises(ValueError):
+        capture(1, interval=5)
+
+
+def test_one_capture_at_a_time():
+    running = threading.Thread(target=capture, args=(0.5,))
+    running.start()
+    time.sleep(0.1)
+    try:
+        with pytest.raises(ProfilerBusy):
+            capture(0.1)
+    finally:
+        running.join()
+    assert capture(0.01) is not None
+
+
+def test_profile_endpoint(client, monkeypatch):
+    monkeypatch.delenv('RAG_PROFILING', raising=False)
+    assert client.get('/api/profile?seconds=0.01').status_code == 404
+
+    monkeypatch.setenv('RAG_PROFILING', '1')
+    response = client.get('/api/profile?seconds=0.05&interval=0.01')
+    assert response.status_code == 200
+    assert response.headers['X-Profile-Pid']
+    for line in response.get_data(as_text=True).splitlines():
+        stack, count = line.rsplit(' ', 1)
+        assert stack and int(count) > 0
+    assert client.get('/api/profile?seconds=1000').status_code == 400
+
+    assert profiling._capture_lock.acquire(blocking=False)
+    try:
+        assert client.get('/api/profile?seconds=0.01').status_code == 409
+    finally:
+        profiling._capture_lock.release()
@@ -0,0 +1,134 @@
+"""Incremental deadlock detection (WaitForGraph) against brute force."""
+
+import random
+
+import networkx as nx
+import pytest
+
+from app.models.deadlock import WaitForGraph
+from conftest import manager_blocked, workload_manager
+
+
+class Edges:
+    """Stand-in for a Resource: the wait-for graph only reads its edge dicts."""
+
+    def __init__(self):
+        self.allocated_to = {}
+        self.requested_by = {}
+
+
+def cyclic_by_search(successors) -> set:
+    """Processes that can reach themselves, by a search from every node."""
+    cyclic = set()
+    for start in successors:
+        seen, stack = set(), list(successors[start])
+        while stack:
+            node = stack.pop()
+            if node == start:
+                cyclic.add(start)
+                break
+            if node not in seen:
+                seen.add(node)
+                stack.extend(successors.get(node, ()))
+    return cyclic
+
+
+def expected_successors(resources) -> dict:
+    successors = {}
+    for resource in resources.values():
+        for waiter in resource.requested_by:
+            for holder in resource.allocated_to:
+                successors.setdefault(waiter, set()).add(holder)
+    return successors
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_random_edge_changes_match_a_full_search(seed):
+    rng = random.Random(seed)
+    graph = WaitForGraph()
+    resources = {f"R{i}": Edges() for i in range(6)}
+    processes = [f"P{i}" for i in range(8)]
+    for _ in range(300):
+        resource = resources[rng.choice(list(resources))]
+        process_id = rng.choice(processes)
+        kind = rng.random()
+        if kind < 0.3 and process_id not in resource.allocated_to:
+            graph.holder_added(resource, process_id)
+            resource.allocated_to[process_id] = 1
+        elif kind < 0.6 and process_id not in resource.requested_by:
+            graph.waiter_added(resource, process_id)
+            resource.requested_by[process_id] = 1
+        elif kind < 0.8 and process_id in resource.allocated_to:
+            del resource.allocated_to[process_id]
+            graph.holder_removed(resource, process_id)
+        elif process_id in resource.requested_by:
+            del resource.requested_by[process_id]
+            graph.waiter_removed(resource, process_id)
+        # Query only now and then, so several changes pile up between queries
+        if rng.random() < 0.3:
+            expected = cyclic_by_search(expected_successors(resources))
+            assert graph.cyclic_processes() == expected
+            assert graph.has_cycle() == bool(expected)
+
+
+def test_edge_through_two_resources_survives_removing_one():
+    graph = WaitForGraph()
+    first, second, back = Edges(), Edges(), Edges()
+    for resource in (first, second):
+        graph.holder_added(resource, 'B')
+        resource.allocated_to['B'] = 1
+        graph.waiter_added(resource, 'A')
+        resource.requested_by['A'] = 1
+    graph.holder_added(back, 'A')
+    back.allocated_to['A'] = 1
+    graph.waiter_added(back, 'B')
+    back.requested_by['B'] = 1
+    assert graph.cyclic_processes() == {'A', 'B'}
+
+    del first.requested_by['A']
+    graph.waiter_removed(first, 'A')
+    assert graph.cyclic_processes() == {'A', 'B'}
+    del second.requested_by['A']
+    graph.waiter_removed(second, 'A')
+    assert graph.cyclic_processes() == set()
+
+
+@pytest.mark.parametrize('seed', range(6))
+def test_manager_deadlock_matches_the_brute_force_reduction(seed):
+    if seed % 2:
+        # Every process holds its own single-unit resource and waits in a ring
+        manager = workload_manager(seed, processes=20, resources=20, shape='cycles')
+    else:
+        manager = workload_manager(seed)
+    assert manager.deadlocked_processes() == manager_blocked(manager)
+    report = manager.detect_deadlock()
+    assert report['has_deadlock'] == bool(manager_blocked(manager))
+    assert report['affected_processes'] == sorted(manager_blocked(manager))
+
+
+def test_listed_cycles_are_cycles_of_the_allocation_graph():
+    manager = workload_manager(3, processes=12, resources=12, shape='cycles')
+    graph = manager.graph
+    cycles = manager.find_cycles(limit=25)
+    assert cycles
+    assert len(cycles) <= 25
+    for cycle in cycles:
+        assert all(graph.has_edge(source, target) for source, target in zip(cycle, cycle[1:] + cycle[:1]))
+    assert manager.find_cycles(limit=0) == []
+
+
+def test_single_unit_deadlock_appears_and_clears(manager):
+    first = manager.add_resource('R1', 1)
+    second = manager.add_resource('R2', 1)
+    a = manager.add_process('A')
+    b = manager.add_process('B')
+    manager.allocate_resource(a, first)
+    manager.allocate_resource(b, second)
+    manager.request_resource(a, second)
+    assert not manager.deadlocked_processes()
+    manager.request_resource(b, first)
+    assert manager.deadlocked_processes() == {a, b}
+    assert nx.is_directed_acyclic_graph(manager.graph) is False
+
+    manager.cancel_request(b, first)
+    assert manager.deadlocked_processes() == set()
@@ -0,0 +1,137 @@
+"""The binary graph encoding decodes to the JSON encoding."""
+
+import gzip
+import json
+import os
+import shutil
+import subprocess
+
+import numpy as np
+import pytest
+
+from app.models.graph_views import GraphViewSpec
+from app.models.resource_allocation import ResourceAllocationManager
+from app.models.wire import GRAPH_MEDIA_TYPE, _integers, accepts_binary, accepts_gzip, decode_graph
+from conftest import ROOT, workload_manager
+
+
+def uuid_manager(**options) -> ResourceAllocationManager:
+    """A deadlocked manager whose IDs are all UUIDs, as the web app's are."""
+    manager = ResourceAllocationManager(**options)
+    resources = [manager.add_resource(f"Resource {i}", 1 if i < 4 else 3) for i in range(6)]
+    processes = [manager.add_process(f"Process {i}") for i in range(8)]
+    for i, process_id in enumerate(processes[:4]):
+        manager.allocate_resource(process_id, resources[i])
+        manager.request_resource(process_id, resources[(i + 1) % 4])
+    manager.allocate_resource(processes[4], resources[4], 2)
+    manager.allocate_resource(processes[5], resources[5], 3)
+    manager.request_resource(processes[4], resources[5], 2)
+    return manager
+
+
+def json_output(snapshot) -> dict:
+    """The graph data exactly as the JSON encoding serves it."""
+    return json.loads(snapshot.body)
+
+
+MANAGERS = {
+    'uuids': uuid_manager,
+    'no-layout': lambda: uuid_manager(layout=False),
+    'workload': lambda: workload_manager(51, processes=80, resources=20, operations=800),
+    'cycles': lambda: workload_manager(52, processes=40, resources=40, operations=20, shape='cycles'),
+    'empty': ResourceAllocationManager,
+}
+
+SPECS = [None, GraphViewSpec(deadlocked=True), GraphViewSpec(top=3), GraphViewSpec(max_nodes=8),
+         GraphViewSpec(max_nodes=1), GraphViewSpec(deadlocked=True, max_nodes=4)]
+
+
+@pytest.mark.parametrize('name', MANAGERS)
+@pytest.mark.parametrize('spec', SPECS, ids=str)
+def test_decode_equals_the_json_output(name, spec):
+    manager = MANAGERS[name]()
+    snapshot, body = manager.encoded_graph(spec)
+    assert decode_graph(body) == json_output(snapshot)
+    _, gzipped = manager.encoded_graph(spec, gzipped=True)
+    assert gzip.decompress(gzipped) == body
+
+
+def test_uuid_ids_are_packed():
+    manager = uuid_manager()
+    snapshot, body = manager.encoded_graph()
+    assert len(body) < len(snapshot.body) / 2
+    for node in snapshot.data['nodes']:
+        assert node['id'].encode() not in body
+
+
+def test_encodings_are_built_once_per_version(manager):
+    manager.add_resource('R', 1)
+    first = manager.encoded_graph()[1]
+    assert manager.encoded_graph()[1] is first
+    manager.add_process('P')
+    assert manager.encoded_graph()[1] is not first
+
+
+def test_integer_columns_use_the_smallest_type():
+    assert _integers([0, 255]).dtype == np.uint8
+    assert _integers([0, 256]).dtype == np.uint16
+    assert _integers([-1, 127]).dtype == np.int8
+    assert _integers([-1, 40_000]).dtype == np.int32
+    assert _integers([]).dtype == np.uint8
+    with pytest.raises(ValueError):
+        _integers([1 << 32])
+
+
+def test_content_negotiation():
+    assert accepts_binary(GRAPH_MEDIA_TYPE)
+    assert accepts_binary(f"application/json;q=0.5, {GRAPH_MEDIA_TYPE}")
+    assert not accepts_binary('*/*')
+    assert not accepts_binary(f"{GRAPH_MEDIA_TYPE};q=0")
+    assert not accepts_binary(f"{GRAPH_MEDIA_TYPE};q=nonsense")
+    assert accepts_gzip('gzip, deflate')
+    assert not accepts_gzip('identity')
+
+
+def test_graph_data_endpoint(client, web_manager):
+    resource = web_manager.add_resource('R', 1)
+    for i in range(3):
+        web_manager.request_resource(web_manager.add_process(f"P{i}"), resource)
+    as_json = client.get('/api/graph-data')
+    binary = client.get('/api/graph-data', headers={'Accept': GRAPH_MEDIA_TYPE})
+    assert binary.mimetype == GRAPH_MEDIA_TYPE
+    assert decode_graph(binary.data) == as_json.get_json()
+    assert binary.headers['ETag'] != as_json.headers['ETag']
+    assert 'Accept' in binary.headers['Vary']
+
+    gzipped = client.get('/api/graph-data', headers={'Accept': GRAPH_MEDIA_TYPE, 'Accept-Encoding': 'gzip'})
+    assert gzipped.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(gzipped.data) == binary.data
+    assert client.get('/api/graph-data', headers={'Accept': GRAPH_MEDIA_TYPE,
+                                                  'If-None-Match': binary.headers['ETag']}).status_code == 304
+
+    view = client.get('/api/graph-data?max_nodes=2', headers={'Accept': GRAPH_MEDIA_TYPE})
+    assert decode_graph(view.data) == client.get('/api/graph-data?max_nodes=2').get_json()
+
+
+DECODE_SCRIPT = """
+const fs = require('fs');
+const vm = require('vm');
+vm.runInThisContext(fs.readFileSync(process.argv[1], 'utf8'));
+const file = fs.readFileSync(process.argv[2]);
+const buffer = file.buffer.slice(file.byteOffset, file.byteOffset + file.length);
+process.stdout.write(JSON.stringify(decodeGraph(buffer)));
+"""
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='node is not installed')
+@pytest.mark.parametrize('name', ['uuids', 'workload', 'cycles'])
+def test_the_browser_decoder_agrees(tmp_path, name):
+    manager = MANAGERS[name]()
+    decoder = os.path.join(ROOT, 'app', 'static', 'js', 'graph_wire.js')
+    for spec in (None, GraphViewSpec(max_nodes=8)):
+        snapshot, body = manager.encoded_graph(spec)
+        path = tmp_path / 'graph.bin'
+        path.write_bytes(body)
+        result = subprocess.run(['node', '-e', DECODE_SCRIPT, decoder, str(path)],
+                                check=True, capture_output=True, text=True)
+        assert json.loads(result.stdout) == json_output(snapshot)